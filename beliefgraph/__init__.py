@@ -0,0 +1,45 @@
+"""
+Headless Python engine for Belief Graph minimal-format graphs.
+
+Loads minimal JSON (``minimal-format.schema.json``) into a compact array-backed
+``CompiledGraph`` and runs the same lite (robust logit) and heavy (CPT) rules
+as the browser app, without Cytoscape.
+
+    from beliefgraph import load_graph, propagate_heavy, propagate_lite
+    g = load_graph('tests/minimal-json/funding-round-herd.json')
+    heavy = propagate_heavy(g)
+    lite = propagate_lite(g).probs
+
+``IncrementalPropagator`` keeps that state alive and re-propagates only the
+descendants of an edited fact, weight or CPT. ``beliefgraph.causal`` batches
+heavy-mode do() interventions (ATE matrices, dose-response sweeps), and
+``ReachabilityIndex`` answers cycle checks and d-separation from ancestor bitsets.
+``solve_lite`` solves the lite fixed point to tight tolerance (vectorized,
+Anderson-accelerated). ``beliefgraph.montecarlo`` samples uncertain CPTs /
+weights and returns per-node uncertainty bands. ``PeerOverlay`` computes the
+peer-relation display overlay as one sparse step.
+
+Requires numpy (pip install numpy).
+"""
+
+from .causal import ATEResult, ate_matrix, compute_do, dose_response, propagate_interventions
+from .config import FACT_PROB
+from .graph import CompiledGraph, compile_graph, load_graph, normalize_any
+from .heavy import propagate_heavy
+from .incremental import IncrementalPropagator
+from .lite import LiteResult, propagate_lite
+from .peers import PeerOverlay
+from .reachability import ReachabilityIndex
+from .solver import SolverResult, solve_lite
+
+__all__ = [
+    'ATEResult', 'ate_matrix', 'compute_do', 'dose_response', 'propagate_interventions',
+    'FACT_PROB',
+    'CompiledGraph', 'compile_graph', 'load_graph', 'normalize_any',
+    'propagate_heavy',
+    'IncrementalPropagator',
+    'LiteResult', 'propagate_lite',
+    'PeerOverlay',
+    'ReachabilityIndex',
+    'SolverResult', 'solve_lite',
+]
@@ -0,0 +1,104 @@
+"""
+Accuracy report: the browser's many-parent log-odds fallback vs the exact marginal.
+
+For random heavy-mode assertions with a given fan-in, compares
+``log_odds_marginal`` (used above ``MAX_EXACT_PARENTS`` parents, as in
+bayes-logic.js) with ``many_parent_marginal`` and reports absolute errors, the
+DP's own error bound and the time per node.
+
+Usage:
+  python3 -m beliefgraph.accuracy [--fan-in 10,20,40,60] [--cases 200] [--seed 0] [--json]
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from .config import ENUMERATE_MAX_PARENTS
+from .heavy import (
+    baseline_probs, bucketed_marginal, clamp_cpt, log_odds_marginal, many_parent_marginal,
+)
+
+# CPT profiles (percent ranges for condTrue, condFalse, baseline)
+PROFILES = {
+    'wide': ((1, 99), (1, 99), (30, 70)),       # same ranges as test_validation.random_multi_parent_cases
+    'supportive': ((55, 95), (5, 45), (40, 60)),
+}
+
+
+def random_cases(n_cases: int, fan_in: int, profile: str = 'wide', seed: int = 0):
+    """(parent_probs (n, k), condTrue, condFalse, baseline (n, k) percentages)."""
+    rng = np.random.default_rng(seed)
+    (t_lo, t_hi), (f_lo, f_hi), (b_lo, b_hi) = PROFILES[profile]
+    shape = (n_cases, fan_in)
+    return (rng.uniform(0, 1, shape), rng.uniform(t_lo, t_hi, shape),
+            rng.uniform(f_lo, f_hi, shape), rng.uniform(b_lo, b_hi, shape))
+
+
+def fan_in_report(fan_in: int, n_cases: int = 200, profile: str = 'wide', seed: int = 0) -> dict:
+    """Error statistics of the log-odds fallback for one fan-in."""
+    probs, cond_true, cond_false, baseline = random_cases(n_cases, fan_in, profile, seed)
+    exact = np.empty(n_cases)
+    bound = np.zeros(n_cases)
+    approx = np.empty(n_cases)
+    t0 = time.perf_counter()
+    for i in range(n_cases):
+        args = (probs[i:i + 1], clamp_cpt(cond_true[i]), clamp_cpt(cond_false[i]), baseline_probs(baseline[i]))
+        if fan_in <= ENUMERATE_MAX_PARENTS:
+            exact[i] = many_parent_marginal(*args)[0]
+        else:
+            value, err = bucketed_marginal(*args, return_bound=True)
+            exact[i], bound[i] = value[0], err[0]
+    exact_ms = (time.perf_counter() - t0) * 1000 / n_cases
+    for i in range(n_cases):
+        approx[i] = np.clip(log_odds_marginal(probs[i:i + 1], clamp_cpt(cond_true[i]), clamp_cpt(cond_false[i])), 0, 1)[0]
+    err = np.abs(approx - exact)
+    return {
+        'fan_in': fan_in,
+        'profile': profile,
+        'cases': n_cases,
+        'method': 'enumeration' if fan_in <= ENUMERATE_MAX_PARENTS else 'bucketed-dp',
+        'log_odds_mean_abs_err': float(err.mean()),
+        'log_odds_p95_abs_err': float(np.quantile(err, 0.95)),
+        'log_odds_max_abs_err': float(err.max()),
+        'share_off_by_0_05': float((err > 0.05).mean()),
+        'exact_max_error_bound': float(bound.max()),
+        'exact_ms_per_node': round(exact_ms, 3),
+    }
+
+
+def many_parent_report(fan_ins=(10, 20, 40, 60), n_cases: int = 200, profiles=tuple(PROFILES), seed: int = 0):
+    return [fan_in_report(k, n_cases, profile, seed) for profile in profiles for k in fan_ins]
+
+
+def format_report(rows) -> str:
+    head = f"{'profile':11s} {'fan-in':>6s} {'method':12s} {'mean err':>9s} {'p95 err':>9s} {'max err':>9s} " \
+           f"{'>0.05':>6s} {'bound':>9s} {'ms/node':>8s}"
+    lines = [head, '-' * len(head)]
+    for r in rows:
+        lines.append(f"{r['profile']:11s} {r['fan_in']:6d} {r['method']:12s} {r['log_odds_mean_abs_err']:9.4f} "
+                     f"{r['log_odds_p95_abs_err']:9.4f} {r['log_odds_max_abs_err']:9.4f} "
+                     f"{r['share_off_by_0_05']:6.0%} {r['exact_max_error_bound']:9.1e} {r['exact_ms_per_node']:8.2f}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m beliefgraph.accuracy',
+                                     description='Compare the many-parent log-odds fallback with the exact marginal.')
+    parser.add_argument('--fan-in', default='10,20,40,60', help='comma-separated parent counts')
+    parser.add_argument('--cases', type=int, default=200)
+    parser.add_argument('--profile', choices=sorted(PROFILES), action='append')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print JSON rows instead of a table')
+    args = parser.parse_args(argv)
+    fan_ins = [int(k) for k in args.fan_in.split(',') if k]
+    rows = many_parent_report(fan_ins, args.cases, tuple(args.profile or PROFILES), args.seed)
+    print(json.dumps(rows, indent=2) if args.json else format_report(rows))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
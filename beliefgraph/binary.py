@@ -0,0 +1,394 @@
+"""
+Columnar binary graph files, memory-mapped straight into a ``CompiledGraph``.
+
+Minimal JSON is parsed into one dict per node and edge, and ``compile_graph``
+then builds the CSR indexes and topological order in Python. A binary graph
+file stores the result instead: every ``CompiledGraph`` array (types, probs,
+weights, the CPT block, CSR indexes, order) as a little-endian typed column,
+plus the remaining minimal-format fields (labels, descriptions, styles,
+rationales, contributing factors, positions) as columns over an interned
+string table. Anything that does not fit a column (keys outside the schema,
+such as a node ``position``, or values of an unexpected type) is kept as a
+per-element JSON string in the same table. Opening a file maps it copy-on-write and wraps the columns with
+``np.frombuffer``; no array is copied or rebuilt, so the cost is decoding the
+node ids.
+
+Layout (all offsets 64-byte aligned)::
+
+    MAGIC | column data ... | footer JSON | u64 footer length | MAGIC
+
+The footer lists each column's dtype, shape and offset, and keeps the
+document-level fields (``version``, ``annotations``, other ``layout`` keys).
+``read_binary`` rebuilds the minimal document: ``write_binary(doc)`` followed by
+``read_binary`` returns ``normalize_any(doc)`` (numbers come back as JSON would
+print them: integral floats as ints).
+
+    from beliefgraph.binary import load_binary, read_binary, write_binary
+    write_binary(json.load(open('graph.json')), 'graph.bgraph')
+    g = load_binary('graph.bgraph')          # or load_graph(), which sniffs the magic
+    doc = read_binary('graph.bgraph')
+
+``python3 -m beliefgraph.binary in.json out.bgraph`` converts either way.
+"""
+
+import argparse
+import json
+import mmap
+import sys
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .graph import CompiledGraph, compile_graph, normalize_any
+
+MAGIC = b'BGRAPH\x00\x01'
+FORMAT_VERSION = 1
+ALIGN = 64
+
+ENGINE_COLUMNS = ('node_type', 'prob', 'fact_prob', 'inert', 'edge_source', 'edge_target', 'weight', 'opposes',
+                  'cond_true', 'cond_false', 'baseline', 'inverse')
+INDEX_COLUMNS = ('parent_ptr', 'parent_edges', 'child_ptr', 'child_edges', 'order')
+
+# Presence bits in node_flags / edge_flags
+INERT_SET, INERT, HAS_CPT, CPT_INVERSE_SET, CPT_INVERSE, HAS_STYLE, HAS_POSITION = (1 << k for k in range(7))
+HAS_WEIGHT, HAS_FACTORS = 1 << 1, 1 << 5            # edge-only bits, reusing slots nodes use for INERT / STYLE
+
+# String fields -> columns of string-table indices (-1 = absent)
+NODE_TEXT = {'label': 'node_label', 'type': 'node_type_name', 'description': 'node_description'}
+STYLE_TEXT = {'textColor': 'style_text_color', 'floretColor': 'style_floret_color'}
+EDGE_TEXT = {'id': 'edge_id', 'type': 'edge_type_name', 'rationale': 'edge_rationale'}
+CPT_KEYS = ('condTrue', 'condFalse', 'baseline')
+STYLE_KEYS = {'textColor', 'sizeIndex', 'floretColor'}
+
+
+# -- writing --------------------------------------------------------------------
+
+class _Strings:
+    """Interned string table: each distinct string is stored once."""
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+
+    def add(self, s: str) -> int:
+        return self.index.setdefault(s, len(self.index))
+
+    def columns(self):
+        data = [s.encode('utf-8') + b'\x00' for s in self.index]
+        offsets = np.zeros(len(data) + 1, dtype='<i8')
+        np.cumsum([len(b) for b in data], out=offsets[1:])
+        return offsets, np.frombuffer(b''.join(data), dtype=np.uint8)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_cpt(cpt) -> bool:
+    return isinstance(cpt, dict) and set(cpt) <= set(CPT_KEYS) | {'inverse'} and \
+        all(_is_number(cpt[k]) for k in CPT_KEYS if k in cpt) and isinstance(cpt.get('inverse', False), bool)
+
+
+def _is_style(style) -> bool:
+    return isinstance(style, dict) and set(style) <= STYLE_KEYS and _is_number(style.get('sizeIndex', 0)) and \
+        all(isinstance(style.get(k, ''), str) for k in ('textColor', 'floretColor'))
+
+
+def _store_cpt(cpt: dict, block: np.ndarray, flags: np.ndarray, i: int):
+    flags[i] |= HAS_CPT
+    for k, key in enumerate(CPT_KEYS):
+        block[k, i] = cpt.get(key, np.nan)
+    if 'inverse' in cpt:
+        flags[i] |= CPT_INVERSE_SET | (CPT_INVERSE if cpt['inverse'] else 0)
+
+
+def _encode(doc) -> Tuple[Dict[str, np.ndarray], dict]:
+    minimal = normalize_any(doc)
+    graph = compile_graph(minimal)
+    nodes, edges = minimal['nodes'], minimal['edges']
+    n, m = len(nodes), len(edges)
+    strings = _Strings()
+    for i, nid in enumerate(graph.ids):                  # ids first: string i is node i
+        if not isinstance(nid, str):
+            raise ValueError(f"nodes[{i}].id must be a string")
+        strings.add(nid)
+
+    cols = {name: getattr(graph, name) for name in ENGINE_COLUMNS + INDEX_COLUMNS}
+    text = {name: np.full(n, -1, dtype='<i4') for name in list(NODE_TEXT.values()) + list(STYLE_TEXT.values())}
+    text.update((name, np.full(m, -1, dtype='<i4')) for name in EDGE_TEXT.values())
+    node_flags, edge_flags = np.zeros(n, dtype=np.uint8), np.zeros(m, dtype=np.uint8)
+    node_cpt, edge_cpt = np.full((3, n), np.nan), np.full((3, m), np.nan)
+    size_index = np.full(n, np.nan)
+    node_extra, edge_extra = np.full(n, -1, dtype='<i4'), np.full(m, -1, dtype='<i4')
+    factor_ptr = np.zeros(m + 1, dtype='<i8')
+    factors: List[int] = []
+
+    for i, nd in enumerate(nodes):
+        extra = {}
+        for key, value in nd.items():
+            if key in NODE_TEXT and isinstance(value, str):
+                text[NODE_TEXT[key]][i] = strings.add(value)
+            elif key == 'inert' and isinstance(value, bool):
+                node_flags[i] |= INERT_SET | (INERT if value else 0)
+            elif key == 'cpt' and _is_cpt(value):
+                _store_cpt(value, node_cpt, node_flags, i)
+            elif key == 'style' and _is_style(value):
+                node_flags[i] |= HAS_STYLE
+                for k, name in STYLE_TEXT.items():
+                    if k in value:
+                        text[name][i] = strings.add(value[k])
+                size_index[i] = value.get('sizeIndex', np.nan)
+            elif key != 'id' and not (key == 'prob' and _is_number(value)):        # prob: engine column
+                extra[key] = value
+        if extra:
+            node_extra[i] = strings.add(json.dumps(extra, ensure_ascii=False))
+
+    for i, e in enumerate(edges):
+        extra = {}
+        for key, value in e.items():
+            if key in EDGE_TEXT and isinstance(value, str):
+                text[EDGE_TEXT[key]][i] = strings.add(value)
+            elif key == 'weight' and _is_number(value):                            # engine column
+                edge_flags[i] |= HAS_WEIGHT
+            elif key == 'cpt' and _is_cpt(value):
+                _store_cpt(value, edge_cpt, edge_flags, i)
+            elif key == 'contributingFactors' and isinstance(value, list) and all(isinstance(f, str) for f in value):
+                edge_flags[i] |= HAS_FACTORS
+                factors.extend(strings.add(f) for f in value)
+            elif key not in ('source', 'target'):
+                extra[key] = value
+        factor_ptr[i + 1] = len(factors)
+        if extra:
+            edge_extra[i] = strings.add(json.dumps(extra, ensure_ascii=False))
+
+    meta = {k: v for k, v in minimal.items() if k not in ('nodes', 'edges')}
+    position = np.full((n, 2), np.nan)
+    layout = meta.get('layout')
+    if isinstance(layout, dict) and isinstance(layout.get('positions'), dict):
+        rest = {}
+        for nid, pos in layout['positions'].items():
+            i = graph.index.get(nid)
+            if i is not None and isinstance(pos, dict) and set(pos) == {'x', 'y'} and all(map(_is_number, pos.values())):
+                position[i] = pos['x'], pos['y']
+                node_flags[i] |= HAS_POSITION
+            else:
+                rest[nid] = pos                           # kept verbatim in the footer
+        meta['layout'] = dict(layout, positions=rest)
+
+    str_offsets, str_data = strings.columns()
+    cols.update(text)
+    cols.update(
+        node_flags=node_flags, node_cpt=node_cpt, style_size_index=size_index, position=position,
+        node_extra=node_extra, edge_flags=edge_flags, edge_cpt=edge_cpt, edge_extra=edge_extra,
+        factor_ptr=factor_ptr, factors=np.asarray(factors, dtype='<i4'), str_offsets=str_offsets, str_data=str_data,
+    )
+    nul_free = not any('\x00' in s for s in strings.index)
+    return cols, {'nodes': n, 'edges': m, 'document': meta, 'nul_free_strings': nul_free}
+
+
+def write_binary(doc, path) -> int:
+    """Write any document ``normalize_any`` accepts as a binary graph file; returns the size in bytes."""
+    cols, footer = _encode(doc)
+    footer.update(format=FORMAT_VERSION, columns={})
+    with Path(path).open('wb') as f:
+        f.write(MAGIC)
+        pos = len(MAGIC)
+        for name, arr in cols.items():
+            arr = np.ascontiguousarray(arr)
+            dtype = arr.dtype.newbyteorder('<') if arr.dtype.byteorder == '>' else arr.dtype
+            pad = -pos % ALIGN
+            f.write(b'\x00' * pad)
+            pos += pad
+            footer['columns'][name] = {'dtype': dtype.str, 'shape': list(arr.shape), 'offset': pos}
+            data = arr.astype(dtype, copy=False).tobytes()
+            f.write(data)
+            pos += len(data)
+        raw = json.dumps(footer, ensure_ascii=False).encode('utf-8')
+        f.write(raw)
+        f.write(len(raw).to_bytes(8, 'little'))
+        f.write(MAGIC)
+        return pos + len(raw) + 8 + len(MAGIC)
+
+
+# -- reading --------------------------------------------------------------------
+
+class BinaryGraph:
+    """An open binary graph file. Columns are read-write views of a private (copy-on-write) mapping."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        with Path(path).open('rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        tail = len(MAGIC) + 8
+        if len(self._map) < len(MAGIC) + tail or self._map[:len(MAGIC)] != MAGIC or self._map[-len(MAGIC):] != MAGIC:
+            raise ValueError(f"{self.path}: not a binary graph file")
+        size = int.from_bytes(self._map[-tail:-len(MAGIC)], 'little')
+        self.footer = json.loads(self._map[-tail - size:-tail].decode('utf-8'))
+        if self.footer.get('format') != FORMAT_VERSION:
+            raise ValueError(f"{self.path}: unsupported binary graph format {self.footer.get('format')}")
+        self.n_nodes, self.n_edges = self.footer['nodes'], self.footer['edges']
+        self._offsets = self.column('str_offsets')
+
+    def column(self, name: str) -> np.ndarray:
+        spec = self.footer['columns'][name]
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        return np.frombuffer(self._map, dtype=dtype, count=count, offset=spec['offset']).reshape(spec['shape'])
+
+    def string(self, i: int) -> Optional[str]:
+        if i < 0:
+            return None
+        start, stop = int(self._offsets[i]), int(self._offsets[i + 1]) - 1
+        return self._map[self._data_offset + start:self._data_offset + stop].decode('utf-8')
+
+    @property
+    def _data_offset(self) -> int:
+        return self.footer['columns']['str_data']['offset']
+
+    def strings(self, start: int, stop: int) -> List[str]:
+        """Strings ``start:stop`` of the table (one bulk decode when no string contains NUL)."""
+        if stop <= start:
+            return []
+        if not self.footer['nul_free_strings']:
+            return [self.string(i) for i in range(start, stop)]
+        lo, hi = self._data_offset + int(self._offsets[start]), self._data_offset + int(self._offsets[stop])
+        return self._map[lo:hi - 1].decode('utf-8').split('\x00')
+
+    def graph(self) -> CompiledGraph:
+        """Zero-copy ``CompiledGraph`` over the mapped columns (edits stay private to this process)."""
+        columns = {name: self.column(name) for name in ENGINE_COLUMNS}
+        columns['ids'] = self.strings(0, self.n_nodes)
+        columns['edge_ids'] = StringColumn(self, self.column('edge_id'))
+        return CompiledGraph.from_columns(columns, {name: self.column(name) for name in INDEX_COLUMNS})
+
+    def document(self) -> dict:
+        """Rebuild the minimal-format document."""
+        table = self.strings(0, len(self._offsets) - 1)
+        ids = table[:self.n_nodes]
+        c = {name: self.column(name).tolist() for name in (
+            *NODE_TEXT.values(), *STYLE_TEXT.values(), *EDGE_TEXT.values(), 'node_flags', 'edge_flags', 'prob',
+            'style_size_index', 'node_extra', 'edge_extra', 'edge_source', 'edge_target', 'weight', 'factor_ptr',
+            'factors', 'position')}
+        node_cpt, edge_cpt = self.column('node_cpt').T.tolist(), self.column('edge_cpt').T.tolist()
+
+        def strings_into(d: dict, fields: dict, i: int):
+            for key, name in fields.items():
+                if c[name][i] >= 0:
+                    d[key] = table[c[name][i]]
+
+        nodes = []
+        for i, nid in enumerate(ids):
+            flags = c['node_flags'][i]
+            nd = {'id': nid}
+            strings_into(nd, NODE_TEXT, i)
+            if flags & INERT_SET:
+                nd['inert'] = bool(flags & INERT)
+            _put(nd, 'prob', _json_number(c['prob'][i]))
+            if flags & HAS_CPT:
+                nd['cpt'] = _cpt_dict(node_cpt[i], flags)
+            if flags & HAS_STYLE:
+                nd['style'] = style = {}
+                strings_into(style, STYLE_TEXT, i)
+                _put(style, 'sizeIndex', _json_number(c['style_size_index'][i]))
+            if c['node_extra'][i] >= 0:
+                nd.update(json.loads(table[c['node_extra'][i]]))
+            nodes.append(nd)
+
+        edges = []
+        for i in range(self.n_edges):
+            flags = c['edge_flags'][i]
+            e = {'source': ids[c['edge_source'][i]], 'target': ids[c['edge_target'][i]]}
+            strings_into(e, EDGE_TEXT, i)
+            if flags & HAS_WEIGHT:
+                e['weight'] = _json_number(c['weight'][i])
+            if flags & HAS_FACTORS:
+                e['contributingFactors'] = [table[k] for k in c['factors'][c['factor_ptr'][i]:c['factor_ptr'][i + 1]]]
+            if flags & HAS_CPT:
+                e['cpt'] = _cpt_dict(edge_cpt[i], flags)
+            if c['edge_extra'][i] >= 0:
+                e.update(json.loads(table[c['edge_extra'][i]]))
+            edges.append(e)
+
+        doc = dict(self.footer['document'], nodes=nodes, edges=edges)
+        layout = doc.get('layout')
+        if isinstance(layout, dict) and isinstance(layout.get('positions'), dict):
+            placed = {ids[i]: {'x': _json_number(x), 'y': _json_number(y)}
+                      for i, (x, y) in enumerate(c['position']) if c['node_flags'][i] & HAS_POSITION}
+            doc['layout'] = dict(layout, positions={**placed, **layout['positions']})
+        return doc
+
+
+class StringColumn(Sequence):
+    """Lazily decoded string column (-1 = None), e.g. the edge ids of a mapped graph."""
+
+    def __init__(self, source: BinaryGraph, refs: np.ndarray):
+        self._source, self._refs = source, refs
+
+    def __len__(self) -> int:
+        return len(self._refs)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        return self._source.string(int(self._refs[i]))
+
+
+def _put(d: dict, key: str, value):
+    if value is not None:
+        d[key] = value
+
+
+def _json_number(x: float):
+    """NaN -> None (absent); integral floats back to ints, as JSON would print them."""
+    if x != x:
+        return None
+    return int(x) if x.is_integer() else x
+
+
+def _cpt_dict(values, flags: int) -> dict:
+    out = {}
+    for key, v in zip(CPT_KEYS, values):
+        _put(out, key, _json_number(v))
+    if flags & CPT_INVERSE_SET:
+        out['inverse'] = bool(flags & CPT_INVERSE)
+    return out
+
+
+def load_binary(path) -> CompiledGraph:
+    """Memory-map a binary graph file as a ``CompiledGraph``."""
+    return BinaryGraph(path).graph()
+
+
+def read_binary(path) -> dict:
+    """Read a binary graph file back into minimal format."""
+    return BinaryGraph(path).document()
+
+
+def is_binary(path) -> bool:
+    with Path(path).open('rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m beliefgraph.binary',
+                                     description='Convert between JSON graphs and binary graph files.')
+    parser.add_argument('input', help='minimal / Cytoscape JSON, or a binary graph file')
+    parser.add_argument('output', help='binary graph file (from JSON) or minimal JSON (from binary)')
+    args = parser.parse_args(argv)
+    try:
+        if is_binary(args.input):
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(read_binary(args.input), f, ensure_ascii=False, indent=2)
+        else:
+            with open(args.input, 'r', encoding='utf-8') as f:
+                size = write_binary(json.load(f), args.output)
+            print(f"{args.output}: {size} bytes", file=sys.stderr)
+    except (OSError, ValueError) as e:
+        print(f"{args.input}: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
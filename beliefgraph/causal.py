@@ -0,0 +1,155 @@
+"""
+Batched heavy-mode interventions: do() sweeps and all-pairs ATE matrices.
+
+Port of ``computeDo`` / ``estimateATE`` (do-calculus.js) without the
+per-query snapshot / edge-removal / re-propagation cycle. Each intervention
+is one row of a (B, n) state matrix; rows carry their own frozen-node mask,
+so B different interventions are propagated together in a single walk of
+the cached topological order. The compiled graph is never modified.
+
+    from beliefgraph import load_graph
+    from beliefgraph.causal import ate_matrix, dose_response
+    g = load_graph('graph.json')
+    res = ate_matrix(g)                      # every treatment x every outcome
+    res.top_drivers('verdict', 5)
+    curve = dose_response(g, 'witness', np.linspace(0, 1, 11), outcomes=['verdict'])
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from . import profiling
+from .config import AND, ASSERTION, FACT, INTERVENTION_ROW_CHUNK, OR
+from .graph import CompiledGraph
+from .heavy import _initial_state, heavy_node
+
+PROPAGATED_TYPES = (FACT, ASSERTION, AND, OR)
+
+
+def _ids_to_index(graph: CompiledGraph, ids: Optional[Sequence[str]]) -> np.ndarray:
+    if ids is None:
+        return np.flatnonzero(np.isin(graph.node_type, PROPAGATED_TYPES)).astype(np.int64)
+    try:
+        return np.array([graph.index[i] for i in ids], dtype=np.int64)
+    except KeyError as e:
+        raise KeyError(f"Unknown node id {e.args[0]!r}") from None
+
+
+def propagate_interventions(graph: CompiledGraph, nodes: np.ndarray, values: np.ndarray,
+                            fact_probs: Optional[np.ndarray] = None,
+                            exact_many_parents: bool = False) -> np.ndarray:
+    """Heavy propagation with a different intervention per row.
+
+    Args:
+        graph: compiled graph
+        nodes: (B, m) node indices to freeze per row; -1 pads rows with fewer
+            than m interventions (m = 1 for single-node do())
+        values: (B, m) intervention probabilities (clipped to [0, 1])
+        fact_probs: optional (n,) fact probabilities shared by every row, or
+            (B, n) with one set per row
+
+    Returns:
+        (B, n) probabilities under each row's intervention (NaN = no probability)
+    """
+    nodes = np.atleast_2d(np.asarray(nodes, dtype=np.int64))
+    values = np.clip(np.atleast_2d(np.asarray(values, dtype=np.float64)), 0, 1)
+    if nodes.shape != values.shape:
+        raise ValueError(f"nodes and values must have the same shape; got {nodes.shape} and {values.shape}")
+    batch = nodes.shape[0]
+    state = _initial_state(graph, fact_probs)
+    if state.shape[0] != batch:
+        state = np.repeat(state, batch, axis=0)
+    fixed = np.zeros((batch, graph.n_nodes), dtype=bool)
+    rows, cols = np.nonzero(nodes >= 0)
+    state[rows, nodes[rows, cols]] = values[rows, cols]
+    fixed[rows, nodes[rows, cols]] = True
+
+    has_cpt = graph.has_cpt()
+    prof = profiling.ACTIVE
+    with profiling.phase('propagate', mode='heavy-do', batch=batch):
+        for v in graph.order:
+            if graph.node_type[v] not in PROPAGATED_TYPES:
+                continue
+            frozen = fixed[:, v]
+            if frozen.all():
+                continue
+            start = profiling.clock() if prof is not None else 0.0
+            computed = np.clip(heavy_node(graph, state, v, has_cpt, exact_many_parents), 0, 1)
+            state[:, v] = np.where(frozen, state[:, v], computed)
+            if prof is not None:
+                prof.node(graph, v, start)
+    return state
+
+
+def compute_do(graph: CompiledGraph, do: Dict[str, float], **kwargs) -> Dict[str, float]:
+    """``computeDo``: probabilities by node id under one intervention map (NaN omitted)."""
+    idx = _ids_to_index(graph, list(do))
+    probs = propagate_interventions(graph, idx[None, :], np.array([list(do.values())], dtype=np.float64), **kwargs)[0]
+    return {nid: float(p) for nid, p in zip(graph.ids, probs) if not np.isnan(p)}
+
+
+@dataclass
+class ATEResult:
+    """Average treatment effects P(Y | do(X=high)) - P(Y | do(X=low)).
+
+    ``p1``/``p0``/``ate`` are (T, O) arrays indexed [treatment, outcome]; NaN
+    where the outcome has no probability under either intervention. A node is
+    its own outcome with ATE = high - low.
+    """
+    treatments: List[str]
+    outcomes: List[str]
+    p1: np.ndarray
+    p0: np.ndarray
+    ate: np.ndarray
+
+    def effect(self, treatment: str, outcome: str) -> Dict[str, float]:
+        """Same shape as ``estimateATE``: {'p1', 'p0', 'ate'}."""
+        t, o = self.treatments.index(treatment), self.outcomes.index(outcome)
+        return {'p1': float(self.p1[t, o]), 'p0': float(self.p0[t, o]), 'ate': float(self.ate[t, o])}
+
+    def top_drivers(self, outcome: str, k: int = 10, include_self: bool = False):
+        """[(treatment, ate)] with the largest |ATE| on ``outcome``."""
+        o = self.outcomes.index(outcome)
+        col = np.abs(self.ate[:, o])
+        ranked = [t for t in np.argsort(-np.nan_to_num(col, nan=-1.0), kind='stable')
+                  if not np.isnan(col[t]) and (include_self or self.treatments[t] != outcome)]
+        return [(self.treatments[t], float(self.ate[t, o])) for t in ranked[:k]]
+
+
+def ate_matrix(graph: CompiledGraph, treatments: Optional[Sequence[str]] = None,
+               outcomes: Optional[Sequence[str]] = None, high: float = 1.0, low: float = 0.0,
+               fact_probs: Optional[np.ndarray] = None, exact_many_parents: bool = False,
+               row_chunk: int = INTERVENTION_ROW_CHUNK) -> ATEResult:
+    """ATE of every treatment on every outcome.
+
+    Each treatment contributes two rows (do(X=high), do(X=low)); rows are
+    propagated ``row_chunk`` at a time. Treatments/outcomes default to every
+    node that carries a heavy-mode probability (facts, assertions, AND, OR).
+    """
+    t_idx = _ids_to_index(graph, treatments)
+    o_idx = _ids_to_index(graph, outcomes)
+    n_t = len(t_idx)
+    p1 = np.empty((n_t, len(o_idx)))
+    p0 = np.empty_like(p1)
+    per_pass = max(1, row_chunk // 2)
+    for start in range(0, n_t, per_pass):
+        chunk = t_idx[start:start + per_pass]
+        nodes = np.repeat(chunk, 2)[:, None]
+        values = np.tile([high, low], len(chunk))[:, None]
+        state = propagate_interventions(graph, nodes, values, fact_probs, exact_many_parents)
+        p1[start:start + len(chunk)] = state[0::2][:, o_idx]
+        p0[start:start + len(chunk)] = state[1::2][:, o_idx]
+    return ATEResult(treatments=[graph.ids[i] for i in t_idx], outcomes=[graph.ids[i] for i in o_idx],
+                     p1=p1, p0=p0, ate=p1 - p0)
+
+
+def dose_response(graph: CompiledGraph, treatment: str, doses: Sequence[float],
+                  outcomes: Optional[Sequence[str]] = None, fact_probs: Optional[np.ndarray] = None,
+                  exact_many_parents: bool = False) -> np.ndarray:
+    """(len(doses), O) matrix of P(outcome | do(treatment = dose)), one pass for all doses."""
+    doses = np.asarray(doses, dtype=np.float64).ravel()
+    nodes = np.full((len(doses), 1), graph.index[treatment], dtype=np.int64)
+    state = propagate_interventions(graph, nodes, doses[:, None], fact_probs, exact_many_parents)
+    return state[:, _ids_to_index(graph, outcomes)]
@@ -0,0 +1,95 @@
+"""
+Shared constants for the Python belief graph engine.
+
+Values mirror config.js / logic.js / bayes-logic.js and the constants table in
+Belief_Graph_Math_Core.md so that headless results match the browser.
+"""
+
+# --- NODE/EDGE TYPE CONSTANTS ---
+NODE_TYPE_FACT = "fact"
+NODE_TYPE_ASSERTION = "assertion"
+NODE_TYPE_AND = "and"
+NODE_TYPE_OR = "or"
+NODE_TYPE_NOTE = "note"
+EDGE_TYPE_SUPPORTS = "supports"
+EDGE_TYPE_OPPOSES = "opposes"
+
+ALLOWED_NODE_TYPES = [
+    NODE_TYPE_FACT, NODE_TYPE_ASSERTION, NODE_TYPE_AND, NODE_TYPE_OR, NODE_TYPE_NOTE
+]
+ALLOWED_EDGE_TYPES = [EDGE_TYPE_SUPPORTS, EDGE_TYPE_OPPOSES]
+
+# Integer codes used in the compiled (array-backed) graph
+TYPE_CODES = {name: code for code, name in enumerate(ALLOWED_NODE_TYPES)}
+FACT, ASSERTION, AND, OR, NOTE = (TYPE_CODES[t] for t in ALLOWED_NODE_TYPES)
+
+# --- PROBABILITY BOUNDS ---
+FACT_PROB = 0.995             # Fact node probability (both modes)
+EPSILON = 0.01                # Numerical stability bound (lite logits)
+SATURATION_K = 1.0            # Saturation strength
+HIGH_WEIGHT_BYPASS = 0.99     # Single-edge |w_eff| at which lite copies the parent
+ASSERTION_PRIOR = 0.5         # Lite base probability / heavy isolated-node default
+
+# --- CONVERGENCE (lite mode only) ---
+TOLERANCE = 0.001
+MAX_ITERS = 30
+# Sparse fixed-point solver (solver.py, Python only)
+SOLVER_TOLERANCE = 1e-10      # Max |F(x) - x| at convergence
+SOLVER_MAX_ITERS = 500
+ANDERSON_DEPTH = 5            # Residuals kept for Anderson mixing (0 = plain Jacobi)
+
+# --- INCREMENTAL PROPAGATION ---
+INCREMENTAL_TOLERANCE = 1e-9  # Smaller per-node changes are not pushed to children
+
+# --- BATCHED INTERVENTIONS ---
+INTERVENTION_ROW_CHUNK = 512  # do() rows propagated per pass (bounds the (B, n) state)
+
+# --- MONTE CARLO (montecarlo.py) ---
+MC_CPT_CONCENTRATION = 50.0   # Beta a + b around each CPT entry
+MC_WEIGHT_JITTER = 0.2        # Log-normal sigma for lite edge weights
+MC_CHUNK = 512                # Samples propagated per (chunk, n) state
+MC_BINS = 1000                # Histogram buckets on [0, 1] (quantile resolution)
+MC_QUANTILES = (0.05, 0.5, 0.95)
+
+# --- SENSITIVITY TORNADO (sensitivity.py) ---
+SENS_CPT_SWING = 10           # +- percentage points per CPT entry
+SENS_WEIGHT_SWING = 0.1       # +- lite edge weight
+SENS_FACT_SWING = 0.1         # +- fact probability
+
+# --- PEER RELATIONS (visual overlay, peer-relations.js) ---
+PEER_DEFAULT_STRENGTH = 0.15  # Default pair strength (aligned/antagonistic)
+PEER_MAX_ABS_DELTA = 0.25     # Max absolute display adjustment per node
+PEER_DISPLAY_MIN = 0.0005     # Smaller adjustments leave displayProb unset
+
+# --- SNAPSHOT STORE (snapshots.py; autosave tiers from smartAutosave in logic.js) ---
+SNAPSHOT_KEYFRAME_INTERVAL = 100  # Snapshots per keyframe at most
+SNAPSHOT_KEYFRAME_RATIO = 0.25    # New keyframe once a diff touches this share of the keyframe's elements
+AUTOSAVE_TIERS = ((0, 6), (60, 10), (600, 6))    # (min seconds apart, kept): recent, medium, long-term
+
+# --- SCORING SERVICE (service.py) ---
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8765
+SERVICE_CACHE_BYTES = 512 * 2**20    # Compiled-graph LRU budget, per process
+SERVICE_COALESCE_SECONDS = 0.002     # Wait this long for more requests on the same graph
+SERVICE_MAX_BODY = 1 << 30           # Largest request body accepted (bytes)
+
+# --- PROFILING (profiling.py) ---
+PROFILE_SLOW_NODE_SECONDS = 0.001  # Node evaluations at least this long get their own trace span
+
+# --- PARALLEL SCORING (parallel.py) ---
+PARALLEL_MIN_NODES = 20000        # Smaller graphs propagate serially (process startup dominates)
+PARALLEL_BINS_PER_WORKER = 4      # Component bins per worker, for load balancing
+
+# --- WEIGHTS ---
+WEIGHT_MIN = 0.01
+DEFAULT_WEIGHT = 0.15         # Converter default for edges into assertions
+
+# --- HEAVY MODE ---
+CPT_CLAMP_MIN = 0.001         # CPT entries are clamped to [0.001, 0.999]
+CPT_CLAMP_MAX = 0.999
+DEFAULT_BASELINE = 50         # Used when a CPT baseline is 0 / missing (percent)
+MAX_EXACT_PARENTS = 8         # Exact enumeration cutoff; above this use log-odds
+# Opt-in exact many-parent marginal (Python only; the browser keeps log-odds)
+ENUMERATE_MAX_PARENTS = 16    # Chunked exact enumeration up to here, bucketed DP above
+ENUM_CHUNK_BITS = 16          # Parents enumerated per vectorized block (2^16 columns)
+BUCKET_RESOLUTION = 1e-3      # Log-likelihood bucket width for the bucketed DP
@@ -0,0 +1,339 @@
+"""
+Minimal-format loading and the compact array-backed graph.
+
+``normalize_any`` ports ``BeliefGraphFormatCore.normalizeAny`` (format-core.js):
+it accepts minimal JSON, a ``{"graph": [...]}`` wrapper or a raw Cytoscape
+elements list and returns minimal format. ``compile_graph`` then turns a
+minimal document into a ``CompiledGraph``: CSR parent/child index arrays plus
+float64 probability, weight and CPT vectors that the propagation kernels read.
+"""
+
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import profiling
+from .config import (
+    ALLOWED_NODE_TYPES, DEFAULT_WEIGHT, EDGE_TYPE_OPPOSES, EDGE_TYPE_SUPPORTS,
+    FACT_PROB, NODE_TYPE_ASSERTION, NODE_TYPE_FACT, TYPE_CODES, ASSERTION,
+)
+
+
+def detect_format(doc) -> str:
+    if isinstance(doc, list):
+        return 'elements'
+    if isinstance(doc, dict) and isinstance(doc.get('graph'), list):
+        return 'graph-wrapper'
+    if isinstance(doc, dict) and isinstance(doc.get('nodes'), list) and isinstance(doc.get('edges'), list):
+        return 'minimal'
+    return 'unknown'
+
+
+def _node_type(d: dict) -> Optional[str]:
+    t = d.get('type')
+    return t if t in ALLOWED_NODE_TYPES else None
+
+
+def _prune_cpt(cpt) -> Optional[dict]:
+    if not isinstance(cpt, dict):
+        return None
+    out = {k: cpt[k] for k in ('condTrue', 'condFalse', 'baseline') if isinstance(cpt.get(k), (int, float))}
+    if cpt.get('inverse') is True:
+        out['inverse'] = True
+    return out or None
+
+
+def normalize_from_elements(elements) -> dict:
+    """Convert Cytoscape element JSON (``cy.elements().jsons()``) to minimal format."""
+    nodes, edges = [], []
+    for el in elements or []:
+        d = (el or {}).get('data')
+        if not d:
+            continue
+        if el.get('group') == 'nodes' or (not d.get('source') and not d.get('target')):
+            o = {'id': d['id'], 'label': d.get('origLabel') or d.get('label') or d['id'], 'type': _node_type(d) or NODE_TYPE_ASSERTION}
+            if d.get('type') == NODE_TYPE_FACT and d.get('inertFact'):
+                o['inert'] = True
+            if d.get('hoverLabel'):
+                o['description'] = d['hoverLabel']
+            if isinstance(d.get('prob'), (int, float)):
+                o['prob'] = d['prob']
+            cpt = _prune_cpt(d.get('cpt'))
+            if cpt:
+                o['cpt'] = cpt
+            nodes.append(o)
+        else:
+            w = d.get('userAssignedWeight', d.get('weight'))
+            o = {'id': d.get('id'), 'source': d['source'], 'target': d['target'], 'type': d.get('type') or EDGE_TYPE_SUPPORTS}
+            if isinstance(w, (int, float)):
+                o['weight'] = w
+            if d.get('rationale'):
+                o['rationale'] = d['rationale']
+            if isinstance(d.get('contributingFactors'), list) and d['contributingFactors']:
+                seen = set()
+                factors = []
+                for f in d['contributingFactors']:
+                    f = (f or '').strip()
+                    if f and f not in seen:
+                        seen.add(f)
+                        factors.append(f)
+                o['contributingFactors'] = factors
+            cpt = _prune_cpt(d.get('cpt'))
+            if cpt:
+                o['cpt'] = cpt
+            edges.append(o)
+    return {'version': '2', 'nodes': nodes, 'edges': edges}
+
+
+def normalize_any(doc) -> dict:
+    """Return minimal format for any supported document shape (see format-core.js)."""
+    kind = detect_format(doc)
+    if kind == 'elements':
+        return normalize_from_elements(doc)
+    if kind == 'graph-wrapper':
+        minimal = normalize_from_elements(doc['graph'])
+        if doc.get('textAnnotations'):
+            minimal['annotations'] = doc['textAnnotations']
+        return minimal
+    if kind == 'minimal':
+        if str(doc.get('version')) == '2':
+            return doc
+        migrated = json.loads(json.dumps(doc))
+        migrated['version'] = '2'
+        return migrated
+    raise ValueError('Unrecognized format')
+
+
+def _csr(keys: np.ndarray, n: int):
+    """Group edge indices by ``keys`` (stable, so edge order is preserved within a group)."""
+    order = np.argsort(keys, kind='stable').astype(np.int32)
+    counts = np.bincount(keys, minlength=n)
+    ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(counts, out=ptr[1:])
+    return ptr, order
+
+
+@dataclass
+class CompiledGraph:
+    """Array-backed belief graph.
+
+    Nodes are addressed by position in ``ids``; edges by position in the edge
+    arrays. ``parent_ptr``/``parent_edges`` list the incoming edge indices of node
+    ``v`` as ``parent_edges[parent_ptr[v]:parent_ptr[v + 1]]`` (CSR), and
+    ``child_ptr``/``child_edges`` do the same for outgoing edges. Missing numeric
+    values (node prob, edge weight, CPT entries) are stored as NaN.
+    """
+    ids: List[str]
+    node_type: np.ndarray           # int8 type codes (config.TYPE_CODES)
+    prob: np.ndarray                # float64 stored/initial probability (NaN = virgin)
+    fact_prob: np.ndarray           # float64 probability used for fact nodes
+    inert: np.ndarray               # bool, lite-mode inert facts
+    edge_ids: List[Optional[str]]
+    edge_source: np.ndarray         # int32
+    edge_target: np.ndarray         # int32
+    weight: np.ndarray              # float64 lite weight
+    opposes: np.ndarray             # bool, edge type == 'opposes'
+    cond_true: np.ndarray           # float64 CPT percentages
+    cond_false: np.ndarray
+    baseline: np.ndarray
+    inverse: np.ndarray             # bool, cpt.inverse
+    parent_ptr: np.ndarray = field(init=False)
+    parent_edges: np.ndarray = field(init=False)
+    child_ptr: np.ndarray = field(init=False)
+    child_edges: np.ndarray = field(init=False)
+    order: np.ndarray = field(init=False)
+    index: Dict[str, int] = field(init=False)
+    _components: Optional[Tuple[np.ndarray, int]] = field(init=False, default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.index = {nid: i for i, nid in enumerate(self.ids)}
+        self.build_indexes()
+
+    @classmethod
+    def from_columns(cls, columns: dict, indexes: dict) -> 'CompiledGraph':
+        """Wrap existing arrays (e.g. views of a mapped file) without copying them.
+
+        ``indexes`` holds prebuilt ``parent_ptr``, ``parent_edges``, ``child_ptr``,
+        ``child_edges`` and ``order``, so ``build_indexes`` is skipped.
+        """
+        graph = cls.__new__(cls)
+        graph.__dict__.update(columns)
+        graph.__dict__.update(indexes)
+        graph.index = {nid: i for i, nid in enumerate(graph.ids)}
+        return graph
+
+    def build_indexes(self):
+        """(Re)build the CSR adjacency and the cached topological order."""
+        n = self.n_nodes
+        self.parent_ptr, self.parent_edges = _csr(self.edge_target, n)
+        self.child_ptr, self.child_edges = _csr(self.edge_source, n)
+        with profiling.phase('sort', nodes=n):
+            self.order = topological_order(self)
+        self._components = None
+
+    def components(self) -> Tuple[np.ndarray, int]:
+        """(label per node, count) of the weakly connected components; computed once and cached.
+
+        Labels are numbered by each component's smallest node index.
+        """
+        if self._components is None:
+            self._components = weakly_connected_components(self.n_nodes, self.edge_source, self.edge_target)
+        return self._components
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.ids)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.edge_source)
+
+    def parents(self, v: int) -> np.ndarray:
+        """Incoming edge indices of node ``v``."""
+        return self.parent_edges[self.parent_ptr[v]:self.parent_ptr[v + 1]]
+
+    def children(self, v: int) -> np.ndarray:
+        """Outgoing edge indices of node ``v``."""
+        return self.child_edges[self.child_ptr[v]:self.child_ptr[v + 1]]
+
+    def has_cpt(self) -> np.ndarray:
+        """Per-edge mask of complete CPTs (condTrue, condFalse and baseline all set)."""
+        return ~(np.isnan(self.cond_true) | np.isnan(self.cond_false) | np.isnan(self.baseline))
+
+
+def weakly_connected_components(n: int, source: np.ndarray, target: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Union-find over all edges at once, without a Python loop per edge.
+
+    Each round hooks the larger root of every still-split edge under the smaller
+    one (``np.minimum.at``), then compresses paths by pointer jumping. Rounds
+    repeat until no edge spans two roots (a handful on typical graphs).
+    """
+    parent = np.arange(n, dtype=np.int64)
+    src, dst = np.asarray(source, dtype=np.int64), np.asarray(target, dtype=np.int64)
+    while True:
+        ru, rv = parent[src], parent[dst]
+        split = ru != rv
+        if not split.any():
+            break
+        src, dst, ru, rv = src[split], dst[split], ru[split], rv[split]
+        np.minimum.at(parent, np.maximum(ru, rv), np.minimum(ru, rv))
+        while True:                                        # pointer jumping: every node points at its root
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+    roots, labels = np.unique(parent, return_inverse=True)
+    return labels.astype(np.int64), len(roots)
+
+
+def topological_order(graph: CompiledGraph) -> np.ndarray:
+    """Parents-first DFS order, skipping back edges on cycles.
+
+    Same traversal as ``topologicalSort`` in logic.js / bayes-logic.js: nodes are
+    visited in input order and each node's parents (in edge order) are emitted
+    before the node itself.
+    """
+    n = graph.n_nodes
+    ptr, pedges, src = graph.parent_ptr, graph.parent_edges, graph.edge_source
+    state = np.zeros(n, dtype=np.int8)  # 0 = unvisited, 1 = visiting, 2 = done
+    order = []
+    for root in range(n):
+        if state[root]:
+            continue
+        state[root] = 1
+        stack = [[root, int(ptr[root])]]
+        while stack:
+            top = stack[-1]
+            v, k = top
+            if k < ptr[v + 1]:
+                top[1] = k + 1
+                u = int(src[pedges[k]])
+                if state[u] == 0:
+                    state[u] = 1
+                    stack.append([u, int(ptr[u])])
+            else:
+                stack.pop()
+                state[v] = 2
+                order.append(v)
+    return np.asarray(order, dtype=np.int32)
+
+
+def _num(value) -> float:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+
+
+def compile_graph(minimal: dict) -> CompiledGraph:
+    """Compile a minimal-format document (any shape accepted by ``normalize_any``)."""
+    with profiling.phase('compile'):
+        return _compile(normalize_any(minimal))
+
+
+def _compile(minimal: dict) -> CompiledGraph:
+    nodes, edges = minimal['nodes'], minimal['edges']
+
+    ids = [n['id'] for n in nodes]
+    index = {}
+    for i, nid in enumerate(ids):
+        if nid in index:
+            raise ValueError(f"Duplicate node id '{nid}'")
+        index[nid] = i
+
+    has_incoming = set()
+    for i, e in enumerate(edges):
+        for end in ('source', 'target'):
+            if e.get(end) not in index:
+                raise ValueError(f"edges[{i}] {end} '{e.get(end)}' not in nodes")
+        has_incoming.add(e['target'])
+
+    n, m = len(nodes), len(edges)
+    node_type = np.empty(n, dtype=np.int8)
+    prob = np.full(n, np.nan)
+    fact_prob = np.full(n, FACT_PROB)
+    inert = np.zeros(n, dtype=bool)
+    for i, nd in enumerate(nodes):
+        t = _node_type(nd)
+        if t is None:
+            # Converter default: fact without incoming edges, assertion otherwise
+            t = NODE_TYPE_ASSERTION if nd['id'] in has_incoming else NODE_TYPE_FACT
+        node_type[i] = TYPE_CODES[t]
+        prob[i] = _num(nd.get('prob'))
+        inert[i] = t == NODE_TYPE_FACT and bool(nd.get('inert'))
+
+    edge_source = np.fromiter((index[e['source']] for e in edges), dtype=np.int32, count=m)
+    edge_target = np.fromiter((index[e['target']] for e in edges), dtype=np.int32, count=m)
+    weight = np.array([_num(e.get('weight')) for e in edges], dtype=np.float64).reshape(m)
+    # Converter default: edges into assertions without a weight get minimal influence
+    missing = np.isnan(weight) & (node_type[edge_target] == ASSERTION)
+    weight[missing] = DEFAULT_WEIGHT
+    opposes = np.array([e.get('type') == EDGE_TYPE_OPPOSES for e in edges], dtype=bool).reshape(m)
+    cpts = [e.get('cpt') or {} for e in edges]
+    cond_true = np.array([_num(c.get('condTrue')) for c in cpts], dtype=np.float64).reshape(m)
+    cond_false = np.array([_num(c.get('condFalse')) for c in cpts], dtype=np.float64).reshape(m)
+    baseline = np.array([_num(c.get('baseline')) for c in cpts], dtype=np.float64).reshape(m)
+    inverse = np.array([c.get('inverse') is True for c in cpts], dtype=bool).reshape(m)
+
+    return CompiledGraph(
+        ids=ids, node_type=node_type, prob=prob, fact_prob=fact_prob, inert=inert,
+        edge_ids=[e.get('id') for e in edges], edge_source=edge_source, edge_target=edge_target,
+        weight=weight, opposes=opposes, cond_true=cond_true, cond_false=cond_false,
+        baseline=baseline, inverse=inverse,
+    )
+
+
+def load_graph(path) -> CompiledGraph:
+    """Read a JSON file (minimal, graph-wrapper or elements) and compile it.
+
+    Binary graph files (``beliefgraph.binary``) are memory-mapped instead.
+    """
+    from .binary import MAGIC, load_binary
+    with Path(path).open('rb') as f:
+        if f.read(len(MAGIC)) == MAGIC:
+            with profiling.phase('load', path=str(path), format='binary'):
+                return load_binary(path)
+        f.seek(0)
+        with profiling.phase('load', path=str(path)):
+            doc = json.loads(f.read().decode('utf-8'))
+    return compile_graph(doc)
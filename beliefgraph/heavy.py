@@ -0,0 +1,343 @@
+"""
+Heavy mode: single-pass topological CPT propagation.
+
+Port of ``propagateBayesHeavy`` / ``calculateNodeMarginal`` (bayes-logic.js).
+All kernels work on a (B, n) state matrix so a batch of scenarios (different
+fact probabilities or ``do()`` values) is propagated in one sweep; a single
+scenario is just B = 1.
+"""
+
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from . import profiling
+from .config import (
+    AND, ASSERTION, ASSERTION_PRIOR, BUCKET_RESOLUTION, CPT_CLAMP_MAX, CPT_CLAMP_MIN,
+    DEFAULT_BASELINE, ENUM_CHUNK_BITS, ENUMERATE_MAX_PARENTS, FACT, MAX_EXACT_PARENTS, OR,
+)
+from .graph import CompiledGraph
+
+Cpt = Tuple[np.ndarray, np.ndarray, np.ndarray]   # (condTrue, condFalse, baseline) percentages per edge
+
+
+@lru_cache(maxsize=None)
+def parent_state_combos(n_parents: int) -> np.ndarray:
+    """(2^n, n) boolean parent-state matrix; bit ``i`` of row ``combo`` is parent ``i``."""
+    combo_ids = np.arange(1 << n_parents, dtype=np.int64)
+    combos = ((combo_ids[:, None] >> np.arange(n_parents)) & 1).astype(bool)
+    combos.setflags(write=False)
+    return combos
+
+
+def clamp_cpt(values: np.ndarray) -> np.ndarray:
+    """Percent CPT entries to probabilities clamped to [0.001, 0.999]."""
+    return np.clip(np.asarray(values, dtype=np.float64) / 100, CPT_CLAMP_MIN, CPT_CLAMP_MAX)
+
+
+def baseline_probs(baseline: np.ndarray) -> np.ndarray:
+    """Percent baselines to clamped probabilities; 0 falls back to 50% like ``cpt.baseline || 50``."""
+    baseline = np.asarray(baseline, dtype=np.float64)
+    return clamp_cpt(np.where(baseline == 0, DEFAULT_BASELINE, baseline))
+
+
+def exact_marginal(parent_probs: np.ndarray, p_true: np.ndarray, p_false: np.ndarray,
+                   baseline: np.ndarray) -> np.ndarray:
+    """Exact Naive Bayes marginal with baseline normalization, for a batch.
+
+    Args:
+        parent_probs: (B, k) parent marginals
+        p_true, p_false, baseline: clamped CPT probabilities, shape (k,) or (B, k)
+
+    Returns:
+        (B,) P(child=true), clamped to [0, 1]
+    """
+    parent_probs = np.atleast_2d(parent_probs)
+    k = parent_probs.shape[1]
+    combos = parent_state_combos(k)
+    p_true = np.broadcast_to(p_true, parent_probs.shape)
+    p_false = np.broadcast_to(p_false, parent_probs.shape)
+    baseline = np.broadcast_to(baseline, parent_probs.shape)
+
+    p_combo = np.ones((parent_probs.shape[0], combos.shape[0]))
+    likelihood = np.ones_like(p_combo)
+    for i in range(k):
+        state = combos[:, i]
+        p_combo *= np.where(state, parent_probs[:, i:i + 1], 1 - parent_probs[:, i:i + 1])
+        likelihood *= np.where(state, p_true[:, i:i + 1], p_false[:, i:i + 1])
+    # Normalize by baseline^(k-1): product of all baselines over the first one
+    normalization = baseline.prod(axis=1) / baseline[:, 0]
+    p_child = np.clip(likelihood / normalization[:, None], 0, 1)
+    return np.clip((p_combo * p_child).sum(axis=1), 0, 1)
+
+
+def log_odds_marginal(parent_probs: np.ndarray, p_true: np.ndarray, p_false: np.ndarray) -> np.ndarray:
+    """Many-parent fallback: sum of per-parent log likelihood ratios (bayes-logic.js, > 8 parents)."""
+    parent_probs = np.atleast_2d(parent_probs)
+    p_given = p_true * parent_probs + p_false * (1 - parent_probs)
+    log_odds = np.log(p_given / (1 - p_given)).sum(axis=1)
+    return 1 / (1 + np.exp(-log_odds))
+
+
+def enumerated_marginal(parent_probs: np.ndarray, p_true: np.ndarray, p_false: np.ndarray,
+                        baseline: np.ndarray, chunk_bits: int = ENUM_CHUNK_BITS) -> np.ndarray:
+    """``exact_marginal`` for more parents, enumerating 2^k states in bounded blocks.
+
+    The first ``chunk_bits`` parents form a (B, 2^chunk_bits) block that is
+    reused for every state of the remaining parents, so memory stays fixed
+    while time grows as 2^k (practical up to ~24 parents).
+    """
+    parent_probs = np.atleast_2d(parent_probs)
+    batch, k = parent_probs.shape
+    p_true = np.broadcast_to(p_true, parent_probs.shape)
+    p_false = np.broadcast_to(p_false, parent_probs.shape)
+    baseline = np.broadcast_to(baseline, parent_probs.shape)
+    low = min(k, chunk_bits)
+
+    def block(cols):
+        combos = parent_state_combos(len(cols))
+        p_combo = np.ones((batch, combos.shape[0]))
+        likelihood = np.ones_like(p_combo)
+        for j, i in enumerate(cols):
+            state = combos[:, j]
+            p_combo *= np.where(state, parent_probs[:, i:i + 1], 1 - parent_probs[:, i:i + 1])
+            likelihood *= np.where(state, p_true[:, i:i + 1], p_false[:, i:i + 1])
+        return p_combo, likelihood
+
+    p_low, like_low = block(range(low))
+    like_low /= (baseline.prod(axis=1) / baseline[:, 0])[:, None]
+    p_high, like_high = block(range(low, k))
+    total = np.zeros(batch)
+    for h in range(p_high.shape[1]):
+        p_child = np.clip(like_low * like_high[:, h:h + 1], 0, 1)
+        total += p_high[:, h] * (p_low * p_child).sum(axis=1)
+    return np.clip(total, 0, 1)
+
+
+def bucketed_marginal(parent_probs: np.ndarray, p_true: np.ndarray, p_false: np.ndarray,
+                      baseline: np.ndarray, resolution: float = BUCKET_RESOLUTION,
+                      return_bound: bool = False):
+    """Exact-marginal dynamic program over per-parent factors, polynomial in k.
+
+    The marginal is E[min(L / N, 1)] with L the product of the chosen
+    condTrue/condFalse entries and N the baseline normalization. Writing
+    log L - log N = D - tau with D = sum_i s_i * d_i, d_i = log(p_true_i / p_false_i),
+    the DP walks the parents once and keeps, per bucket of D (width
+    ``resolution``), the state mass P and the likelihood mass W = sum P_s * e^D_s
+    (both accumulated exactly; only the bucket index is rounded). Buckets whose
+    every completion stays below tau leave the window with their exact linear
+    contribution W * E[e^D_rest] * e^-tau, buckets that always clip leave with
+    P, so the window only spans the undecided band. Only buckets straddling tau
+    at the end are approximated, by min(W e^-tau, P), which is an upper bound
+    within a factor e^(2h) (h = summed rounding of the d_i).
+
+    CPT arrays are shape (k,) (shared by the batch); (B, k) is solved row by row.
+
+    Returns:
+        (B,) P(child=true); with ``return_bound`` also the (B,) absolute error bound
+    """
+    parent_probs = np.atleast_2d(np.asarray(parent_probs, dtype=np.float64))
+    batch, k = parent_probs.shape
+    if any(np.ndim(a) == 2 for a in (p_true, p_false, baseline)):
+        rows = [bucketed_marginal(parent_probs[b:b + 1], *(np.broadcast_to(a, parent_probs.shape)[b]
+                                  for a in (p_true, p_false, baseline)), resolution, True) for b in range(batch)]
+        probs, bounds = (np.concatenate(part) for part in zip(*rows))
+        return (probs, bounds) if return_bound else probs
+
+    d = np.log(p_true) - np.log(p_false)
+    q = np.rint(d / resolution).astype(np.int64)
+    h = float(np.abs(d - q * resolution).sum())
+    tau = float(np.log(baseline).sum() - np.log(baseline[0]) - np.log(p_false).sum())
+    # Key ranges still reachable after parent i (parents i+1..k-1), and log E[e^D] over them
+    rem_lo = np.concatenate((np.cumsum(np.minimum(q, 0)[::-1])[::-1][1:], [0]))
+    rem_hi = np.concatenate((np.cumsum(np.maximum(q, 0)[::-1])[::-1][1:], [0]))
+    log_gain = np.log(parent_probs * np.exp(d) + 1 - parent_probs)
+    rem_gain = np.concatenate((np.cumsum(log_gain[:, ::-1], axis=1)[:, ::-1][:, 1:], np.zeros((batch, 1))), axis=1)
+    rounding = np.exp(d - q * resolution)
+
+    mass = np.ones((batch, 1))          # P per bucket
+    like = np.ones((batch, 1))          # W * e^(-key * resolution) per bucket, within e^(+-h) of P
+    base = 0                            # key of column 0
+    linear = np.zeros(batch)
+    clipped = np.zeros(batch)
+    for i in range(k):
+        p = parent_probs[:, i:i + 1]
+        width, shift = mass.shape[1], int(q[i])
+        on, off = max(shift, 0), max(-shift, 0)
+        new_mass = np.zeros((batch, width + abs(shift)))
+        new_like = np.zeros_like(new_mass)
+        new_mass[:, off:off + width] += mass * (1 - p)
+        new_mass[:, on:on + width] += mass * p
+        new_like[:, off:off + width] += like * (1 - p)
+        new_like[:, on:on + width] += like * (p * rounding[i])
+        base += min(shift, 0)
+
+        keys = (base + np.arange(new_mass.shape[1])) * resolution
+        n_below = int(np.count_nonzero(keys + h + rem_hi[i] * resolution <= tau))
+        n_above = int(np.count_nonzero(keys[n_below:] - h + rem_lo[i] * resolution >= tau))
+        stop = new_mass.shape[1] - n_above
+        if n_below:
+            scale = np.exp(keys[:n_below] - tau)
+            linear += (new_like[:, :n_below] * scale).sum(axis=1) * np.exp(rem_gain[:, i])
+        if n_above:
+            clipped += new_mass[:, stop:].sum(axis=1)
+        mass, like = new_mass[:, n_below:stop], new_like[:, n_below:stop]
+        base += n_below
+
+    keys = (base + np.arange(mass.shape[1])) * resolution
+    straddle = np.minimum(like * np.exp(keys - tau), mass).sum(axis=1)
+    probs = np.clip(linear + clipped + straddle, 0, 1)
+    if return_bound:
+        return probs, straddle * (1 - np.exp(-2 * h))
+    return probs
+
+
+def many_parent_marginal(parent_probs: np.ndarray, p_true: np.ndarray, p_false: np.ndarray,
+                         baseline: np.ndarray) -> np.ndarray:
+    """Exact baseline-normalized marginal for any fan-in: chunked enumeration up to
+    ``ENUMERATE_MAX_PARENTS`` parents, the bucketed DP above."""
+    if np.shape(parent_probs)[-1] <= ENUMERATE_MAX_PARENTS:
+        return enumerated_marginal(parent_probs, p_true, p_false, baseline)
+    return bucketed_marginal(parent_probs, p_true, p_false, baseline)
+
+
+def assertion_marginal(parent_probs: np.ndarray, cond_true: np.ndarray, cond_false: np.ndarray,
+                       baseline: np.ndarray, exact_many_parents: bool = False) -> np.ndarray:
+    """Heavy-mode assertion marginal from valid parents (``calculateNaiveBayesMarginal``).
+
+    ``cond_true``/``cond_false``/``baseline`` are percentages, shape (k,) or (B, k).
+    Above ``MAX_EXACT_PARENTS`` the browser's log-odds approximation is used
+    unless ``exact_many_parents`` asks for ``many_parent_marginal``.
+    """
+    p_true = clamp_cpt(cond_true)
+    p_false = clamp_cpt(cond_false)
+    k = parent_probs.shape[1]
+    if k == 1:
+        p = parent_probs[:, 0]
+        return np.clip(p_true[..., 0] * p + p_false[..., 0] * (1 - p), 0, 1)
+    if k <= MAX_EXACT_PARENTS:
+        return exact_marginal(parent_probs, p_true, p_false, baseline_probs(baseline))
+    if exact_many_parents:
+        return many_parent_marginal(parent_probs, p_true, p_false, baseline_probs(baseline))
+    return np.clip(log_odds_marginal(parent_probs, p_true, p_false), 0, 1)
+
+
+def heavy_node(graph: CompiledGraph, state: np.ndarray, v: int, has_cpt: np.ndarray,
+               exact_many_parents: bool = False, cpt: Optional[Cpt] = None) -> np.ndarray:
+    """Heavy-mode probability column for node ``v`` given parent columns in ``state``.
+
+    Returns a (B,) array; NaN marks a virgin node (no valid parents). Parent
+    validity is read from row 0; rows whose parents differ in which ones are
+    NaN (per-row interventions) are evaluated group by group. ``cpt`` replaces
+    the graph's (condTrue, condFalse, baseline) arrays, per row when (B, E).
+    """
+    batch = state.shape[0]
+    t = graph.node_type[v]
+    pe = graph.parents(v)
+    if len(pe) == 0:
+        if t == FACT:
+            return state[:, v]  # seeded from fact_probs
+        return np.full(batch, ASSERTION_PRIOR)
+
+    src = graph.edge_source[pe]
+    if batch > 1 and t != FACT:
+        missing = np.isnan(state[:, src])
+        if (missing != missing[0]).any():
+            out = np.empty(batch)
+            patterns, group = np.unique(missing, axis=0, return_inverse=True)
+            for g in range(len(patterns)):
+                rows = np.flatnonzero(group.ravel() == g)
+                rows_cpt = cpt if cpt is None or np.ndim(cpt[0]) == 1 else tuple(a[rows] for a in cpt)
+                out[rows] = heavy_node(graph, state[rows], v, has_cpt, exact_many_parents, rows_cpt)
+            return out
+    if t == AND or t == OR:
+        valid = ~np.isnan(state[0, src])
+        if not valid.any():
+            return np.full(batch, np.nan)
+        p = state[:, src[valid]]
+        p = np.where(graph.inverse[pe[valid]], 1 - p, p)
+        if t == AND:
+            return p.prod(axis=1)
+        return 1 - (1 - p).prod(axis=1)
+
+    if t == ASSERTION:
+        valid = has_cpt[pe] & ~np.isnan(state[0, src])
+        if not valid.any():
+            return np.full(batch, np.nan)
+        ev = pe[valid]
+        cond_true, cond_false, baseline = cpt or (graph.cond_true, graph.cond_false, graph.baseline)
+        prof = profiling.ACTIVE
+        start = profiling.clock() if prof is not None else 0.0
+        out = assertion_marginal(state[:, src[valid]], cond_true[..., ev],
+                                 cond_false[..., ev], baseline[..., ev], exact_many_parents)
+        if prof is not None and len(ev) > 1:
+            prof.marginal(graph, v, start)
+        return out
+
+    # Facts with parents fall through to the JS default
+    return np.full(batch, ASSERTION_PRIOR)
+
+
+def _initial_state(graph: CompiledGraph, fact_probs: Optional[np.ndarray]) -> np.ndarray:
+    if fact_probs is None:
+        fact_probs = graph.fact_prob
+    fact_probs = np.atleast_2d(np.asarray(fact_probs, dtype=np.float64))
+    if fact_probs.shape[1] != graph.n_nodes:
+        raise ValueError(f"fact_probs must have {graph.n_nodes} columns; got {fact_probs.shape}")
+    state = np.full(fact_probs.shape, np.nan)
+    facts = graph.node_type == FACT
+    state[:, facts] = fact_probs[:, facts]
+    return state
+
+
+def propagate_heavy(graph: CompiledGraph, do: Optional[Dict[str, float]] = None,
+                    fact_probs: Optional[np.ndarray] = None, exact_many_parents: bool = False,
+                    cpt: Optional[Cpt] = None) -> np.ndarray:
+    """Propagate heavy-mode probabilities in topological order.
+
+    Args:
+        graph: compiled graph
+        do: optional intervention map node id -> probability; intervened nodes
+            are frozen at their value (their incoming edges are ignored). Values
+            may be scalars or length-B arrays.
+        fact_probs: optional per-node fact probabilities, shape (n,) or (B, n);
+            defaults to ``graph.fact_prob``. Only fact columns are read.
+        exact_many_parents: compute assertions with more than
+            ``MAX_EXACT_PARENTS`` CPT parents exactly (``many_parent_marginal``)
+            instead of with the browser's log-odds approximation
+        cpt: optional (condTrue, condFalse, baseline) percentage arrays of shape
+            (E,) or (B, E) used instead of the graph's CPTs (e.g. parameter samples)
+
+    Returns:
+        (n,) array of probabilities, or (B, n) when ``fact_probs`` or ``cpt`` is
+        2-D or a ``do`` value is an array. NaN marks nodes without a probability
+        (virgin assertions/logic nodes and notes).
+    """
+    state = _initial_state(graph, fact_probs)
+    batched = state.shape[0] > 1 or (fact_probs is not None and np.ndim(fact_probs) == 2)
+    if cpt is not None and np.ndim(cpt[0]) == 2:
+        if state.shape[0] == 1:
+            state = np.repeat(state, cpt[0].shape[0], axis=0)
+        batched = True
+    fixed = np.zeros(graph.n_nodes, dtype=bool)
+    for nid, value in (do or {}).items():
+        value = np.clip(np.asarray(value, dtype=np.float64), 0, 1)
+        if value.ndim and state.shape[0] == 1:
+            state = np.repeat(state, value.shape[0], axis=0)
+            batched = True
+        v = graph.index[nid]
+        state[:, v] = value
+        fixed[v] = True
+
+    has_cpt = graph.has_cpt()
+    prof = profiling.ACTIVE
+    with profiling.phase('propagate', mode='heavy', batch=state.shape[0]):
+        for v in graph.order:
+            if fixed[v] or graph.node_type[v] not in (FACT, ASSERTION, AND, OR):
+                continue
+            start = profiling.clock() if prof is not None else 0.0
+            state[:, v] = np.clip(heavy_node(graph, state, v, has_cpt, exact_many_parents, cpt), 0, 1)
+            if prof is not None:
+                prof.node(graph, v, start)
+    return state if batched else state[0]
@@ -0,0 +1,210 @@
+"""
+Incremental propagation: re-propagate only the descendant cone of an edit.
+
+``propagate_heavy`` / ``propagate_lite`` recompute every node. An
+``IncrementalPropagator`` keeps the compiled graph, its cached topological
+order and the current probabilities; editing a fact probability, a weight or a
+CPT marks the affected node dirty, and ``flush`` drains a worklist ordered by
+topological rank, recomputing a node only when one of its parents moved.
+
+A change smaller than ``tolerance`` is stored but not pushed to the children.
+Each node remembers the value its children last saw, so these small deltas are
+bounded by ``tolerance`` per node instead of accumulating across edits. With
+``tolerance=0`` a DAG ends up exactly where a full recompute would.
+
+    from beliefgraph import IncrementalPropagator, load_graph
+    live = IncrementalPropagator(load_graph('graph.json'), mode='heavy')
+    live.set_fact_prob('witness', 0.7)
+    live.set_cpt(('witness', 'verdict'), condTrue=85)
+    live.prob('verdict')          # flushes pending edits first
+
+Edits mutate the compiled graph in place. Structural edits (adding or removing
+nodes/edges) need a new ``compile_graph`` and a new propagator.
+"""
+
+import heapq
+import math
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+from . import profiling
+from .config import AND, ASSERTION, FACT, INCREMENTAL_TOLERANCE, MAX_ITERS, OR
+from .graph import CompiledGraph
+from .heavy import heavy_node, propagate_heavy
+from .lite import lite_node, propagate_lite
+
+EdgeRef = Union[int, str, Tuple[str, str]]
+MODES = ('heavy', 'lite')
+
+
+class IncrementalPropagator:
+    """Persistent propagation state with a dirty-node worklist.
+
+    Attributes:
+        graph: the compiled graph (edited in place)
+        mode: 'heavy' or 'lite'
+        tolerance: smallest change that is propagated to children
+        rank: position of each node in ``graph.order``
+        last_updates: nodes recomputed by the most recent ``flush``
+        converged: False if the last lite flush hit its update cap (cycles)
+    """
+
+    def __init__(self, graph: CompiledGraph, mode: str = 'heavy', tolerance: float = INCREMENTAL_TOLERANCE,
+                 exact_many_parents: bool = False, max_iters: int = MAX_ITERS):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode '{mode}' (expected one of {', '.join(MODES)})")
+        self.graph = graph
+        self.mode = mode
+        self.tolerance = tolerance
+        self.exact_many_parents = exact_many_parents
+        self.max_iters = max_iters
+        self.rank = np.empty(graph.n_nodes, dtype=np.int64)
+        self.rank[graph.order] = np.arange(len(graph.order))
+        self._has_cpt = graph.has_cpt()
+        self._queue = []
+        self._queued = bytearray(graph.n_nodes)
+        self._edge_index = None
+        self.last_updates = 0
+        self.converged = True
+        self.recompute()
+
+    # -- full recompute ---------------------------------------------------------
+
+    def recompute(self) -> np.ndarray:
+        """Drop pending edits' bookkeeping and recompute every node from scratch."""
+        if self.mode == 'heavy':
+            probs = propagate_heavy(self.graph, exact_many_parents=self.exact_many_parents)
+        else:
+            result = propagate_lite(self.graph, max_iters=self.max_iters)
+            probs, self.converged = result.probs, result.converged
+        self.state = np.array(probs, dtype=np.float64).reshape(1, -1)
+        self.pushed = self.state[0].copy()
+        self._queue.clear()
+        self._queued = bytearray(self.graph.n_nodes)
+        return self.state[0].copy()
+
+    # -- edits ------------------------------------------------------------------
+
+    def _node(self, node: Union[int, str]) -> int:
+        return self.graph.index[node] if isinstance(node, str) else int(node)
+
+    def _edge(self, edge: EdgeRef) -> int:
+        g = self.graph
+        if isinstance(edge, (int, np.integer)):
+            return int(edge)
+        if isinstance(edge, str):
+            if self._edge_index is None:       # built once; first edge wins for duplicate ids
+                self._edge_index = {}
+                for e, eid in enumerate(g.edge_ids):
+                    if eid is not None:
+                        self._edge_index.setdefault(eid, e)
+            try:
+                return self._edge_index[edge]
+            except KeyError:
+                raise KeyError(f"Unknown edge id '{edge}'") from None
+        source, target = (g.index[end] for end in edge)
+        for e in g.parents(target):
+            if g.edge_source[e] == source:
+                return int(e)
+        raise KeyError(f"No edge {edge[0]} -> {edge[1]}")
+
+    def mark_dirty(self, node: Union[int, str]):
+        """Queue ``node`` for recomputation at the next ``flush``."""
+        v = self._node(node)
+        if not self._queued[v]:
+            self._queued[v] = 1
+            heapq.heappush(self._queue, (int(self.rank[v]), v))
+
+    def set_fact_prob(self, node: Union[int, str], prob: float):
+        v = self._node(node)
+        self.graph.fact_prob[v] = prob
+        if self.graph.node_type[v] != FACT:
+            return
+        if self.mode == 'heavy':
+            if len(self.graph.parents(v)) == 0:
+                self.state[0, v] = min(max(prob, 0.0), 1.0)
+                self._push(v)
+        else:
+            self.mark_dirty(v)
+            self._push_fact_readers(v)
+
+    def set_weight(self, edge: EdgeRef, weight: float):
+        e = self._edge(edge)
+        self.graph.weight[e] = weight
+        self.mark_dirty(int(self.graph.edge_target[e]))
+
+    def set_cpt(self, edge: EdgeRef, condTrue: Optional[float] = None, condFalse: Optional[float] = None,
+                baseline: Optional[float] = None, inverse: Optional[bool] = None):
+        """Update any subset of an edge's CPT entries (percentages)."""
+        g, e = self.graph, self._edge(edge)
+        for arr, value in ((g.cond_true, condTrue), (g.cond_false, condFalse), (g.baseline, baseline)):
+            if value is not None:
+                arr[e] = value
+        if inverse is not None:
+            g.inverse[e] = inverse
+        self._has_cpt[e] = not (math.isnan(g.cond_true[e]) or math.isnan(g.cond_false[e]) or math.isnan(g.baseline[e]))
+        self.mark_dirty(int(g.edge_target[e]))
+
+    # -- propagation ------------------------------------------------------------
+
+    def _push(self, v: int):
+        """Queue ``v``'s children if its value moved more than ``tolerance`` since they last saw it."""
+        old, new = self.pushed[v], self.state[0, v]
+        old_nan, new_nan = math.isnan(old), math.isnan(new)
+        if old_nan and new_nan:
+            return
+        if old_nan == new_nan and abs(new - old) <= self.tolerance:
+            return
+        self.pushed[v] = new
+        for e in self.graph.children(v):
+            self.mark_dirty(int(self.graph.edge_target[e]))
+
+    def _push_fact_readers(self, v: int):
+        # Lite reads fact parents' fact_prob directly, so readers change even if state[v] does not
+        for e in self.graph.children(v):
+            self.mark_dirty(int(self.graph.edge_target[e]))
+
+    def _compute(self, v: int) -> float:
+        g = self.graph
+        if self.mode == 'heavy':
+            if g.node_type[v] not in (FACT, ASSERTION, AND, OR):
+                return np.nan
+            return float(np.clip(heavy_node(g, self.state, v, self._has_cpt, self.exact_many_parents), 0, 1)[0])
+        return float(lite_node(g, self.state, v)[0])
+
+    def flush(self) -> int:
+        """Recompute dirty nodes and their moved descendants; returns the number recomputed."""
+        updates = 0
+        cap = self.max_iters * max(self.graph.n_nodes, 1)
+        self.converged = True
+        prof = profiling.ACTIVE if self._queue else None
+        began = profiling.clock() if prof is not None else 0.0
+        while self._queue:
+            _, v = heapq.heappop(self._queue)
+            self._queued[v] = 0
+            start = profiling.clock() if prof is not None else 0.0
+            self.state[0, v] = self._compute(v)
+            if prof is not None:
+                prof.node(self.graph, v, start)
+            self._push(v)
+            updates += 1
+            if updates >= cap:                   # lite cycles that keep moving
+                self.converged = False
+                break
+        if prof is not None:
+            prof.span('propagate', began, mode=f'incremental-{self.mode}', updates=updates)
+        self.last_updates = updates
+        return updates
+
+    # -- results ----------------------------------------------------------------
+
+    @property
+    def probs(self) -> np.ndarray:
+        """(n,) probabilities after flushing pending edits (NaN = no probability)."""
+        self.flush()
+        return self.state[0].copy()
+
+    def prob(self, node: Union[int, str]) -> float:
+        self.flush()
+        return float(self.state[0, self._node(node)])
@@ -0,0 +1,137 @@
+"""
+Lite mode: robust logit propagation with iterative convergence.
+
+Port of ``convergeNodes`` / ``propagateFromParentsRobust`` (logic.js). Each
+iteration walks the cached topological order and updates nodes in place, so a
+node sees its parents' values from the current iteration when they were
+already visited (Gauss-Seidel), exactly like ``getCurrentIterProb`` in JS.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from . import profiling
+from .config import (
+    AND, ASSERTION, ASSERTION_PRIOR, EPSILON, FACT, HIGH_WEIGHT_BYPASS, MAX_ITERS, OR,
+    SATURATION_K, TOLERANCE,
+)
+from .graph import CompiledGraph
+
+
+@dataclass
+class LiteResult:
+    probs: np.ndarray       # (n,) or (B, n); NaN = virgin / no probability
+    converged: bool
+    iterations: int
+    final_delta: float
+
+
+def logit(p: np.ndarray) -> np.ndarray:
+    return np.log(p / (1 - p))
+
+
+def robust_update(parent_probs: np.ndarray, weights: np.ndarray, base_prob: float = ASSERTION_PRIOR,
+                  epsilon: float = EPSILON, saturation_k: float = SATURATION_K) -> np.ndarray:
+    """Per-parent saturated logit update (``propagateFromParentsRobust``).
+
+    Args:
+        parent_probs: (B, k) parent probabilities of the valid edges
+        weights: effective (signed) weights, shape (k,) or (B, k)
+
+    Returns:
+        (B,) updated probabilities
+    """
+    clamped_base = min(max(base_prob, epsilon), 1 - epsilon)
+    prior_odds = np.log(clamped_base / (1 - clamped_base))
+    odds = logit(np.clip(parent_probs, epsilon, 1 - epsilon))
+    sat = 1 - np.exp(-saturation_k * np.abs(weights))
+    delta = (sat * weights * (odds - prior_odds)).sum(axis=1)
+    result = 1 / (1 + np.exp(-(prior_odds + delta)))
+    if parent_probs.shape[1] == 1:
+        # High-weight single edge copies (or inverts) the parent, unclamped
+        w = np.broadcast_to(weights, parent_probs.shape)[:, 0]
+        p = parent_probs[:, 0]
+        result = np.where(np.abs(w) >= HIGH_WEIGHT_BYPASS, np.where(w > 0, p, 1 - p), result)
+    return result
+
+
+def lite_node(graph: CompiledGraph, state: np.ndarray, v: int, weights: np.ndarray = None) -> np.ndarray:
+    """Lite-mode probability column for node ``v`` (NaN = virgin).
+
+    ``weights`` replaces ``graph.weight``, per row when (B, E); validity is read from row 0.
+    """
+    batch = state.shape[0]
+    t = graph.node_type[v]
+    if t == FACT:
+        return np.full(batch, graph.fact_prob[v])
+    pe = graph.parents(v)
+    src = graph.edge_source[pe]
+
+    if t == AND or t == OR:
+        # Any missing/inert parent makes a logic node virgin
+        if len(pe) == 0 or np.isnan(state[0, src]).any() or graph.inert[src].any():
+            return np.full(batch, np.nan)
+        p = state[:, src]
+        p = np.where(graph.inverse[pe] | graph.opposes[pe], 1 - p, p)
+        if t == AND:
+            return p.prod(axis=1)
+        return 1 - (1 - p).prod(axis=1)
+
+    if t == ASSERTION:
+        w = (graph.weight if weights is None else weights)[..., pe]
+        w0 = w if w.ndim == 1 else w[0]
+        valid = ~np.isnan(state[0, src]) & ~graph.inert[src] & ~np.isnan(w0) & (w0 != 0)
+        if not valid.any():
+            return np.full(batch, np.nan)
+        ev, sv = pe[valid], src[valid]
+        p = state[:, sv]
+        # Fact parents contribute FACT_PROB regardless of stored state
+        p = np.where(graph.node_type[sv] == FACT, graph.fact_prob[sv], p)
+        w_eff = np.where(graph.opposes[ev], -w[..., valid], w[..., valid])
+        return robust_update(p, w_eff)
+
+    # Notes (and unknown types) carry no probability
+    return np.full(batch, np.nan)
+
+
+def propagate_lite(graph: CompiledGraph, tolerance: float = TOLERANCE, max_iters: int = MAX_ITERS,
+                   initial: np.ndarray = None) -> LiteResult:
+    """Iterate lite-mode updates until the max change drops below ``tolerance``.
+
+    Args:
+        graph: compiled graph
+        tolerance: convergence threshold on max |delta| over nodes
+        max_iters: iteration cap
+        initial: optional starting probabilities (n,) or (B, n); defaults to the
+            graph's stored ``prob`` values (NaN = virgin)
+
+    Returns:
+        LiteResult with final probabilities and convergence info
+    """
+    start = graph.prob if initial is None else initial
+    batched = np.ndim(start) == 2
+    state = np.array(np.atleast_2d(start), dtype=np.float64)
+
+    converged, iterations, final_delta = False, 0, 0.0
+    prof = profiling.ACTIVE
+    with profiling.phase('propagate', mode='lite', batch=state.shape[0]):
+        for it in range(max_iters):
+            iterations = it + 1
+            prev = state.copy()
+            for v in graph.order:
+                start = profiling.clock() if prof is not None else 0.0
+                state[:, v] = lite_node(graph, state, v)
+                if prof is not None:
+                    prof.node(graph, v, start)
+            both = ~np.isnan(prev) & ~np.isnan(state)
+            changed = bool(((np.isnan(prev) != np.isnan(state)) | (both & (prev != state))).any())
+            final_delta = float(np.abs(state - prev)[both].max(initial=0.0))
+            if prof is not None:
+                prof.iteration('lite max delta', iterations, final_delta)
+            if not changed or final_delta < tolerance:
+                converged = True
+                break
+
+    probs = state if batched else state[0]
+    return LiteResult(probs=probs, converged=converged, iterations=iterations, final_delta=final_delta)
@@ -0,0 +1,281 @@
+"""
+Monte Carlo uncertainty bands: propagate K perturbed parameter sets at once.
+
+Each sample redraws the uncertain parameters of the graph:
+
+- heavy: CPT entries (condTrue, condFalse, baseline) ~ Beta with mean at the
+  stated value (after the usual [0.001, 0.999] clamp; a 0 baseline means 50%)
+  and concentration ``cpt_concentration`` (a + b; larger = tighter), and
+  optionally fact probabilities ~ Beta around ``fact_prob`` (``fact_concentration``)
+- lite: edge weights with multiplicative log-normal jitter
+  ``w * exp(N(0, weight_jitter))``, clipped to [WEIGHT_MIN, 1]
+
+Samples are drawn in chunks of ``chunk`` rows and propagated as one (chunk, n)
+state through the heavy kernels (``propagate_heavy(cpt=...)``) or the lite
+fixed-point solver (``solve_lite(weights=...)``). Every chunk is folded into a
+per-node histogram on [0, 1] (``bins`` buckets), which gives running means and
+quantiles accurate to 1 / bins without keeping the samples. Chunks are seeded
+from (seed, chunk index), so results do not depend on ``workers``.
+
+    from beliefgraph import load_graph
+    from beliefgraph.montecarlo import iter_monte_carlo, monte_carlo
+    g = load_graph('graph.json')
+    res = monte_carlo(g, 10000, mode='heavy', workers=8)
+    res.band('verdict')                           # {'mean', 'std', 'q05', 'q50', 'q95'}
+    for partial in iter_monte_carlo(g, 10000):    # streamed after every chunk
+        print(partial.samples, partial.band('verdict'))
+
+Usage:
+  python3 -m beliefgraph.montecarlo graph.json [--samples 10000] [--mode heavy|lite] [--workers N] [--json]
+"""
+
+import argparse
+import json
+import math
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from .config import (
+    CPT_CLAMP_MAX, CPT_CLAMP_MIN, FACT, MC_BINS, MC_CHUNK, MC_CPT_CONCENTRATION, MC_QUANTILES,
+    MC_WEIGHT_JITTER, WEIGHT_MIN,
+)
+from .graph import CompiledGraph, load_graph
+from .heavy import baseline_probs, clamp_cpt, propagate_heavy
+from .solver import LiteOperator, solve_lite
+
+MODES = ('heavy', 'lite')
+
+
+def _beta_around(rng: np.random.Generator, mean: np.ndarray, concentration: float, k: int) -> np.ndarray:
+    """(k, m) Beta draws with the given per-column means; NaN means stay NaN."""
+    out = np.full((k, len(mean)), np.nan)
+    ok = ~np.isnan(mean)
+    m = np.clip(mean[ok], CPT_CLAMP_MIN, CPT_CLAMP_MAX)
+    out[:, ok] = rng.beta(m * concentration, (1 - m) * concentration, size=(k, int(ok.sum())))
+    return out
+
+
+def sample_parameters(graph: CompiledGraph, k: int, rng: np.random.Generator, mode: str = 'heavy',
+                      cpt_concentration: float = MC_CPT_CONCENTRATION, weight_jitter: float = MC_WEIGHT_JITTER,
+                      fact_concentration: Optional[float] = None) -> Dict[str, np.ndarray]:
+    """Draw ``k`` parameter sets for ``mode``.
+
+    Heavy: (k, E) 'cond_true', 'cond_false', 'baseline' (percent), plus (k, n)
+    'fact_probs' when ``fact_concentration`` is set. Lite: (k, E) 'weight'.
+    """
+    if mode == 'lite':
+        jitter = np.exp(rng.normal(0.0, weight_jitter, size=(k, graph.n_edges)))
+        w = graph.weight
+        return {'weight': np.where(np.isnan(w) | (w == 0), w, np.clip(w * jitter, WEIGHT_MIN, 1.0))}
+    out = {
+        'cond_true': 100 * _beta_around(rng, clamp_cpt(graph.cond_true), cpt_concentration, k),
+        'cond_false': 100 * _beta_around(rng, clamp_cpt(graph.cond_false), cpt_concentration, k),
+        'baseline': 100 * _beta_around(rng, baseline_probs(graph.baseline), cpt_concentration, k),
+    }
+    if fact_concentration:
+        out['fact_probs'] = np.tile(graph.fact_prob, (k, 1))
+        facts = graph.node_type == FACT
+        out['fact_probs'][:, facts] = _beta_around(rng, graph.fact_prob[facts], fact_concentration, k)
+    return out
+
+
+class Histogram:
+    """Per-node counts over ``bins`` equal buckets of [0, 1], plus running moments.
+
+    NaN samples (virgin nodes) are counted in ``undefined`` and left out of the
+    moments and quantiles. Histograms from different chunks ``merge`` exactly.
+    """
+
+    def __init__(self, n: int, bins: int = MC_BINS):
+        self.bins = bins
+        self.counts = np.zeros((n, bins), dtype=np.int64)
+        self.total = np.zeros(n)
+        self.total_sq = np.zeros(n)
+        self.defined = np.zeros(n, dtype=np.int64)
+        self.undefined = np.zeros(n, dtype=np.int64)
+        self.low = np.full(n, np.inf)
+        self.high = np.full(n, -np.inf)
+
+    def add(self, samples: np.ndarray):
+        """Fold a (k, n) block of sampled probabilities in."""
+        ok = ~np.isnan(samples)
+        values = np.where(ok, samples, 0.0)
+        self.total += values.sum(axis=0)
+        self.total_sq += (values ** 2).sum(axis=0)
+        self.defined += ok.sum(axis=0)
+        self.undefined += (~ok).sum(axis=0)
+        self.low = np.minimum(self.low, np.where(ok, samples, np.inf).min(axis=0))
+        self.high = np.maximum(self.high, np.where(ok, samples, -np.inf).max(axis=0))
+        bucket = np.minimum((values * self.bins).astype(np.int64), self.bins - 1)
+        flat = (bucket + self.bins * np.arange(samples.shape[1]))[ok]
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+
+    def merge(self, other: 'Histogram'):
+        self.counts += other.counts
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.defined += other.defined
+        self.undefined += other.undefined
+        self.low = np.minimum(self.low, other.low)
+        self.high = np.maximum(self.high, other.high)
+
+    def mean(self) -> np.ndarray:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.defined > 0, self.total / self.defined, np.nan)
+
+    def std(self) -> np.ndarray:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            var = self.total_sq / self.defined - self.mean() ** 2
+        return np.sqrt(np.clip(var, 0, None))
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        """(len(qs), n) quantiles, interpolated inside the bucket and kept within the
+        observed range (error <= 1 / bins; exact for constant nodes)."""
+        cum = np.cumsum(self.counts, axis=1)
+        out = np.full((len(qs), len(self.defined)), np.nan)
+        has = self.defined > 0
+        for i, q in enumerate(qs):
+            rank = q * self.defined[has]
+            b = np.minimum((cum[has] < rank[:, None]).sum(axis=1), self.bins - 1)
+            rows = np.flatnonzero(has)
+            below = np.where(b > 0, cum[rows, b - 1], 0)
+            inside = self.counts[rows, b]
+            frac = np.where(inside > 0, (rank - below) / np.maximum(inside, 1), 0.5)
+            out[i, has] = np.clip((b + np.clip(frac, 0, 1)) / self.bins, self.low[has], self.high[has])
+        return out
+
+
+@dataclass
+class MonteCarloResult:
+    """Uncertainty summary after ``samples`` draws; arrays are aligned with ``ids``."""
+    ids: List[str]
+    samples: int
+    mean: np.ndarray
+    std: np.ndarray
+    quantile_levels: Sequence[float]
+    quantiles: np.ndarray           # (len(quantile_levels), n)
+    defined_share: np.ndarray       # fraction of samples in which the node had a probability
+    index: Dict[str, int] = field(default=None, repr=False, compare=False)   # id -> position in ``ids``
+
+    def __post_init__(self):
+        if self.index is None:
+            self.index = {nid: i for i, nid in enumerate(self.ids)}
+
+    def _columns(self) -> Dict[str, np.ndarray]:
+        cols = {'mean': self.mean, 'std': self.std}
+        cols.update({f"q{round(q * 100):02d}": self.quantiles[i] for i, q in enumerate(self.quantile_levels)})
+        return cols
+
+    def band(self, node: str) -> Dict[str, float]:
+        v = self.index[node]
+        return {k: float(col[v]) for k, col in self._columns().items()}
+
+    def to_dict(self) -> dict:
+        cols = {k: [None if math.isnan(v) else round(v, 6) for v in col.tolist()]
+                for k, col in self._columns().items()}
+        defined = [round(v, 6) for v in np.asarray(self.defined_share, dtype=float).tolist()]
+        nodes = {nid: dict({k: col[i] for k, col in cols.items()}, defined=defined[i])
+                 for i, nid in enumerate(self.ids)}
+        return {'samples': self.samples, 'nodes': nodes}
+
+
+def _summarize(graph: CompiledGraph, hist: Histogram, levels: Sequence[float]) -> MonteCarloResult:
+    n_samples = int((hist.defined + hist.undefined).max(initial=0))
+    return MonteCarloResult(ids=list(graph.ids), index=graph.index, samples=n_samples, mean=hist.mean(), std=hist.std(),
+                            quantile_levels=tuple(levels), quantiles=hist.quantiles(levels),
+                            defined_share=hist.defined / max(n_samples, 1))
+
+
+def run_chunk(graph: CompiledGraph, k: int, seed: int, index: int, mode: str = 'heavy',
+              cpt_concentration: float = MC_CPT_CONCENTRATION, weight_jitter: float = MC_WEIGHT_JITTER,
+              fact_concentration: Optional[float] = None, bins: int = MC_BINS,
+              operator: Optional[LiteOperator] = None) -> Histogram:
+    """Sample and propagate one chunk of ``k`` parameter sets; returns its histogram."""
+    rng = np.random.default_rng([seed, index])
+    params = sample_parameters(graph, k, rng, mode, cpt_concentration, weight_jitter, fact_concentration)
+    if mode == 'heavy':
+        probs = propagate_heavy(graph, fact_probs=params.get('fact_probs'),
+                                cpt=(params['cond_true'], params['cond_false'], params['baseline']))
+    else:
+        probs = solve_lite(graph, weights=params['weight'], operator=operator).probs
+    hist = Histogram(graph.n_nodes, bins)
+    hist.add(np.atleast_2d(probs))
+    return hist
+
+
+def iter_monte_carlo(graph: CompiledGraph, n_samples: int, mode: str = 'heavy', seed: int = 0,
+                     chunk: int = MC_CHUNK, workers: int = 1, quantiles: Sequence[float] = MC_QUANTILES,
+                     cpt_concentration: float = MC_CPT_CONCENTRATION, weight_jitter: float = MC_WEIGHT_JITTER,
+                     fact_concentration: Optional[float] = None, bins: int = MC_BINS) -> Iterator[MonteCarloResult]:
+    """Yield a running ``MonteCarloResult`` after every finished chunk (the last one covers all samples).
+
+    With ``workers`` > 1, chunks run in a process pool and are merged as they finish.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}' (expected one of {', '.join(MODES)})")
+    if mode == 'lite' and fact_concentration:
+        raise ValueError("fact_concentration is only supported in heavy mode")
+    sizes = [min(chunk, n_samples - start) for start in range(0, n_samples, chunk)]
+    options = dict(mode=mode, cpt_concentration=cpt_concentration, weight_jitter=weight_jitter,
+                   fact_concentration=fact_concentration, bins=bins)
+    hist = Histogram(graph.n_nodes, bins)
+    if workers <= 1:
+        operator = LiteOperator(graph) if mode == 'lite' else None
+        for i, k in enumerate(sizes):
+            hist.merge(run_chunk(graph, k, seed, i, operator=operator, **options))
+            yield _summarize(graph, hist, quantiles)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_chunk, graph, k, seed, i, **options) for i, k in enumerate(sizes)]
+        for future in futures:
+            hist.merge(future.result())
+            yield _summarize(graph, hist, quantiles)
+
+
+def monte_carlo(graph: CompiledGraph, n_samples: int, **kwargs) -> MonteCarloResult:
+    """Run all chunks of ``iter_monte_carlo`` and return the final summary."""
+    result = None
+    for result in iter_monte_carlo(graph, n_samples, **kwargs):
+        pass
+    if result is None:
+        raise ValueError("n_samples must be positive")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m beliefgraph.montecarlo',
+                                     description='Uncertainty bands from sampled CPTs and weights.')
+    parser.add_argument('file', help='minimal-format (or full Cytoscape) JSON file')
+    parser.add_argument('--samples', type=int, default=10000)
+    parser.add_argument('--mode', choices=MODES, default='heavy')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--chunk', type=int, default=MC_CHUNK)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cpt-concentration', type=float, default=MC_CPT_CONCENTRATION)
+    parser.add_argument('--weight-jitter', type=float, default=MC_WEIGHT_JITTER)
+    parser.add_argument('--json', action='store_true', help='print one JSON object instead of a table')
+    args = parser.parse_args(argv)
+    graph = load_graph(args.file)
+    result = monte_carlo(graph, args.samples, mode=args.mode, seed=args.seed, chunk=args.chunk,
+                         workers=args.workers, cpt_concentration=args.cpt_concentration,
+                         weight_jitter=args.weight_jitter)
+    if args.json:
+        print(json.dumps(result.to_dict(), ensure_ascii=False))
+        return 0
+    labels = [f"q{round(q * 100):02d}" for q in result.quantile_levels]
+    print(f"{'node':30s} {'mean':>7s} {'std':>7s} " + ' '.join(f"{q:>7s}" for q in labels))
+    cols = result._columns()
+    for i, nid in enumerate(result.ids):
+        if math.isnan(cols['mean'][i]):
+            continue
+        print(f"{nid[:30]:30s} {cols['mean'][i]:7.4f} {cols['std'][i]:7.4f} "
+              + ' '.join(f"{cols[q][i]:7.4f}" for q in labels))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
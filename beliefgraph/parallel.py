@@ -0,0 +1,290 @@
+"""
+Parallel scoring: the independent components of one graph, and whole collections of graphs.
+
+Converter output such as ``excel-topics-deps.json`` often splits into many
+weakly connected components, yet ``propagate_heavy`` / ``propagate_lite`` walk
+the whole graph in one loop. ``CompiledGraph.components()`` labels the
+components once (vectorized union-find, cached on the graph). A
+``ComponentPool`` then:
+
+- copies the graph's arrays into one shared-memory block that worker processes
+  map without copying
+- packs the components into size-balanced bins (largest first, each into the
+  lightest bin)
+- propagates the bins concurrently; every worker writes its nodes straight
+  into a shared result array
+
+A bin walks the graph's cached topological order restricted to its own nodes,
+so heavy-mode results are identical to ``propagate_heavy``. In lite mode each
+bin iterates until its own max delta drops below the tolerance, instead of
+waiting for the slowest component to converge.
+
+``score_directory`` scores a collection of graph files on a process pool.
+Files are queued largest first and handed out one at a time, so an idle
+worker always takes the next file. Each record carries the graph's load +
+propagate latency; ``summarize`` aggregates throughput.
+
+    from beliefgraph.parallel import ComponentPool, propagate_components, score_directory, summarize
+    probs = propagate_components(g, mode='heavy', workers=8)
+    with ComponentPool(g, workers=8) as pool:        # keeps workers and shared arrays between runs
+        heavy = pool.propagate('heavy')
+        lite = pool.propagate('lite').probs
+    records = list(score_directory(['graphs/'], mode='heavy', workers=8))
+
+Usage:
+  python3 -m beliefgraph.parallel DIR_OR_FILE [...] [--mode lite|heavy] [--workers N] [--pattern '*.json']
+                                  [--exact-many-parents] [--solver sweeps|sparse] [-o results.jsonl]
+"""
+
+import argparse
+import copy
+import heapq
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .binary import ENGINE_COLUMNS, INDEX_COLUMNS
+from .config import PARALLEL_BINS_PER_WORKER, PARALLEL_MIN_NODES
+from .graph import CompiledGraph
+from .heavy import propagate_heavy
+from .lite import LiteResult, propagate_lite
+
+MODES = ('heavy', 'lite')
+Layout = Dict[str, Tuple[int, str, Tuple[int, ...]]]         # column -> (offset, dtype, shape)
+
+
+def _spawn_pool(workers: int, initializer=None, initargs=()) -> ProcessPoolExecutor:
+    # spawn, not fork: a forked worker would inherit whatever the parent holds (sockets, threads, locks)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=initializer, initargs=initargs)
+
+
+# -- components -----------------------------------------------------------------
+
+def component_bins(graph: CompiledGraph, n_bins: int) -> List[np.ndarray]:
+    """Split ``graph.order`` into at most ``n_bins`` topological orders over whole components.
+
+    Components are weighted by nodes + edges and placed largest first into the
+    currently lightest bin. Empty bins are dropped.
+    """
+    labels, count = graph.components()
+    size = np.bincount(labels, minlength=count) + np.bincount(labels[graph.edge_target], minlength=count)
+    n_bins = max(1, min(n_bins, count))
+    heap = [(0, b) for b in range(n_bins)]
+    bin_of = np.empty(count, dtype=np.int64)
+    for c in np.argsort(-size, kind='stable'):
+        load, b = heapq.heappop(heap)
+        bin_of[c] = b
+        heapq.heappush(heap, (load + int(size[c]), b))
+    node_bin = bin_of[labels[graph.order]]
+    ranked = graph.order[np.argsort(node_bin, kind='stable')]          # stable: topological within a bin
+    bounds = np.cumsum(np.bincount(node_bin, minlength=n_bins))[:-1]
+    return [part for part in np.split(ranked, bounds) if len(part)]
+
+
+def _share(arrays: Dict[str, np.ndarray]) -> Tuple[SharedMemory, Layout]:
+    layout, offset = {}, 0
+    for name, arr in arrays.items():
+        offset += -offset % 64
+        layout[name] = (offset, arr.dtype.str, arr.shape)
+        offset += arr.nbytes
+    shm = SharedMemory(create=True, size=max(offset, 1))
+    for name, arr in arrays.items():
+        start, dtype, shape = layout[name]
+        np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=start)[...] = arr
+    return shm, layout
+
+
+_WORKER: dict = {}
+
+
+def _attach(graph_name: str, layout: Layout, ids: List[str], edge_ids: list, out_name: str):
+    shm, out = SharedMemory(name=graph_name), SharedMemory(name=out_name)
+    cols = {name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=start)
+            for name, (start, dtype, shape) in layout.items()}
+    columns = {name: cols[name] for name in ENGINE_COLUMNS}
+    columns.update(ids=ids, edge_ids=edge_ids)
+    graph = CompiledGraph.from_columns(columns, {name: cols[name] for name in INDEX_COLUMNS})
+    _WORKER.update(shm=shm, out_shm=out, graph=graph, out=np.ndarray(len(ids), dtype=np.float64, buffer=out.buf))
+
+
+def _propagate_bin(order: np.ndarray, mode: str, options: dict):
+    """Propagate one bin on the shared graph; writes its nodes into the shared result."""
+    view = copy.copy(_WORKER['graph'])
+    view.order = order
+    if mode == 'heavy':
+        probs, info = propagate_heavy(view, **options), None
+    else:
+        res = propagate_lite(view, **options)
+        probs, info = res.probs, (res.converged, res.iterations, res.final_delta)
+    _WORKER['out'][order] = probs[order]
+    return info
+
+
+class ComponentPool:
+    """Worker processes plus the graph's arrays in shared memory, for component-parallel propagation.
+
+    Args:
+        graph: compiled graph (its arrays are copied once into shared memory)
+        workers: process count (default: CPU count)
+        bins_per_worker: component bins per worker, for load balancing
+    """
+
+    def __init__(self, graph: CompiledGraph, workers: Optional[int] = None,
+                 bins_per_worker: int = PARALLEL_BINS_PER_WORKER):
+        self.graph = graph
+        self.workers = workers or os.cpu_count() or 1
+        self.n_components = graph.components()[1]
+        self.bins = component_bins(graph, self.workers * bins_per_worker)
+        self._shm, layout = _share({name: np.asarray(getattr(graph, name)) for name in ENGINE_COLUMNS + INDEX_COLUMNS})
+        self._out_shm = SharedMemory(create=True, size=max(8 * graph.n_nodes, 1))
+        self._out = np.ndarray(graph.n_nodes, dtype=np.float64, buffer=self._out_shm.buf)
+        self._pool = _spawn_pool(min(self.workers, len(self.bins)), _attach,
+                                 (self._shm.name, layout, list(graph.ids), list(graph.edge_ids), self._out_shm.name))
+
+    def propagate(self, mode: str = 'heavy', **options) -> Union[np.ndarray, LiteResult]:
+        """One scenario over all bins: (n,) heavy probabilities, or a ``LiteResult`` for lite.
+
+        ``options`` go to ``propagate_heavy`` / ``propagate_lite`` (single-row
+        ``fact_probs``, ``do``, ``exact_many_parents``, ``tolerance``, ...).
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode '{mode}' (expected one of {', '.join(MODES)})")
+        if np.ndim(options.get('fact_probs')) == 2 or np.ndim(options.get('initial')) == 2:
+            raise ValueError("ComponentPool propagates a single scenario; use propagate_heavy for batches")
+        self._out[:] = np.nan
+        infos = list(self._pool.map(_propagate_bin, self.bins, [mode] * len(self.bins),
+                                    [options] * len(self.bins)))
+        probs = self._out.copy()
+        if mode == 'heavy':
+            return probs
+        return LiteResult(probs=probs, converged=all(i[0] for i in infos),
+                          iterations=max(i[1] for i in infos), final_delta=max(i[2] for i in infos))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            del self._out
+            for shm in (self._shm, self._out_shm):
+                shm.close()
+                shm.unlink()
+
+    def __enter__(self) -> 'ComponentPool':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def propagate_components(graph: CompiledGraph, mode: str = 'heavy', workers: Optional[int] = None,
+                         min_nodes: int = PARALLEL_MIN_NODES, **options) -> Union[np.ndarray, LiteResult]:
+    """``propagate_heavy`` / ``propagate_lite`` with independent components on a process pool.
+
+    Runs serially when there is one component, one worker, or fewer than
+    ``min_nodes`` nodes (pool startup would dominate).
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}' (expected one of {', '.join(MODES)})")
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or graph.n_nodes < min_nodes or graph.components()[1] == 1:
+        return propagate_heavy(graph, **options) if mode == 'heavy' else propagate_lite(graph, **options)
+    with ComponentPool(graph, workers) as pool:
+        return pool.propagate(mode, **options)
+
+
+# -- graph collections ----------------------------------------------------------
+
+def collect_files(paths: Sequence[Union[str, Path]], pattern: str = '*.json') -> List[Path]:
+    """Files under ``paths`` (directories searched recursively for ``pattern``), largest first."""
+    files = []
+    for p in map(Path, paths):
+        files.extend(sorted(f for f in p.rglob(pattern) if f.is_file()) if p.is_dir() else [p])
+    return sorted(files, key=lambda f: -f.stat().st_size)
+
+
+def _score_timed(path: str, mode: str, exact_many_parents: bool, solver: str) -> dict:
+    from .__main__ import score_file
+    start = time.perf_counter()
+    try:
+        record = score_file(path, mode, exact_many_parents, solver)
+    except (OSError, ValueError) as e:
+        record = {'file': path, 'mode': mode, 'error': str(e)}
+    else:
+        record['nodes'] = len(record['probs'])
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+
+def score_directory(paths: Sequence[Union[str, Path]], mode: str = 'lite', workers: Optional[int] = None,
+                    pattern: str = '*.json', exact_many_parents: bool = False,
+                    solver: str = 'sweeps') -> Iterator[dict]:
+    """Yield one ``python3 -m beliefgraph`` record per file, in completion order.
+
+    Each record adds ``nodes`` and ``seconds`` (load + propagate time in its
+    worker); a file that fails to load yields ``{'file', 'mode', 'error', 'seconds'}``.
+    """
+    files = [str(f) for f in collect_files(paths, pattern)]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        for f in files:
+            yield _score_timed(f, mode, exact_many_parents, solver)
+        return
+    with _spawn_pool(min(workers, max(len(files), 1))) as pool:
+        futures = [pool.submit(_score_timed, f, mode, exact_many_parents, solver) for f in files]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def summarize(records: Sequence[dict], wall_seconds: float) -> dict:
+    """Aggregate throughput and latency percentiles for ``score_directory`` records."""
+    ok = [r for r in records if 'error' not in r]
+    latency = np.array([r['seconds'] for r in records]) if records else np.zeros(1)
+    nodes = sum(r['nodes'] for r in ok)
+    wall = max(wall_seconds, 1e-9)
+    return {'graphs': len(ok), 'failed': len(records) - len(ok), 'nodes': nodes, 'wallSeconds': wall_seconds,
+            'graphsPerSecond': len(records) / wall, 'nodesPerSecond': nodes / wall,
+            'latency': {'p50': float(np.percentile(latency, 50)), 'p95': float(np.percentile(latency, 95)),
+                        'max': float(latency.max())}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m beliefgraph.parallel',
+                                     description='Score a collection of graph files on a process pool.')
+    parser.add_argument('paths', nargs='+', help='directories (searched recursively) or graph files')
+    parser.add_argument('--mode', choices=MODES, default='lite')
+    parser.add_argument('--workers', type=int, default=None, help='process count (default: CPU count)')
+    parser.add_argument('--pattern', default='*.json', help='file pattern inside directories')
+    parser.add_argument('--exact-many-parents', action='store_true')
+    parser.add_argument('--solver', choices=['sweeps', 'sparse'], default='sweeps')
+    parser.add_argument('-o', '--output', help='write JSON Lines records here instead of stdout')
+    args = parser.parse_args(argv)
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    records = []
+    start = time.perf_counter()
+    try:
+        for record in score_directory(args.paths, args.mode, args.workers, args.pattern,
+                                      args.exact_many_parents, args.solver):
+            records.append({k: v for k, v in record.items() if k != 'probs'})
+            if 'error' in record:
+                print(f"{record['file']}: {record['error']}", file=sys.stderr)
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    summary = summarize(records, time.perf_counter() - start)
+    print(json.dumps(summary), file=sys.stderr)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""
+Peer-relation overlay: display-only adjustments between aligned / antagonistic nodes.
+
+``applyPeerInfluence`` (peer-relations.js) looks up every ``peerId`` per node
+and rescans all nodes for symmetry and fact links on each recompute. A
+``PeerOverlay`` stores the relations once as a symmetric sparse matrix S of
+signed strengths (+s aligned, -s antagonistic; CSR rows by node index), so the
+overlay for all nodes is one vectorized step:
+
+    delta = clamp(S @ p - rowsum(S) * p, +-PEER_MAX_ABS_DELTA)
+    display = clip(p + delta, 0, 1)
+
+where S only counts peers with a numeric probability (a NaN peer is skipped,
+as in the browser). Facts never take part: links to or from a fact are dropped
+when the overlay is built. A node is ``adjusted`` when
+``|display - p| > PEER_DISPLAY_MIN``; otherwise its display value is ``p``.
+
+``update`` keeps the last base probabilities and recomputes only nodes whose
+probability or links changed and their peers:
+
+    from beliefgraph import PeerOverlay, load_graph, propagate_lite
+    g = load_graph('graph.json')
+    peers = PeerOverlay.from_document(g, doc)        # node data('peerLinks')
+    display = peers.update(propagate_lite(g).probs)
+    peers.add('verdict', 'motive', 'antagonistic', 0.2)
+    display = peers.update(probs)                    # 2 rows + their peers
+
+Core propagation is not affected; the overlay only reads probabilities.
+"""
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from . import profiling
+from .config import FACT, PEER_DEFAULT_STRENGTH, PEER_DISPLAY_MIN, PEER_MAX_ABS_DELTA
+from .graph import CompiledGraph
+
+NodeRef = Union[int, str]
+RELATIONS = {'aligned': 1.0, 'antagonistic': -1.0}
+Link = Tuple[NodeRef, NodeRef, str, float]
+
+
+class PeerOverlay:
+    """Symmetric signed peer strengths over the nodes of a compiled graph.
+
+    Attributes:
+        display: display probability per node after the last ``update`` (NaN = no base prob)
+        delta: clamped adjustment per node
+        adjusted: ``peerAdjusted`` mask (``|display - base| > PEER_DISPLAY_MIN``)
+        last_updates: rows recomputed by the most recent ``update``
+    """
+
+    def __init__(self, graph: CompiledGraph, links: Iterable[Link] = ()):
+        self.graph = graph
+        self.n = graph.n_nodes
+        self.is_fact = graph.node_type == FACT
+        self._links: List[Dict[int, Tuple[float, float]]] = [{} for _ in range(self.n)]   # peer -> (sign, strength)
+        self._matrix: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._touched: Set[int] = set()
+        self._base: Optional[np.ndarray] = None
+        self.display = np.full(self.n, np.nan)
+        self.delta = np.zeros(self.n)
+        self.adjusted = np.zeros(self.n, dtype=bool)
+        self.last_updates = 0
+        for a, b, relation, strength in links:
+            self.add(a, b, relation, strength)
+
+    @classmethod
+    def from_document(cls, graph: CompiledGraph, doc) -> 'PeerOverlay':
+        """Read node ``peerLinks`` from an elements / graph-wrapper / minimal document.
+
+        Mirrors ``ensurePeerRelationSymmetry`` + ``pruneFactRelations``: self
+        links, unknown peers, unknown relations and links touching a fact are
+        dropped, and a one-sided link is mirrored. If both sides disagree, the
+        node listed first wins.
+        """
+        if isinstance(doc, dict) and isinstance(doc.get('graph'), list):
+            doc = doc['graph']
+        items = doc.get('nodes', []) if isinstance(doc, dict) else [(el or {}).get('data') or {} for el in doc or []]
+        overlay = cls(graph)
+        seen = set()
+        for d in items:
+            a = graph.index.get(d.get('id'))
+            if a is None:
+                continue
+            for link in d.get('peerLinks') or []:
+                b = graph.index.get((link or {}).get('peerId'))
+                if b is None or link.get('relation') not in RELATIONS:
+                    continue
+                if overlay._excluded(a, b) or (min(a, b), max(a, b)) in seen:
+                    continue
+                seen.add((min(a, b), max(a, b)))
+                strength = link.get('strength')
+                if not isinstance(strength, (int, float)):
+                    strength = PEER_DEFAULT_STRENGTH
+                overlay._set(a, b, RELATIONS[link['relation']], float(strength))
+        return overlay
+
+    # -- edits ------------------------------------------------------------------
+
+    def node(self, ref: NodeRef) -> int:
+        return self.graph.index[ref] if isinstance(ref, str) else int(ref)
+
+    def _excluded(self, a: int, b: int) -> bool:
+        return a == b or bool(self.is_fact[a] or self.is_fact[b])
+
+    def _set(self, a: int, b: int, sign: float, strength: float):
+        self._links[a][b] = self._links[b][a] = (sign, strength)
+        self._matrix = None
+        self._touched.update((a, b))
+
+    def add(self, a: NodeRef, b: NodeRef, relation: str = 'aligned', strength: float = PEER_DEFAULT_STRENGTH) -> bool:
+        """``addPeerRelation``: link a and b (replacing another relation between them).
+
+        Returns False (no change) for a self link, a fact endpoint, or when the
+        same relation already exists (its strength is kept, as in the browser).
+        """
+        if relation not in RELATIONS:
+            raise ValueError(f"Unknown peer relation '{relation}' (expected one of {', '.join(RELATIONS)})")
+        a, b = self.node(a), self.node(b)
+        if self._excluded(a, b):
+            return False
+        current = self._links[a].get(b)
+        if current is not None and current[0] == RELATIONS[relation]:
+            return False
+        self._set(a, b, RELATIONS[relation], float(strength))
+        return True
+
+    def remove(self, a: NodeRef, b: NodeRef) -> bool:
+        """``removePeerRelation``; returns False if a and b were not linked."""
+        a, b = self.node(a), self.node(b)
+        if b not in self._links[a]:
+            return False
+        del self._links[a][b], self._links[b][a]
+        self._matrix = None
+        self._touched.update((a, b))
+        return True
+
+    def set_strength(self, a: NodeRef, b: NodeRef, strength: float) -> bool:
+        """``setPeerRelationStrength`` (both directions); returns False if a and b are not linked."""
+        a, b = self.node(a), self.node(b)
+        current = self._links[a].get(b)
+        if current is None:
+            return False
+        self._set(a, b, current[0], float(strength))
+        return True
+
+    def relations(self, node: NodeRef) -> List[dict]:
+        """``listPeerRelations``: the node's ``peerLinks`` in the browser's shape."""
+        return [{'peerId': self.graph.ids[b], 'relation': 'aligned' if sign > 0 else 'antagonistic',
+                 'strength': strength} for b, (sign, strength) in self._links[self.node(node)].items()]
+
+    @property
+    def n_links(self) -> int:
+        """Number of related pairs."""
+        return sum(map(len, self._links)) // 2
+
+    # -- overlay ----------------------------------------------------------------
+
+    def matrix(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """S in CSR form ``(ptr, peer, strength)``; row v is ``ptr[v]:ptr[v + 1]``. Rebuilt after edits."""
+        if self._matrix is None:
+            counts = np.fromiter(map(len, self._links), dtype=np.int64, count=self.n)
+            ptr = np.zeros(self.n + 1, dtype=np.int64)
+            np.cumsum(counts, out=ptr[1:])
+            total = int(ptr[-1])
+            peer = np.fromiter((b for row in self._links for b in row), dtype=np.int64, count=total)
+            strength = np.fromiter((s * w for row in self._links for s, w in row.values()), dtype=np.float64,
+                                   count=total)
+            self._matrix = (ptr, peer, strength)
+        return self._matrix
+
+    def _entries(self, rows: np.ndarray):
+        """CSR entry indices of ``rows`` plus the per-row counts and offsets into them."""
+        ptr = self.matrix()[0]
+        starts, counts = ptr[rows], ptr[rows + 1] - ptr[rows]
+        offsets = np.cumsum(counts) - counts
+        entries = np.arange(int(counts.sum())) + np.repeat(starts - offsets, counts)
+        return entries, counts, offsets
+
+    def deltas(self, probs: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Clamped adjustment of ``rows`` (default: all nodes) for base probs (n,) or (B, n)."""
+        _, peer, strength = self.matrix()
+        p = np.atleast_2d(np.asarray(probs, dtype=np.float64))
+        rows = np.arange(self.n) if rows is None else np.asarray(rows, dtype=np.int64)
+        entries, counts, offsets = self._entries(rows)
+        diff = p[:, peer[entries]] - p[:, np.repeat(rows, counts)]            # p_j - p_i per link
+        contrib = np.where(np.isnan(diff), 0.0, strength[entries] * diff)
+        out = np.zeros((p.shape[0], len(rows)))
+        nonempty = np.flatnonzero(counts)
+        if len(nonempty):
+            out[:, nonempty] = np.add.reduceat(contrib, offsets[nonempty], axis=1)
+        out = np.clip(out, -PEER_MAX_ABS_DELTA, PEER_MAX_ABS_DELTA)
+        return out if np.ndim(probs) == 2 else out[0]
+
+    def apply(self, probs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Stateless overlay: ``(display, adjusted)`` for base probs (n,) or (B, n)."""
+        p = np.asarray(probs, dtype=np.float64)
+        with profiling.phase('overlay', nodes=self.n):
+            return _display(p, self.deltas(p))
+
+    def update(self, probs: np.ndarray) -> np.ndarray:
+        """Overlay for new base probs (n,), recomputing only moved / relinked nodes and their peers.
+
+        Returns a copy of ``display``; ``adjusted`` and ``delta`` are updated in place.
+        """
+        p = np.array(probs, dtype=np.float64)
+        if self._base is None:
+            rows = np.arange(self.n)
+        else:
+            moved = np.flatnonzero(~((p == self._base) | (np.isnan(p) & np.isnan(self._base))))
+            peer = self.matrix()[1]
+            rows = np.union1d(moved, peer[self._entries(moved)[0]])
+            if self._touched:
+                rows = np.union1d(rows, np.fromiter(self._touched, dtype=np.int64))
+        self._touched = set()
+        self._base = p
+        with profiling.phase('overlay', nodes=len(rows)):
+            delta = self.deltas(p, rows)
+            self.delta[rows] = delta
+            self.display[rows], self.adjusted[rows] = _display(p[rows], delta)
+        self.last_updates = len(rows)
+        return self.display.copy()
+
+
+def _display(base: np.ndarray, delta: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    adj = np.clip(base + delta, 0.0, 1.0)
+    adjusted = np.abs(adj - base) > PEER_DISPLAY_MIN                       # NaN base -> False
+    return np.where(adjusted, adj, base), adjusted
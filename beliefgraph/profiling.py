@@ -0,0 +1,195 @@
+"""
+Structured profiling of propagation runs: phase timers, convergence traces, per-node costs.
+
+``convergeNodes`` only instruments itself through ``window.DEBUG_COMPREHENSIVE``
+console dumps, and ``debugBayesCalculations`` only logs. While a ``Profiler`` is
+active, the engine records:
+
+- phases: ``load`` / ``compile`` / ``sort`` / ``propagate`` / ``overlay`` spans
+  with their arguments (mode, batch size, ...)
+- iterations: the max |delta| (lite sweeps) or residual (``solve_lite``) per
+  iteration
+- nodes: evaluation count and seconds per node, and seconds spent in
+  multi-parent CPT marginals (exact enumeration, the many-parent DP, or the
+  log-odds approximation), so a slow run can be traced to its high-fan-in
+  nodes. Single evaluations slower than ``PROFILE_SLOW_NODE_SECONDS`` are also
+  kept as trace spans.
+
+Without an active profiler each instrumented phase does one module attribute
+lookup and per-node loops do one ``is None`` test, so instrumentation costs
+nothing measurable. Work done in other processes (e.g. ``monte_carlo`` or the
+scoring service with ``workers`` > 0) is not recorded.
+
+    from beliefgraph.profiling import Profiler
+    with Profiler() as prof:
+        g = load_graph('graph.json')
+        propagate_heavy(g, exact_many_parents=True)
+    prof.hot_nodes(5)                         # [{'id', 'fanIn', 'evaluations', 'seconds', ...}]
+    prof.write_chrome_trace('trace.json')     # chrome://tracing or ui.perfetto.dev
+    prof.write_jsonl('trace.jsonl')
+
+From the command line, ``python3 -m beliefgraph graph.json --profile trace.json``
+(``.jsonl`` for JSON Lines) profiles a batch run and prints the hot nodes to stderr.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .config import PROFILE_SLOW_NODE_SECONDS
+
+ACTIVE: Optional['Profiler'] = None                   # the profiler the engine reports to, if any
+clock = time.perf_counter
+_OFF = contextlib.nullcontext()
+
+
+def phase(name: str, **args):
+    """Context manager timing ``name`` on the active profiler (a no-op without one)."""
+    return _OFF if ACTIVE is None else ACTIVE.phase(name, **args)
+
+
+class _NodeStats:
+    """Per-node counters for one compiled graph."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        n = graph.n_nodes
+        self.evaluations = np.zeros(n, dtype=np.int64)
+        self.seconds = np.zeros(n)
+        self.marginal_calls = np.zeros(n, dtype=np.int64)
+        self.marginal_seconds = np.zeros(n)
+
+
+class Profiler:
+    """Collects phases, iteration traces and node costs while active (``with Profiler() as prof``).
+
+    Args:
+        slow_node_seconds: node evaluations at least this long are kept as trace spans
+    """
+
+    def __init__(self, slow_node_seconds: float = PROFILE_SLOW_NODE_SECONDS):
+        self.slow_node_seconds = slow_node_seconds
+        self.events: List[dict] = []                  # Chrome trace events, timestamps in seconds
+        self._stats: Dict[int, _NodeStats] = {}
+        self._previous: Optional[Profiler] = None
+        self.origin = clock()
+
+    def __enter__(self) -> 'Profiler':
+        global ACTIVE
+        self._previous, ACTIVE = ACTIVE, self
+        return self
+
+    def __exit__(self, *exc):
+        global ACTIVE
+        ACTIVE = self._previous
+
+    # -- recording (called by the engine) --
+
+    @contextlib.contextmanager
+    def phase(self, name: str, **args):
+        start = clock()
+        try:
+            yield
+        finally:
+            self.span(name, start, **args)
+
+    def span(self, name: str, start: float, **args):
+        """Phase ``name`` ran from ``start`` (a ``clock()`` reading) until now."""
+        self._span(name, 'phase', start, clock() - start, args)
+
+    def _span(self, name: str, cat: str, start: float, dur: float, args: dict):
+        self.events.append({'ph': 'X', 'name': name, 'cat': cat, 'ts': start - self.origin, 'dur': dur,
+                            'tid': threading.get_ident(), 'args': args})
+
+    def iteration(self, name: str, iteration: int, value: float):
+        """One convergence sample (Chrome counter track ``name``)."""
+        self.events.append({'ph': 'C', 'name': name, 'cat': 'iteration', 'ts': clock() - self.origin,
+                            'tid': threading.get_ident(), 'args': {'iteration': iteration, 'value': value}})
+
+    def _node_stats(self, graph) -> _NodeStats:
+        stats = self._stats.get(id(graph))
+        if stats is None or stats.graph is not graph:
+            stats = self._stats[id(graph)] = _NodeStats(graph)
+        return stats
+
+    def node(self, graph, v: int, start: float):
+        """Node ``v`` was evaluated from ``start`` (a ``clock()`` reading) until now."""
+        dur = clock() - start
+        stats = self._node_stats(graph)
+        stats.evaluations[v] += 1
+        stats.seconds[v] += dur
+        if dur >= self.slow_node_seconds:
+            self._span(graph.ids[v], 'node', start, dur, {'fanIn': int(graph.parent_ptr[v + 1] - graph.parent_ptr[v])})
+
+    def marginal(self, graph, v: int, start: float):
+        """A multi-parent CPT marginal of node ``v`` ran from ``start`` until now."""
+        stats = self._node_stats(graph)
+        stats.marginal_calls[v] += 1
+        stats.marginal_seconds[v] += clock() - start
+
+    # -- reports --
+
+    def phases(self) -> Dict[str, float]:
+        """Total seconds per phase name."""
+        totals: Dict[str, float] = {}
+        for e in self.events:
+            if e['cat'] == 'phase':
+                totals[e['name']] = totals.get(e['name'], 0.0) + e['dur']
+        return totals
+
+    def node_rows(self) -> List[dict]:
+        """One row per evaluated node of every profiled graph."""
+        rows = []
+        for k, stats in enumerate(self._stats.values()):
+            g = stats.graph
+            fan_in = np.diff(g.parent_ptr)
+            for v in np.flatnonzero(stats.evaluations | stats.marginal_calls):
+                rows.append({'graph': k, 'id': g.ids[v], 'fanIn': int(fan_in[v]),
+                             'evaluations': int(stats.evaluations[v]), 'seconds': float(stats.seconds[v]),
+                             'marginalCalls': int(stats.marginal_calls[v]),
+                             'marginalSeconds': float(stats.marginal_seconds[v])})
+        return rows
+
+    def hot_nodes(self, k: Optional[int] = 10) -> List[dict]:
+        """The ``k`` nodes (None = all) with the most evaluation time; marginal time breaks ties."""
+        return sorted(self.node_rows(), key=lambda r: (-r['seconds'], -r['marginalSeconds']))[:k]
+
+    def chrome_trace(self) -> dict:
+        """Chrome trace-event JSON (microsecond timestamps); per-node totals go in ``otherData``."""
+        pid = os.getpid()
+        events = []
+        for e in self.events:
+            out = dict(e, pid=pid, ts=round(e['ts'] * 1e6, 3))
+            if 'dur' in e:
+                out['dur'] = round(e['dur'] * 1e6, 3)
+            if e['ph'] == 'C':
+                out['args'] = {'value': e['args']['value']}
+            events.append(out)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'nodes': self.hot_nodes(None)}}
+
+    def write_chrome_trace(self, path):
+        with Path(path).open('w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+
+    def records(self) -> List[dict]:
+        """JSON Lines records: phases, iterations and slow nodes in time order, then per-node totals."""
+        out = []
+        for e in sorted(self.events, key=lambda e: e['ts']):
+            if e['ph'] == 'C':
+                out.append({'type': 'iteration', 'name': e['name'], 'iteration': e['args']['iteration'],
+                            'value': e['args']['value'], 'time': e['ts']})
+            else:
+                out.append({'type': e['cat'], 'name': e['name'], 'start': e['ts'], 'seconds': e['dur'], **e['args']})
+        return out + [dict(type='nodeTotals', **row) for row in self.node_rows()]
+
+    def write_jsonl(self, path):
+        with Path(path).open('w', encoding='utf-8') as f:
+            for rec in self.records():
+                f.write(json.dumps(rec, ensure_ascii=False) + '\n')
+
@@ -0,0 +1,350 @@
+"""
+Reverse-mode sensitivities: dP(target) / d(every CPT entry, weight and fact probability).
+
+One forward propagation (``propagate_heavy`` or ``solve_lite``) gives every
+node's value. Each node in the target's ancestor cone then gets its local
+partials: with respect to the parent values it read and to its own incoming
+edge parameters. A single backward sweep in reverse topological order
+accumulates the adjoint dP(target)/dP(node). Every parameter gradient is then
+its edge's local partial times the adjoint of the edge's target. The cost is
+one forward pass plus work proportional to the cone, not one propagation per
+parameter.
+
+Local partials are analytic for the lite robust logit/saturation update, the
+high-weight bypass, AND / OR, and the heavy single-parent, exact (<= 8 parents)
+and log-odds (> 8 parents) rules. The opt-in exact many-parent marginal uses
+central differences of the kernel. Gradients are per unit of the stored
+parameter: CPT entries per percentage point, weights per unit weight. A clamped
+entry (outside [0.1%, 99.9%]) has zero gradient.
+
+Heavy mode reads a parent only if it was computed earlier in the sweep, or if
+it is a fact (seeded). Lite cycles iterate the backward sweep to its own fixed
+point, just as the forward solve does.
+
+    from beliefgraph import load_graph
+    from beliefgraph.sensitivity import sensitivities
+    sens = sensitivities(load_graph('graph.json'), 'verdict', mode='heavy')
+    print(sens.format_tornado(15))
+
+Usage:
+  python3 -m beliefgraph.sensitivity graph.json --target verdict [--mode heavy|lite] [--top 20] [--json]
+"""
+
+import argparse
+import json
+import math
+import sys
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from .config import (
+    AND, ASSERTION, CPT_CLAMP_MAX, CPT_CLAMP_MIN, EPSILON, FACT, HIGH_WEIGHT_BYPASS, MAX_EXACT_PARENTS, OR,
+    SATURATION_K, SENS_CPT_SWING, SENS_FACT_SWING, SENS_WEIGHT_SWING, SOLVER_MAX_ITERS, SOLVER_TOLERANCE,
+    WEIGHT_MIN,
+)
+from .graph import CompiledGraph, load_graph
+from .heavy import baseline_probs, clamp_cpt, many_parent_marginal, parent_state_combos, propagate_heavy
+from .solver import solve_lite
+
+MODES = ('heavy', 'lite')
+FD_STEP = 1e-5
+
+
+def _cpt_scale(values: np.ndarray) -> np.ndarray:
+    """d clamp_cpt(v) / dv per percentage point (0 where the clamp is active)."""
+    p = np.asarray(values, dtype=np.float64) / 100
+    return np.where((p > CPT_CLAMP_MIN) & (p < CPT_CLAMP_MAX), 0.01, 0.0)
+
+
+def _baseline_scale(values: np.ndarray) -> np.ndarray:
+    return np.where(np.asarray(values) == 0, 0.0, _cpt_scale(values))
+
+
+def exact_partials(p: np.ndarray, pt: np.ndarray, pf: np.ndarray, b: np.ndarray):
+    """Partials of ``exact_marginal`` for one node w.r.t. (parent probs, p_true, p_false, baseline), each (k,)."""
+    k = len(p)
+    combos = parent_state_combos(k)
+    p_terms = np.where(combos, p, 1 - p)
+    l_terms = np.where(combos, pt, pf)
+    norm = b[1:].prod()
+    p_combo = p_terms.prod(axis=1)
+    child_raw = l_terms.prod(axis=1) / norm
+    open_ = child_raw < 1                       # combos where min(L / N, 1) is not clipped
+    child = np.minimum(child_raw, 1)
+    zeros = np.zeros(k)
+    if not 0 <= (p_combo * child).sum() <= 1:
+        return zeros, zeros, zeros, zeros
+    d_p, d_pt, d_pf, d_b = zeros.copy(), zeros.copy(), zeros.copy(), zeros.copy()
+    for i in range(k):
+        others = np.arange(k) != i
+        s = combos[:, i]
+        d_p[i] = (np.where(s, 1.0, -1.0) * p_terms[:, others].prod(axis=1) * child).sum()
+        g = p_combo * open_ * l_terms[:, others].prod(axis=1) / norm
+        d_pt[i], d_pf[i] = g[s].sum(), g[~s].sum()
+    d_b[1:] = -(p_combo * open_ * child_raw).sum() / b[1:]
+    return d_p, d_pt, d_pf, d_b
+
+
+def log_odds_partials(p: np.ndarray, pt: np.ndarray, pf: np.ndarray):
+    """Partials of ``log_odds_marginal`` w.r.t. (parent probs, p_true, p_false)."""
+    g = pt * p + pf * (1 - p)
+    f = 1 / (1 + np.exp(-np.log(g / (1 - g)).sum()))
+    dg = f * (1 - f) / (g * (1 - g))
+    return dg * (pt - pf), dg * p, dg * (1 - p)
+
+
+def numeric_partials(p: np.ndarray, pt: np.ndarray, pf: np.ndarray, b: np.ndarray, step: float = FD_STEP):
+    """Central-difference partials of ``many_parent_marginal`` (all perturbations in one batch)."""
+    k = len(p)
+    base = np.stack([p, pt, pf, b])                               # (4, k)
+    rows = np.repeat(base[None], 8 * k, axis=0)                   # (8k, 4, k)
+    which = np.repeat(np.arange(4 * k), 2)
+    rows[np.arange(8 * k), which // k, which % k] += np.tile([step, -step], 4 * k)
+    rows[:, 0] = np.clip(rows[:, 0], 0, 1)
+    rows[:, 1:] = np.clip(rows[:, 1:], CPT_CLAMP_MIN, CPT_CLAMP_MAX)
+    vals = many_parent_marginal(rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3])
+    span = (rows[0::2] - rows[1::2])[np.arange(4 * k), which[0::2] // k, which[0::2] % k]
+    grads = np.where(span > 0, (vals[0::2] - vals[1::2]) / np.where(span > 0, span, 1), 0.0)
+    return tuple(grads.reshape(4, k))
+
+
+@dataclass
+class Sensitivities:
+    """Gradients of P(target) at the current parameters.
+
+    Edge arrays are (E,) in graph edge order, node arrays (n,); entries outside
+    the target's ancestor cone (or unused by the mode) are 0.
+    """
+    graph: CompiledGraph
+    target: str
+    mode: str
+    value: float
+    probs: np.ndarray
+    adjoint: np.ndarray              # dP(target) / dP(node)
+    d_weight: np.ndarray             # per unit weight (lite)
+    d_cond_true: np.ndarray          # per percentage point (heavy)
+    d_cond_false: np.ndarray
+    d_baseline: np.ndarray
+    d_fact_prob: np.ndarray
+
+    def _edge_label(self, e: int) -> str:
+        g = self.graph
+        return g.edge_ids[e] or f"{g.ids[g.edge_source[e]]}->{g.ids[g.edge_target[e]]}"
+
+    def tornado(self, top: Optional[int] = 20) -> List[dict]:
+        """Parameters ranked by the linearized swing of P(target).
+
+        Each parameter moves by its configured swing (CPT entries
+        +-``SENS_CPT_SWING`` points, weights +-``SENS_WEIGHT_SWING``, facts
+        +-``SENS_FACT_SWING``) inside its valid range; ``low``/``high`` are
+        value + gradient * move.
+        """
+        g = self.graph
+        rows = []
+        specs = [
+            ('condTrue', self.d_cond_true, g.cond_true, SENS_CPT_SWING, 0.0, 100.0),
+            ('condFalse', self.d_cond_false, g.cond_false, SENS_CPT_SWING, 0.0, 100.0),
+            ('baseline', self.d_baseline, g.baseline, SENS_CPT_SWING, 0.0, 100.0),
+            ('weight', self.d_weight, g.weight, SENS_WEIGHT_SWING, WEIGHT_MIN, 1.0),
+        ]
+        for kind, grad, current, swing, lo, hi in specs:
+            for e in np.flatnonzero(grad):
+                rows.append(self._row(kind, self._edge_label(e), current[e], grad[e], swing, lo, hi))
+        for v in np.flatnonzero(self.d_fact_prob):
+            rows.append(self._row('factProb', g.ids[v], g.fact_prob[v], self.d_fact_prob[v], SENS_FACT_SWING, 0.0, 1.0))
+        rows.sort(key=lambda r: -r['swing'])
+        return rows if top is None else rows[:top]
+
+    def _row(self, kind, element, current, grad, swing, lo, hi) -> dict:
+        down, up = max(lo, current - swing) - current, min(hi, current + swing) - current
+        ends = (self.value + grad * down, self.value + grad * up)
+        return {'parameter': kind, 'element': element, 'value': float(current), 'gradient': float(grad),
+                'low': float(min(ends)), 'high': float(max(ends)), 'swing': float(abs(ends[1] - ends[0]))}
+
+    def format_tornado(self, top: int = 20) -> str:
+        lines = [f"P({self.target}) = {self.value:.4f}  [{self.mode}]",
+                 f"{'parameter':10s} {'element':40s} {'value':>8s} {'gradient':>10s} {'low':>7s} {'high':>7s}"]
+        for r in self.tornado(top):
+            lines.append(f"{r['parameter']:10s} {r['element'][:40]:40s} {r['value']:8.3f} {r['gradient']:10.2e} "
+                         f"{r['low']:7.4f} {r['high']:7.4f}")
+        return '\n'.join(lines)
+
+
+def _ancestor_cone(graph: CompiledGraph, t: int) -> np.ndarray:
+    seen = np.zeros(graph.n_nodes, dtype=bool)
+    seen[t] = True
+    stack = [t]
+    while stack:
+        for e in graph.parents(stack.pop()):
+            u = int(graph.edge_source[e])
+            if not seen[u]:
+                seen[u] = True
+                stack.append(u)
+    return seen
+
+
+def _heavy_locals(graph: CompiledGraph, probs: np.ndarray, cone: np.ndarray, rank: np.ndarray,
+                  exact_many_parents: bool):
+    """Per-edge partials of the target node of each edge, heavy rules."""
+    E = graph.n_edges
+    d_read = np.zeros(E)                 # d node / d (value read through the edge)
+    d_ct, d_cf, d_bl = np.zeros(E), np.zeros(E), np.zeros(E)
+    seed_read = np.zeros(E, dtype=bool)  # parent read before it was computed (its fact seed)
+    d_own = np.zeros(graph.n_nodes)      # d node / d fact_prob[node]
+    has_cpt = graph.has_cpt()
+    facts = graph.node_type == FACT
+    for v in np.flatnonzero(cone):
+        t, pe = graph.node_type[v], graph.parents(v)
+        if len(pe) == 0:
+            if t == FACT and 0 <= graph.fact_prob[v] <= 1:
+                d_own[v] = 1.0
+            continue
+        src = graph.edge_source[pe]
+        before = rank[src] < rank[v]
+        read = np.where(before, probs[src], np.where(facts[src], graph.fact_prob[src], np.nan))
+        seed_read[pe] = ~before & facts[src]
+        if t == AND or t == OR:
+            valid = ~np.isnan(read)
+            ev, q = pe[valid], np.where(graph.inverse[pe[valid]], 1 - read[valid], read[valid])
+            sign = np.where(graph.inverse[ev], -1.0, 1.0)
+            terms = q if t == AND else 1 - q
+            for j, e in enumerate(ev):
+                d_read[e] = sign[j] * np.delete(terms, j).prod()
+        elif t == ASSERTION:
+            valid = has_cpt[pe] & ~np.isnan(read)
+            ev, r = pe[valid], read[valid]
+            if not len(ev):
+                continue
+            ct, cf, bl = graph.cond_true[ev], graph.cond_false[ev], graph.baseline[ev]
+            pt, pf, b = clamp_cpt(ct), clamp_cpt(cf), baseline_probs(bl)
+            k = len(ev)
+            if k == 1:
+                raw = pt[0] * r[0] + pf[0] * (1 - r[0])
+                inside = float(0 <= raw <= 1)
+                dp, dpt, dpf, db = (pt - pf) * inside, r * inside, (1 - r) * inside, np.zeros(1)
+            elif k <= MAX_EXACT_PARENTS:
+                dp, dpt, dpf, db = exact_partials(r, pt, pf, b)
+            elif exact_many_parents:
+                dp, dpt, dpf, db = numeric_partials(r, pt, pf, b)
+            else:
+                (dp, dpt, dpf), db = log_odds_partials(r, pt, pf), np.zeros(k)
+            d_read[ev] = dp
+            d_ct[ev], d_cf[ev], d_bl[ev] = dpt * _cpt_scale(ct), dpf * _cpt_scale(cf), db * _baseline_scale(bl)
+    return d_read, d_ct, d_cf, d_bl, seed_read, d_own
+
+
+def _lite_locals(graph: CompiledGraph, probs: np.ndarray, cone: np.ndarray):
+    """Per-edge partials of the target node of each edge, lite rules at the fixed point."""
+    E = graph.n_edges
+    d_read, d_w = np.zeros(E), np.zeros(E)
+    d_own = np.where(graph.node_type == FACT, 1.0, 0.0)
+    facts = graph.node_type == FACT
+    for v in np.flatnonzero(cone):
+        t, pe = graph.node_type[v], graph.parents(v)
+        if t == FACT or len(pe) == 0 or np.isnan(probs[v]):
+            continue
+        src = graph.edge_source[pe]
+        read = np.where(facts[src], graph.fact_prob[src], probs[src])
+        if t == AND or t == OR:
+            flip = graph.inverse[pe] | graph.opposes[pe]
+            q = np.where(flip, 1 - read, read)
+            terms = q if t == AND else 1 - q
+            for j, e in enumerate(pe):
+                d_read[e] = (-1.0 if flip[j] else 1.0) * np.delete(terms, j).prod()
+            continue
+        w = graph.weight[pe]
+        valid = ~np.isnan(probs[src]) & ~graph.inert[src] & ~np.isnan(w) & (w != 0)
+        ev, r, w = pe[valid], read[valid], w[valid]
+        sign = np.where(graph.opposes[ev], -1.0, 1.0)
+        if len(ev) == 1 and abs(w[0]) >= HIGH_WEIGHT_BYPASS:
+            d_read[ev] = sign                          # copies (or inverts) the parent
+            continue
+        clipped = np.clip(r, EPSILON, 1 - EPSILON)
+        odds = np.log(clipped / (1 - clipped))        # prior odds are 0 (base 0.5)
+        d_odds = np.where((r > EPSILON) & (r < 1 - EPSILON), 1 / (r * (1 - r)), 0.0)
+        decay = np.exp(-SATURATION_K * np.abs(w))
+        slope = probs[v] * (1 - probs[v])
+        d_read[ev] = slope * (1 - decay) * sign * w * d_odds
+        d_w[ev] = slope * sign * ((1 - decay) + SATURATION_K * np.abs(w) * decay) * odds
+    return d_read, d_w, d_own
+
+
+def sensitivities(graph: CompiledGraph, target: str, mode: str = 'heavy',
+                  exact_many_parents: bool = False) -> Sensitivities:
+    """Gradient of P(target) with respect to every edge parameter and fact probability."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}' (expected one of {', '.join(MODES)})")
+    t = graph.index[target]
+    E, n = graph.n_edges, graph.n_nodes
+    cone = _ancestor_cone(graph, t)
+    rank = np.empty(n, dtype=np.int64)
+    rank[graph.order] = np.arange(n)
+    zeros = np.zeros(E)
+    if mode == 'heavy':
+        probs = propagate_heavy(graph, exact_many_parents=exact_many_parents)
+        d_read, d_ct, d_cf, d_bl, seed_read, d_own = _heavy_locals(graph, probs, cone, rank, exact_many_parents)
+        d_wl = zeros
+    else:
+        probs = solve_lite(graph).probs
+        d_read, d_wl, d_own = _lite_locals(graph, probs, cone)
+        d_ct = d_cf = d_bl = zeros
+        seed_read = np.zeros(E, dtype=bool)
+
+    adjoint = np.zeros(n)
+    if not np.isnan(probs[t]):
+        adjoint = _backward(graph, t, cone, d_read, seed_read, iterate=mode == 'lite')
+    tgt = graph.edge_target
+    d_fact = adjoint * d_own
+    np.add.at(d_fact, graph.edge_source[seed_read], (adjoint[tgt] * d_read)[seed_read])
+    return Sensitivities(graph=graph, target=target, mode=mode, value=float(probs[t]), probs=probs,
+                         adjoint=adjoint, d_weight=adjoint[tgt] * d_wl, d_cond_true=adjoint[tgt] * d_ct,
+                         d_cond_false=adjoint[tgt] * d_cf, d_baseline=adjoint[tgt] * d_bl,
+                         d_fact_prob=d_fact)
+
+
+def _backward(graph: CompiledGraph, t: int, cone: np.ndarray, d_read: np.ndarray, seed_read: np.ndarray,
+              iterate: bool) -> np.ndarray:
+    """Adjoint a[u] = [u == t] + sum over edges u -> v of d_read[e] * a[v], children first."""
+    adjoint = np.zeros(graph.n_nodes)
+    adjoint[t] = 1.0
+    nodes = [int(v) for v in graph.order[::-1] if cone[v]]
+    live = d_read * ~seed_read
+    for _ in range(SOLVER_MAX_ITERS if iterate else 1):
+        delta = 0.0
+        for u in nodes:
+            ce = graph.children(u)
+            new = float(u == t) + float((live[ce] * adjoint[graph.edge_target[ce]]).sum())
+            delta = max(delta, abs(new - adjoint[u]))
+            adjoint[u] = new
+        if delta < SOLVER_TOLERANCE:
+            break
+    return adjoint
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m beliefgraph.sensitivity',
+                                     description='Rank the parameters that move a target node most.')
+    parser.add_argument('file', help='minimal-format (or full Cytoscape) JSON file')
+    parser.add_argument('--target', required=True, help='node id')
+    parser.add_argument('--mode', choices=MODES, default='heavy')
+    parser.add_argument('--exact-many-parents', action='store_true')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='print the tornado rows as JSON')
+    args = parser.parse_args(argv)
+    graph = load_graph(args.file)
+    if args.target not in graph.index:
+        parser.error(f"unknown node id '{args.target}'")
+    sens = sensitivities(graph, args.target, args.mode, args.exact_many_parents)
+    if args.json:
+        value = None if math.isnan(sens.value) else sens.value
+        print(json.dumps({'target': args.target, 'mode': args.mode, 'value': value,
+                          'tornado': sens.tornado(args.top)}, ensure_ascii=False))
+    else:
+        print(sens.format_tornado(args.top))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,457 @@
+"""
+Local batch scoring service: compiled graphs cached by content hash, coalesced heavy-mode batches.
+
+Each uploaded graph is parsed and compiled once, and written as a binary graph
+file (``beliefgraph.binary``) under the content hash of the uploaded bytes.
+Scoring processes memory-map that file into their own ``GraphCache``. The
+cache is an LRU of compiled graphs, evicted by a byte budget, so the parse and
+topological sort that ``propagateBayesHeavy`` repeats on every call happen
+once per graph.
+
+A scenario is ``{"facts": {id: p}, "do": {id: p}}``: fact probability
+overrides plus ``do()`` interventions. Scoring requests for the same graph
+that arrive within ``SERVICE_COALESCE_SECONDS`` of each other are merged into
+one (B, n) ``propagate_interventions`` call, which runs in a process pool
+(``workers`` > 0) or a thread (``workers`` = 0).
+
+Endpoints (JSON bodies):
+  POST /graphs                  graph document (minimal, graph wrapper or elements)
+                                -> {"graph": key, "nodes": n, "edges": m, "cached": bool}
+  GET  /graphs/<key>            -> {"graph": key, "nodes": n, "edges": m}
+  POST /graphs/<key>/score      {"scenarios": [scenario, ...], "nodes": [id, ...] (optional)}
+                                -> {"results": [{id: prob | null}, ...]}
+  GET  /stats                   cache and batching counters
+
+A graph evicted from the cache answers 404; upload it again.
+
+Usage:
+  python3 -m beliefgraph.service [--host 127.0.0.1] [--port 8765] [--workers N] [--cache-mb 512]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import multiprocessing
+import shutil
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .binary import load_binary, write_binary
+from .causal import propagate_interventions
+from .config import (
+    FACT, INTERVENTION_ROW_CHUNK, SERVICE_CACHE_BYTES, SERVICE_COALESCE_SECONDS, SERVICE_HOST,
+    SERVICE_MAX_BODY, SERVICE_PORT,
+)
+from .graph import CompiledGraph
+
+Request = Tuple[list, Optional[List[str]]]          # (scenarios, output node ids)
+
+
+def graph_key(raw: bytes) -> str:
+    """Content hash of an uploaded graph document."""
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def graph_nbytes(graph: CompiledGraph) -> int:
+    """Approximate resident size of a compiled graph: its arrays plus ~64 bytes per node id."""
+    return sum(v.nbytes for v in vars(graph).values() if isinstance(v, np.ndarray)) + 64 * graph.n_nodes
+
+
+class GraphCache:
+    """LRU map key -> value, evicting least recently used entries once their total size exceeds ``budget``.
+
+    The newest entry is always kept, even if it alone exceeds the budget.
+    """
+
+    def __init__(self, budget: int = SERVICE_CACHE_BYTES):
+        self.budget = budget
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self._items: 'OrderedDict[str, Tuple[object, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._items
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: str, value, nbytes: int) -> List[str]:
+        """Insert ``value``; returns the keys evicted to make room."""
+        with self._lock:
+            if key in self._items:
+                self.nbytes -= self._items.pop(key)[1]
+            self._items[key] = (value, nbytes)
+            self.nbytes += nbytes
+            evicted = []
+            while self.nbytes > self.budget and len(self._items) > 1:
+                old, (_, size) = self._items.popitem(last=False)
+                self.nbytes -= size
+                evicted.append(old)
+            self.evictions += len(evicted)
+            return evicted
+
+    def stats(self) -> dict:
+        return {'entries': len(self), 'bytes': self.nbytes, 'budget': self.budget,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+# -- scoring --------------------------------------------------------------------
+
+def _node_values(graph: CompiledGraph, values, where: str) -> Tuple[List[int], List[float]]:
+    if not isinstance(values, dict):
+        raise ValueError(f"{where} must be an object of node id -> probability")
+    nodes, probs = [], []
+    for nid, p in values.items():
+        v = graph.index.get(nid)
+        if v is None:
+            raise KeyError(f"{where}: unknown node id {nid!r}")
+        if isinstance(p, bool) or not isinstance(p, (int, float)) or math.isnan(p):
+            raise ValueError(f"{where}.{nid} must be a number")
+        nodes.append(v)
+        probs.append(float(p))
+    return nodes, probs
+
+
+def scenario_arrays(graph: CompiledGraph, scenarios: Sequence[dict]):
+    """(fact_probs (B, n), do nodes (B, m), do values (B, m)) for ``propagate_interventions``."""
+    fact_probs = np.tile(graph.fact_prob, (len(scenarios), 1))
+    interventions = []
+    for r, scenario in enumerate(scenarios):
+        if not isinstance(scenario, dict):
+            raise ValueError(f"scenarios[{r}] must be an object")
+        unknown = set(scenario) - {'facts', 'do'}
+        if unknown:
+            raise ValueError(f"scenarios[{r}]: unknown field '{sorted(unknown)[0]}'")
+        nodes, probs = _node_values(graph, scenario.get('facts', {}), f"scenarios[{r}].facts")
+        for v in nodes:
+            if graph.node_type[v] != FACT:
+                raise ValueError(f"scenarios[{r}].facts: '{graph.ids[v]}' is not a fact (use do)")
+        fact_probs[r, nodes] = np.clip(probs, 0, 1)
+        interventions.append(_node_values(graph, scenario.get('do', {}), f"scenarios[{r}].do"))
+    width = max([len(nodes) for nodes, _ in interventions] + [1])
+    do_nodes = np.full((len(scenarios), width), -1, dtype=np.int64)
+    do_values = np.zeros((len(scenarios), width))
+    for r, (nodes, probs) in enumerate(interventions):
+        do_nodes[r, :len(nodes)] = nodes
+        do_values[r, :len(probs)] = probs
+    return fact_probs, do_nodes, do_values
+
+
+def propagate_scenarios(graph: CompiledGraph, fact_probs: np.ndarray, do_nodes: np.ndarray,
+                        do_values: np.ndarray, exact_many_parents: bool = False,
+                        row_chunk: int = INTERVENTION_ROW_CHUNK) -> np.ndarray:
+    """``propagate_interventions`` over ``scenario_arrays`` output, ``row_chunk`` rows per pass."""
+    out = np.empty(fact_probs.shape)
+    for start in range(0, len(out), row_chunk):
+        rows = slice(start, start + row_chunk)
+        out[rows] = propagate_interventions(graph, do_nodes[rows], do_values[rows], fact_probs[rows],
+                                            exact_many_parents)
+    return out
+
+
+def score_scenarios(graph: CompiledGraph, scenarios: Sequence[dict], **kwargs) -> np.ndarray:
+    """(B, n) heavy-mode probabilities, one row per scenario (NaN = no probability)."""
+    return propagate_scenarios(graph, *scenario_arrays(graph, scenarios), **kwargs)
+
+
+def _output_columns(graph: CompiledGraph, outputs: Optional[List[str]]) -> Tuple[List[str], Optional[list]]:
+    if outputs is None:
+        return list(graph.ids), None
+    return list(outputs), _node_values(graph, {nid: 0.0 for nid in outputs}, 'nodes')[0]
+
+
+def _results(probs: np.ndarray, ids: List[str], cols: Optional[list]) -> List[dict]:
+    rows = probs if cols is None else probs[:, cols]
+    return [{nid: (None if math.isnan(p) else round(p, 6)) for nid, p in zip(ids, row)} for row in rows.tolist()]
+
+
+# -- process-side jobs (module level so a process pool can pickle them) --
+
+_CACHE = GraphCache()
+
+
+def _init_worker(budget: int):
+    _CACHE.budget = budget
+
+
+def _cached_graph(key: str, path: str) -> CompiledGraph:
+    graph = _CACHE.get(key)
+    if graph is None:
+        graph = load_binary(path)
+        _CACHE.put(key, graph, graph_nbytes(graph))
+    return graph
+
+
+def _compile_job(key: str, raw: bytes, path: str) -> Tuple[int, int, int]:
+    """Parse + compile an upload into ``path``; returns (nodes, edges, compiled bytes)."""
+    write_binary(json.loads(raw.decode('utf-8')), path)
+    graph = _cached_graph(key, path)
+    return graph.n_nodes, graph.n_edges, graph_nbytes(graph)
+
+
+def _score_job(key: str, path: str, requests: List[Request]) -> List[Tuple[bool, object]]:
+    """Score several requests in one propagation; per request (True, results) or (False, error message)."""
+    graph = _cached_graph(key, path)
+    prepared = []
+    for scenarios, outputs in requests:
+        try:
+            prepared.append((_output_columns(graph, outputs), scenario_arrays(graph, scenarios)))
+        except (KeyError, ValueError) as e:
+            prepared.append(str(e.args[0]) if e.args else str(e))
+    good = [p[1] for p in prepared if not isinstance(p, str)]
+    if good:
+        width = max(a[1].shape[1] for a in good)
+        probs = propagate_scenarios(
+            graph, np.concatenate([a[0] for a in good]),
+            np.concatenate([np.pad(a[1], ((0, 0), (0, width - a[1].shape[1])), constant_values=-1) for a in good]),
+            np.concatenate([np.pad(a[2], ((0, 0), (0, width - a[2].shape[1]))) for a in good]))
+    out, row = [], 0
+    for p in prepared:
+        if isinstance(p, str):
+            out.append((False, p))
+            continue
+        (ids, cols), arrays = p
+        b = len(arrays[0])
+        out.append((True, _results(probs[row:row + b], ids, cols)))
+        row += b
+    return out
+
+
+# -- service --------------------------------------------------------------------
+
+class GraphNotFound(KeyError):
+    pass
+
+
+class ScoringService:
+    """Graph registry, request coalescing and the HTTP front end.
+
+    Args:
+        workers: process pool size; 0 scores in a thread of this process
+        cache_bytes: compiled-graph budget for the registry and for each process cache
+        coalesce: seconds to wait for more requests on the same graph before propagating
+        cache_dir: where binary graph files are kept (default: a temporary directory)
+    """
+
+    def __init__(self, workers: int = 0, cache_bytes: int = SERVICE_CACHE_BYTES,
+                 coalesce: float = SERVICE_COALESCE_SECONDS, cache_dir=None, max_body: int = SERVICE_MAX_BODY):
+        self.coalesce = coalesce
+        self.max_body = max_body
+        self._own_dir = cache_dir is None
+        self.cache_dir = Path(tempfile.mkdtemp(prefix='beliefgraph-service-') if cache_dir is None else cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.graphs = GraphCache(cache_bytes)                      # key -> {'nodes', 'edges'}
+        if workers > 0:
+            # spawn, not fork: forked workers would inherit (and hold open) client sockets
+            self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_init_worker, initargs=(cache_bytes,))
+        else:
+            self._pool = None
+            _init_worker(cache_bytes)
+        self._compiling: Dict[str, asyncio.Future] = {}
+        self._pending: Dict[str, List[Tuple[Request, asyncio.Future]]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.requests = self.batches = self.rows = 0
+
+    def _path(self, key: str) -> str:
+        return str(self.cache_dir / f"{key}.bgraph")
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    # -- graphs --
+
+    async def add_graph(self, raw: bytes) -> dict:
+        """Register an uploaded document (compiled once per distinct content)."""
+        key = graph_key(raw)
+        info = self.graphs.get(key)
+        cached = info is not None
+        if not cached:
+            job = self._compiling.get(key)
+            if job is None:                                        # first upload of these bytes
+                job = self._compiling[key] = asyncio.ensure_future(self._compile(key, raw))
+                job.add_done_callback(lambda _: self._compiling.pop(key, None))
+            info = await asyncio.shield(job)
+        return {'graph': key, **info, 'cached': cached}
+
+    async def _compile(self, key: str, raw: bytes) -> dict:
+        n, m, nbytes = await self._run(_compile_job, key, raw, self._path(key))
+        info = {'nodes': n, 'edges': m}
+        for old in self.graphs.put(key, info, nbytes):
+            Path(self._path(old)).unlink(missing_ok=True)
+        return info
+
+    def graph_info(self, key: str) -> dict:
+        info = self.graphs.get(key)
+        if info is None:
+            raise GraphNotFound(key)
+        return {'graph': key, **info}
+
+    # -- scoring --
+
+    async def score(self, key: str, scenarios: list, nodes: Optional[List[str]] = None) -> List[dict]:
+        """Probabilities per scenario, coalesced with other requests on the same graph."""
+        self.graph_info(key)
+        if not isinstance(scenarios, list):
+            raise ValueError("scenarios must be a list")
+        if nodes is not None and not (isinstance(nodes, list) and all(isinstance(i, str) for i in nodes)):
+            raise ValueError("nodes must be a list of node ids")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append(((scenarios, nodes), future))
+        if len(batch) == 1:
+            loop.call_later(self.coalesce, lambda: asyncio.ensure_future(self._flush(key)))
+        self.requests += 1
+        return await future
+
+    async def _flush(self, key: str):
+        batch = self._pending.pop(key, [])
+        if not batch:
+            return
+        self.batches += 1
+        self.rows += sum(len(scenarios) for (scenarios, _), _ in batch)
+        try:
+            results = await self._run(_score_job, key, self._path(key), [req for req, _ in batch])
+        except FileNotFoundError:
+            results = [(False, GraphNotFound(key))] * len(batch)
+        except Exception as e:                                    # pool failure: fail every waiter
+            results = [(False, e)] * len(batch)
+        for (ok, value), (_, future) in zip(results, batch):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value if isinstance(value, Exception) else ValueError(value))
+
+    def stats(self) -> dict:
+        return {'graphs': self.graphs.stats(), 'requests': self.requests, 'batches': self.batches,
+                'rows': self.rows, 'workers': self._pool._max_workers if self._pool else 0}
+
+    # -- HTTP --
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, dict]:
+        parts = [p for p in path.split('/') if p]
+        try:
+            if parts == ['stats'] and method == 'GET':
+                return 200, self.stats()
+            if parts == ['graphs'] and method == 'POST':
+                return 200, await self.add_graph(body)
+            if len(parts) == 2 and parts[0] == 'graphs' and method == 'GET':
+                return 200, self.graph_info(parts[1])
+            if len(parts) == 3 and parts[0] == 'graphs' and parts[2] == 'score' and method == 'POST':
+                req = json.loads(body.decode('utf-8'))
+                if not isinstance(req, dict):
+                    raise ValueError("request body must be an object")
+                return 200, {'results': await self.score(parts[1], req.get('scenarios', []), req.get('nodes'))}
+            return 404, {'error': f"no route for {method} {path}"}
+        except GraphNotFound as e:
+            return 404, {'error': f"unknown graph '{e.args[0]}' (upload it to /graphs)"}
+        except json.JSONDecodeError as e:
+            return 400, {'error': f"invalid JSON: {e}"}
+        except (KeyError, ValueError, TypeError) as e:
+            return 400, {'error': str(e.args[0]) if e.args else str(e)}
+        except Exception as e:                                    # e.g. a broken process pool
+            return 500, {'error': f"{type(e).__name__}: {e}"}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                method, target, version = line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = h.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                keep = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                if length > self.max_body:
+                    status, payload, keep = 413, {'error': f"body larger than {self.max_body} bytes"}, False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload = await self.dispatch(method, target.split('?', 1)[0], body)
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                writer.write(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep else 'close'}\r\n\r\n".encode('latin-1') + data)
+                await writer.drain()
+                if not keep:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass                                                  # malformed request or client went away
+        finally:
+            writer.close()
+
+    async def start(self, host: str = SERVICE_HOST, port: int = SERVICE_PORT) -> Tuple[str, int]:
+        """Start listening; returns the bound (host, port) (``port=0`` picks a free one)."""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._own_dir:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+async def serve(host: str = SERVICE_HOST, port: int = SERVICE_PORT, **kwargs):
+    service = ScoringService(**kwargs)
+    host, port = await service.start(host, port)
+    print(f"beliefgraph scoring service on http://{host}:{port}", file=sys.stderr)
+    try:
+        await service._server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m beliefgraph.service',
+                                     description='Local HTTP service for batched heavy-mode scoring.')
+    parser.add_argument('--host', default=SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    parser.add_argument('--workers', type=int, default=0, help='process pool size (0 = score in a thread)')
+    parser.add_argument('--cache-mb', type=float, default=SERVICE_CACHE_BYTES / 2**20)
+    parser.add_argument('--cache-dir', default=None, help='directory for compiled graph files')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, workers=args.workers, cache_bytes=int(args.cache_mb * 2**20),
+                          cache_dir=args.cache_dir))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
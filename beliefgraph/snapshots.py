@@ -0,0 +1,417 @@
+"""
+Versioned snapshot store: keyframes plus structural diffs, content-addressed.
+
+``createSnapshot`` (logic.js) stringifies the whole graph on every autosave
+tick, and ``smartAutosave`` keeps up to 22 full copies. A ``SnapshotStore``
+saves a graph document (Cytoscape ``cy.elements().jsons()`` or minimal format)
+as one of two kinds of record:
+
+- a keyframe: the ordered list of (element key, content hash)
+- a delta against the latest keyframe: added elements, removed keys, and
+  changed elements as attribute patches (set / delete at a nested path)
+
+Elements, patches and keyframe manifests are stored once per distinct
+content, keyed by a 128-bit BLAKE2b hash. An element nobody edits is stored
+once for the whole history, and a patch repeated in consecutive deltas is
+stored once. History therefore grows with the amount of editing, not with
+graph size times snapshot count. A new keyframe starts every
+``SNAPSHOT_KEYFRAME_INTERVAL`` snapshots, or once a diff touches
+``SNAPSHOT_KEYFRAME_RATIO`` of the keyframe's elements.
+
+``restore`` rebuilds a delta from the cached keyframe: only the delta's own
+entries are read and patched. The other elements are decoded from the
+keyframe cache.
+
+On disk a store is a directory with two append-only files:
+
+- ``objects.pack``: records of (16-byte hash, u32 length, zlib-compressed JSON)
+- ``snapshots.jsonl``: one JSON record per snapshot
+
+``compact`` rewrites both files to keep only chosen snapshots (e.g. the
+autosave tiers from ``autosave_retention``).
+
+    from beliefgraph.snapshots import SnapshotStore
+    store = SnapshotStore('autosave.snapshots')
+    sid = store.save(cy_elements)              # each autosave tick
+    doc = store.restore(sid)
+    store.compact(store.autosave_retention())
+"""
+
+import hashlib
+import json
+import os
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .config import AUTOSAVE_TIERS, SNAPSHOT_KEYFRAME_INTERVAL, SNAPSHOT_KEYFRAME_RATIO
+
+PACK, LOG = 'objects.pack', 'snapshots.jsonl'
+HASH_BYTES = 16
+_HEADER = HASH_BYTES + 4
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+Entries = List[Tuple[str, str]]                    # (element key, content hash)
+
+
+@dataclass
+class Snapshot:
+    id: int
+    timestamp: float
+    keyframe: bool
+    base: int                                       # keyframe id (itself for keyframes)
+    changes: int                                    # diff entries (element count for keyframes)
+
+
+# -- document <-> keyed elements ------------------------------------------------
+
+def split_document(doc) -> Tuple[dict, Dict[str, object], List[str]]:
+    """(shape, elements by key, key order) for an elements list or a minimal document.
+
+    Keys are ``n:<id>`` / ``e:<id>`` (edges without an id: ``e:<source>><target>``),
+    ``m:<field>`` for top-level minimal fields; repeats get ``#k`` suffixes.
+    """
+    elements: Dict[str, object] = {}
+    order: List[str] = []
+
+    def put(key: str, value):
+        k, dup = key, 0
+        while k in elements:
+            dup += 1
+            k = f"{key}#{dup}"
+        elements[k] = value
+        order.append(k)
+
+    if isinstance(doc, list):
+        for el in doc:
+            d = el.get('data') if isinstance(el, dict) and isinstance(el.get('data'), dict) else {}
+            edge = el.get('group') == 'edges' if isinstance(el, dict) and 'group' in el else bool(d.get('source'))
+            put(('e:' if edge else 'n:') + str(d.get('id', '')), el)
+        return {'kind': 'elements'}, elements, order
+    if not isinstance(doc, dict):
+        raise ValueError('Snapshot must be an elements list or a minimal-format object')
+    for field, value in doc.items():
+        if field == 'nodes' and isinstance(value, list):
+            for nd in value:
+                put('n:' + str(nd.get('id', '') if isinstance(nd, dict) else ''), nd)
+        elif field == 'edges' and isinstance(value, list):
+            for e in value:
+                e_ = e if isinstance(e, dict) else {}
+                put('e:' + str(e_['id'] if 'id' in e_ else f"{e_.get('source')}>{e_.get('target')}"), e)
+        else:
+            put('m:' + field, value)
+    return {'kind': 'minimal', 'fields': list(doc)}, elements, order
+
+
+def join_document(shape: dict, elements: Dict[str, object], order: List[str]):
+    if shape['kind'] == 'elements':
+        return [elements[k] for k in order]
+    doc = {}
+    for field in shape['fields']:
+        if field in ('nodes', 'edges') and 'm:' + field not in elements:
+            prefix = field[0] + ':'
+            doc[field] = [elements[k] for k in order if k.startswith(prefix)]
+        else:
+            doc[field] = elements['m:' + field]
+    return doc
+
+
+def merge_order(base_order: List[str], gone: Set[str], added: List[str]) -> List[str]:
+    """Default key order of a delta: the keyframe's survivors, each added key after the last of its kind."""
+    order = [k for k in base_order if k not in gone]
+    groups: Dict[str, List[str]] = {}
+    for k in added:
+        groups.setdefault(k[:2], []).append(k)
+    if not groups:
+        return order
+    last = {k[:2]: i for i, k in enumerate(order)}
+    out = []
+    for i, k in enumerate(order):
+        out.append(k)
+        if last[k[:2]] == i and k[:2] in groups:
+            out += groups.pop(k[:2])
+    for keys in groups.values():
+        out += keys
+    return out
+
+
+# -- attribute patches ----------------------------------------------------------
+
+def _same(a, b) -> bool:
+    return type(a) is type(b) and a == b
+
+
+def diff_values(old, new, path: Tuple = ()) -> Tuple[list, list]:
+    """(set, delete) operations turning ``old`` into ``new``; nested dicts are diffed key by key."""
+    if not (isinstance(old, dict) and isinstance(new, dict)):
+        return ([[list(path), new]], []) if not _same(old, new) else ([], [])
+    sets, dels = [], []
+    for k, v in new.items():
+        if k not in old:
+            sets.append([list(path) + [k], v])
+        else:
+            s, d = diff_values(old[k], v, path + (k,))
+            sets += s
+            dels += d
+    dels += [list(path) + [k] for k in old if k not in new]
+    return sets, dels
+
+
+def apply_patch(value, patch: dict):
+    """Apply ``{'set': [[path, v], ...], 'del': [path, ...]}`` to a decoded value (in place where possible)."""
+    for path, v in patch.get('set', ()):
+        if not path:
+            value = v
+            continue
+        target = value
+        for k in path[:-1]:
+            target = target[k]
+        target[path[-1]] = v
+    for path in patch.get('del', ()):
+        target = value
+        for k in path[:-1]:
+            target = target[k]
+        del target[path[-1]]
+    return value
+
+
+# -- store ----------------------------------------------------------------------
+
+class SnapshotStore:
+    """Append-only keyframe / delta history in a directory (created if missing)."""
+
+    def __init__(self, path, keyframe_interval: int = SNAPSHOT_KEYFRAME_INTERVAL,
+                 keyframe_ratio: float = SNAPSHOT_KEYFRAME_RATIO):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.keyframe_interval = keyframe_interval
+        self.keyframe_ratio = keyframe_ratio
+        self._index: Dict[bytes, Tuple[int, int]] = {}          # hash -> (payload offset, length)
+        self._records: Dict[int, dict] = {}
+        self.snapshots: List[Snapshot] = []
+        self._keyframe: Optional[Tuple[int, Dict[str, str], List[str]]] = None   # (id, key -> hash, order)
+        self._base_raw: Dict[str, bytes] = {}                  # decoded elements of the cached keyframe
+        self._pack = None
+        self._load()
+
+    def close(self):
+        if self._pack is not None:
+            self._pack.close()
+            self._pack = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -- files --
+
+    def _load(self):
+        self.close()
+        self._pack = (self.path / PACK).open('a+b')
+        f = self._pack
+        size = f.seek(0, os.SEEK_END)
+        pos = 0
+        while pos + _HEADER <= size:
+            f.seek(pos)
+            header = f.read(_HEADER)
+            length = int.from_bytes(header[HASH_BYTES:], 'little')
+            if pos + _HEADER + length > size:
+                break
+            self._index[header[:HASH_BYTES]] = (pos + _HEADER, length)
+            pos += _HEADER + length
+        if pos < size:
+            f.truncate(pos)                                     # torn write at the tail (header or payload)
+        log = self.path / LOG
+        if log.exists():
+            with log.open('r+b') as f:
+                end = 0                                         # offset after the last complete record
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        rec = None
+                    if rec is None or not line.endswith(b'\n'):
+                        f.truncate(end)                         # torn write at the tail: later appends
+                        break                                   # must start on a fresh line
+                    self._add_record(rec)
+                    end += len(line)
+
+    def _add_record(self, rec: dict):
+        self._records[rec['id']] = rec
+        keyframe = rec['kind'] == 'key'
+        changes = rec['size'] if keyframe else len(rec['added']) + len(rec['changed']) + len(rec['removed'])
+        self.snapshots.append(Snapshot(rec['id'], rec['t'], keyframe, rec['id'] if keyframe else rec['base'], changes))
+
+    def put(self, value) -> str:
+        """Store a JSON value once; returns its hex content hash."""
+        return self._put_raw(_encode(value).encode('utf-8'))
+
+    def _put_raw(self, raw: bytes) -> str:
+        digest = hashlib.blake2b(raw, digest_size=HASH_BYTES).digest()
+        if digest not in self._index:
+            payload = zlib.compress(raw)
+            offset = self._pack.seek(0, os.SEEK_END)
+            self._pack.write(digest + len(payload).to_bytes(4, 'little') + payload)
+            self._index[digest] = (offset + _HEADER, len(payload))
+        return digest.hex()
+
+    def _raw(self, h: str) -> bytes:
+        offset, length = self._index[bytes.fromhex(h)]
+        self._pack.seek(offset)
+        return zlib.decompress(self._pack.read(length))
+
+    def get(self, h: str):
+        return json.loads(self._raw(h))
+
+    def _append(self, rec: dict):
+        self._pack.flush()                                      # objects land before the record naming them
+        with (self.path / LOG).open('a', encoding='utf-8') as f:
+            f.write(_encode(rec) + '\n')
+        self._add_record(rec)
+
+    # -- saving --
+
+    def _keyframe_state(self, kid: int) -> Tuple[Dict[str, str], List[str]]:
+        if self._keyframe is None or self._keyframe[0] != kid:
+            manifest = self.get(self._records[kid]['manifest'])
+            order = [k for k, _ in manifest]
+            self._keyframe, self._base_raw = (kid, dict(manifest), order), {}
+        return self._keyframe[1], self._keyframe[2]
+
+    def _base_element(self, k: str):
+        """Keyframe element ``k``, decompressed once per cached keyframe and decoded fresh per call."""
+        raw = self._base_raw.get(k)
+        if raw is None:
+            raw = self._base_raw[k] = self._raw(self._keyframe[1][k])
+        return json.loads(raw)
+
+    def save(self, doc, timestamp: Optional[float] = None) -> int:
+        """Record a snapshot of ``doc``; returns its id."""
+        shape, elements, order = split_document(doc)
+        sid = self.snapshots[-1].id + 1 if self.snapshots else 0
+        t = time.time() if timestamp is None else float(timestamp)
+        last_key = next((s for s in reversed(self.snapshots) if s.keyframe), None)
+        if last_key is not None and sid - last_key.id < self.keyframe_interval:
+            rec = self._delta(last_key.id, shape, elements, order)
+            if rec is not None:
+                rec.update(id=sid, t=t)
+                self._append(rec)
+                return sid
+        entries = [[k, self.put(elements[k])] for k in order]
+        self._append({'id': sid, 't': t, 'kind': 'key', 'shape': shape, 'size': len(entries),
+                      'manifest': self.put(entries)})
+        self._keyframe, self._base_raw = (sid, dict(entries), order), {}
+        return sid
+
+    def _delta(self, kid: int, shape: dict, elements: Dict[str, object], order: List[str]) -> Optional[dict]:
+        """Diff against keyframe ``kid``, or None if the diff is too large to be worth it.
+
+        Objects are only written once the delta is accepted, so a fallback to
+        a keyframe leaves nothing behind in the pack.
+        """
+        base, base_order = self._keyframe_state(kid)
+        limit = self.keyframe_ratio * max(len(base), 1)
+        added, changed, pending = [], [], []
+        for k in order:
+            h_old = base.get(k)
+            raw = _encode(elements[k]).encode('utf-8')
+            h_new = hashlib.blake2b(raw, digest_size=HASH_BYTES).hexdigest()
+            if h_old is None:
+                added.append([k, h_new])
+                pending.append(raw)
+                continue
+            if h_new == h_old:
+                continue                                        # unchanged: no decode of the old version
+            sets, dels = diff_values(self._base_element(k), elements[k])
+            patch = _encode({'set': sets, 'del': dels}).encode('utf-8')
+            if len(patch) < len(raw):
+                changed.append([k, hashlib.blake2b(patch, digest_size=HASH_BYTES).hexdigest(), 'patch'])
+                pending.append(patch)
+            else:
+                changed.append([k, h_new, 'full'])
+                pending.append(raw)
+            if len(added) + len(changed) > limit:
+                return None
+        removed = [k for k in base_order if k not in elements]
+        if len(added) + len(changed) + len(removed) > limit:
+            return None
+        for raw in pending:
+            self._put_raw(raw)
+        rec = {'kind': 'delta', 'base': kid, 'added': added, 'changed': changed, 'removed': removed}
+        if self._records[kid]['shape'] != shape:
+            rec['shape'] = shape
+        if merge_order(base_order, set(removed), [k for k, _ in added]) != order:
+            rec['order'] = order                                # elements were reordered
+        return rec
+
+    # -- restoring --
+
+    def restore(self, sid: int):
+        """Rebuild snapshot ``sid`` (an elements list or minimal document, as saved)."""
+        rec = self._records[sid]
+        kid = sid if rec['kind'] == 'key' else rec['base']
+        base, base_order = self._keyframe_state(kid)
+        shape = rec.get('shape', self._records[kid]['shape'])
+        if rec['kind'] == 'key':
+            return join_document(shape, {k: self._base_element(k) for k in base_order}, base_order)
+        own = {k: self.get(h) for k, h in rec['added']}
+        for k, h, how in rec['changed']:
+            own[k] = apply_patch(self._base_element(k), self.get(h)) if how == 'patch' else self.get(h)
+        order = rec.get('order') or merge_order(base_order, set(rec['removed']), [k for k, _ in rec['added']])
+        return join_document(shape, {k: own[k] if k in own else self._base_element(k) for k in order}, order)
+
+    def latest(self):
+        return self.restore(self.snapshots[-1].id) if self.snapshots else None
+
+    # -- retention --
+
+    def autosave_retention(self, tiers: Iterable[Tuple[float, int]] = AUTOSAVE_TIERS) -> Set[int]:
+        """Snapshot ids that ``smartAutosave``'s rings would still hold (recent, medium, long-term)."""
+        keep: Set[int] = set()
+        for interval, count in tiers:
+            ring: List[int] = []
+            last = None
+            for s in self.snapshots:
+                if last is None or s.timestamp - last >= interval:
+                    ring.append(s.id)
+                    last = s.timestamp
+            keep.update(ring[-count:])
+        return keep
+
+    def compact(self, keep: Iterable[int]):
+        """Rewrite the store with only ``keep`` (plus the keyframes their deltas need); drops unused objects."""
+        keep = set(keep)
+        needed = sorted(keep | {self._records[i]['base'] for i in keep if self._records[i]['kind'] == 'delta'})
+        objects: Set[str] = set()
+        for i in needed:
+            rec = self._records[i]
+            if rec['kind'] == 'key':
+                objects.add(rec['manifest'])
+                objects.update(h for _, h in self.get(rec['manifest']))
+            else:
+                objects.update(h for _, h in rec['added'])
+                objects.update(h for _, h, _ in rec['changed'])
+        pack, log = self.path / (PACK + '.tmp'), self.path / (LOG + '.tmp')
+        self._pack.flush()
+        with pack.open('wb') as f:
+            for h in sorted(objects, key=lambda h: self._index[bytes.fromhex(h)][0]):
+                offset, length = self._index[bytes.fromhex(h)]
+                self._pack.seek(offset - _HEADER)
+                f.write(self._pack.read(_HEADER + length))
+        self.close()
+        with log.open('w', encoding='utf-8') as f:
+            for i in needed:
+                f.write(_encode(self._records[i]) + '\n')
+        os.replace(pack, self.path / PACK)
+        os.replace(log, self.path / LOG)
+        self._index, self._records, self.snapshots, self._keyframe, self._base_raw = {}, {}, [], None, {}
+        self._load()
+
+    def disk_usage(self) -> int:
+        """Bytes used by the store's files."""
+        self._pack.flush()
+        return sum((self.path / name).stat().st_size for name in (PACK, LOG) if (self.path / name).exists())
@@ -0,0 +1,563 @@
+"""
+Streaming minimal-format reader, validator and writer for very large graph files.
+
+``validateMinimal`` (validation.js) and ``compile_graph`` need the whole
+document in memory. Here a document is read as a stream of events, one node or
+edge at a time, from minimal JSON (nodes / edges arrays in any key order) or
+from the JSON Lines layout the lineage converter writes (a header object, then
+one ``{"node": ...}`` / ``{"edge": ...}`` per line):
+
+    ('meta', (key, value))    top-level field other than nodes / edges
+    ('begin', 'nodes')        start of the nodes (or edges) array
+    ('node', {...})  /  ('edge', {...})
+
+``MinimalValidator`` checks each event against the rules of
+``minimal-format.schema.json`` plus the semantic checks of validation.js
+(duplicate ids, dangling endpoints, edges touching note nodes, duplicate
+pairs, contributing-factor style). Node ids and edge pairs are remembered as
+64-bit hashes in a flat open-addressing table (8 bytes per slot, at most half
+full; no Python object per id). A hash collision can at worst hide a dangling endpoint or flag
+a false duplicate, with probability about n^2 / 2^64. An endpoint that is not
+a known id yet is rechecked when the stream ends, so nodes and edges may come
+in any order; only these misses are held in memory. Cycle detection needs the
+whole graph and is left to ``ReachabilityIndex``.
+
+``MinimalWriter`` writes the same events back as compact JSON, so a pipeline
+validates and converts in one pass:
+
+    python3 -m beliefgraph.stream huge.jsonl -o huge.json
+    generate | python3 -m beliefgraph.stream - -o - | gzip > graph.json.gz
+"""
+
+import argparse
+import io
+import json
+import sys
+from typing import Iterator, List, Optional, TextIO, Tuple
+
+import numpy as np
+
+from .config import ALLOWED_NODE_TYPES, EDGE_TYPE_OPPOSES, EDGE_TYPE_SUPPORTS, NODE_TYPE_NOTE
+
+CHUNK_SIZE = 1 << 20                  # characters read per refill
+_RETRY_MARGIN = 16                    # decode errors this close to the buffer end may be a cut token
+
+NODE_FIELDS = {'id', 'label', 'type', 'inert', 'description', 'prob', 'cpt', 'style'}
+EDGE_FIELDS = {'id', 'source', 'target', 'type', 'weight', 'rationale', 'contributingFactors', 'cpt'}
+DOC_FIELDS = {'version', 'nodes', 'edges', 'annotations', 'layout'}
+CPT_FIELDS = ('condTrue', 'condFalse', 'baseline')
+STYLE_FIELDS = {'textColor', 'sizeIndex', 'floretColor'}
+EDGE_TYPES = (EDGE_TYPE_SUPPORTS, EDGE_TYPE_OPPOSES)
+
+Event = Tuple[str, object]
+
+
+# -- reading --------------------------------------------------------------------
+
+class _Source:
+    """Character buffer over a text stream; values are decoded with ``raw_decode`` as they complete."""
+
+    def __init__(self, fp: TextIO, chunk_size: int):
+        self.fp, self.chunk_size = fp, chunk_size
+        self.buf, self.pos, self.offset, self.eof = '', 0, 0, False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        data = self.fp.read(self.chunk_size)
+        self.offset += self.pos
+        self.buf, self.pos = self.buf[self.pos:] + data, 0
+        self.eof = not data
+        return bool(data)
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at end of input)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def take(self, expected: str):
+        c = self.peek()
+        if c not in expected:
+            raise self.error(f"Expecting {' or '.join(repr(x) for x in expected)}")
+        self.pos += 1
+        return c
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                cut = e.msg.startswith('Unterminated') or e.pos >= len(self.buf) - _RETRY_MARGIN
+                if cut and self._fill():
+                    continue
+                raise ValueError(f"Invalid JSON at offset {self.offset + e.pos}: {e.msg}") from None
+            if end == len(self.buf) and self._fill():   # a number may continue in the next chunk
+                continue
+            self.pos = end
+            return value
+
+    def error(self, msg: str) -> ValueError:
+        return ValueError(f"Invalid JSON at offset {self.offset + self.pos}: {msg}")
+
+
+def iter_minimal(fp: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator[Event]:
+    """Events of a minimal JSON or JSON Lines document, reading ``chunk_size`` characters at a time."""
+    src = _Source(fp, chunk_size)
+    if src.peek() != '{':
+        raise ValueError('Root must be object')
+    src.take('{')
+    if src.peek() == '}':
+        src.take('}')
+    else:
+        while True:
+            key = src.value()
+            if not isinstance(key, str):
+                raise src.error('Expecting property name')
+            src.take(':')
+            if key in ('nodes', 'edges'):
+                if src.peek() != '[':
+                    raise ValueError(f"{key} must be array")
+                src.take('[')
+                yield 'begin', key
+                kind = key[:-1]
+                if src.peek() == ']':
+                    src.take(']')
+                else:
+                    while True:
+                        yield kind, src.value()
+                        if src.take(',]') == ']':
+                            break
+            else:
+                yield 'meta', (key, src.value())
+            if src.take(',}') == '}':
+                break
+    begun = set()
+    while src.peek():                                   # JSON Lines: one object per line after the header
+        line = src.value()
+        if not isinstance(line, dict):
+            raise ValueError('JSON Lines entries must be objects')
+        if len(line) == 1 and ('node' in line or 'edge' in line):
+            kind = next(iter(line))
+            if kind not in begun:
+                begun.add(kind)
+                yield 'begin', kind + 's'
+            yield kind, line[kind]
+        else:
+            for item in line.items():
+                yield 'meta', item
+
+
+def open_minimal(path: str) -> TextIO:
+    """Open a path for ``iter_minimal`` ('-' = stdin)."""
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+# -- validation -----------------------------------------------------------------
+
+class HashSet:
+    """Set of strings stored as 64-bit hashes in a flat open-addressing table (linear probing)."""
+
+    def __init__(self, capacity: int = 1024):
+        self.table = np.zeros(capacity, dtype=np.uint64)
+        self.size = 0
+
+    @staticmethod
+    def _key(s: str) -> int:
+        return (hash(s) & 0xFFFFFFFFFFFFFFFF) or 1         # 0 marks an empty slot
+
+    def _slot(self, key: int) -> Tuple[int, int]:
+        """(slot index, stored key) for ``key``: its slot, or the empty slot where it would go."""
+        table = self.table
+        mask = len(table) - 1
+        i = key & mask                                      # str hashes are already well mixed
+        k = table.item(i)
+        while k and k != key:
+            i = (i + 1) & mask
+            k = table.item(i)
+        return i, k
+
+    def add(self, s: str) -> bool:
+        """Insert ``s``; False if it was already present."""
+        key = self._key(s)
+        i, k = self._slot(key)
+        if k:
+            return False
+        self.table[i] = key
+        self.size += 1
+        if 2 * self.size > len(self.table):
+            old = self.table[self.table != 0].tolist()
+            self.table = np.zeros(2 * len(self.table), dtype=np.uint64)
+            for k in old:
+                self.table[self._slot(k)[0]] = k
+        return True
+
+    def __contains__(self, s: str) -> bool:
+        return bool(self._slot(self._key(s))[1])
+
+    def __len__(self) -> int:
+        return self.size
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class MinimalValidator:
+    """Incremental ``validateMinimal``: feed events, then call ``finish``.
+
+    Attributes:
+        errors / warnings: the first ``max_messages`` messages of each kind
+        n_errors / n_warnings: total counts
+        n_nodes / n_edges: elements seen
+    """
+
+    def __init__(self, strict: bool = False, allow_negative_weights: bool = True,
+                 allow_unknown_fields: bool = False, max_messages: int = 1000):
+        self.strict = strict
+        self.allow_negative_weights = allow_negative_weights
+        self.allow_unknown_fields = allow_unknown_fields
+        self.max_messages = max_messages
+        self.errors: List[str] = []
+        self.warnings: List[str] = []
+        self.n_errors = self.n_warnings = 0
+        self.n_nodes = self.n_edges = 0
+        self.node_ids = HashSet()
+        self.note_ids = HashSet()
+        self.edge_pairs = HashSet()
+        self.sections = set()
+        self._pending: List[Tuple[int, str, str]] = []    # endpoints not (yet) seen as node ids
+
+    def error(self, msg: str):
+        self.n_errors += 1
+        if len(self.errors) < self.max_messages:
+            self.errors.append(msg)
+
+    def warn(self, msg: str):
+        self.n_warnings += 1
+        if len(self.warnings) < self.max_messages:
+            self.warnings.append(msg)
+
+    @property
+    def valid(self) -> bool:
+        return self.n_errors == 0
+
+    def feed(self, kind: str, value):
+        if kind == 'node':
+            self.node(value)
+        elif kind == 'edge':
+            self.edge(value)
+        elif kind == 'begin':
+            self.sections.add(value)
+        else:
+            self.meta(*value)
+
+    def _fields(self, obj: dict, allowed, where: str):
+        for key in obj:
+            if key not in allowed:
+                (self.warn if self.allow_unknown_fields else self.error)(f"{where}: unknown field '{key}'")
+
+    def _string(self, obj: dict, key: str, where: str):
+        if key in obj and not isinstance(obj[key], str):
+            self.error(f"{where}.{key} must be string")
+
+    def _cpt(self, cpt, where: str):
+        if not isinstance(cpt, dict):
+            self.error(f"{where}.cpt must be object")
+            return
+        self._fields(cpt, CPT_FIELDS + ('inverse',), f"{where}.cpt")
+        for k in CPT_FIELDS:
+            if k in cpt and (not _is_number(cpt[k]) or cpt[k] < 0 or cpt[k] > 100):
+                self.error(f"{where}.cpt.{k} must be 0..100")
+        if 'inverse' in cpt and not isinstance(cpt['inverse'], bool):
+            self.error(f"{where}.cpt.inverse must be boolean")
+
+    def meta(self, key: str, value):
+        if key not in DOC_FIELDS:
+            (self.warn if self.allow_unknown_fields else self.error)(f"unknown field '{key}'")
+        elif key == 'version' and not (isinstance(value, str) or _is_number(value)):
+            self.error('version must be string or number')
+        elif key == 'annotations' and not isinstance(value, list):
+            self.error('annotations must be array')
+        elif key == 'layout':
+            if not isinstance(value, dict):
+                self.error('layout must be object')
+                return
+            self._fields(value, ('positions',), 'layout')
+            positions = value.get('positions', {})
+            if not isinstance(positions, dict) or not all(
+                    isinstance(p, dict) and set(p) == {'x', 'y'} and _is_number(p['x']) and _is_number(p['y'])
+                    for p in positions.values()):
+                self.error('layout.positions must map ids to {x, y}')
+
+    def node(self, n):
+        i = self.n_nodes
+        self.n_nodes += 1
+        where = f"nodes[{i}]"
+        if not isinstance(n, dict):
+            self.error(f"{where} not an object")
+            return
+        nid = n.get('id')
+        if not nid:
+            self.error(f"{where} missing id")
+            return
+        if not isinstance(nid, str):
+            self.error(f"{where}.id must be string")
+            return
+        if not self.node_ids.add(nid):
+            self.error(f"Duplicate node id '{nid}'")
+        self._fields(n, NODE_FIELDS, where)
+        for key in ('label', 'description'):
+            self._string(n, key, where)
+        t = n.get('type')
+        if t and t not in ALLOWED_NODE_TYPES:
+            self.error(f"{where}.type '{t}' invalid")
+        if t == NODE_TYPE_NOTE:
+            self.note_ids.add(nid)
+            if not n.get('description'):
+                self.warn(f"note node '{nid}' missing description")
+        if not t and self.strict:
+            self.warn(f"{where} missing type (will be inferred)")
+        if 'inert' in n and not isinstance(n['inert'], bool):
+            self.error(f"{where}.inert must be boolean")
+        if 'prob' in n and (not _is_number(n['prob']) or n['prob'] < 0 or n['prob'] > 1):
+            self.error(f"{where}.prob must be 0..1")
+        if 'cpt' in n:
+            self._cpt(n['cpt'], where)
+        style = n.get('style')
+        if style is not None:
+            if not isinstance(style, dict):
+                self.error(f"{where}.style must be object")
+            else:
+                self._fields(style, STYLE_FIELDS, f"{where}.style")
+                s = style.get('sizeIndex')
+                if s is not None and (not _is_number(s) or s < 1 or s > 10):
+                    self.error(f"{where}.style.sizeIndex out of range 1-10")
+                for key in ('textColor', 'floretColor'):
+                    self._string(style, key, f"{where}.style")
+
+    def edge(self, e):
+        i = self.n_edges
+        self.n_edges += 1
+        where = f"edges[{i}]"
+        if not isinstance(e, dict):
+            self.error(f"{where} not an object")
+            return
+        self._fields(e, EDGE_FIELDS, where)
+        for end in ('source', 'target'):
+            v = e.get(end)
+            if not v:
+                self.error(f"{where} missing {end}")
+            elif not isinstance(v, str):
+                self.error(f"{where}.{end} must be string")
+            elif v not in self.node_ids:
+                self._pending.append((i, end, v))              # may still arrive later in the stream
+            elif v in self.note_ids:
+                self.error(f"{where} connects to note node which must be isolated")
+        for key in ('id', 'rationale'):
+            self._string(e, key, where)
+        t = e.get('type')
+        if t and t not in EDGE_TYPES:
+            self.error(f"{where}.type '{t}' invalid")
+        w = e.get('weight')
+        if 'weight' in e and not _is_number(w):
+            self.error(f"{where}.weight must be number")
+        elif _is_number(w):
+            if not self.allow_negative_weights and w < 0:
+                self.error(f"{where}.weight negative not allowed")
+            if w < -1 or w > 1:
+                self.error(f"{where}.weight must be -1..1")
+        if 'contributingFactors' in e:
+            self._factors(e['contributingFactors'], where)
+        if 'cpt' in e:
+            self._cpt(e['cpt'], where)
+        if isinstance(e.get('source'), str) and isinstance(e.get('target'), str):
+            pair = f"{e['source']}->{e['target']}"
+            if not self.edge_pairs.add(pair):
+                self.warn(f"Duplicate edge pair {pair}")
+
+    def _factors(self, factors, where: str):
+        if not isinstance(factors, list):
+            self.error(f"{where}.contributingFactors must be array if present")
+            return
+        seen = set()
+        for fi, f in enumerate(factors):
+            if not isinstance(f, str):
+                self.error(f"{where}.contributingFactors[{fi}] must be string")
+                continue
+            trimmed = f.strip()
+            if not trimmed:
+                self.warn(f"{where}.contributingFactors[{fi}] empty after trim")
+            if len(trimmed) > 80:
+                self.warn(f"{where}.contributingFactors[{fi}] unusually long (>80 chars)")
+            if trimmed[-1:] in ('.', '!', '?'):
+                self.warn(f"{where}.contributingFactors[{fi}] should not end with punctuation")
+            if len(trimmed.split('.')) > 2:
+                self.warn(f"{where}.contributingFactors[{fi}] appears to contain full sentence(s)")
+            cf = trimmed.lower()
+            if cf and cf in seen:
+                self.warn(f"{where}.contributingFactors contains duplicate phrase '{cf}'")
+            seen.add(cf)
+
+    def finish(self) -> 'MinimalValidator':
+        """Check deferred endpoints and missing arrays; returns self."""
+        for section in ('nodes', 'edges'):
+            if section not in self.sections:
+                self.error(f"{section} must be array")
+        for i, end, v in self._pending:
+            if v not in self.node_ids:
+                self.error(f"edges[{i}] {end} '{v}' not in nodes")
+            elif v in self.note_ids:
+                self.error(f"edges[{i}] connects to note node which must be isolated")
+        self._pending = []
+        return self
+
+
+# -- writing --------------------------------------------------------------------
+
+class MinimalWriter:
+    """Write events (or plain nodes / edges) as one compact minimal JSON document.
+
+    Top-level fields are written where they arrive. Each array is written once,
+    so its items must arrive together (JSON Lines with nodes and edges
+    interleaved cannot be copied). Missing arrays are written empty on ``close``.
+    """
+
+    def __init__(self, fp: TextIO):
+        self.fp = fp
+        self._encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+        self._open: Optional[str] = None                 # array currently being written
+        self._done = set()
+        self._first_member = True
+        self._first_item = True
+        self.closed = False
+
+    def _member(self, key: str):
+        self.fp.write(('{' if self._first_member else ',') + self._encode(key) + ':')
+        self._first_member = False
+
+    def _close_array(self):
+        if self._open:
+            self.fp.write(']')
+            self._done.add(self._open)
+            self._open = None
+
+    def _item(self, section: str, value):
+        if self._open != section:
+            if section in self._done:
+                raise ValueError(f"{section} must be written as one array")
+            self._close_array()
+            self._member(section)
+            self.fp.write('[')
+            self._open, self._first_item = section, True
+        if value is not None:
+            self.fp.write(('' if self._first_item else ',') + self._encode(value))
+            self._first_item = False
+
+    def node(self, node: dict):
+        self._item('nodes', node)
+
+    def edge(self, edge: dict):
+        self._item('edges', edge)
+
+    def meta(self, key: str, value):
+        self._close_array()
+        self._member(key)
+        self.fp.write(self._encode(value))
+
+    def write(self, kind: str, value):
+        """Write one ``iter_minimal`` event."""
+        if kind == 'node':
+            self.node(value)
+        elif kind == 'edge':
+            self.edge(value)
+        elif kind == 'begin':
+            self._item(value, None)
+        else:
+            self.meta(*value)
+
+    def close(self):
+        if self.closed:
+            return
+        self._close_array()
+        for section in ('nodes', 'edges'):
+            if section not in self._done:
+                self._item(section, None)
+                self._close_array()
+        self.fp.write('}\n')
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+
+
+def validate_stream(fp: TextIO, out: Optional[TextIO] = None, **options) -> MinimalValidator:
+    """Validate a minimal JSON / JSON Lines stream, optionally copying it to ``out`` as compact JSON.
+
+    Malformed JSON is recorded as an error and ends the pass.
+    """
+    validator = MinimalValidator(**options)
+    writer = MinimalWriter(out) if out is not None else None
+    try:
+        for kind, value in iter_minimal(fp):
+            validator.feed(kind, value)
+            if writer:
+                writer.write(kind, value)
+    except ValueError as e:
+        validator.error(str(e))
+        return validator
+    if writer:
+        writer.close()
+    return validator.finish()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m beliefgraph.stream',
+                                     description='Validate (and convert) minimal-format graphs in one streaming pass.')
+    parser.add_argument('input', help="minimal JSON or JSON Lines file ('-' = stdin)")
+    parser.add_argument('-o', '--output', help="write compact minimal JSON here ('-' = stdout)")
+    parser.add_argument('--strict', action='store_true', help='warn about nodes without a type')
+    parser.add_argument('--no-negative-weights', action='store_true', help='reject negative edge weights')
+    parser.add_argument('--allow-unknown-fields', action='store_true',
+                        help='report fields outside the schema as warnings instead of errors')
+    parser.add_argument('--max-messages', type=int, default=20, help='errors / warnings printed of each kind')
+    args = parser.parse_args(argv)
+
+    out = None
+    try:
+        fp = open_minimal(args.input)
+        if args.output:
+            out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+        with fp:
+            v = validate_stream(fp, out, strict=args.strict, allow_negative_weights=not args.no_negative_weights,
+                                allow_unknown_fields=args.allow_unknown_fields, max_messages=args.max_messages)
+    except OSError as e:
+        print(f"{args.input}: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if out is not None and out is not sys.stdout:
+            out.close()
+    for kind, messages, total in (('error', v.errors, v.n_errors), ('warning', v.warnings, v.n_warnings)):
+        for msg in messages:
+            print(f"{kind}: {msg}", file=sys.stderr)
+        if total > len(messages):
+            print(f"... {total - len(messages)} more {kind}s", file=sys.stderr)
+    print(f"{args.input}: {'valid' if v.valid else 'invalid'} ({v.n_nodes} nodes, {v.n_edges} edges, "
+          f"{v.n_errors} errors, {v.n_warnings} warnings)", file=sys.stderr)
+    return 0 if v.valid else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
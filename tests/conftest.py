@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+TESTS = Path(__file__).resolve().parent
+
+# Make the repo-root `beliefgraph` package and the dev-tools converter modules
+# importable when pytest is run from anywhere
+sys.path.insert(0, str(TESTS.parent))
+sys.path.insert(0, str(TESTS / 'dev-tools'))
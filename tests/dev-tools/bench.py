@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the Excel converters, the math validation helpers and
+the headless engine.
+
+Generates synthetic inputs of configurable size, times each case in a fresh
+process (so peak RSS is per case) and writes wall time, peak RSS and
+throughput to a JSON results file. Pass an earlier results file with
+``--compare`` to flag slowdowns between versions.
+
+Synthetic inputs:
+  - workbook: ``--sheets`` x ``--rows`` with ``--formula-cols`` formula columns;
+    ``--density`` is the fraction of rows holding a formula in each formula
+    column and ``--cross`` the fraction of formulas that read another sheet
+    (the rest chain within their own sheet)
+  - belief graph: ``--nodes`` nodes, each assertion with ``--fan-in`` parents
+    (CPT + weight on every edge, so both lite and heavy run)
+
+Usage:
+  python3 tests/dev-tools/bench.py [--preset small|medium|large] [--out bench-results.json]
+      [--sheets N] [--rows N] [--formula-cols N] [--density F] [--cross F]
+      [--nodes N] [--fan-in K] [--repeat N] [--cases name,...] [--compare old.json] [--tolerance F]
+
+Requires openpyxl and numpy.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:             # Windows: no per-process peak RSS
+    resource = None
+
+HERE = Path(__file__).resolve().parent
+ROOT = HERE.parent.parent
+for p in (str(ROOT), str(HERE.parent), str(HERE)):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+PRESETS = {
+    'small':  dict(sheets=3, rows=500, formula_cols=2, density=0.5, cross=0.3, nodes=500, fan_in=3),
+    'medium': dict(sheets=6, rows=5_000, formula_cols=3, density=0.5, cross=0.3, nodes=20_000, fan_in=4),
+    'large':  dict(sheets=10, rows=50_000, formula_cols=4, density=0.6, cross=0.3, nodes=200_000, fan_in=6),
+}
+VALIDATION_PARENTS = 8
+RESULTS_VERSION = 1
+
+
+# ---------------------------------------------------------------------------
+# Synthetic inputs
+# ---------------------------------------------------------------------------
+
+def make_workbook(path, sheets: int, rows: int, formula_cols: int = 2, density: float = 0.5,
+                  cross: float = 0.3, seed: int = 0) -> int:
+    """Write a synthetic .xlsx and return its number of formula cells.
+
+    Every sheet has a header row, a label column (A) and a value column (B);
+    columns C.. hold formulas: cross-sheet ones read a cell or a short range on
+    another sheet, same-sheet ones chain to the cell above or to column B.
+    """
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    names = [f"Sheet {i}" if i else 'Projection' for i in range(sheets)]
+    n_formulas = 0
+    for s, name in enumerate(names):
+        ws = wb.create_sheet(name)
+        ws.append(['Label', 'Value'] + [f"Calc {k + 1}" for k in range(formula_cols)])
+        for r in range(2, rows + 2):
+            row = [f"Item {r}", rng.randint(1, 1000)]
+            for k in range(formula_cols):
+                if rng.random() >= density:
+                    row.append(None)
+                    continue
+                col = get_column_letter(3 + k)
+                if sheets > 1 and rng.random() < cross:
+                    other = names[(s + 1 + rng.randrange(sheets - 1)) % sheets]
+                    if rng.random() < 0.5:
+                        row.append(f"='{other}'!B{r}*{rng.randint(2, 9)}")
+                    else:
+                        row.append(f"=SUM('{other}'!B{max(2, r - 5)}:B{r})")
+                elif r > 2:
+                    row.append(f"={col}{r - 1}+B{r}")
+                else:
+                    row.append(f"=B{r}*2")
+                n_formulas += 1
+            ws.append(row)
+    wb.save(path)
+    return n_formulas
+
+
+def make_belief_graph(nodes: int, fan_in: int, seed: int = 0) -> dict:
+    """Minimal-format DAG: the first max(fan_in, nodes // 10) nodes are facts,
+    every later node is an assertion with ``fan_in`` earlier parents."""
+    rng = random.Random(seed)
+    n_facts = min(nodes, max(fan_in, nodes // 10))
+    doc_nodes, edges = [], []
+    for i in range(nodes):
+        doc_nodes.append({'id': f"n{i}", 'type': 'fact' if i < n_facts else 'assertion'})
+        if i < n_facts:
+            continue
+        for j in rng.sample(range(i), min(fan_in, i)):
+            edges.append({'source': f"n{j}", 'target': f"n{i}",
+                          'type': 'opposes' if rng.random() < 0.2 else 'supports',
+                          'weight': round(rng.uniform(0.1, 1.0), 3),
+                          'cpt': {'condTrue': rng.randint(55, 95), 'condFalse': rng.randint(5, 45),
+                                  'baseline': rng.randint(30, 70)}})
+    return {'version': '2', 'nodes': doc_nodes, 'edges': edges}
+
+
+# ---------------------------------------------------------------------------
+# Cases: setup(inputs, params) -> (callable, items); only the callable is timed
+# ---------------------------------------------------------------------------
+
+def _scan(backend):
+    def setup(inputs, params):
+        from excel_index import scan_workbook
+        return (lambda: scan_workbook(inputs['workbook'], backend=backend)), inputs['formulas']
+    return setup
+
+
+def _projection(builder_name):
+    def setup(inputs, params):
+        import excel_lineage_to_minimal, excel_to_minimal, excel_topics_to_minimal
+        from excel_index import scan_workbook
+        builders = {
+            'build_sheet_dependency_graph': excel_to_minimal.build_sheet_dependency_graph,
+            'build_topic_graph': excel_topics_to_minimal.build_topic_graph,
+            'build_lineage_graph': excel_lineage_to_minimal.build_lineage_graph,
+        }
+        index = scan_workbook(inputs['workbook'], backend='xml')
+        build = builders[builder_name]
+        return (lambda: build(index)), inputs['formulas']
+    return setup
+
+
+def _validation_module():
+    with contextlib.redirect_stdout(io.StringIO()):     # the script prints its cases on import
+        import test_validation
+    return test_validation
+
+
+def _validate_scalar(inputs, params):
+    tv = _validation_module()
+    n = max(1, params['nodes'] // 100)
+    probs, cpts = tv.random_multi_parent_cases(n, VALIDATION_PARENTS)
+    cases = [(list(p), [{'condTrue': c[0], 'condFalse': c[1], 'baseline': c[2]} for c in cpt])
+             for p, cpt in zip(probs, cpts)]
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for p, cpt in cases:
+                tv.validate_multi_parent_bayes(p, cpt)
+    return run, n
+
+
+def _validate_batch(inputs, params):
+    tv = _validation_module()
+    probs, cpts = tv.random_multi_parent_cases(params['nodes'], VALIDATION_PARENTS)
+    return (lambda: tv.validate_multi_parent_bayes_batch(probs, cpts)), params['nodes']
+
+
+def _engine(mode):
+    def setup(inputs, params):
+        from beliefgraph import load_graph, propagate_heavy, propagate_lite
+        graph = load_graph(inputs['graph'])
+        run = (lambda: propagate_heavy(graph)) if mode == 'heavy' else (lambda: propagate_lite(graph))
+        return run, params['nodes']
+    return setup
+
+
+def _compile(inputs, params):
+    from beliefgraph import load_graph
+    return (lambda: load_graph(inputs['graph'])), params['nodes']
+
+
+CASES = {
+    'scan_openpyxl': _scan('openpyxl'),
+    'scan_xml': _scan('xml'),
+    'build_sheet_dependency_graph': _projection('build_sheet_dependency_graph'),
+    'build_topic_graph': _projection('build_topic_graph'),
+    'build_lineage_graph': _projection('build_lineage_graph'),
+    'validate_multi_parent_bayes': _validate_scalar,
+    'validate_multi_parent_bayes_batch': _validate_batch,
+    'load_graph': _compile,
+    'propagate_lite': _engine('lite'),
+    'propagate_heavy': _engine('heavy'),
+}
+
+
+def _proc_status_mb(field):
+    """``VmRSS``/``VmHWM`` from /proc/self/status in MB, or None off Linux."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the kernel's RSS high-water mark (Linux >= 4.0) so setup does not count."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb(reset: bool = False):
+    if reset:
+        return _proc_status_mb('VmHWM')
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024, 1)  # bytes on macOS, KiB elsewhere
+
+
+def run_case(name: str, inputs: dict, params: dict, repeat: int = 3) -> dict:
+    """Set up and time one case in the current process.
+
+    ``setup_rss_mb`` is the resident set once setup is done; ``peak_rss_mb``
+    is the high-water mark during the timed runs only where the kernel lets
+    us reset it (Linux), else the process-lifetime peak including setup.
+    ``run_rss_mb`` is their difference: memory the timed callable added.
+    """
+    run, items = CASES[name](inputs, params)
+    reset = _reset_peak_rss()
+    baseline = _proc_status_mb('VmRSS') if reset else _peak_rss_mb()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t0)
+    peak = _peak_rss_mb(reset)
+    times.sort()
+    median = times[len(times) // 2]
+    return {
+        'case': name,
+        'items': items,
+        'repeat': repeat,
+        'wall_s': round(median, 6),
+        'best_s': round(times[0], 6),
+        'throughput_per_s': round(items / median, 1) if median > 0 else None,
+        'setup_rss_mb': baseline,
+        'peak_rss_mb': peak,
+        'run_rss_mb': round(max(0.0, peak - baseline), 1) if peak is not None and baseline is not None else None,
+    }
+
+
+def run_isolated(name: str, inputs: dict, params: dict, repeat: int = 3) -> dict:
+    """``run_case`` in a freshly spawned process so peak RSS belongs to this case alone."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+        return pool.submit(run_case, name, inputs, params, repeat).result()
+
+
+# ---------------------------------------------------------------------------
+# Results
+# ---------------------------------------------------------------------------
+
+def _versions() -> dict:
+    out = {'python': platform.python_version(), 'platform': platform.platform()}
+    for mod in ('numpy', 'openpyxl'):
+        try:
+            out[mod] = __import__(mod).__version__
+        except ImportError:
+            out[mod] = None
+    try:
+        out['git'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                    text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        out['git'] = None
+    return out
+
+
+def run_benchmarks(params: dict, cases=None, repeat: int = 3, isolate: bool = True, workdir=None) -> dict:
+    """Generate the synthetic inputs into ``workdir`` and run ``cases`` (default: all)."""
+    cases = list(cases or CASES)
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        raise ValueError(f"Unknown benchmark case(s): {', '.join(unknown)}")
+    with tempfile.TemporaryDirectory() as tmp:
+        work = Path(workdir or tmp)
+        inputs = {'workbook': str(work / 'bench.xlsx'), 'graph': str(work / 'bench-graph.json')}
+        inputs['formulas'] = make_workbook(inputs['workbook'], params['sheets'], params['rows'],
+                                           params['formula_cols'], params['density'], params['cross'])
+        with open(inputs['graph'], 'w', encoding='utf-8') as f:
+            json.dump(make_belief_graph(params['nodes'], params['fan_in']), f)
+        runner = run_isolated if isolate else run_case
+        results = []
+        for name in cases:
+            res = runner(name, inputs, params, repeat)
+            print(f"{name:36s} {res['wall_s']:10.4f}s  {res['throughput_per_s'] or 0:14,.0f}/s  "
+                  f"rss {res['peak_rss_mb']} MB (+{res['run_rss_mb']})", file=sys.stderr)
+            results.append(res)
+    return {'version': RESULTS_VERSION, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'env': _versions(), 'params': params, 'results': results}
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.2, min_seconds: float = 0.001):
+    """Cases whose median wall time grew by more than ``tolerance`` (a fraction).
+
+    Returns [(case, baseline seconds, current seconds)]; cases missing from
+    either side, or measured with different params, are not compared, and
+    cases under ``min_seconds`` in both runs are treated as timer noise.
+    """
+    if current.get('params') != baseline.get('params'):
+        return []
+    before = {r['case']: r['wall_s'] for r in baseline.get('results', [])}
+    slower = []
+    for r in current['results']:
+        old = before.get(r['case'])
+        if old is None or max(old, r['wall_s']) < min_seconds:
+            continue
+        if r['wall_s'] > old * (1 + tolerance):
+            slower.append((r['case'], old, r['wall_s']))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark converters, validation and the engine on synthetic data.')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    for key, kind in (('sheets', int), ('rows', int), ('formula-cols', int), ('density', float),
+                      ('cross', float), ('nodes', int), ('fan-in', int)):
+        parser.add_argument(f'--{key}', type=kind)
+    parser.add_argument('--cases', help='comma-separated subset of: ' + ', '.join(CASES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--in-process', action='store_true', help='skip per-case processes (peak RSS is then cumulative)')
+    parser.add_argument('--out', default='bench-results.json')
+    parser.add_argument('--compare', help='earlier results file; exit 1 if a case got slower than --tolerance')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    params = dict(PRESETS[args.preset])
+    for key in params:
+        value = getattr(args, key)
+        if value is not None:
+            params[key] = value
+    try:
+        report = run_benchmarks(params, args.cases.split(',') if args.cases else None,
+                                max(1, args.repeat), isolate=not args.in_process)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    report['params']['preset'] = args.preset
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote results: {os.path.abspath(args.out)}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('params') != report['params']:
+            print("Baseline was measured with different params; not compared", file=sys.stderr)
+            return 0
+        slower = compare(report, baseline, args.tolerance)
+        for case, old, new in slower:
+            print(f"SLOWER {case}: {old:.4f}s -> {new:.4f}s ({new / old - 1:+.0%})")
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Excel → Minimal JSON (all three graphs from one scan)
+
+Scans the workbook once with excel_index.scan_workbook and writes the sheet,
+topic and cell-lineage graphs as projections of that single index:
+  <out_dir>/excel-sheet-deps.json
+  <out_dir>/excel-topics-deps.json
+  <out_dir>/excel-lineage-deps.json
+
+Usage:
+  python3 tests/dev-tools/excel_all_to_minimal.py "Field Goal 1 Projections (1).xlsx" [out_dir] [max_targets]
+Where out_dir defaults to tests/minimal-json and max_targets (lineage) to 8.
+--evaluate evaluates the workbook once (excel_eval.py) and weights all three
+graphs by finite-difference sensitivities instead of reference counts.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+from excel_eval import evaluate_index, pop_evaluate_arg
+from excel_index import cache_report, pop_scan_args, scan_workbook
+from excel_lineage_to_minimal import build_lineage_graph
+from excel_to_minimal import build_sheet_dependency_graph
+from excel_topics_to_minimal import build_topic_graph
+
+
+def main():
+    argv, scan_opts = pop_scan_args(sys.argv[1:])
+    argv, evaluate = pop_evaluate_arg(argv)
+    if len(argv) < 1:
+        print("Usage: excel_all_to_minimal.py <workbook.xlsx> [out_dir] [max_targets] [--evaluate] [--workers N] [--backend openpyxl|xml] [--cache DIR]", file=sys.stderr)
+        sys.exit(2)
+    xlsx = Path(argv[0]).expanduser().resolve()
+    if not xlsx.exists():
+        print(f"File not found: {xlsx}", file=sys.stderr)
+        sys.exit(1)
+    out_dir = Path(argv[1]).expanduser().resolve() if len(argv) > 1 else Path(__file__).parent.parent / 'minimal-json'
+    max_targets = int(argv[2]) if len(argv) > 2 and argv[2].isdigit() else 8
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    index = scan_workbook(xlsx, values=evaluate, **scan_opts)
+    sensitivity = evaluate_index(index) if evaluate else None
+    outputs = {
+        'excel-sheet-deps.json': build_sheet_dependency_graph(index, sensitivity),
+        'excel-topics-deps.json': build_topic_graph(index, sensitivity),
+        'excel-lineage-deps.json': build_lineage_graph(index, max_targets=max_targets, sensitivity=sensitivity),
+    }
+    for name, minimal in outputs.items():
+        out = out_dir / name
+        with out.open('w', encoding='utf-8') as f:
+            json.dump(minimal, f, ensure_ascii=False, indent=2)
+        print(f"Wrote minimal JSON: {out} (nodes: {len(minimal['nodes'])}, edges: {len(minimal['edges'])})")
+    print(f"Scanned {sum(index.formula_counts.values())} formulas across {len(index.sheet_names)} sheets once")
+    if scan_opts['cache_dir']:
+        print(cache_report(index))
+
+
+if __name__ == '__main__':
+    main()
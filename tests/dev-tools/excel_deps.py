@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Range-aware formula dependencies on top of the workbook index.
+
+``excel_index.parse_refs`` only sees single ``Sheet!A1`` references, which is
+all the sheet/topic/top-N lineage projections need. This module reads every
+reference in a formula instead -- same-sheet cells, ``A1:B9`` ranges, whole
+columns/rows -- and keeps each one as an interval (``RangeRef``) rather than
+expanding it to cells. On top of that it provides:
+
+  - a per-sheet interval index answering "which formulas depend on this cell"
+  - a memoized transitive closure that follows intra-sheet formula chains and
+    collapses them into the cross-sheet ranges they ultimately read
+    (``DependencyIndex.provenance``)
+
+External-workbook (``[1]Sheet!A1``), 3-D (``Sheet1:Sheet3!A1``), defined-name
+and structured (table) references are not resolved.
+
+Usage:
+    from excel_deps import DependencyIndex
+    deps = DependencyIndex(index_or_path)
+    deps.dependents('Inputs', 2, 5)          # formula ids reading Inputs!B5
+    deps.provenance(fid)                     # cross-sheet RangeRefs behind a formula
+"""
+
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from functools import lru_cache
+
+from excel_index import as_index, col_to_index, index_to_col
+
+MAX_ROW, MAX_COL = 1_048_576, 16_384
+
+# One reference inside a formula as a closed rectangle of cells (1-based ints)
+RangeRef = namedtuple('RangeRef', 'sheet c1 r1 c2 r2')
+
+_CELL_RE = re.compile(r"([A-Z]{1,3})(\d+)$")
+_STRING_RE = re.compile(r'"(?:[^"]|"")*"')
+RANGE_REF_RE = re.compile(r"""
+    (?<![\w.$'\]:!])                                 # not mid-identifier, external or 3-D
+    (?:(?:'((?:[^']|'')+)'|([A-Za-z0-9_.]+))!)?      # optional sheet prefix
+    (?:
+        \$?([A-Za-z]{1,3})\$?(\d+)(?::\$?([A-Za-z]{1,3})\$?(\d+))?   # A1 or A1:B9
+      | \$?([A-Za-z]{1,3}):\$?([A-Za-z]{1,3})                         # A:C
+      | \$?(\d+):\$?(\d+)                                             # 2:5
+    )
+    (?![\w(!.:])                                     # not a function name, sheet prefix or 3-D
+""", re.VERBOSE)
+
+
+@lru_cache(maxsize=None)
+def _col(letters: str) -> int:
+    return col_to_index(letters)
+
+
+def parse_ranges(formula: str, sheet: str):
+    """Return ``RangeRef`` intervals for every cell/range reference in ``formula``.
+
+    References without a sheet prefix resolve to ``sheet``. String literals are
+    ignored; tokens outside Excel's grid (e.g. ``ABCD1``) are not references.
+    """
+    out = []
+    if '"' in formula:
+        formula = _STRING_RE.sub(lambda s: ' ' * len(s.group()), formula)
+    for m in RANGE_REF_RE.finditer(formula):
+        quoted, bare, a, ra, b, rb, ca, cb, rowa, rowb = m.groups()
+        name = quoted.replace("''", "'") if quoted else (bare or sheet)
+        if a:
+            c1, r1 = _col(a), int(ra)
+            c2, r2 = (_col(b), int(rb)) if b else (c1, r1)
+        elif ca:
+            c1, c2, r1, r2 = _col(ca), _col(cb), 1, MAX_ROW
+        else:
+            c1, c2, r1, r2 = 1, MAX_COL, int(rowa), int(rowb)
+        if c1 > c2:
+            c1, c2 = c2, c1
+        if r1 > r2:
+            r1, r2 = r2, r1
+        if 1 <= c1 and c2 <= MAX_COL and 1 <= r1 and r2 <= MAX_ROW:
+            out.append(RangeRef(name, c1, r1, c2, r2))
+    return tuple(out)
+
+
+def range_address(ref: RangeRef) -> str:
+    """``Sheet!A1`` or ``Sheet!A1:B9`` (whole columns/rows keep their explicit bounds)."""
+    a = f"{index_to_col(ref.c1)}{ref.r1}"
+    if (ref.c1, ref.r1) == (ref.c2, ref.r2):
+        return f"{ref.sheet}!{a}"
+    return f"{ref.sheet}!{a}:{index_to_col(ref.c2)}{ref.r2}"
+
+
+class IntervalIndex:
+    """Static stabbing-query index over closed integer intervals.
+
+    Intervals are sorted by start and viewed as an implicit balanced binary
+    tree (node = middle of a slice); each node stores the largest end in its
+    subtree, so a query visits O(log n + hits) nodes.
+    """
+
+    def __init__(self, intervals):
+        items = sorted(intervals, key=lambda it: (it[0], it[1]))
+        self.starts = array('l', (it[0] for it in items))
+        self.ends = array('l', (it[1] for it in items))
+        self.payloads = [it[2] for it in items]
+        self.max_end = array('l', self.ends)
+        stack = [(0, len(items), False)]
+        while stack:                        # post-order fill of subtree maxima
+            lo, hi, done = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if not done:
+                stack.extend(((lo, hi, True), (lo, mid, False), (mid + 1, hi, False)))
+                continue
+            best = self.ends[mid]
+            if lo < mid:
+                best = max(best, self.max_end[(lo + mid) // 2])
+            if mid + 1 < hi:
+                best = max(best, self.max_end[(mid + 1 + hi) // 2])
+            self.max_end[mid] = best
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def stab(self, point: int):
+        """Payloads of every interval containing ``point``."""
+        hits, stack = [], [(0, len(self.payloads))]
+        starts, ends, max_end = self.starts, self.ends, self.max_end
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if max_end[mid] < point:
+                continue
+            stack.append((lo, mid))
+            if starts[mid] <= point:
+                if ends[mid] >= point:
+                    hits.append(self.payloads[mid])
+                stack.append((mid + 1, hi))
+        return hits
+
+
+class DependencyIndex:
+    """Range-aware dependency view of a ``WorkbookIndex``.
+
+    Formulas are numbered in ``index.formulas`` order (``cells[fid]``);
+    ``ranges[fid]`` holds that formula's references with sheet names resolved
+    case-insensitively to the workbook's spelling.
+    """
+
+    def __init__(self, source):
+        self.index = as_index(source)
+        canonical = {name.lower(): name for name in self.index.sheet_names}
+        self.cells = list(self.index.formulas)
+        self.ranges = []
+        self._sheet_of = []
+        # sheet -> (sorted formula columns, {col: (rows, fids)}) for position lookups
+        self._positions = {}
+        for fid, f in enumerate(self.cells):
+            refs = parse_ranges(f.formula, f.sheet)
+            if any(r.sheet != f.sheet and r.sheet not in self.index.formulas_by_sheet for r in refs):
+                refs = tuple(r._replace(sheet=canonical.get(r.sheet.lower(), r.sheet)) for r in refs)
+            self.ranges.append(refs)
+            self._sheet_of.append(f.sheet)
+            m = _CELL_RE.match(f.cell)
+            cols = self._positions.setdefault(f.sheet, ([], {}))[1]
+            rows, fids = cols.setdefault(col_to_index(m.group(1)), (array('l'), array('l')))
+            rows.append(int(m.group(2)))
+            fids.append(fid)
+        for sheet, (order, cols) in self._positions.items():
+            order.extend(sorted(cols))
+            for col, (rows, fids) in cols.items():
+                if any(a > b for a, b in zip(rows, rows[1:])):     # scan order is row-major already
+                    pairs = sorted(zip(rows, fids))
+                    cols[col] = (array('l', (p[0] for p in pairs)), array('l', (p[1] for p in pairs)))
+        self._readers = None
+        self._provenance = None
+
+    def formula_at(self, sheet: str, col: int, row: int):
+        """Formula id at a cell, or None."""
+        rows, fids = self._positions.get(sheet, ((), {}))[1].get(col, ((), ()))
+        i = bisect_left(rows, row)
+        return fids[i] if i < len(rows) and rows[i] == row else None
+
+    def formulas_within(self, ref: RangeRef):
+        """Formula ids inside ``ref`` (column by column, top to bottom)."""
+        order, cols = self._positions.get(ref.sheet, ((), {}))
+        out = []
+        for k in range(bisect_left(order, ref.c1), bisect_right(order, ref.c2)):
+            rows, fids = cols[order[k]]
+            out.extend(fids[bisect_left(rows, ref.r1):bisect_right(rows, ref.r2)])
+        return out
+
+    def dependents(self, sheet: str, col: int, row: int):
+        """Ids of formulas with a reference covering ``sheet!(col, row)``, ascending."""
+        if self._readers is None:
+            by_sheet = {}
+            for fid, refs in enumerate(self.ranges):
+                for ref in refs:
+                    by_sheet.setdefault(ref.sheet, []).append((ref.r1, ref.r2, (ref.c1, ref.c2, fid)))
+            self._readers = {s: IntervalIndex(items) for s, items in by_sheet.items()}
+        tree = self._readers.get(sheet)
+        if tree is None:
+            return []
+        return sorted({fid for c1, c2, fid in tree.stab(row) if c1 <= col <= c2})
+
+    def _local_precedents(self, fid: int):
+        sheet = self._sheet_of[fid]
+        for ref in self.ranges[fid]:
+            if ref.sheet == sheet:
+                yield from self.formulas_within(ref)
+
+    def provenance(self, fid: int):
+        """Cross-sheet ``RangeRef`` set a formula reads directly or through same-sheet formulas."""
+        if self._provenance is None:
+            self.closure()
+        return self._provenance[fid]
+
+    def closure(self):
+        """Memoized provenance for every formula; returns the list indexed by formula id.
+
+        Iterative Tarjan over the same-sheet precedent graph: strongly connected
+        components (circular references) share one result, and components are
+        finished precedents-first, so each formula's set is the union of its own
+        cross-sheet ranges and its precedents' already-computed sets. A set that
+        adds nothing to its single precedent's set is shared rather than copied,
+        so plain chains cost O(length) instead of O(length^2).
+        """
+        if self._provenance is not None:
+            return self._provenance
+        n = len(self.cells)
+        empty = frozenset()
+        prov = [None] * n
+        order = array('l', [-1]) * n
+        low = array('l', [0]) * n
+        on_stack = bytearray(n)
+        inherited = {}                      # fid -> finished precedent sets seen from it
+        stack, counter = [], 0
+        for root in range(n):
+            if order[root] != -1:
+                continue
+            order[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [(root, self._local_precedents(root))]
+            while work:
+                v, succ = work[-1]
+                for w in succ:
+                    if order[w] == -1:
+                        order[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack[w] = 1
+                        work.append((w, self._local_precedents(w)))
+                        break
+                    if on_stack[w]:
+                        low[v] = min(low[v], order[w])
+                    else:
+                        inherited.setdefault(v, []).append(prov[w])
+                else:
+                    work.pop()
+                    if work:
+                        u = work[-1][0]
+                        if on_stack[v]:
+                            low[u] = min(low[u], low[v])
+                    if low[v] != order[v]:
+                        continue
+                    members = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = 0
+                        members.append(w)
+                        if w == v:
+                            break
+                    sheet = self._sheet_of[v]
+                    own = {ref for m in members for ref in self.ranges[m] if ref.sheet != sheet}
+                    parts = {id(s): s for m in members for s in inherited.pop(m, ()) if s}
+                    if not own and len(parts) <= 1:
+                        result = next(iter(parts.values()), empty)
+                    else:
+                        result = frozenset(own).union(*parts.values())
+                    for m in members:
+                        prov[m] = result
+                    if work:
+                        inherited.setdefault(work[-1][0], []).append(result)
+        self._provenance = prov
+        return prov
@@ -0,0 +1,676 @@
+#!/usr/bin/env python3
+"""
+Vectorized formula evaluation and finite-difference reference sensitivities.
+
+The converters do not evaluate formulas: sheet and topic edges are weighted by
+reference counts and lineage edges by ``1 / len(refs)``, so a growth rate that
+drives a whole projection weighs the same as a footnote cell. ``WorkbookModel``
+evaluates the workbook instead:
+
+  - every formula is compiled once into a closure over a value matrix with one
+    row per cell and one column per scenario, so a pass evaluates all
+    scenarios with NumPy operations
+  - formula cells are evaluated in topological order of their dependencies
+    (circular references evaluate to NaN)
+  - ``derivatives`` perturbs a batch of source cells per pass (column 0 is the
+    unperturbed workbook, column j bumps source j) and only re-evaluates
+    formulas downstream of that batch
+
+``reference_sensitivities`` turns the forward differences into a signed
+influence per ``Sheet!A1`` reference: the elasticity d target / d source *
+|source| / |target| (magnitudes of zero count as 1), i.e. the first-order
+relative change of the target if the source doubled. Being dimensionless, it
+adds up across formulas of different scale (a currency total next to a
+ratio). ``reference_weights`` turns them into the absolute masses the
+converters sum and normalize per target sheet, topic target or cell; a
+negative influence becomes an ``opposes`` edge.
+
+Supported: numbers, TRUE/FALSE, ``+ - * / ^ %``, unary signs, comparisons,
+parentheses, cell and range references (same-sheet, ``Sheet!``,
+``'Quoted'!``, ``$`` anchors, ``A:C`` columns, ``2:5`` rows), SUM, AVERAGE,
+MIN, MAX, IF, IFERROR, ROUND and INDEX/MATCH lookups.
+
+  - blank cells read as 0; text cells and text literals are not numbers and
+    read as NaN (an error value), so ``IFERROR(x, "")`` is just ``x``
+  - ranges skip blank and text cells, as in Excel
+  - ROUND is exact in column 0; the perturbation columns see the change of the
+    unrounded value, since finite differences through a staircase would be
+    zero almost everywhere
+  - exact MATCH (type 0) and INDEX positions are resolved once at compile time,
+    so their keys and lookup ranges must be constant cells
+
+Anything else (``&``, other functions, defined names, external or 3-D
+references, implicit intersection, lookups over formulas) leaves the formula
+opaque. Opaque, circular and error cells are NaN, and references into or
+through them fall back to count weights (one typical reference's mass).
+
+Usage:
+    from excel_eval import WorkbookModel
+    model = WorkbookModel(path)                # or an index from scan_workbook(path, values=True)
+    model.value('Projection', 'B2')
+    sens = model.reference_sensitivities()     # (sheet, cell) -> influence per formula.refs entry
+    build_sheet_dependency_graph(index, sensitivity=sens)
+
+Or pass ``--evaluate`` to any of the converter CLIs.
+"""
+
+import re
+from collections import deque
+
+import numpy as np
+
+from excel_deps import parse_ranges
+from excel_index import as_index, col_to_index
+
+SENSITIVITY_BATCH = 32       # perturbed sources per evaluation pass (value matrix columns - 1)
+SENSITIVITY_STEP = 1e-6      # forward-difference step, relative to the source's magnitude
+ROW_BITS = 21                # cell keys for range lookups: column << ROW_BITS | row
+
+_CELL_RE = re.compile(r"\$?([A-Za-z]{1,3})\$?(\d+)$")
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<str>"(?:[^"]|"")*")
+      | (?P<func>[A-Za-z_][A-Za-z0-9_.]*)\s*(?=\()
+      | (?P<ref>(?:(?:'(?:[^']|'')+'|[A-Za-z0-9_.]+)!)?
+            (?:\$?[A-Za-z]{1,3}\$?\d+(?::\$?[A-Za-z]{1,3}\$?\d+)?
+              | \$?[A-Za-z]{1,3}:\$?[A-Za-z]{1,3}
+              | \$?\d+:\$?\d+)
+            (?![\w(!.]))
+      | (?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+      | (?P<bool>TRUE|FALSE)(?![\w(])
+      | (?P<op><=|>=|<>|[-+*/^&=<>%(),])
+      | (?P<name>\S+)
+    )\s*""", re.VERBOSE | re.IGNORECASE)
+
+_BINARY = {'+': np.add, '-': np.subtract, '*': np.multiply, '/': np.divide, '^': np.power}
+_COMPARE = {'=': np.equal, '<>': np.not_equal, '<': np.less, '>': np.greater,
+            '<=': np.less_equal, '>=': np.greater_equal}
+
+
+class FormulaError(ValueError):
+    """A formula uses syntax or functions the evaluator does not cover."""
+
+
+def _tokens(text: str):
+    pos, out = 0, []
+    while pos < len(text):
+        m = _TOKEN_RE.match(text, pos)
+        if not m or m.end() == pos:
+            raise FormulaError(f"cannot read {text[pos:pos + 12]!r}")
+        kind = m.lastgroup
+        out.append((kind, m.group(kind)))
+        pos = m.end()
+    return out
+
+
+def _finite(v):
+    """Excel errors (#DIV/0!, #NUM!) as NaN."""
+    return np.where(np.isfinite(v), v, np.nan)
+
+
+class _Compiler:
+    """Recursive-descent compiler from formula text to ``fn(X) -> value`` closures.
+
+    Excel precedence, loosest first: comparison, ``&``, ``+ -``, ``* /``,
+    ``^`` (left-associative), postfix ``%``, unary sign. A compiled node is
+    ``(fn, rng)``: ``rng`` is None for scalars and the ``RangeRef`` of a
+    multi-cell range otherwise, which only SUM/AVERAGE/MIN/MAX (values) and
+    INDEX/MATCH (positions) accept. ``reads`` collects the cell ids the
+    formula's value depends on.
+    """
+
+    def __init__(self, model, sheet: str, text: str):
+        self.model, self.sheet = model, sheet
+        self.toks = _tokens(text[1:] if text.startswith('=') else text)
+        self.pos = 0
+        self.reads = set()
+
+    def compile(self):
+        fn = self._scalar(self._compare())
+        if self.pos != len(self.toks):
+            raise FormulaError(f"unexpected {self.toks[self.pos][1]!r}")
+        return fn
+
+    def _peek(self):
+        return self.toks[self.pos] if self.pos < len(self.toks) else (None, None)
+
+    def _take(self, value=None):
+        kind, tok = self._peek()
+        if kind is None or (value is not None and tok != value):
+            raise FormulaError(f"expected {value or 'operand'}")
+        self.pos += 1
+        return kind, tok
+
+    @staticmethod
+    def _scalar(node):
+        fn, rng = node
+        if rng is not None:
+            raise FormulaError("range used as a value")
+        return fn
+
+    def _compare(self):
+        left = self._concat()
+        while self._peek()[1] in _COMPARE:
+            op = _COMPARE[self._take()[1]]
+            a, b = self._scalar(left), self._scalar(self._concat())
+            left = (lambda X, a=a, b=b, op=op: op(a(X), b(X)) * 1.0), None
+        return left
+
+    def _concat(self):
+        left = self._additive()
+        if self._peek()[1] == '&':
+            raise FormulaError("text concatenation")
+        return left
+
+    def _binary(self, ops, operand):
+        left = operand()
+        while self._peek()[1] in ops:
+            op = _BINARY[self._take()[1]]
+            a, b = self._scalar(left), self._scalar(operand())
+            left = (lambda X, a=a, b=b, op=op: op(a(X), b(X))), None
+        return left
+
+    def _additive(self):
+        return self._binary(('+', '-'), self._term)
+
+    def _term(self):
+        return self._binary(('*', '/'), self._power)
+
+    def _power(self):
+        return self._binary(('^',), self._percent)
+
+    def _percent(self):
+        node = self._unary()
+        while self._peek()[1] == '%':
+            self._take()
+            a = self._scalar(node)
+            node = (lambda X, a=a: a(X) / 100.0), None
+        return node
+
+    def _unary(self):
+        if self._peek()[1] in ('-', '+'):
+            sign = self._take()[1]
+            a = self._scalar(self._unary())
+            return ((lambda X, a=a: -a(X)) if sign == '-' else a), None
+        return self._primary()
+
+    def _primary(self):
+        kind, tok = self._take()
+        if kind == 'num':
+            c = float(tok)
+            return (lambda X, c=c: c), None
+        if kind == 'bool':
+            c = 1.0 if tok.upper() == 'TRUE' else 0.0
+            return (lambda X, c=c: c), None
+        if kind == 'ref':
+            return self._reference(tok)
+        if kind == 'func':
+            return self._call(tok.upper())
+        if tok == '(':
+            node = self._compare()
+            self._take(')')
+            return node
+        if kind == 'str':
+            return (lambda X: np.nan), None
+        raise FormulaError(f"unsupported {tok!r}")
+
+    def _reference(self, tok: str):
+        refs = parse_ranges(tok, self.sheet)
+        if len(refs) != 1:
+            raise FormulaError(f"unsupported reference {tok!r}")
+        ref = self.model._canonical(refs[0])
+        if ':' not in tok:
+            return self._cell(ref.sheet, ref.c1, ref.r1)
+        ids = self.model._cells_within(ref)
+        return (lambda X, ids=ids: X[ids]), ref
+
+    def _cell(self, sheet: str, col: int, row: int):
+        i = self.model._intern(sheet, col, row)
+        self.reads.add(i)
+        return (lambda X, i=i: X[i]), None
+
+    def _static(self, node) -> float:
+        """Value of an argument that may only depend on constants (lookup positions)."""
+        v = self.model._static_value(self._scalar(node))
+        if np.isnan(v) and self.model._reads_formulas(self._scalar(node)):
+            raise FormulaError("lookup position depends on formulas")
+        return v
+
+    def _index(self, args):
+        if not 2 <= len(args) <= 3 or args[0][1] is None:
+            raise FormulaError("INDEX takes a range and 1 or 2 positions")
+        rng = args[0][1]
+        row = self._static(args[1])
+        col = self._static(args[2]) if len(args) > 2 else 1.0
+        if len(args) == 2 and rng.r1 == rng.r2 and rng.c1 != rng.c2:
+            row, col = 1.0, row                 # INDEX(row_range, n) picks the n-th column
+        if np.isnan(row) or np.isnan(col):
+            return (lambda X: np.nan), None     # #N/A from a failed MATCH
+        row, col = int(row), int(col)
+        if not (1 <= row <= rng.r2 - rng.r1 + 1 and 1 <= col <= rng.c2 - rng.c1 + 1):
+            raise FormulaError("INDEX position outside its range or a whole row/column")
+        return self._cell(rng.sheet, rng.c1 + col - 1, rng.r1 + row - 1)
+
+    def _match(self):
+        """Exact MATCH (type 0) over constant cells, resolved once at compile time."""
+        self._take('(')
+        kind, tok = self._peek()
+        after = self.toks[self.pos + 1][1] if self.pos + 1 < len(self.toks) else None
+        if kind == 'str' and after == ',':
+            key = self._take()[1][1:-1].replace('""', '"')
+        elif kind == 'ref' and ':' not in tok and after == ',':
+            self._take()
+            ref = self.model._canonical(parse_ranges(tok, self.sheet)[0])
+            key = self.model._constant(ref.sheet, ref.c1, ref.r1)
+        else:
+            key = self._static(self._compare())
+        self._take(',')
+        rng = self._compare()[1]
+        match_type = 1.0
+        if self._peek()[1] == ',':
+            self._take()
+            match_type = self._static(self._compare())
+        self._take(')')
+        if rng is None or (rng.r1 != rng.r2 and rng.c1 != rng.c2):
+            raise FormulaError("MATCH needs a single row or column")
+        if match_type != 0:
+            raise FormulaError("approximate MATCH")
+        pos = self.model._match_position(rng, key)
+        return (lambda X, pos=pos: pos), None
+
+    def _args(self):
+        self._take('(')
+        args = []
+        if self._peek()[1] != ')':
+            args.append(self._compare())
+            while self._peek()[1] == ',':
+                self._take()
+                args.append(self._compare())
+        self._take(')')
+        return args
+
+    def _call(self, name: str):
+        if name == 'MATCH':
+            return self._match()
+        args = self._args()
+        if name == 'INDEX':
+            return self._index(args)
+        if name == 'IF':
+            if not 2 <= len(args) <= 3:
+                raise FormulaError("IF takes 2 or 3 arguments")
+            c, a = self._scalar(args[0]), self._scalar(args[1])
+            b = self._scalar(args[2]) if len(args) > 2 else (lambda X: 0.0)
+
+            def fn(X):
+                cond = np.asarray(c(X), dtype=float)
+                return np.where(np.isnan(cond), np.nan, np.where(cond != 0, a(X), b(X)))
+            return fn, None
+        if name == 'IFERROR':
+            if len(args) != 2:
+                raise FormulaError("IFERROR takes 2 arguments")
+            a, b = self._scalar(args[0]), self._scalar(args[1])
+
+            def fn(X):
+                v = _finite(a(X))
+                return np.where(np.isnan(v), b(X), v)
+            return fn, None
+        if name == 'ROUND':
+            if len(args) != 2:
+                raise FormulaError("ROUND takes 2 arguments")
+            a, d = self._scalar(args[0]), self._scalar(args[1])
+
+            def fn(X):
+                v, scale = a(X), 10.0 ** np.trunc(d(X))
+                r = np.sign(v) * np.floor(np.abs(v) * scale + 0.5) / scale      # half away from zero
+                if np.ndim(v) == 0:
+                    return r
+                return r[:1] + (v - v[:1])          # perturbation columns see the unrounded change
+            return fn, None
+        if name not in ('SUM', 'AVERAGE', 'MIN', 'MAX'):
+            raise FormulaError(f"unsupported function {name}")
+        args = [(fn, None if rng is None else self.model._cells_within(rng)) for fn, rng in args]
+        args = [(fn, ids) for fn, ids in args if ids is None or len(ids)]        # empty ranges add nothing
+        for _, ids in args:
+            if ids is not None:
+                self.reads.update(ids.tolist())
+        count = sum(1 if ids is None else len(ids) for _, ids in args)
+        if name in ('SUM', 'AVERAGE'):
+            def total(X):
+                out = 0.0
+                for fn, ids in args:
+                    out = out + (fn(X) if ids is None else fn(X).sum(axis=0))
+                return out
+            if name == 'SUM':
+                return total, None
+            return (lambda X: total(X) / count if count else np.nan), None
+        reduce, pick = (np.minimum, 'min') if name == 'MIN' else (np.maximum, 'max')
+
+        def extreme(X):
+            out = None
+            for fn, ids in args:
+                v = fn(X) if ids is None else getattr(fn(X), pick)(axis=0)
+                out = v if out is None else reduce(out, v)
+            return 0.0 if out is None else out
+        return extreme, None
+
+
+class WorkbookModel:
+    """Compiled, evaluable view of a workbook's formulas.
+
+    Attributes:
+        index: the ``WorkbookIndex`` whose formulas are compiled
+        cells: (sheet, column, row) per cell id: number, text and formula
+            cells, then referenced blanks
+        base: evaluated value per cell id (NaN for opaque or circular formulas)
+        errors: (sheet, cell) -> reason, for formulas that evaluate to NaN
+            because they could not be compiled or are circular
+    """
+
+    def __init__(self, source):
+        self.index = as_index(source, values=True)
+        if self.index.values_by_sheet is None:
+            raise ValueError("WorkbookModel needs the constants: scan_workbook(path, values=True)")
+        self._sheets = {name.lower(): name for name in self.index.sheet_names}
+        self.cells, self._ids = [], {}
+        self._values, self._text = self._read_cells()
+        formulas = list(self.index.formulas)
+        targets = [self._intern(f.sheet, *self._position(f.cell)) for f in formulas]
+        self._formulas = set(targets)
+        self._nonblank = self._cell_index()
+        self._within, self._lookups = {}, {}
+        self._x0 = np.zeros(0)
+        self.errors = {}
+        fns, reads = {}, {}
+        for f, t in zip(formulas, targets):
+            comp = _Compiler(self, f.sheet, f.formula)
+            try:
+                fns[t] = comp.compile()
+            except FormulaError as e:
+                self.errors[(f.sheet, f.cell)] = str(e)
+                continue
+            reads[t] = comp.reads
+            for ref in f.refs:              # so reference_sensitivities can always look refs up
+                sheet = self._sheets.get(ref.sheet.lower())
+                if sheet is not None:
+                    self._intern(sheet, col_to_index(ref.col), ref.row)
+        self._fns = fns
+        self._order = self._topological(formulas, targets, fns, reads)
+        self._rank = {c: k for k, c in enumerate(self._order)}
+        self.base = self._constants_vector()
+        X = self.base[:, None].copy()
+        self._evaluate(X, self._order)
+        self.base = X[:, 0]
+
+    # -- cells --
+
+    @staticmethod
+    def _position(cell: str):
+        m = _CELL_RE.match(cell)
+        return col_to_index(m.group(1)), int(m.group(2))
+
+    def _intern(self, sheet: str, col: int, row: int) -> int:
+        key = (sheet, col, row)
+        i = self._ids.get(key)
+        if i is None:
+            i = self._ids[key] = len(self.cells)
+            self.cells.append(key)
+        return i
+
+    def _canonical(self, ref):
+        sheet = self._sheets.get(ref.sheet.lower())
+        if sheet is None:
+            raise FormulaError(f"unknown sheet {ref.sheet!r}")
+        return ref._replace(sheet=sheet)
+
+    def _cell_index(self):
+        """Sheet -> (sorted column-major keys, cell ids, distinct columns) of the cells interned so far."""
+        by_sheet = {}
+        for i, (sheet, c, r) in enumerate(self.cells):
+            by_sheet.setdefault(sheet, []).append(((c << ROW_BITS) | r, i))
+        out = {}
+        for sheet, entries in by_sheet.items():
+            entries.sort()
+            keys = np.array([k for k, _ in entries], dtype=np.int64)
+            out[sheet] = (keys, np.array([i for _, i in entries], dtype=np.int64), np.unique(keys >> ROW_BITS))
+        return out
+
+    def _in_range(self, ref) -> np.ndarray:
+        """Ids of the number, text and formula cells inside a ``RangeRef``, column by column."""
+        hit = self._nonblank.get(ref.sheet)
+        if hit is None:
+            return np.zeros(0, dtype=np.int64)
+        keys, ids, cols = hit
+        cols = cols[np.searchsorted(cols, ref.c1):np.searchsorted(cols, ref.c2, side='right')]
+        lo = np.searchsorted(keys, (cols << ROW_BITS) | ref.r1)
+        hi = np.searchsorted(keys, (cols << ROW_BITS) | ref.r2, side='right')
+        return np.concatenate([ids[a:b] for a, b in zip(lo, hi)] or [np.zeros(0, dtype=np.int64)])
+
+    def _cells_within(self, ref) -> np.ndarray:
+        """Ids of the number and formula cells inside a ``RangeRef`` (what SUM and friends read)."""
+        ids = self._within.get(ref)
+        if ids is None:
+            ids = self._in_range(ref)
+            ids = self._within[ref] = ids[[i not in self._text for i in ids.tolist()]] if self._text else ids
+        return ids
+
+    def _read_cells(self):
+        """Intern the scanned constants; returns ({cell id: number}, {cell id: text})."""
+        values, text = {}, {}
+        for sheet in self.index.sheet_names:
+            for r, c, v in self.index.values_by_sheet.get(sheet) or ():
+                (text if isinstance(v, str) else values)[self._intern(sheet, c, r)] = v
+        return values, text
+
+    def _constants_vector(self) -> np.ndarray:
+        """Value per cell id before evaluation: numbers, 0 for blanks, NaN for text and formulas."""
+        x = np.zeros(len(self.cells))
+        x[list(self._values)] = list(self._values.values())
+        x[list(self._text) + list(self._formulas)] = np.nan
+        return x
+
+    def _static_value(self, fn) -> float:
+        if len(self._x0) != len(self.cells):
+            self._x0 = self._constants_vector()[:, None]
+        with np.errstate(all='ignore'):
+            return float(np.asarray(fn(self._x0)).reshape(-1)[0])
+
+    def _reads_formulas(self, fn) -> bool:
+        x = self._constants_vector()[:, None]
+        x[list(self._formulas)] = 0.0
+        with np.errstate(all='ignore'):
+            return not np.isnan(np.asarray(fn(x)).reshape(-1)[0])
+
+    def _constant(self, sheet: str, col: int, row: int):
+        """Number or text of a non-formula cell (None if blank); formulas are not constant."""
+        i = self._ids.get((sheet, col, row))
+        if i in self._formulas:
+            raise FormulaError("lookup key is a formula")
+        return self._text.get(i, self._values.get(i))
+
+    def _match_position(self, ref, key) -> float:
+        """1-based position of the first cell equal to ``key`` in a one-dimensional range, NaN if none."""
+        table = self._lookups.get(ref)
+        if table is None:
+            ids = self._in_range(ref).tolist()
+            if any(i in self._formulas for i in ids):
+                raise FormulaError("lookup range contains formulas")
+            table = self._lookups[ref] = {}
+            for i in ids:
+                _, c, r = self.cells[i]
+                v = self._text.get(i, self._values.get(i))
+                table.setdefault(v.casefold() if isinstance(v, str) else v, (c - ref.c1) + (r - ref.r1) + 1)
+        if isinstance(key, str):
+            key = key.casefold()
+        return float(table.get(key, np.nan))
+
+    def cell_id(self, sheet: str, cell: str):
+        """Cell id of ``sheet!cell`` (e.g. ``'B2'``), or None if the model never saw it."""
+        return self._ids.get((self._sheets.get(sheet.lower()), *self._position(cell)))
+
+    def value(self, sheet: str, cell: str) -> float:
+        i = self.cell_id(sheet, cell)
+        return 0.0 if i is None else float(self.base[i])
+
+    # -- evaluation --
+
+    def _topological(self, formulas, targets, fns, reads):
+        """Kahn order of the compiled formula cells; circular ones are left out (and noted in ``errors``)."""
+        readers = {}                # cell id -> formula cells reading it (constants and blanks too)
+        pending = {}
+        for t in fns:
+            pending[t] = sum(r in fns for r in reads[t])
+            for r in reads[t]:
+                if r != t:
+                    readers.setdefault(r, []).append(t)
+        self._readers = readers
+        ready = deque(t for t in targets if pending.get(t) == 0)
+        order = []
+        while ready:
+            c = ready.popleft()
+            order.append(c)
+            for t in readers.get(c, ()):
+                if t not in fns:
+                    continue
+                pending[t] -= 1
+                if pending[t] == 0:
+                    ready.append(t)
+        done = set(order)
+        for f, t in zip(formulas, targets):
+            if t in fns and t not in done:
+                self.errors[(f.sheet, f.cell)] = "circular reference"
+        return order
+
+    def _evaluate(self, X: np.ndarray, cells, bumps=None):
+        """Evaluate formula ``cells`` (topological order) into rows of ``X``; re-apply ``bumps`` after each."""
+        fns = self._fns
+        with np.errstate(all='ignore'):
+            for c in cells:
+                X[c] = _finite(fns[c](X))
+                if bumps and c in bumps:
+                    col, h = bumps[c]
+                    X[c, col] += h
+
+    def _downstream(self, sources):
+        """Compiled, non-circular formula cells reading ``sources`` directly or indirectly, in evaluation order."""
+        seen, stack = set(), list(sources)
+        readers = self._readers
+        while stack:
+            for t in readers.get(stack.pop(), ()):
+                if t not in seen:
+                    seen.add(t)
+                    stack.append(t)
+        for s in sources:
+            if s in self._fns:
+                seen.add(s)             # a perturbed formula must keep its bump when re-evaluated
+        return sorted((c for c in seen if c in self._rank), key=self._rank.__getitem__)
+
+    def derivatives(self, pairs, batch: int = SENSITIVITY_BATCH, rel_step: float = SENSITIVITY_STEP) -> np.ndarray:
+        """Forward-difference d target / d source for each (source id, target id) pair.
+
+        Sources are perturbed ``batch`` at a time by ``rel_step`` times their
+        magnitude (1 for zeros); NaN where either cell is opaque or circular.
+        """
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        out = np.full(len(pairs), np.nan)
+        sources = np.unique(pairs[:, 0])
+        scale = self.scale(sources)
+        # One buffer for all passes; after each pass only the rows it wrote go back to base
+        buf = np.repeat(self.base[:, None], min(batch, len(sources)) + 1, axis=1)
+        for start in range(0, len(sources), batch):
+            chunk, h = sources[start:start + batch], rel_step * scale[start:start + batch]
+            cols = np.arange(1, len(chunk) + 1)
+            X = buf[:, :len(chunk) + 1]
+            X[chunk, cols] += h
+            cells = self._downstream(chunk.tolist())
+            self._evaluate(X, cells, dict(zip(chunk.tolist(), zip(cols, h))))
+            pick = np.flatnonzero(np.isin(pairs[:, 0], chunk))
+            j = np.searchsorted(chunk, pairs[pick, 0])
+            t = pairs[pick, 1]
+            with np.errstate(all='ignore'):
+                out[pick] = (X[t, j + 1] - X[t, 0]) / h[j]
+            touched = np.concatenate([chunk, np.asarray(cells, dtype=np.int64)])
+            buf[touched] = self.base[touched, None]
+        return out
+
+    def scale(self, ids) -> np.ndarray:
+        """|value| per cell id, with 1 for zeros and NaNs (the unit of a relative perturbation)."""
+        s = np.abs(self.base[ids])
+        return np.where(s > 0, s, 1.0)
+
+    def reference_sensitivities(self, batch: int = SENSITIVITY_BATCH, rel_step: float = SENSITIVITY_STEP) -> dict:
+        """(sheet, cell) -> signed influence of each of the formula's ``refs`` on its value.
+
+        Influence is the elasticity d target / d source times the source's
+        ``scale`` over the target's; a cell referenced k times gets 1/k of it
+        per reference. Entries are NaN where the formula or the referenced cell
+        cannot be evaluated.
+        """
+        formulas = list(self.index.formulas)
+        pairs, owner = [], []
+        for k, f in enumerate(formulas):
+            t = self.cell_id(f.sheet, f.cell)
+            for n, ref in enumerate(f.refs):
+                sheet = self._sheets.get(ref.sheet.lower())
+                s = self._ids.get((sheet, col_to_index(ref.col), ref.row))
+                if s is not None and t in self._fns:
+                    pairs.append((s, t))
+                    owner.append((k, n))
+        d = self.derivatives(pairs, batch, rel_step) if pairs else np.zeros(0)
+        ids = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+        influence = d * self.scale(ids[:, 0]) / self.scale(ids[:, 1])
+        out = {(f.sheet, f.cell): np.full(len(f.refs), np.nan) for f in formulas}
+        for (k, n), v in zip(owner, influence):
+            out[(formulas[k].sheet, formulas[k].cell)][n] = v
+        for f in formulas:
+            keys = [(ref.sheet.lower(), ref.col.upper(), ref.row) for ref in f.refs]
+            if len(set(keys)) < len(keys):
+                counts = {key: keys.count(key) for key in keys}
+                out[(f.sheet, f.cell)] /= [counts[key] for key in keys]
+        return out
+
+
+def influence_unit(sensitivity) -> float:
+    """Median nonzero |influence| over all references (1 without any): what one count is worth."""
+    if not sensitivity:
+        return 1.0
+    mags = np.abs(np.concatenate([np.asarray(v, dtype=float).reshape(-1) for v in sensitivity.values()] or [np.zeros(0)]))
+    mags = mags[np.isfinite(mags) & (mags > 0)]
+    return float(np.median(mags)) if len(mags) else 1.0
+
+
+def reference_weights(sensitivity, formula, positions=None, unit: float = 1.0):
+    """(masses, signs) for the ``formula.refs`` entries at ``positions`` (default: all).
+
+    Without sensitivities every reference weighs 1 and supports, which
+    reproduces the converters' reference counts. Otherwise a reference weighs
+    its absolute (dimensionless) influence, so how strongly a formula depends
+    on it carries into the converters' per-target normalization, and negative
+    influences are marked -1. Only references with an unknown (NaN) influence fall back to a count:
+    the mean known mass of the same formula, or ``unit``
+    (``influence_unit``) when it has none.
+    """
+    picks = list(range(len(formula.refs)) if positions is None else positions)
+    n = len(picks)
+    infl = None if sensitivity is None else sensitivity.get((formula.sheet, formula.cell))
+    if infl is None or n == 0:
+        return [1.0] * n, [1] * n
+    infl = np.asarray(infl, dtype=float)
+    known = np.abs(infl[np.isfinite(infl)])
+    fill = known.mean() if len(known) and known.mean() > 0 else unit
+    picked = infl[picks]
+    mass = np.where(np.isfinite(picked), np.abs(picked), fill)
+    return mass.tolist(), [(-1 if v < 0 else 1) for v in picked]
+
+
+def pop_evaluate_arg(argv):
+    """Strip ``--evaluate`` from ``argv``; returns (remaining args, flag)."""
+    return [a for a in argv if a != '--evaluate'], '--evaluate' in argv
+
+
+def evaluate_index(index) -> dict:
+    """``reference_sensitivities`` for a scanned workbook, reporting opaque formulas to stdout."""
+    model = WorkbookModel(index)
+    sens = model.reference_sensitivities()
+    print(f"Evaluated {len(model._order)} formulas ({len(model.errors)} opaque or circular;"
+          f" their references fall back to count weights)")
+    return sens
@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+"""
+Shared formula-reference index for the Excel → Minimal JSON converters.
+
+Purpose
+-------
+``excel_to_minimal.py`` (sheet deps), ``excel_topics_to_minimal.py`` (topic
+deps) and ``excel_lineage_to_minimal.py`` (cell lineage) all need the same
+thing: every formula cell and the ``Sheet!A1`` references it contains. Instead
+of each converter reopening the workbook and regex-scanning every cell (the
+lineage converter even scanned twice), ``scan_workbook`` streams the workbook
+once and records a ``WorkbookIndex``. The three graphs are projections of it.
+
+Usage
+-----
+    from excel_index import scan_workbook
+    index = scan_workbook(Path("model.xlsx"))
+    sheet_graph = build_sheet_dependency_graph(index)
+    topic_graph = build_topic_graph(index)
+    lineage_graph = build_lineage_graph(index)
+
+Or write all three outputs from one scan with ``excel_all_to_minimal.py``.
+
+The scan also captures each sheet's header band (top 10 rows) and label
+columns (first 3 columns), so ``column_header`` / ``row_label`` are dictionary
+lookups behind a bounded LRU cache instead of ``ws.cell()`` calls, which
+re-stream the sheet XML on every access in read-only mode.
+
+Sheets are independent, so ``scan_workbook(path, workers=N)`` (``--workers N``
+on the converter CLIs) scans them in a process pool and merges the per-sheet
+results in workbook order; output is byte-identical to the serial scan.
+``backend='xml'`` (``--backend xml``) reads the sheet XML directly with
+``xlsx_stream`` instead of building openpyxl cells, with openpyxl as fallback.
+``cache_dir=...`` (``--cache DIR``) keeps each sheet's scan result keyed by the
+sheet XML's content hash, so re-converting a re-exported workbook only parses
+the sheets that changed. ``values=True`` also keeps every number and text
+constant (``WorkbookIndex.values_by_sheet``), which formula evaluation
+(``excel_eval.py``) reads instead of opening the workbook a second time.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import zipfile
+from collections import Counter, namedtuple
+from datetime import date, datetime, time, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from xml.etree.ElementTree import ParseError
+
+try:
+    from openpyxl import load_workbook
+    from openpyxl.utils.datetime import to_excel
+except Exception:
+    print("Missing dependency 'openpyxl'. Install with: pip install openpyxl", file=sys.stderr)
+    raise
+
+import xlsx_stream
+
+
+CELL_REF_RE = re.compile(r"(?:(?:'([^']+)')|([A-Za-z0-9_]+))!\$?([A-Za-z]{1,3})\$?(\d+)")
+
+# Header band / label column captured during the scan (see WorkbookIndex.column_header)
+HEADER_BAND_ROWS = 10
+LABEL_COLUMNS = 3
+HEADER_CACHE_SIZE = 4096
+
+SCAN_BACKENDS = ('openpyxl', 'xml')
+# Bump when the cached per-sheet result layout (or what the scan captures) changes
+CACHE_VERSION = 2
+XML_SCAN_ERRORS = (zipfile.BadZipFile, KeyError, IndexError, ValueError, AttributeError, ParseError)
+
+# One cross-sheet-capable reference inside a formula: (sheet, column letters, row)
+CellRef = namedtuple('CellRef', 'sheet col row')
+# One formula cell: owning sheet, A1 address, formula text, parsed references
+FormulaCell = namedtuple('FormulaCell', 'sheet cell formula refs')
+
+
+def col_to_index(col_letters: str) -> int:
+    idx = 0
+    for ch in col_letters.upper():
+        idx = idx * 26 + (ord(ch) - ord('A') + 1)
+    return idx
+
+
+def index_to_col(idx: int) -> str:
+    letters = ''
+    n = idx
+    while n:
+        n, rem = divmod(n-1, 26)
+        letters = chr(65 + rem) + letters
+    return letters or 'A'
+
+
+def _text(val):
+    """Stripped text of a string cell value, or None for blanks and non-strings."""
+    if isinstance(val, str):
+        t = val.strip()
+        if t:
+            return t
+    return None
+
+
+def parse_refs(formula: str):
+    """Return ``CellRef`` tuples for every Sheet!A1 reference in ``formula``."""
+    refs = []
+    for m in CELL_REF_RE.finditer(formula):
+        name = (m.group(1) or m.group(2) or '').strip()
+        if name:
+            refs.append(CellRef(name, m.group(3), int(m.group(4))))
+    return tuple(refs)
+
+
+class WorkbookIndex:
+    """Formula-reference index built by a single pass over a workbook.
+
+    Attributes:
+        path: source workbook path
+        sheet_names: sheet names in workbook order
+        formulas_by_sheet: sheet -> ``FormulaCell`` records in row-major order
+        formula_counts: Counter sheet -> number of formula cells
+        headers_by_sheet: sheet -> {col: (row, text)}, first text cell in the
+            top ``HEADER_BAND_ROWS`` rows of each column
+        row_labels_by_sheet: sheet -> {row: (col, text)}, first text cell in the
+            first ``LABEL_COLUMNS`` columns of each row
+        values_by_sheet: sheet -> [(row, col, value)] number (float) and text
+            constants in row-major order, or None unless scanned with
+            ``values=True``
+        workbook: the read-only openpyxl workbook, only used for lookups that
+            reach beyond the captured header band / label columns (opened
+            lazily after a streaming-XML or cached scan)
+        reused_sheets / parsed_sheets: with a scan cache, the sheets taken from
+            the cache and the sheets that were (re)parsed; empty otherwise
+    """
+
+    def __init__(self, path: Path, sheet_names, formulas_by_sheet, headers_by_sheet=None,
+                 row_labels_by_sheet=None, workbook=None, header_cache_size: int = HEADER_CACHE_SIZE,
+                 values_by_sheet=None):
+        self.path = path
+        self.sheet_names = list(sheet_names)
+        self.formulas_by_sheet = formulas_by_sheet
+        self.formula_counts = Counter({s: len(fs) for s, fs in formulas_by_sheet.items() if fs})
+        self.headers_by_sheet = headers_by_sheet or {}
+        self.row_labels_by_sheet = row_labels_by_sheet or {}
+        self.values_by_sheet = values_by_sheet
+        self._workbook = workbook
+        self.reused_sheets, self.parsed_sheets = [], []
+        # Bounded memo of (sheet, col, max_scan_rows) -> header, per index
+        self.column_header = lru_cache(maxsize=header_cache_size)(self._column_header)
+
+    @property
+    def workbook(self):
+        """Read-only openpyxl workbook; opened on first use if the scan did not keep one."""
+        if self._workbook is None and self.path is not None and Path(self.path).exists():
+            self._workbook = load_workbook(filename=str(self.path), data_only=False, read_only=True)
+        return self._workbook
+
+    @workbook.setter
+    def workbook(self, wb):
+        self._workbook = wb
+
+    @property
+    def formulas(self):
+        """All formula cells in scan order (sheet by sheet, row-major)."""
+        for sname in self.sheet_names:
+            yield from self.formulas_by_sheet.get(sname, ())
+
+    def formulas_in(self, sheet: str):
+        return self.formulas_by_sheet.get(sheet, [])
+
+    def worksheet(self, name: str):
+        return self.workbook[name]
+
+    def _column_header(self, sheet: str, col_idx: int, max_scan_rows: int = HEADER_BAND_ROWS) -> str:
+        """First text cell in the top ``max_scan_rows`` rows of a column; fallback "Col <letter>"."""
+        hit = self.headers_by_sheet.get(sheet, {}).get(col_idx)
+        if hit and hit[0] <= max_scan_rows:
+            return hit[1]
+        if max_scan_rows > HEADER_BAND_ROWS and self.workbook is not None:
+            ws = self.worksheet(sheet)
+            for r in range(HEADER_BAND_ROWS + 1, max_scan_rows + 1):
+                t = _text(ws.cell(row=r, column=col_idx).value)
+                if t:
+                    return t
+        return f"Col {index_to_col(col_idx)}"
+
+    def row_label(self, sheet: str, row_idx: int, max_scan_cols: int = LABEL_COLUMNS) -> str:
+        """First text cell in the first ``max_scan_cols`` columns of a row; fallback "Row <n>"."""
+        hit = self.row_labels_by_sheet.get(sheet, {}).get(row_idx)
+        if hit and hit[0] <= max_scan_cols:
+            return hit[1]
+        if max_scan_cols > LABEL_COLUMNS and self.workbook is not None:
+            ws = self.worksheet(sheet)
+            for c in range(LABEL_COLUMNS + 1, max_scan_cols + 1):
+                t = _text(ws.cell(row=row_idx, column=c).value)
+                if t:
+                    return t
+        return f"Row {row_idx}"
+
+
+def index_sheet_values(sname: str, values, keep_values: bool = False):
+    """Index one sheet from ``(row, col, address, value)`` string (and number) cells.
+
+    Returns (formula cells, header band, row labels, constants). ``address`` is
+    only read for formula values, so backends may pass None for plain text.
+    ``constants`` lists ``(row, col, value)`` for numbers and non-blank text
+    with ``keep_values``, else it is None.
+    """
+    cells, headers, labels = [], {}, {}
+    constants = [] if keep_values else None
+    for r, c, address, val in values:
+        if not isinstance(val, str):
+            if keep_values:
+                constants.append((r, c, val))
+            continue
+        if val.startswith('='):
+            cells.append(FormulaCell(sname, address, val, parse_refs(val)))
+        elif keep_values and val.strip():
+            constants.append((r, c, val))
+        if r <= HEADER_BAND_ROWS and c not in headers:
+            t = _text(val)
+            if t:
+                headers[c] = (r, t)
+        if c <= LABEL_COLUMNS and r not in labels:
+            t = _text(val)
+            if t:
+                labels[r] = (c, t)
+    return cells, headers, labels, constants
+
+
+def _openpyxl_values(ws, numbers: bool = False):
+    """String cells of a read-only worksheet; only strings can be formulas, headers or labels.
+
+    With ``numbers`` also number, boolean and date cells as floats (dates as
+    serials in the workbook's date system), matching ``iter_sheet_values``.
+    """
+    epoch = ws.parent.epoch if numbers else None
+    for r, row in enumerate(ws.iter_rows(), start=1):
+        for c, cell in enumerate(row, start=1):
+            val = cell.value
+            if isinstance(val, str):
+                yield r, c, (f"{cell.column_letter}{cell.row}" if val.startswith('=') else None), val
+            elif not numbers or val is None:
+                continue
+            elif isinstance(val, (int, float)):
+                yield r, c, None, float(val)
+            elif isinstance(val, (datetime, date, time, timedelta)):
+                yield r, c, None, float(to_excel(val, epoch))
+
+
+def scan_sheet(ws, sname: str, values: bool = False):
+    """Index one openpyxl worksheet: (formula cells, header band, row labels, constants)."""
+    return index_sheet_values(sname, _openpyxl_values(ws, values), values)
+
+
+def _scan_sheets_openpyxl(xlsx_path: str, sheet_names, values: bool = False):
+    """Process-pool entry point: open a private read-only handle and scan ``sheet_names``."""
+    wb = load_workbook(filename=xlsx_path, data_only=False, read_only=True)
+    try:
+        return [scan_sheet(wb[sname], sname, values) for sname in sheet_names]
+    finally:
+        wb.close()
+
+
+def _scan_sheets_xml(xlsx_path: str, sheets, sst_part, values: bool = False):
+    """Streaming-XML counterpart of ``_scan_sheets_openpyxl``; ``sheets`` is [(name, part)]."""
+    out = []
+    with xlsx_stream.open_package(xlsx_path) as zf:
+        strings = xlsx_stream.read_shared_strings(zf, sst_part)
+        epoch = xlsx_stream.workbook_epoch(zf) if values else None
+        for sname, part in sheets:
+            if part is None:
+                out.append(([], {}, {}, [] if values else None))
+                continue
+            with zf.open(part) as src:
+                cells = xlsx_stream.iter_sheet_values(src, strings, values, epoch)
+                out.append(index_sheet_values(sname, cells, values))
+    return out
+
+
+def _partition(items, n_parts: int):
+    """Split ``items`` into ``n_parts`` contiguous, order-preserving chunks."""
+    size, extra = divmod(len(items), n_parts)
+    chunks, start = [], 0
+    for i in range(n_parts):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+def _map_chunks(worker, xlsx_path: Path, items, workers: int, *extra):
+    """Run ``worker(path, chunk, *extra)`` over contiguous chunks; results stay in ``items`` order."""
+    chunks = _partition(items, max(1, min(workers, len(items))))
+    if len(chunks) <= 1:
+        return worker(str(xlsx_path), items, *extra)
+    n = len(chunks)
+    with ProcessPoolExecutor(max_workers=n) as pool:
+        parts = pool.map(worker, [str(xlsx_path)] * n, chunks, *([e] * n for e in extra))
+        return [res for part in parts for res in part]
+
+
+def _build_index(xlsx_path: Path, sheet_names, results, workbook=None) -> WorkbookIndex:
+    formulas_by_sheet, headers_by_sheet, row_labels_by_sheet, values_by_sheet = {}, {}, {}, {}
+    for sname, (cells, headers, labels, constants) in zip(sheet_names, results):
+        formulas_by_sheet[sname] = cells
+        headers_by_sheet[sname] = headers
+        row_labels_by_sheet[sname] = labels
+        values_by_sheet[sname] = constants
+    if any(v is None for v in values_by_sheet.values()):
+        values_by_sheet = None
+    return WorkbookIndex(Path(xlsx_path), sheet_names, formulas_by_sheet, headers_by_sheet,
+                         row_labels_by_sheet, workbook=workbook, values_by_sheet=values_by_sheet)
+
+
+def _scan_parts(xlsx_path: Path, sheets, sst_part, workers: int, backend: str, values: bool = False):
+    """Scan the given [(name, part)] sheets with ``backend``; XML failures fall back to openpyxl."""
+    if backend == 'xml':
+        try:
+            return _map_chunks(_scan_sheets_xml, xlsx_path, sheets, workers, sst_part, values)
+        except XML_SCAN_ERRORS as exc:
+            print(f"Streaming XML scan failed ({exc!r}); falling back to openpyxl", file=sys.stderr)
+    return _map_chunks(_scan_sheets_openpyxl, xlsx_path, [name for name, _ in sheets], workers, values)
+
+
+def _scan_workbook_xml(xlsx_path: Path, workers: int, values: bool = False) -> WorkbookIndex:
+    with xlsx_stream.open_package(xlsx_path) as zf:
+        sheets, sst_part = xlsx_stream.workbook_parts(zf)
+    results = _map_chunks(_scan_sheets_xml, xlsx_path, sheets, workers, sst_part, values)
+    return _build_index(xlsx_path, [name for name, _ in sheets], results)
+
+
+class SheetCache:
+    """Directory of per-sheet scan results keyed by the sheet XML's content hash.
+
+    Each entry (``<sha256>.json``) stores one sheet's formula cells with their
+    parsed references, header band and row labels (and constants, for
+    ``values=True`` scans, which are keyed separately). Header/label text can come
+    from the workbook's shared-strings table, so an entry also records how many
+    shared strings its sheet references and a digest of that prefix of the
+    table; an entry is only reused while that prefix is unchanged.
+    """
+
+    def __init__(self, cache_dir):
+        self.dir = Path(cache_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(zf, part, values: bool = False) -> str:
+        h = hashlib.sha256(f"{CACHE_VERSION}:{HEADER_BAND_ROWS}:{LABEL_COLUMNS}:{int(values)}:".encode())
+        if part is not None:
+            with zf.open(part) as src:
+                for block in iter(lambda: src.read(1 << 20), b''):
+                    h.update(block)
+        return h.hexdigest()
+
+    def load(self, key: str, sname: str, sst_xml: bytes):
+        """Cached (formula cells, header band, row labels, constants) for ``sname``, or None."""
+        path = self.dir / f"{key}.json"
+        try:
+            with path.open('r', encoding='utf-8') as f:
+                doc = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if doc.get('version') != CACHE_VERSION:
+            return None
+        if xlsx_stream.strings_digest(sst_xml, doc['strings']) != doc['strings_digest']:
+            return None
+        cells = [FormulaCell(sname, cell, formula, tuple(CellRef(*ref) for ref in refs))
+                 for cell, formula, refs in doc['formulas']]
+        headers = {c: (r, t) for c, r, t in doc['headers']}
+        labels = {r: (c, t) for r, c, t in doc['labels']}
+        constants = doc.get('values')
+        if constants is not None:
+            constants = [tuple(v) for v in constants]
+        return cells, headers, labels, constants
+
+    def store(self, key: str, result, n_strings: int, digest: str):
+        cells, headers, labels, constants = result
+        doc = {
+            'version': CACHE_VERSION,
+            'strings': n_strings,
+            'strings_digest': digest,
+            'formulas': [[f.cell, f.formula, [list(ref) for ref in f.refs]] for f in cells],
+            'headers': [[c, r, t] for c, (r, t) in headers.items()],
+            'labels': [[r, c, t] for r, (c, t) in labels.items()],
+        }
+        if constants is not None:
+            doc['values'] = [list(v) for v in constants]
+        path = self.dir / f"{key}.json"
+        tmp = path.with_suffix('.tmp')
+        with tmp.open('w', encoding='utf-8') as f:
+            json.dump(doc, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp, path)
+
+
+def _scan_workbook_cached(xlsx_path: Path, workers: int, backend: str, cache_dir, values: bool = False) -> WorkbookIndex:
+    """Reuse cached results for unchanged sheets and scan only the rest."""
+    cache = SheetCache(cache_dir)
+    with xlsx_stream.open_package(xlsx_path) as zf:
+        sheets, sst_part = xlsx_stream.workbook_parts(zf)
+        sst_xml = zf.read(sst_part) if sst_part in zf.NameToInfo else b''
+        keys = [cache.key(zf, part, values) for _, part in sheets]
+        results = [cache.load(key, name, sst_xml) for key, (name, _) in zip(keys, sheets)]
+        misses = [i for i, res in enumerate(results) if res is None]
+        bounds = {}
+        for i in misses:
+            part = sheets[i][1]
+            if part is None:
+                bounds[i] = 0
+                continue
+            with zf.open(part) as src:
+                bounds[i] = xlsx_stream.shared_string_bound(src)
+
+    if misses:
+        scanned = _scan_parts(xlsx_path, [sheets[i] for i in misses], sst_part, workers, backend, values)
+        for i, res in zip(misses, scanned):
+            results[i] = res
+            digest = xlsx_stream.strings_digest(sst_xml, bounds[i])
+            if digest is not None:
+                cache.store(keys[i], res, bounds[i], digest)
+
+    sheet_names = [name for name, _ in sheets]
+    index = _build_index(xlsx_path, sheet_names, results)
+    missed = set(misses)
+    index.reused_sheets = [name for i, name in enumerate(sheet_names) if i not in missed]
+    index.parsed_sheets = [sheet_names[i] for i in misses]
+    return index
+
+
+def scan_workbook(xlsx_path: Path, workers: int = 1, backend: str = 'openpyxl', cache_dir=None,
+                  values: bool = False) -> WorkbookIndex:
+    """Stream every sheet once and index formula cells, header band and row labels.
+
+    Args:
+        xlsx_path: workbook path
+        workers: with ``workers > 1`` sheets are split into contiguous chunks
+            scanned in a ``ProcessPoolExecutor``; each worker opens its own
+            read-only handle and per-sheet results are stored in workbook sheet
+            order, so the index is identical to the serial scan
+        backend: ``'openpyxl'`` (read-only workbook) or ``'xml'`` (the
+            ``xlsx_stream`` reader, which skips openpyxl cell objects and falls
+            back to openpyxl if the package cannot be streamed)
+        cache_dir: optional ``SheetCache`` directory; sheets whose XML is
+            unchanged since an earlier run are loaded from it instead of parsed
+            (see ``WorkbookIndex.reused_sheets`` / ``parsed_sheets``)
+        values: also keep number and text constants
+            (``WorkbookIndex.values_by_sheet``) for formula evaluation
+    """
+    if backend not in SCAN_BACKENDS:
+        raise ValueError(f"Unknown scan backend '{backend}' (expected one of {', '.join(SCAN_BACKENDS)})")
+    workers = max(1, int(workers or 1))
+    if cache_dir is not None:
+        try:
+            return _scan_workbook_cached(xlsx_path, workers, backend, cache_dir, values)
+        except XML_SCAN_ERRORS as exc:
+            print(f"Cannot read sheet parts for the scan cache ({exc!r}); scanning without it", file=sys.stderr)
+    if backend == 'xml':
+        try:
+            return _scan_workbook_xml(xlsx_path, workers, values)
+        except XML_SCAN_ERRORS as exc:
+            print(f"Streaming XML scan failed ({exc!r}); falling back to openpyxl", file=sys.stderr)
+
+    wb = load_workbook(filename=str(xlsx_path), data_only=False, read_only=True)
+    sheet_names = list(wb.sheetnames)
+    if workers == 1 or len(sheet_names) <= 1:
+        results = [scan_sheet(wb[sname], sname, values) for sname in sheet_names]
+    else:
+        results = _map_chunks(_scan_sheets_openpyxl, xlsx_path, sheet_names, workers, values)
+    return _build_index(xlsx_path, sheet_names, results, workbook=wb)
+
+
+def iter_sheet_scans(xlsx_path: Path, backend: str = 'openpyxl'):
+    """Scan one sheet at a time: yields the sheet names list once, then
+    ``(sheet, (formula cells, header band, row labels, None))`` per sheet.
+
+    For consumers that fold each sheet into their own compact structures
+    (``excel_lineage_to_minimal.build_full_lineage``) and never need the whole
+    ``WorkbookIndex``: only one sheet's formula cells are alive at a time. With
+    ``backend='xml'`` a sheet the streaming reader cannot handle is rescanned
+    with openpyxl.
+    """
+    if backend not in SCAN_BACKENDS:
+        raise ValueError(f"Unknown scan backend '{backend}' (expected one of {', '.join(SCAN_BACKENDS)})")
+    if backend == 'xml':
+        try:
+            with xlsx_stream.open_package(xlsx_path) as zf:
+                sheets, sst_part = xlsx_stream.workbook_parts(zf)
+                strings = xlsx_stream.read_shared_strings(zf, sst_part)
+        except XML_SCAN_ERRORS as exc:
+            print(f"Streaming XML scan failed ({exc!r}); falling back to openpyxl", file=sys.stderr)
+        else:
+            yield [name for name, _ in sheets]
+            with xlsx_stream.open_package(xlsx_path) as zf:
+                for sname, part in sheets:
+                    if part is None:
+                        yield sname, ([], {}, {}, None)
+                        continue
+                    try:
+                        with zf.open(part) as src:
+                            yield sname, index_sheet_values(sname, xlsx_stream.iter_sheet_values(src, strings))
+                    except XML_SCAN_ERRORS as exc:
+                        print(f"Streaming XML scan of '{sname}' failed ({exc!r}); falling back to openpyxl",
+                              file=sys.stderr)
+                        yield sname, _scan_sheets_openpyxl(str(xlsx_path), [sname])[0]
+            return
+    wb = load_workbook(filename=str(xlsx_path), data_only=False, read_only=True)
+    try:
+        yield list(wb.sheetnames)
+        for sname in wb.sheetnames:
+            yield sname, scan_sheet(wb[sname], sname)
+    finally:
+        wb.close()
+
+
+SCAN_OPTIONS = {'--workers': 'workers', '--backend': 'backend', '--cache': 'cache_dir'}
+
+
+def pop_scan_args(argv):
+    """Strip ``--workers N``, ``--backend NAME`` and ``--cache DIR`` (or ``--opt=value``) from ``argv``.
+
+    Returns (remaining args, keyword arguments for ``scan_workbook``).
+    """
+    args, opts, i = [], {'workers': 1, 'backend': 'openpyxl', 'cache_dir': None}, 0
+    while i < len(argv):
+        a = argv[i]
+        name, eq, value = a.partition('=')
+        key = SCAN_OPTIONS.get(name)
+        if key and not eq:
+            if i + 1 >= len(argv):
+                raise ValueError(f'{name} needs a value')
+            value = argv[i + 1]
+            i += 1
+        if key:
+            opts[key] = value
+        else:
+            args.append(a)
+        i += 1
+    opts['workers'] = int(opts['workers'])
+    if opts['workers'] < 1:
+        raise ValueError('--workers must be >= 1')
+    if opts['backend'] not in SCAN_BACKENDS:
+        raise ValueError(f"--backend must be one of {', '.join(SCAN_BACKENDS)}")
+    return args, opts
+
+
+def cache_report(index: WorkbookIndex) -> str:
+    """One-line summary of a cached scan, e.g. for the converter CLIs."""
+    total = len(index.sheet_names)
+    line = f"Cache: reused {len(index.reused_sheets)}/{total} sheets"
+    if index.parsed_sheets:
+        line += f"; parsed {', '.join(index.parsed_sheets)}"
+    return line
+
+
+def as_index(source, **scan_opts) -> WorkbookIndex:
+    """Accept either a ``WorkbookIndex`` or a workbook path (scanned on demand)."""
+    if isinstance(source, WorkbookIndex):
+        return source
+    return scan_workbook(Path(source), **scan_opts)
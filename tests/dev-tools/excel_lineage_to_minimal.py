@@ -12,23 +12,40 @@ Output: tests/minimal-json/excel-lineage-deps.json
 Usage:
   python3 tests/dev-tools/excel_lineage_to_minimal.py "Field Goal 1 Projections (1).xlsx" [N]
 Where N (optional) is the max number of target cells to include (default 8).
+With --evaluate, source → target edges are weighted by each reference's share
+of the target's finite-difference sensitivity (excel_eval.py) instead of
+1/len(refs), and sources that lower the target get ``opposes`` edges.
+
+  python3 tests/dev-tools/excel_lineage_to_minimal.py book.xlsx --full [out.jsonl] [--format jsonl|chunks] [--chunk-edges N]
+Full mode skips the top-N cut and writes every formula cell's references,
+streamed as JSON Lines (default) or as self-contained chunked minimal JSON files.
+--deps ranges adds same-sheet and range references (one node per range);
+--deps provenance collapses same-sheet formula chains into the cross-sheet
+ranges they read (see excel_deps.py). Full mode streams the workbook one sheet
+at a time instead of building the shared index (unless --workers or --cache
+is given).
+
+Formulas come from the shared single-pass index (excel_index.py), so ranking
+projection sheets and collecting candidates no longer rescan the workbook.
 """
 
 import json
 import re
 import sys
+import tempfile
 import unicodedata
+from array import array
 from collections import defaultdict, Counter
 from pathlib import Path
 
-try:
-    from openpyxl import load_workbook
-except Exception:
-    print("Missing dependency 'openpyxl'. Install with: pip install openpyxl", file=sys.stderr)
-    raise
+import numpy as np
 
+from excel_deps import DependencyIndex, RangeRef
+from excel_eval import evaluate_index, influence_unit, pop_evaluate_arg, reference_weights
+from excel_index import (WorkbookIndex, as_index, col_to_index, index_to_col, cache_report, iter_sheet_scans,
+                         pop_scan_args, scan_workbook)
 
-CELL_REF_RE = re.compile(r"(?:(?:'([^']+)')|([A-Za-z0-9_]+))!\$?([A-Za-z]{1,3})\$?(\d+)")
+CELL_RE = re.compile(r"([A-Z]{1,3})(\d+)$")
 
 
 def ascii_id(s: str) -> str:
@@ -38,54 +55,14 @@ def ascii_id(s: str) -> str:
     return s[:160] if len(s) > 160 else s
 
 
-def col_to_index(col_letters: str) -> int:
-    idx = 0
-    for ch in col_letters.upper():
-        idx = idx * 26 + (ord(ch) - ord('A') + 1)
-    return idx
-
-
-def index_to_col(idx: int) -> str:
-    letters = ''
-    n = idx
-    while n:
-        n, rem = divmod(n-1, 26)
-        letters = chr(65 + rem) + letters
-    return letters or 'A'
-
-
-def find_column_header(ws, col_idx: int, max_scan_rows: int = 10) -> str:
-    for r in range(1, max_scan_rows + 1):
-        val = ws.cell(row=r, column=col_idx).value
-        if isinstance(val, str) and val.strip():
-            return val.strip()
-    return f"Col {index_to_col(col_idx)}"
-
-
-def find_row_label(ws, row_idx: int, max_scan_cols: int = 3) -> str:
-    # Heuristic: look in first few columns for a string label
-    for c in range(1, max_scan_cols + 1):
-        val = ws.cell(row=row_idx, column=c).value
-        if isinstance(val, str) and val.strip():
-            return val.strip()
-    return f"Row {row_idx}"
-
-
-def detect_projection_sheets(wb):
+def detect_projection_sheets(index):
     # Strategy: sheets with many formulas and many cross-sheet references
-    formula_counts = Counter()
+    formula_counts = index.formula_counts
     inbound_xsheet = Counter()
-    for sname in wb.sheetnames:
-        ws = wb[sname]
-        for row in ws.iter_rows():
-            for cell in row:
-                val = cell.value
-                if isinstance(val, str) and val.startswith('='):
-                    formula_counts[sname] += 1
-                    for m in CELL_REF_RE.finditer(val):
-                        ref_sheet = (m.group(1) or m.group(2) or '').strip()
-                        if ref_sheet and ref_sheet != sname:
-                            inbound_xsheet[sname] += 1
+    for formula in index.formulas:
+        for ref in formula.refs:
+            if ref.sheet != formula.sheet:
+                inbound_xsheet[formula.sheet] += 1
     # Rank by inbound cross-sheet refs
     ranked = [s for s, _ in inbound_xsheet.most_common()]
     # Ensure obvious names (e.g., contain 'Projection') bubble up even if ties
@@ -94,9 +71,16 @@ def detect_projection_sheets(wb):
     return ranked[:3]
 
 
-def build_lineage_graph(xlsx_path: Path, max_targets: int = 8, max_refs_per_target: int = 6):
-    wb = load_workbook(filename=str(xlsx_path), data_only=False, read_only=True)
-    target_sheets = detect_projection_sheets(wb)
+def build_lineage_graph(source, max_targets: int = 8, max_refs_per_target: int = 6, sensitivity=None):
+    """Cell-lineage projection of the formula-reference index.
+
+    ``source`` is a workbook path or an ``excel_index.WorkbookIndex``;
+    ``sensitivity`` (optional) is a ``WorkbookModel.reference_sensitivities()``
+    result that replaces the uniform ``1 / len(refs)`` source weights.
+    """
+    index = as_index(source)
+    target_sheets = detect_projection_sheets(index)
+    unit = influence_unit(sensitivity)
     nodes = []
     edges = []
     node_ids = set()
@@ -113,25 +97,21 @@ def build_lineage_graph(xlsx_path: Path, max_targets: int = 8, max_refs_per_targ
             node_ids.add(tname)
 
     # Collect candidate target cells
-    candidates = []  # (tname, cell_addr, refs, formula)
+    candidates = []  # (tname, cell_addr, refs, formula, (weights, signs))
     for tname in target_sheets:
-        ws_t = wb[tname]
-        for row in ws_t.iter_rows():
-            for cell in row:
-                val = cell.value
-                if isinstance(val, str) and val.startswith('='):
-                    refs = [m.groups() for m in CELL_REF_RE.finditer(val)]
-                    xs_refs = [(rs or rp, col, int(rn)) for (rs, rp, col, rn) in refs if (rs or rp) and (rs or rp) != tname]
-                    if xs_refs:
-                        addr = f"{tname}!{cell.column_letter}{cell.row}"
-                        candidates.append((tname, addr, xs_refs, val))
+        for formula in index.formulas_in(tname):
+            xs = [n for n, ref in enumerate(formula.refs) if ref.sheet != tname]
+            if xs:
+                addr = f"{tname}!{formula.cell}"
+                xs_refs = [tuple(formula.refs[n]) for n in xs]
+                candidates.append((tname, addr, xs_refs, formula.formula, reference_weights(sensitivity, formula, xs, unit)))
 
     # Rank targets by number of cross-sheet refs and pick top-N
     candidates.sort(key=lambda x: len(x[2]), reverse=True)
     picks = candidates[:max_targets]
 
     # Build nodes and edges for each picked target cell
-    for (tname, addr, xs_refs, formula) in picks:
+    for (tname, addr, xs_refs, formula, (weights, signs)) in picks:
         # Target cell node
         tnode_id = ascii_id(addr)
         if tnode_id not in node_ids:
@@ -151,17 +131,18 @@ def build_lineage_graph(xlsx_path: Path, max_targets: int = 8, max_refs_per_targ
             'contributingFactors': ["Selected output cell"]
         })
 
-        # Compute per-source weights normalized per target cell
-        per = max(1, len(xs_refs))
-        w_each = round(1.0 / per, 4)
+        # Per-source weights normalized per target cell (uniform without sensitivities,
+        # or when every cross-sheet influence is zero)
+        per = sum(weights)
+        if per <= 0:
+            weights, per = [1.0] * len(weights), max(1, len(weights))
 
         # Add source cell nodes and edges
         # Limit to first M refs to keep the graph small
-        for (sname, col_letters, row_num) in xs_refs[:max_refs_per_target]:
-            ws_s = wb[sname]
-            col_idx = col_to_index(col_letters)
-            header = find_column_header(ws_s, col_idx)
-            row_label = find_row_label(ws_s, row_num)
+        for (sname, col_letters, row_num), w, sign in list(zip(xs_refs, weights, signs))[:max_refs_per_target]:
+            # Header band / label column were captured during the scan; no ws.cell() access
+            header = index.column_header(sname, col_to_index(col_letters))
+            row_label = index.row_label(sname, row_num)
             src_addr = f"{sname}!{col_letters}{row_num}"
             snode_id = ascii_id(src_addr)
             if snode_id not in node_ids:
@@ -175,8 +156,8 @@ def build_lineage_graph(xlsx_path: Path, max_targets: int = 8, max_refs_per_targ
             edges.append({
                 'source': snode_id,
                 'target': tnode_id,
-                'type': 'supports',
-                'weight': w_each,
+                'type': 'opposes' if sign < 0 else 'supports',
+                'weight': round(w / per, 4),
                 'contributingFactors': [f"Header: {header}", f"Row: {row_label}"]
             })
 
@@ -187,24 +168,373 @@ def build_lineage_graph(xlsx_path: Path, max_targets: int = 8, max_refs_per_targ
     }
 
 
+# ---------------------------------------------------------------------------
+# Full (unbounded) lineage
+#
+# ``build_lineage_graph`` keeps dict nodes/edges for a handful of picked cells.
+# The full mode covers every formula cell without holding the workbook: sheets
+# are scanned one at a time (``excel_index.iter_sheet_scans``) and each
+# formula's edges are appended as packed sheet/col/row keys to ``array('Q')``
+# buffers while its text goes to a temporary spill file. Once every sheet is
+# in, keys are interned to integer IDs with one NumPy sort (no per-cell dict),
+# and the minimal JSON is only materialized line by line (JSON Lines) or chunk
+# by chunk while writing. What stays resident is ~30 bytes per node and 8 per
+# edge, plus the header band / row labels for node descriptions and the
+# largest single sheet's formulas while it is being folded in.
+# ---------------------------------------------------------------------------
+
+ROW_BITS, COL_BITS = 21, 14     # Excel limits: 1,048,576 rows, 16,384 columns
+NO_FORMULA = -1
+RANGE_KEY = 1 << 63             # node_keys flag: low bits index FullLineage.range_lo / range_hi
+LINEAGE_DEPS = ('refs', 'ranges', 'provenance')
+
+
+def _pack(sheet_id: int, col: int, row: int) -> int:
+    return (sheet_id << (COL_BITS + ROW_BITS)) | (col << ROW_BITS) | row
+
+
+def _unpack(key: int):
+    return key >> (COL_BITS + ROW_BITS), (key >> ROW_BITS) & ((1 << COL_BITS) - 1), key & ((1 << ROW_BITS) - 1)
+
+
+def _uint32(values) -> array:
+    out = array('I')
+    out.frombytes(np.asarray(values, dtype=np.uint32).tobytes())
+    return out
+
+
+class FullLineage:
+    """Interned cell-level dependency graph over every formula in a workbook.
+
+    Built by ``build_full_lineage``: ``add_sheet`` folds one sheet's formulas
+    into the key buffers, ``finish`` assigns node ids. Formula cells come
+    first (in scan order), then the other referenced cells (sorted by
+    sheet/col/row), then multi-cell ranges.
+
+    Attributes:
+        index: formula-free ``WorkbookIndex`` holding only sheet names, header
+            band and row labels (for node descriptions)
+        sheets: sheet names by sheet id (workbook order, then unknown
+            referenced sheets)
+        node_keys: array('Q') packed (sheet id, column, row) per node id, or
+            ``RANGE_KEY | i`` for the multi-cell source range ``i``
+        range_lo / range_hi: array('Q') packed first / last cell of range ``i``
+        formula_of: array('l') formula position for formula cells, else -1
+            (``formula_text`` reads the text back from the spill file)
+        n_refs: array('I') distinct references per node (edge weight = 1 / n_refs[target])
+        edge_source / edge_target: array('I') node ids, one entry per edge
+    """
+
+    def __init__(self, path, sheet_names):
+        self.index = WorkbookIndex(path, sheet_names, {})
+        self.sheets = []
+        self._sheet_ids = {}
+        for name in sheet_names:
+            self._sheet_id(name)
+        self.node_keys = array('Q')
+        self.formula_of = array('l')
+        self.n_refs = array('I')
+        self.edge_source = array('I')
+        self.edge_target = array('I')
+        self.range_lo, self.range_hi = array('Q'), array('Q')
+        self._id_prefix = {}
+        # Build buffers: one entry per formula / per edge, in scan order
+        self._targets = array('Q')
+        self._target_refs = array('I')
+        self._src_keys = array('Q')       # cell key, or RANGE_KEY | position in _range_lo/_range_hi
+        self._range_lo, self._range_hi = array('Q'), array('Q')
+        self._spill = tempfile.TemporaryFile()
+        self._offsets = array('Q', [0])
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_keys)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.edge_source)
+
+    def _sheet_id(self, name: str) -> int:
+        sid = self._sheet_ids.get(name)
+        if sid is None:
+            sid = self._sheet_ids[name] = len(self.sheets)
+            self.sheets.append(name)
+        return sid
+
+    def _range_key(self, ref) -> int:
+        """Build-time key for a ``RangeRef``; single cells are plain cell keys."""
+        lo = _pack(self._sheet_id(ref.sheet), ref.c1, ref.r1)
+        if ref.c1 == ref.c2 and ref.r1 == ref.r2:
+            return lo
+        self._range_lo.append(lo)
+        self._range_hi.append(_pack(0, ref.c2, ref.r2))
+        return RANGE_KEY | (len(self._range_lo) - 1)
+
+    def add_formula(self, formula, sources):
+        """Append one formula cell and its source keys (``_pack`` / ``_range_key``)."""
+        m = CELL_RE.match(formula.cell)
+        target = _pack(self._sheet_id(formula.sheet), col_to_index(m.group(1)), int(m.group(2)))
+        seen = set()
+        for key in sources:
+            if key != target and key not in seen:
+                seen.add(key)
+                self._src_keys.append(key)
+        self._targets.append(target)
+        self._target_refs.append(len(seen))
+        self._offsets.append(self._offsets[-1] + self._spill.write(formula.formula.encode('utf-8')))
+
+    def add_sheet(self, sname: str, cells, headers, labels, deps: str = 'refs'):
+        """Fold one scanned sheet in; its ``FormulaCell`` list can be dropped afterwards."""
+        self.index.headers_by_sheet[sname] = headers
+        self.index.row_labels_by_sheet[sname] = labels
+        if deps == 'refs':
+            for f in cells:
+                self.add_formula(f, (_pack(self._sheet_id(r.sheet), col_to_index(r.col), r.row) for r in f.refs))
+            return
+        # Provenance follows same-sheet chains only, so one sheet's formulas suffice
+        dep_index = DependencyIndex(WorkbookIndex(self.index.path, self.index.sheet_names, {sname: cells}))
+        per_formula = dep_index.closure() if deps == 'provenance' else dep_index.ranges
+        for f, refs in zip(cells, per_formula):
+            self.add_formula(f, [self._range_key(r) for r in sorted(refs)])
+
+    def finish(self):
+        """Assign node ids to the buffered keys and build the edge arrays."""
+        targets = np.frombuffer(self._targets, dtype=np.uint64) if self._targets else np.zeros(0, np.uint64)
+        src = np.frombuffer(self._src_keys, dtype=np.uint64) if self._src_keys else np.zeros(0, np.uint64)
+        is_range = (src & np.uint64(RANGE_KEY)) != 0
+        cells = np.setdiff1d(src[~is_range], targets)               # sorted, unique, non-formula cells
+        keys = np.concatenate([targets, cells])
+        # Distinct multi-cell ranges, numbered in (first cell, last cell) order
+        lo = np.frombuffer(self._range_lo, dtype=np.uint64) if self._range_lo else np.zeros(0, np.uint64)
+        hi = np.frombuffer(self._range_hi, dtype=np.uint64) if self._range_hi else np.zeros(0, np.uint64)
+        pairs, range_ids = np.unique(np.stack([lo, hi], axis=1), axis=0, return_inverse=True)
+        range_ids = range_ids.reshape(-1)
+        order = np.argsort(keys, kind='stable')
+        node_of_src = np.empty(len(src), dtype=np.int64)
+        node_of_src[~is_range] = order[np.searchsorted(keys, src[~is_range], sorter=order)]
+        positions = (src[is_range] & np.uint64(~RANGE_KEY & ((1 << 64) - 1))).astype(np.int64)
+        node_of_src[is_range] = len(keys) + range_ids[positions]
+        n_nodes = len(keys) + len(pairs)
+
+        self.node_keys = array('Q')
+        self.node_keys.frombytes(np.concatenate(
+            [keys, np.uint64(RANGE_KEY) | np.arange(len(pairs), dtype=np.uint64)]).tobytes())
+        self.range_lo, self.range_hi = array('Q', pairs[:, 0].tolist()), array('Q', pairs[:, 1].tolist())
+        self.formula_of = array('l', range(len(targets))) + array('l', [NO_FORMULA]) * (n_nodes - len(targets))
+        self.n_refs = array('I', self._target_refs) + array('I', [0]) * (n_nodes - len(targets))
+        self.edge_source = _uint32(node_of_src)
+        self.edge_target = _uint32(np.repeat(np.arange(len(targets)), np.asarray(self._target_refs, dtype=np.int64)))
+        self._targets = self._src_keys = self._target_refs = None
+        self._range_lo = self._range_hi = None
+        return self
+
+    def formula_text(self, f: int) -> str:
+        self._spill.seek(self._offsets[f])
+        return self._spill.read(self._offsets[f + 1] - self._offsets[f]).decode('utf-8')
+
+    def range_ref(self, i: int) -> RangeRef:
+        sid, c1, r1 = _unpack(self.range_lo[i])
+        _, c2, r2 = _unpack(self.range_hi[i])
+        return RangeRef(self.sheets[sid], c1, r1, c2, r2)
+
+    def _cells(self, node: int):
+        """(sheet id, A1 text) of a node; ranges render as ``A1:B9``."""
+        key = self.node_keys[node]
+        if key & RANGE_KEY:
+            ref = self.range_ref(key & ~RANGE_KEY)
+            sid = self._sheet_ids[ref.sheet]
+            return sid, f"{index_to_col(ref.c1)}{ref.r1}:{index_to_col(ref.c2)}{ref.r2}"
+        sid, col, row = _unpack(key)
+        return sid, f"{index_to_col(col)}{row}"
+
+    def address(self, node: int) -> str:
+        sid, cells = self._cells(node)
+        return f"{self.sheets[sid]}!{cells}"
+
+    def node_id(self, node: int) -> str:
+        """Same id as ``ascii_id(address)`` in the top-N graph, with the sheet part memoized."""
+        sid, cells = self._cells(node)
+        prefix = self._id_prefix.get(sid)
+        if prefix is None:
+            name = unicodedata.normalize('NFKD', self.sheets[sid] + '!')
+            name = ''.join(ch for ch in name if not unicodedata.combining(ch))
+            prefix = self._id_prefix[sid] = re.sub(r"[^A-Za-z0-9_.:-]+", "_", name)
+        return (prefix + cells).strip('_')[:160]
+
+    def node(self, node: int) -> dict:
+        """Minimal-format node object for ``node``."""
+        key = self.node_keys[node]
+        if key & RANGE_KEY:
+            ref = self.range_ref(key & ~RANGE_KEY)
+            sid, cells = self._cells(node)
+            header = self.index.column_header(ref.sheet, ref.c1)
+            return {'id': self.node_id(node), 'label': cells, 'type': 'fact',
+                    'description': f"Source range {ref.sheet}!{cells}\nHeader: {header}\nRows: {ref.r1}-{ref.r2}"}
+        sid, col, row = _unpack(key)
+        cell, sheet = f"{index_to_col(col)}{row}", self.sheets[sid]
+        f = self.formula_of[node]
+        if f != NO_FORMULA:
+            return {'id': self.node_id(node), 'label': cell, 'type': 'assertion',
+                    'description': f"Target cell {sheet}!{cell}\nFormula: {self.formula_text(f)}"}
+        header = self.index.column_header(sheet, col)
+        row_label = self.index.row_label(sheet, row)
+        return {'id': self.node_id(node), 'label': cell, 'type': 'fact',
+                'description': f"Source {sheet}!{cell}\nHeader: {header}\nRow: {row_label}"}
+
+    def edge(self, e: int) -> dict:
+        """Minimal-format edge object for edge ``e``."""
+        src, dst = self.edge_source[e], self.edge_target[e]
+        return {'source': self.node_id(src), 'target': self.node_id(dst), 'type': 'supports',
+                'weight': round(1.0 / self.n_refs[dst], 4)}
+
+
+def build_full_lineage(source, deps: str = 'refs', backend: str = 'openpyxl') -> FullLineage:
+    """Intern every formula cell and the cells/ranges it depends on (no top-N cut).
+
+    ``deps`` selects the edges:
+      - ``'refs'``: explicit ``Sheet!A1`` references, as in the top-N graph
+      - ``'ranges'``: every reference incl. same-sheet cells and ``A1:B9``
+        ranges, one node per range (``excel_deps.parse_ranges``)
+      - ``'provenance'``: the cross-sheet ranges each formula reads directly or
+        through same-sheet formula chains (``DependencyIndex.closure``)
+
+    A workbook path is streamed sheet by sheet with ``backend`` and no
+    ``WorkbookIndex`` is built; an existing index is folded in the same way.
+    """
+    if deps not in LINEAGE_DEPS:
+        raise ValueError(f"Unknown lineage deps '{deps}' (expected one of {', '.join(LINEAGE_DEPS)})")
+    if isinstance(source, WorkbookIndex):
+        path, sheet_names = source.path, source.sheet_names
+        scans = ((s, (source.formulas_in(s), source.headers_by_sheet.get(s, {}),
+                      source.row_labels_by_sheet.get(s, {}))) for s in sheet_names)
+    else:
+        path = Path(source)
+        scans = iter_sheet_scans(path, backend)
+        sheet_names = next(scans)
+    graph = FullLineage(path, sheet_names)
+    for sname, (cells, headers, labels, *_) in scans:
+        graph.add_sheet(sname, cells, headers, labels, deps)
+    return graph.finish()
+
+
+def write_lineage_jsonl(graph: FullLineage, out: Path) -> int:
+    """Stream the graph as JSON Lines: a ``{"version": "2"}`` header, then one
+    ``{"node": {...}}`` line per node and one ``{"edge": {...}}`` line per edge.
+
+    Returns the number of lines written.
+    """
+    with Path(out).open('w', encoding='utf-8') as f:
+        f.write(json.dumps({'version': '2'}) + '\n')
+        for v in range(graph.n_nodes):
+            f.write(json.dumps({'node': graph.node(v)}, ensure_ascii=False) + '\n')
+        for e in range(graph.n_edges):
+            f.write(json.dumps({'edge': graph.edge(e)}, ensure_ascii=False) + '\n')
+    return 1 + graph.n_nodes + graph.n_edges
+
+
+def write_lineage_chunks(graph: FullLineage, out: Path, chunk_edges: int = 100_000):
+    """Write self-contained minimal JSON files of at most ``chunk_edges`` edges each.
+
+    Chunk ``k`` goes to ``<stem>.partKKKK.json`` next to ``out`` and carries the
+    nodes its edges touch, so every file loads on its own; formula cells without
+    references ride along in the last chunk. Returns the paths.
+    """
+    out = Path(out)
+    paths = []
+    isolated = bytearray(b'\x01') * graph.n_nodes
+    for v in graph.edge_source:
+        isolated[v] = 0
+    for v in graph.edge_target:
+        isolated[v] = 0
+    for start in range(0, max(graph.n_edges, 1), chunk_edges):
+        stop = min(start + chunk_edges, graph.n_edges)
+        touched = set(graph.edge_source[start:stop]) | set(graph.edge_target[start:stop])
+        if stop == graph.n_edges:
+            touched.update(v for v in range(graph.n_nodes) if isolated[v])
+        touched = sorted(touched)
+        path = out.with_name(f"{out.stem}.part{len(paths) + 1:04d}{out.suffix or '.json'}")
+        with path.open('w', encoding='utf-8') as f:
+            f.write('{"version": "2", "nodes": [')
+            for i, v in enumerate(touched):
+                f.write((',' if i else '') + '\n  ' + json.dumps(graph.node(v), ensure_ascii=False))
+            f.write('\n], "edges": [')
+            for i, e in enumerate(range(start, stop)):
+                f.write((',' if i else '') + '\n  ' + json.dumps(graph.edge(e), ensure_ascii=False))
+            f.write('\n]}\n')
+        paths.append(path)
+    return paths
+
+
+def _pop_option(argv, flag, default=None):
+    if flag not in argv:
+        return default
+    i = argv.index(flag)
+    if i + 1 >= len(argv):
+        raise ValueError(f"{flag} needs a value")
+    value = argv[i + 1]
+    del argv[i:i + 2]
+    return value
+
+
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: excel_lineage_to_minimal.py <workbook.xlsx> [max_targets] [output.json]", file=sys.stderr)
+    argv, scan_opts = pop_scan_args(sys.argv[1:])
+    argv, evaluate = pop_evaluate_arg(argv)
+    full = '--full' in argv
+    if full:
+        argv.remove('--full')
+    try:
+        fmt = _pop_option(argv, '--format', 'jsonl')
+        chunk_edges = int(_pop_option(argv, '--chunk-edges', '100000'))
+        deps = _pop_option(argv, '--deps', 'refs')
+        if fmt not in ('jsonl', 'chunks') or chunk_edges < 1:
+            raise ValueError("--format must be jsonl|chunks and --chunk-edges a positive integer")
+        if deps not in LINEAGE_DEPS:
+            raise ValueError(f"--deps must be one of {'|'.join(LINEAGE_DEPS)}")
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+    if len(argv) < 1:
+        print("Usage: excel_lineage_to_minimal.py <workbook.xlsx> [max_targets] [output.json] [--evaluate] [--workers N] [--backend openpyxl|xml] [--cache DIR]\n"
+              "       excel_lineage_to_minimal.py <workbook.xlsx> --full [output] [--format jsonl|chunks] [--chunk-edges N] [--deps refs|ranges|provenance]", file=sys.stderr)
         sys.exit(2)
-    xlsx = Path(sys.argv[1]).expanduser().resolve()
+    xlsx = Path(argv[0]).expanduser().resolve()
     if not xlsx.exists():
         print(f"File not found: {xlsx}", file=sys.stderr)
         sys.exit(1)
-    max_targets = int(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2].isdigit() else 8
-    out = Path(sys.argv[3]).expanduser().resolve() if len(sys.argv) > 3 else Path(__file__).parent.parent / 'minimal-json' / 'excel-lineage-deps.json'
+    if full:
+        default_name = 'excel-lineage-full.jsonl' if fmt == 'jsonl' else 'excel-lineage-full.json'
+        out = Path(argv[1]).expanduser().resolve() if len(argv) > 1 else Path(__file__).parent.parent / 'minimal-json' / default_name
+        out.parent.mkdir(parents=True, exist_ok=True)
+        # --workers / --cache need the whole index; otherwise stream sheet by sheet
+        index = None
+        if scan_opts['cache_dir'] or scan_opts['workers'] > 1:
+            index = scan_workbook(xlsx, **scan_opts)
+        graph = build_full_lineage(index or xlsx, deps=deps, backend=scan_opts['backend'])
+        if fmt == 'jsonl':
+            write_lineage_jsonl(graph, out)
+            print(f"Wrote JSON Lines: {out}")
+        else:
+            paths = write_lineage_chunks(graph, out, chunk_edges)
+            print(f"Wrote {len(paths)} minimal JSON chunk(s): {paths[0]}" + (" ..." if len(paths) > 1 else ""))
+        print(f"Nodes: {graph.n_nodes}, Edges: {graph.n_edges}")
+        if index is not None and scan_opts['cache_dir']:
+            print(cache_report(index))
+        return
+
+    max_targets = int(argv[1]) if len(argv) > 1 and argv[1].isdigit() else 8
+    out = Path(argv[2]).expanduser().resolve() if len(argv) > 2 else Path(__file__).parent.parent / 'minimal-json' / 'excel-lineage-deps.json'
     out.parent.mkdir(parents=True, exist_ok=True)
 
-    minimal = build_lineage_graph(xlsx, max_targets=max_targets)
+    index = scan_workbook(xlsx, values=evaluate, **scan_opts)
+    minimal = build_lineage_graph(index, max_targets=max_targets,
+                                  sensitivity=evaluate_index(index) if evaluate else None)
     with out.open('w', encoding='utf-8') as f:
         json.dump(minimal, f, ensure_ascii=False, indent=2)
 
     print(f"Wrote minimal JSON: {out}")
     print(f"Nodes: {len(minimal['nodes'])}, Edges: {len(minimal['edges'])}")
+    if scan_opts['cache_dir']:
+        print(cache_report(index))
 
 
 if __name__ == '__main__':
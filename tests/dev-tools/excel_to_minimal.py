@@ -7,7 +7,9 @@ Purpose
 Low-effort, native value-add for the Belief Graph tool: convert a workbook
 into a causal-style sheet dependency graph by scanning formulas. Each sheet
 becomes a node; if a formula in SheetB references cells in SheetA, we add
-an edge A -> B. Edge weight is proportional to reference counts (0..1).
+an edge A -> B. Edge weight is proportional to reference counts (0..1), or
+with ``--evaluate`` to the references' finite-difference sensitivities (see
+excel_eval.py); sheets whose net effect is negative get ``opposes`` edges.
 
 Output
 ------
@@ -27,61 +29,47 @@ How to use
 
 Notes
 -----
-- We do not evaluate formulas; we just parse text to find Sheet!Cell refs.
+- By default we do not evaluate formulas; we just parse text to find Sheet!Cell
+  refs. ``--evaluate`` compiles and evaluates them (excel_eval.WorkbookModel).
+- The workbook is scanned once by excel_index.scan_workbook; run
+  excel_all_to_minimal.py to write sheet, topic and lineage graphs together.
 - This produces a compact, explainable graph unique to this workbook.
 """
 
 import json
-import re
 import sys
-from collections import defaultdict, Counter
+from collections import Counter
 from pathlib import Path
 
-try:
-    from openpyxl import load_workbook
-except Exception as e:  # pragma: no cover
-    print("Missing dependency 'openpyxl'. Install with: pip install openpyxl", file=sys.stderr)
-    raise
+from excel_eval import evaluate_index, influence_unit, pop_evaluate_arg, reference_weights
+from excel_index import as_index, cache_report, pop_scan_args, scan_workbook
 
 
-REF_RE = re.compile(r"(?:(?:'([^']+)')|([A-Za-z0-9_]+))!\$?[A-Za-z]{1,3}\$?\d+", re.UNICODE)
+def build_sheet_dependency_graph(source, sensitivity=None):
+    """Sheet-level projection of the formula-reference index.
 
-
-def find_sheet_refs(formula: str):
-    """Return a list of sheet names referenced in a formula string.
-    Handles both 'Sheet Name'!A1 and SheetName!A1 patterns.
+    ``source`` is a workbook path or an ``excel_index.WorkbookIndex`` (so one
+    scan can feed all three converters). ``sensitivity`` is an optional
+    ``WorkbookModel.reference_sensitivities()`` result; each reference then
+    counts by its absolute elasticity (``excel_eval.reference_weights``)
+    instead of 1, normalized per target sheet.
     """
-    if not formula or not isinstance(formula, str):
-        return []
-    refs = []
-    for m in REF_RE.finditer(formula):
-        sheet_quoted, sheet_plain = m.groups()
-        name = (sheet_quoted or sheet_plain or '').strip()
-        if name:
-            refs.append(name)
-    return refs
-
-
-def build_sheet_dependency_graph(xlsx_path: Path):
-    wb = load_workbook(filename=str(xlsx_path), data_only=False, read_only=True)
-    sheet_names = wb.sheetnames
-    # Map: target_sheet -> Counter(source_sheet -> count)
+    index = as_index(source)
+    sheet_names = index.sheet_names
+    # Map: target_sheet -> Counter(source_sheet -> weighted count)
     inbound = {name: Counter() for name in sheet_names}
-    formula_counts = Counter()
-
-    for sname in sheet_names:
-        ws = wb[sname]
-        # Iterate cells; for read_only, iterate_rows yields Cell with .value and .data_type
-        for row in ws.iter_rows():
-            for cell in row:
-                # In openpyxl, formulas have data_type 'f' or value starting with '='
-                val = cell.value
-                if isinstance(val, str) and val.startswith('='):
-                    formula_counts[sname] += 1
-                    refs = find_sheet_refs(val)
-                    for ref_sheet in refs:
-                        if ref_sheet in inbound:  # only count known sheets
-                            inbound[sname][ref_sheet] += 1
+    ref_counts = {name: Counter() for name in sheet_names}
+    signed = {name: Counter() for name in sheet_names}
+    formula_counts = index.formula_counts
+    unit = influence_unit(sensitivity)
+
+    for formula in index.formulas:
+        weights, signs = reference_weights(sensitivity, formula, unit=unit)
+        for ref, w, sign in zip(formula.refs, weights, signs):
+            if ref.sheet in inbound:  # only count known sheets
+                inbound[formula.sheet][ref.sheet] += w
+                ref_counts[formula.sheet][ref.sheet] += 1
+                signed[formula.sheet][ref.sheet] += w * sign
 
     # Build minimal JSON
     nodes = []
@@ -90,8 +78,8 @@ def build_sheet_dependency_graph(xlsx_path: Path):
     # Create nodes with provenance-rich description
     for sname in sheet_names:
         total_formulas = formula_counts.get(sname, 0)
-        inbound_refs = sum(inbound[sname].values())
-        top_sources = inbound[sname].most_common(3)
+        inbound_refs = sum(ref_counts[sname].values())
+        top_sources = ref_counts[sname].most_common(3)
         top_str = ', '.join(f"{src} ({cnt})" for src, cnt in top_sources) if top_sources else 'None'
         desc = (
             f"Sheet '{sname}'. Contains {total_formulas} formulas; "
@@ -104,9 +92,13 @@ def build_sheet_dependency_graph(xlsx_path: Path):
             "description": desc
         })
 
-    # Normalize edge weights per target (sum inbounds → 1.0)
+    # Normalize edge weights per target (sum inbounds → 1.0); a target whose
+    # references all have zero influence falls back to reference counts
     for target, sources in inbound.items():
         total = sum(sources.values())
+        if total <= 0:
+            sources = ref_counts[target]
+            total = sum(sources.values())
         if total <= 0:
             continue
         for source, cnt in sources.items():
@@ -114,14 +106,15 @@ def build_sheet_dependency_graph(xlsx_path: Path):
                 # Skip self loops; they aren't helpful at sheet level
                 continue
             w = cnt / total
+            factors = [f"{ref_counts[target][source]} cross-sheet reference(s)"]
+            if sensitivity is not None:
+                factors.append("Weighted by finite-difference sensitivity")
             edges.append({
                 "source": source,
                 "target": target,
-                "type": "supports",
+                "type": "opposes" if signed[target][source] < 0 else "supports",
                 "weight": round(min(max(w, 0.0), 1.0), 4),
-                "contributingFactors": [
-                    f"{cnt} cross-sheet reference(s)"
-                ]
+                "contributingFactors": factors
             })
 
     minimal = {
@@ -133,23 +126,28 @@ def build_sheet_dependency_graph(xlsx_path: Path):
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: excel_to_minimal.py <workbook.xlsx> [output.json]", file=sys.stderr)
+    argv, scan_opts = pop_scan_args(sys.argv[1:])
+    argv, evaluate = pop_evaluate_arg(argv)
+    if len(argv) < 1:
+        print("Usage: excel_to_minimal.py <workbook.xlsx> [output.json] [--evaluate] [--workers N] [--backend openpyxl|xml] [--cache DIR]", file=sys.stderr)
         sys.exit(2)
-    xlsx = Path(sys.argv[1]).expanduser().resolve()
+    xlsx = Path(argv[0]).expanduser().resolve()
     if not xlsx.exists():
         print(f"File not found: {xlsx}", file=sys.stderr)
         sys.exit(1)
-    out = Path(sys.argv[2]).expanduser().resolve() if len(sys.argv) > 2 else Path(__file__).parent.parent / 'minimal-json' / 'excel-sheet-deps.json'
+    out = Path(argv[1]).expanduser().resolve() if len(argv) > 1 else Path(__file__).parent.parent / 'minimal-json' / 'excel-sheet-deps.json'
     out.parent.mkdir(parents=True, exist_ok=True)
 
-    minimal = build_sheet_dependency_graph(xlsx)
+    index = scan_workbook(xlsx, values=evaluate, **scan_opts)
+    minimal = build_sheet_dependency_graph(index, evaluate_index(index) if evaluate else None)
     with out.open('w', encoding='utf-8') as f:
         json.dump(minimal, f, ensure_ascii=False, indent=2)
 
     # Console summary
     print(f"Wrote minimal JSON: {out}")
     print(f"Nodes: {len(minimal['nodes'])}, Edges: {len(minimal['edges'])}")
+    if scan_opts['cache_dir']:
+        print(cache_report(index))
 
 
 if __name__ == '__main__':
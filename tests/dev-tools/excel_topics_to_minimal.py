@@ -16,9 +16,13 @@ Usage:
   python3 tests/dev-tools/excel_topics_to_minimal.py "Field Goal 1 Projections (1).xlsx"
 
 Notes:
-  - No formula evaluation, just lexical parsing; fast + safe.
+  - No formula evaluation by default, just lexical parsing; fast + safe.
+    ``--evaluate`` weights each reference by its finite-difference
+    sensitivity instead (excel_eval.py); topics with a negative net effect on a
+    sheet get ``opposes`` edges.
   - Works even when headers are multiline or spaced; falls back to "Col X".
   - Keeps IDs ASCII-safe; labels are human-friendly.
+  - Formulas come from the shared single-pass index (excel_index.py).
 """
 
 import json
@@ -28,14 +32,8 @@ import unicodedata
 from collections import defaultdict, Counter
 from pathlib import Path
 
-try:
-    from openpyxl import load_workbook
-except Exception:
-    print("Missing dependency 'openpyxl'. Install with: pip install openpyxl", file=sys.stderr)
-    raise
-
-
-CELL_REF_RE = re.compile(r"(?:(?:'([^']+)')|([A-Za-z0-9_]+))!\$?([A-Za-z]{1,3})\$?(\d+)")
+from excel_eval import evaluate_index, influence_unit, pop_evaluate_arg, reference_weights
+from excel_index import as_index, col_to_index, cache_report, pop_scan_args, scan_workbook
 
 
 def ascii_id(s: str) -> str:
@@ -45,84 +43,50 @@ def ascii_id(s: str) -> str:
     return s[:120] if len(s) > 120 else s
 
 
-def col_to_index(col_letters: str) -> int:
-    idx = 0
-    for ch in col_letters.upper():
-        idx = idx * 26 + (ord(ch) - ord('A') + 1)
-    return idx
-
+def build_topic_graph(source, sensitivity=None):
+    """Topic-level projection of the formula-reference index.
 
-def find_column_header(ws, col_idx: int, max_scan_rows: int = 10) -> str:
-    """Find a likely header for a column by scanning top rows in that column.
-    Returns first non-empty text cell (stripped). Fallback: "Col <letter>".
+    ``source`` is a workbook path or an ``excel_index.WorkbookIndex``;
+    ``sensitivity`` (optional) is a ``WorkbookModel.reference_sensitivities()``
+    result, as in ``build_sheet_dependency_graph``.
     """
-    header = None
-    for r in range(1, max_scan_rows + 1):
-        cell = ws.cell(row=r, column=col_idx)
-        val = cell.value
-        if isinstance(val, str):
-            t = val.strip()
-            if t:
-                header = t
-                break
-        elif isinstance(val, (int, float)):
-            # Numeric isn't a great header; keep looking
-            continue
-    if not header:
-        # Fallback to A,B,C name
-        # Convert index to letters
-        n = col_idx
-        letters = ''
-        while n:
-            n, rem = divmod(n-1, 26)
-            letters = chr(65 + rem) + letters
-        header = f"Col {letters}"
-    return header
-
-
-def build_topic_graph(xlsx_path: Path):
-    wb = load_workbook(filename=str(xlsx_path), data_only=False, read_only=True)
-    sheet_names = wb.sheetnames
-
-    # Count: (topic_id, target_sheet) -> references
+    index = as_index(source)
+    sheet_names = index.sheet_names
+
+    # Count: (topic_id, target_sheet) -> references (weighted / signed with sensitivities)
     topic_to_target = Counter()
+    topic_weight = Counter()
+    topic_signed = Counter()
     # Map topic_id -> { sheet, header, sample_cells:set }
     topic_meta = {}
     # Track simple sheet nodes for targets
     target_formula_counts = Counter()
+    unit = influence_unit(sensitivity)
 
     for tname in sheet_names:
-        ws_t = wb[tname]
-        for row in ws_t.iter_rows():
-            for cell in row:
-                val = cell.value
-                if isinstance(val, str) and val.startswith('='):
-                    target_formula_counts[tname] += 1
-                    for m in CELL_REF_RE.finditer(val):
-                        sname = (m.group(1) or m.group(2) or '').strip()
-                        col_letters = m.group(3)
-                        try:
-                            row_num = int(m.group(4))
-                        except Exception:
-                            row_num = None
-                        if not sname or sname == tname:
-                            continue  # same-sheet or invalid
-                        if sname not in wb.sheetnames:
-                            continue
-                        ws_s = wb[sname]
-                        cidx = col_to_index(col_letters)
-                        header = find_column_header(ws_s, cidx)
-                        topic_id = ascii_id(f"{sname}::{header}")
-                        if topic_id not in topic_meta:
-                            topic_meta[topic_id] = {
-                                'sheet': sname,
-                                'header': header,
-                                'samples': set()
-                            }
-                        # Sample up to a few examples for description
-                        if row_num is not None and len(topic_meta[topic_id]['samples']) < 4:
-                            topic_meta[topic_id]['samples'].add(f"{sname}!{col_letters}{row_num}")
-                        topic_to_target[(topic_id, tname)] += 1
+        for formula in index.formulas_in(tname):
+            target_formula_counts[tname] += 1
+            weights, signs = reference_weights(sensitivity, formula, unit=unit)
+            for (sname, col_letters, row_num), w, sign in zip(formula.refs, weights, signs):
+                if sname == tname:
+                    continue  # same-sheet
+                if sname not in index.sheet_names:
+                    continue
+                # Cached (sheet, col) -> header lookup from the scanned header band
+                header = index.column_header(sname, col_to_index(col_letters))
+                topic_id = ascii_id(f"{sname}::{header}")
+                if topic_id not in topic_meta:
+                    topic_meta[topic_id] = {
+                        'sheet': sname,
+                        'header': header,
+                        'samples': set()
+                    }
+                # Sample up to a few examples for description
+                if len(topic_meta[topic_id]['samples']) < 4:
+                    topic_meta[topic_id]['samples'].add(f"{sname}!{col_letters}{row_num}")
+                topic_to_target[(topic_id, tname)] += 1
+                topic_weight[(topic_id, tname)] += w
+                topic_signed[(topic_id, tname)] += w * sign
 
     # Build nodes
     nodes = []
@@ -151,23 +115,29 @@ def build_topic_graph(xlsx_path: Path):
 
     # Build edges with per-target normalization
     # For each target, sum counts and compute weights
+    # (absolute elasticities with sensitivities; counts for targets whose topics all have zero influence)
     counts_by_target = defaultdict(int)
-    for (tid, tname), cnt in topic_to_target.items():
-        counts_by_target[tname] += cnt
+    refs_by_target = Counter()
+    for (tid, tname), mass in topic_weight.items():
+        counts_by_target[tname] += mass
+        refs_by_target[tname] += topic_to_target[(tid, tname)]
     edges = []
     for (tid, tname), cnt in topic_to_target.items():
-        total = counts_by_target[tname] or 1
-        w = round(min(max(cnt / total, 0.0), 1.0), 4)
+        mass, total = topic_weight[(tid, tname)], counts_by_target[tname]
+        if total <= 0:
+            mass, total = cnt, refs_by_target[tname]
+        w = round(min(max(mass / total, 0.0), 1.0), 4)
         meta = topic_meta.get(tid, {})
         src_sheet = meta.get('sheet', '')
+        factors = [f"{cnt} ref(s) from {src_sheet}::{meta.get('header','')}"]
+        if sensitivity is not None:
+            factors.append("Weighted by finite-difference sensitivity")
         edges.append({
             'source': tid,
             'target': tname,
-            'type': 'supports',
+            'type': 'opposes' if topic_signed[(tid, tname)] < 0 else 'supports',
             'weight': w,
-            'contributingFactors': [
-                f"{cnt} ref(s) from {src_sheet}::{meta.get('header','')}"
-            ]
+            'contributingFactors': factors
         })
 
     minimal = {
@@ -179,22 +149,27 @@ def build_topic_graph(xlsx_path: Path):
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: excel_topics_to_minimal.py <workbook.xlsx> [output.json]", file=sys.stderr)
+    argv, scan_opts = pop_scan_args(sys.argv[1:])
+    argv, evaluate = pop_evaluate_arg(argv)
+    if len(argv) < 1:
+        print("Usage: excel_topics_to_minimal.py <workbook.xlsx> [output.json] [--evaluate] [--workers N] [--backend openpyxl|xml] [--cache DIR]", file=sys.stderr)
         sys.exit(2)
-    xlsx = Path(sys.argv[1]).expanduser().resolve()
+    xlsx = Path(argv[0]).expanduser().resolve()
     if not xlsx.exists():
         print(f"File not found: {xlsx}", file=sys.stderr)
         sys.exit(1)
-    out = Path(sys.argv[2]).expanduser().resolve() if len(sys.argv) > 2 else Path(__file__).parent.parent / 'minimal-json' / 'excel-topics-deps.json'
+    out = Path(argv[1]).expanduser().resolve() if len(argv) > 1 else Path(__file__).parent.parent / 'minimal-json' / 'excel-topics-deps.json'
     out.parent.mkdir(parents=True, exist_ok=True)
 
-    minimal = build_topic_graph(xlsx)
+    index = scan_workbook(xlsx, values=evaluate, **scan_opts)
+    minimal = build_topic_graph(index, evaluate_index(index) if evaluate else None)
     with out.open('w', encoding='utf-8') as f:
         json.dump(minimal, f, ensure_ascii=False, indent=2)
 
     print(f"Wrote minimal JSON: {out}")
     print(f"Nodes: {len(minimal['nodes'])}, Edges: {len(minimal['edges'])}")
+    if scan_opts['cache_dir']:
+        print(cache_report(index))
 
 
 if __name__ == '__main__':
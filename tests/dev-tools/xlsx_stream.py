@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Streaming formula reader for .xlsx packages (the ``backend='xml'`` scan).
+
+Purpose
+-------
+openpyxl's read-only mode still builds a ``ReadOnlyCell`` for every cell,
+including the millions of constants the converters never look at. This module
+reads ``xl/worksheets/sheetN.xml`` straight from the zip in 1 MiB blocks cut on
+``</c>`` boundaries and picks out only text and formula cells with one regex
+pass per block, so constant cells never reach Python and memory stays flat
+regardless of sheet size. The small package parts (relationships, workbook,
+shared strings) are read with ``iterparse``.
+``iter_sheet_values(..., numbers=True)`` also yields number cells, for
+``scan_workbook(values=True)`` (formula evaluation needs the constants).
+
+Cell values follow openpyxl's ``WorkSheetParser`` (``data_only=False``) exactly,
+so ``excel_index.scan_workbook(path, backend='xml')`` builds the same index as
+the openpyxl path:
+  * ``<f>`` cells become ``"=" + text``; shared formulas are expanded with
+    openpyxl's ``Translator``; array / data-table formulas are not strings
+  * ``t="s"`` / ``t="inlineStr"`` / ``t="str"`` / ``t="e"`` cells are text
+  * the ``<dimension>`` bounds clip rows and columns like ``iter_rows()``
+
+Cells laid out the way Excel, LibreOffice and openpyxl write them (``r`` as
+the first attribute) take the fast pattern; a block containing anything else
+is re-scanned with a general pattern. Markup outside that subset (non UTF-8,
+CDATA, single-quoted attributes, text cells without ``r``) and structural
+surprises (missing parts) raise, and the caller falls back to openpyxl.
+"""
+
+import hashlib
+import html
+import posixpath
+import re
+import zipfile
+from functools import lru_cache
+from types import SimpleNamespace
+from xml.etree.ElementTree import iterparse
+
+from openpyxl.formula.translate import Translator
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_ISO8601, to_excel
+
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+SHEET_TAG = f'{{{MAIN_NS}}}sheet'
+WORKBOOK_PR_TAG = f'{{{MAIN_NS}}}workbookPr'
+TEXT_TAG = f'{{{MAIN_NS}}}t'
+RUN_TAG = f'{{{MAIN_NS}}}r'
+SI_TAG = f'{{{MAIN_NS}}}si'
+REL_TAG = f'{{{PKG_REL_NS}}}Relationship'
+RID_ATTR = f'{{{REL_NS}}}id'
+
+OFFICE_DOCUMENT = '/officeDocument'
+WORKSHEET_REL = '/worksheet'
+SHARED_STRINGS_REL = '/sharedStrings'
+
+NUMBER_TYPES = (b'n', b'b', b'd')
+COORD_RE = re.compile(r'\$?([A-Za-z]{1,3})\$?(\d+)$')
+
+
+def _col_index(letters: bytes, _cache={}) -> int:
+    """1-based column index of upper-case column letters (memoized)."""
+    idx = _cache.get(letters)
+    if idx is None:
+        idx = 0
+        for ch in letters:
+            idx = idx * 26 + (ch - 64)
+        _cache[letters] = idx
+    return idx
+
+
+def _rels(zf: zipfile.ZipFile, part: str):
+    """Relationship id -> (type, absolute part name) for ``part``."""
+    base = posixpath.dirname(part)
+    rels_path = posixpath.join(base, '_rels', posixpath.basename(part) + '.rels')
+    out = {}
+    with zf.open(rels_path) as src:
+        for _, el in iterparse(src):
+            if el.tag == REL_TAG:
+                target = el.get('Target', '')
+                if target.startswith('/'):
+                    target = target[1:]
+                else:
+                    target = posixpath.normpath(posixpath.join(base, target))
+                out[el.get('Id')] = (el.get('Type', ''), target)
+    return out
+
+
+def _workbook_part(zf: zipfile.ZipFile) -> str:
+    for rel_type, target in _rels(zf, '').values():
+        if rel_type.endswith(OFFICE_DOCUMENT):
+            return target
+    return 'xl/workbook.xml'
+
+
+def workbook_parts(zf: zipfile.ZipFile):
+    """Return ([(sheet name, worksheet part or None)], shared strings part or None).
+
+    Sheets keep workbook order; non-worksheet sheets (chartsheets) map to None.
+    """
+    wb_part = _workbook_part(zf)
+    rels = _rels(zf, wb_part)
+    sheets = []
+    with zf.open(wb_part) as src:
+        for _, el in iterparse(src):
+            if el.tag == SHEET_TAG:
+                rel_type, target = rels.get(el.get(RID_ATTR), ('', None))
+                sheets.append((el.get('name'), target if rel_type.endswith(WORKSHEET_REL) else None))
+    sst = next((t for rt, t in rels.values() if rt.endswith(SHARED_STRINGS_REL)), None)
+    return sheets, sst
+
+
+def workbook_epoch(zf: zipfile.ZipFile):
+    """Date system of the workbook (``workbookPr/@date1904``), as openpyxl's ``Workbook.epoch``."""
+    with zf.open(_workbook_part(zf)) as src:
+        for _, el in iterparse(src):
+            if el.tag == WORKBOOK_PR_TAG:
+                if el.get('date1904', '').lower() in ('1', 'true'):
+                    return CALENDAR_MAC_1904
+                break
+    return CALENDAR_WINDOWS_1900
+
+
+def _text_content(node) -> str:
+    """Plain text of a ``<si>`` / ``<is>`` node (``Text.content``: <t> plus run texts)."""
+    parts = []
+    t = node.find(TEXT_TAG)
+    if t is not None and t.text is not None:
+        parts.append(t.text)
+    for run in node.findall(RUN_TAG):
+        t = run.find(TEXT_TAG)
+        if t is not None and t.text is not None:
+            parts.append(t.text)
+    return ''.join(parts)
+
+
+def read_shared_strings(zf: zipfile.ZipFile, part) -> list:
+    """Shared string table, read incrementally (``read_string_table``)."""
+    strings = []
+    if part is None or part not in zf.NameToInfo:
+        return strings
+    with zf.open(part) as src:
+        for _, el in iterparse(src):
+            if el.tag == SI_TAG:
+                strings.append(_text_content(el).replace('x005F_', ''))
+                el.clear()
+    return strings
+
+
+def _dimension_bounds(ref: str):
+    """(max_col, max_row) of a ``<dimension ref>`` like openpyxl's ``range_boundaries``."""
+    end = ref.split(':')[-1]
+    m = COORD_RE.match(end)
+    if not m:
+        return None, None
+    return _col_index(m.group(1).upper().encode()), int(m.group(2))
+
+
+def _xml_text(raw: bytes) -> str:
+    """Character data as an XML parser reports it (line ends normalized, entities resolved)."""
+    text = raw.decode('utf-8')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    if '&' in text:
+        text = html.unescape(text)
+    return text
+
+
+@lru_cache(maxsize=None)
+def _sheet_patterns(prefix: bytes):
+    """Byte patterns for a worksheet whose elements use namespace ``prefix`` (b'' or b'x:')."""
+    p = re.escape(prefix)
+    return SimpleNamespace(
+        # Text / formula cells with ``r`` as the first attribute, as Excel,
+        # LibreOffice and openpyxl write them; other cells never match
+        fast=re.compile(b'<' + p + b'c\\s+r="([A-Z]{1,3})(\\d+)"'
+                        b'(?=[^>]*?\\st\\s*=\\s*"(?:s|str|inlineStr|e)"|[^>]*+>\\s*<' + p + b'f[\\s/>])'
+                        b'([^>]*+)(?<!/)>(.*?)</' + p + b'c>', re.S),
+        # Every non-empty cell (``numbers=True``), ``r`` first
+        fast_all=re.compile(b'<' + p + b'c\\s+r="([A-Z]{1,3})(\\d+)"([^>]*+)(?<!/)>(.*?)</' + p + b'c>', re.S),
+        # Same cells with attributes in any order
+        general=re.compile(
+            b'<' + p + b'c((?:\\s[^>]*?)?\\st\\s*=\\s*"(?:s|str|inlineStr|e)"[^>]*?)(?<!/)>(.*?)</' + p + b'c>'
+            b'|<' + p + b'c((?:\\s[^>]*?)?)(?<!/)>(\\s*<' + p + b'f[\\s/>].*?)</' + p + b'c>', re.S),
+        general_all=re.compile(b'<' + p + b'c((?:\\s[^>]*?)?)(?<!/)>(.*?)</' + p + b'c>', re.S),
+        # A cell the fast pattern cannot see (no ``r`` or ``r`` not first)
+        # sends the chunk to ``general``
+        unordered=re.compile(b'<' + p + b'c(?:>|\\s+(?!r="[A-Z]{1,3}\\d+")[^\\s/>])'),
+        single_quoted=re.compile(b'<' + p + b'c\\s[^>]*\'', re.S),
+        formula=re.compile(b'\\s*<' + p + b'f((?:\\s[^>]*?)?)(?:/>|>(.*?)</' + p + b'f>)', re.S),
+        value=re.compile(b'<' + p + b'v>(.*?)</' + p + b'v>', re.S),
+        inline=re.compile(b'<' + p + b'is>(.*?)</' + p + b'is>', re.S),
+        inline_text=re.compile(b'<' + p + b't(?:\\s[^>]*)?>(.*?)</' + p + b't>', re.S),
+        phonetic=re.compile(b'<' + p + b'rPh\\b.*?</' + p + b'rPh>', re.S),
+        simple_inline=(b'<' + prefix + b'is><' + prefix + b't>', b'</' + prefix + b't></' + prefix + b'is>'),
+        cell_end=b'</' + prefix + b'c>',
+        dimension=re.compile(b'<' + p + b'dimension\\s[^>]*?ref="([^"]*)"'),
+        shared_string_ref=re.compile(b'<' + p + b'c\\s(?=[^>]*?\\st\\s*=\\s*"s")[^>]*+(?<!/)>\\s*<'
+                                     + p + b'v>\\s*(\\d+)\\s*</' + p + b'v>'),
+    )
+
+
+ROOT_RE = re.compile(rb'<(\w+:)?worksheet[\s>]')
+ENCODING_RE = re.compile(rb'<\?xml[^>]*encoding="([^"]+)"')
+ATTR_RE = re.compile(rb'([\w:]+)\s*=\s*"([^"]*)"')
+READ_BLOCK = 1 << 20
+
+
+def _cell_chunks(src, head: bytes, cell_end: bytes):
+    """Yield ``head`` + the rest of ``src`` in pieces that end right after a ``</c>``."""
+    buf = head
+    while True:
+        block = src.read(READ_BLOCK)
+        if not block:
+            if buf:
+                yield buf
+            return
+        buf += block
+        cut = buf.rfind(cell_end)
+        if cut >= 0:
+            cut += len(cell_end)
+            yield buf[:cut]
+            buf = buf[cut:]
+
+
+def iter_sheet_values(src, shared_strings, numbers: bool = False, epoch=CALENDAR_WINDOWS_1900):
+    """Yield ``(row, col, address, value)`` for every string-valued cell of a worksheet stream.
+
+    ``value`` is what openpyxl would return (``"=..."`` for formulas). Numbers,
+    booleans, dates and array / data-table formulas are skipped: the index only
+    reads string values. With ``numbers=True`` number, boolean and date cells
+    are yielded too, as floats (booleans 1/0, ISO dates as serials from
+    ``epoch``, see ``workbook_epoch``).
+    Raises ``ValueError`` on markup this reader does not handle (non UTF-8,
+    CDATA, single-quoted attributes, cells without ``r``).
+    """
+    shared_formulae = {}
+    head = src.read(READ_BLOCK)
+    enc = ENCODING_RE.search(head, 0, 200)
+    if enc and enc.group(1).lower().replace(b'-', b'') != b'utf8':
+        raise ValueError(f"unsupported sheet encoding {enc.group(1)!r}")
+    root = ROOT_RE.search(head)
+    if root is None:
+        raise ValueError('worksheet root element not found')
+    pat = _sheet_patterns(root.group(1) or b'')
+    dim = pat.dimension.search(head)
+    max_col, max_row = _dimension_bounds(dim.group(1).decode()) if dim else (None, None)
+
+    for chunk in _cell_chunks(src, head, pat.cell_end):
+        if b'<![CDATA[' in chunk or (b"='" in chunk and pat.single_quoted.search(chunk)):
+            raise ValueError('CDATA / single-quoted attributes in sheet XML')
+        if pat.unordered.search(chunk):
+            cells = _general_cells(pat, chunk, numbers)
+        else:
+            cells = (m.groups() for m in (pat.fast_all if numbers else pat.fast).finditer(chunk))
+
+        for letters, row_digits, attrs, body in cells:
+            row = int(row_digits)
+            if max_row is not None and row > max_row:
+                return
+            col = _col_index(letters)
+            if max_col is not None and col > max_col:
+                continue
+
+            fm = pat.formula.match(body)
+            if fm:
+                address = (letters + row_digits).decode()
+                fa = dict(ATTR_RE.findall(fm.group(1))) if fm.group(1) else {}
+                ftype = fa.get(b't')
+                value = '=' + (_xml_text(fm.group(2)) if fm.group(2) else '')
+                if ftype == b'shared':
+                    si = fa.get(b'si')
+                    if si in shared_formulae:
+                        value = shared_formulae[si].translate_formula(address)
+                    elif value != '=':
+                        shared_formulae[si] = Translator(value, address)
+                elif ftype in (b'array', b'dataTable'):
+                    continue
+                yield row, col, address, value
+                continue
+
+            t = _cell_type(attrs)
+            if t in NUMBER_TYPES:
+                vm = pat.value.search(body)
+                if vm is None or not vm.group(1).strip():
+                    continue
+                raw = vm.group(1).decode().strip()
+                yield row, col, None, to_excel(from_ISO8601(raw), epoch) if t == b'd' else float(raw)
+                continue
+            if t == b'inlineStr':
+                start, end = pat.simple_inline
+                if body.startswith(start) and body.endswith(end) and b'<' not in body[len(start):-len(end)]:
+                    value = _xml_text(body[len(start):-len(end)])
+                else:
+                    im = pat.inline.search(body)
+                    if im is None:
+                        continue
+                    inner = pat.phonetic.sub(b'', im.group(1))
+                    value = ''.join(_xml_text(x) for x in pat.inline_text.findall(inner))
+            else:
+                vm = pat.value.search(body)
+                if vm is None or not vm.group(1):
+                    continue
+                value = _xml_text(vm.group(1))
+                if t == b's':
+                    value = shared_strings[int(value)]
+            yield row, col, None, value
+
+
+def _cell_type(attrs: bytes) -> bytes:
+    """``t`` attribute of a text cell from its attribute bytes (``n`` if absent)."""
+    for t in (b's', b'inlineStr', b'str', b'e'):
+        if attrs.endswith(b't="' + t + b'"'):
+            return t
+    m = re.search(rb'\bt\s*=\s*"([^"]*)"', attrs)
+    return m.group(1) if m else b'n'
+
+
+def _general_cells(pat, chunk: bytes, numbers: bool = False):
+    """(column letters, row digits, attributes, body) for text / formula cells (all cells with ``numbers``) in any layout."""
+    for m in (pat.general_all if numbers else pat.general).finditer(chunk):
+        attrs, body = (m.group(1), m.group(2)) if m.group(2) is not None else (m.group(3), m.group(4))
+        ref = dict(ATTR_RE.findall(attrs)).get(b'r')
+        cm = COORD_RE.match(ref.decode()) if ref else None
+        if cm is None:
+            raise ValueError('cell without an r attribute')
+        yield cm.group(1).upper().encode(), cm.group(2).encode(), attrs, body
+
+
+def shared_string_bound(src) -> int:
+    """1 + the highest shared-string index a worksheet stream references (0 if none)."""
+    head = src.read(READ_BLOCK)
+    root = ROOT_RE.search(head)
+    if root is None:
+        raise ValueError('worksheet root element not found')
+    pat = _sheet_patterns(root.group(1) or b'')
+    bound = 0
+    for chunk in _cell_chunks(src, head, pat.cell_end):
+        for m in pat.shared_string_ref.finditer(chunk):
+            bound = max(bound, int(m.group(1)) + 1)
+    return bound
+
+
+SI_RE = re.compile(rb'<(\w+:)?si[\s/>]')
+
+
+def strings_digest(sst_xml: bytes, n_strings: int):
+    """sha256 of the first ``n_strings`` ``<si>`` entries of a shared-strings part.
+
+    Only the entries themselves are hashed (not the ``count`` header), so
+    strings appended by an edit elsewhere leave the digest unchanged. Returns
+    None when the table has fewer than ``n_strings`` entries.
+    """
+    if n_strings == 0:
+        return ''
+    first = SI_RE.search(sst_xml)
+    if first is None:
+        return None
+    prefix = first.group(1) or b''
+    close = re.compile(b'</' + re.escape(prefix) + b'si>|<' + re.escape(prefix) + b'si/>')
+    end, count = first.start(), 0
+    for m in close.finditer(sst_xml, first.start()):
+        end, count = m.end(), count + 1
+        if count == n_strings:
+            return hashlib.sha256(sst_xml[first.start():end]).hexdigest()
+    return None
+
+
+def open_package(xlsx_path) -> zipfile.ZipFile:
+    return zipfile.ZipFile(str(xlsx_path))
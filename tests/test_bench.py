@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Smoke test for the benchmark harness in tests/dev-tools/bench.py (tiny sizes,
+in-process, so it stays fast).
+
+Run:
+    python3 -m pytest -q tests/test_bench.py
+"""
+
+import pytest
+
+pytest.importorskip('openpyxl')
+
+import bench
+from beliefgraph import compile_graph
+from excel_index import scan_workbook
+
+
+def test_generators_match_requested_shape(tmp_path):
+    path = tmp_path / 'bench.xlsx'
+    n = bench.make_workbook(path, sheets=3, rows=40, formula_cols=2, density=0.5, cross=0.5)
+    index = scan_workbook(path)
+    assert index.sheet_names == ['Projection', 'Sheet 1', 'Sheet 2']
+    assert sum(index.formula_counts.values()) == n > 0
+    assert any(f.refs for f in index.formulas)
+
+    graph = compile_graph(bench.make_belief_graph(50, fan_in=3))
+    assert len(graph.ids) == 50
+    assert len(graph.edge_source) == 3 * (50 - 5)
+
+
+def test_run_benchmarks_and_compare(tmp_path):
+    params = dict(bench.PRESETS['small'], rows=30, nodes=60)
+    report = bench.run_benchmarks(params, ['scan_xml', 'build_lineage_graph', 'propagate_lite'],
+                                  repeat=1, isolate=False, workdir=tmp_path)
+    assert [r['case'] for r in report['results']] == ['scan_xml', 'build_lineage_graph', 'propagate_lite']
+    assert all(r['wall_s'] >= 0 and r['items'] > 0 for r in report['results'])
+    assert report['params'] == params and 'python' in report['env']
+
+    slow = {**report, 'results': [dict(r, wall_s=r['wall_s'] * 3 + 1) for r in report['results']]}
+    assert [case for case, _, _ in bench.compare(slow, report)] == ['scan_xml', 'build_lineage_graph', 'propagate_lite']
+    assert bench.compare(report, slow) == []
+    assert bench.compare(slow, dict(report, params={})) == []
+    with pytest.raises(ValueError):
+        bench.run_benchmarks(params, ['nope'], isolate=False, workdir=tmp_path)
@@ -0,0 +1,750 @@
+#!/usr/bin/env python3
+"""
+Tests for the headless Python engine (beliefgraph/).
+
+Expected values are computed by hand from the formulas in
+Belief_Graph_Math_Core.md, mirroring the cases in test_validation.py.
+
+Run:
+    python3 -m pytest -q tests/test_engine.py
+"""
+
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from beliefgraph import FACT_PROB, compile_graph, load_graph, propagate_heavy, propagate_lite
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def graph(nodes, edges):
+    return compile_graph({'version': '2', 'nodes': nodes, 'edges': edges})
+
+
+def prob(g, probs, nid):
+    return probs[g.index[nid]]
+
+
+def test_heavy_single_parent():
+    g = graph([{'id': 'a', 'type': 'fact'}, {'id': 'b', 'type': 'assertion'}],
+              [{'source': 'a', 'target': 'b', 'cpt': {'condTrue': 80, 'condFalse': 20, 'baseline': 50}}])
+    p = propagate_heavy(g)
+    assert math.isclose(prob(g, p, 'b'), 0.8 * FACT_PROB + 0.2 * (1 - FACT_PROB))
+
+
+def test_heavy_two_parent_enumeration():
+    g = graph([{'id': 'a', 'type': 'fact'}, {'id': 'b', 'type': 'fact'}, {'id': 'c', 'type': 'assertion'}],
+              [{'source': 'a', 'target': 'c', 'cpt': {'condTrue': 80, 'condFalse': 20, 'baseline': 50}},
+               {'source': 'b', 'target': 'c', 'cpt': {'condTrue': 70, 'condFalse': 30, 'baseline': 50}}])
+    fact_probs = g.fact_prob.copy()
+    fact_probs[[g.index['a'], g.index['b']]] = [0.6, 0.4]
+    p = propagate_heavy(g, fact_probs=fact_probs)
+    expected = 0.0
+    for a_true in (False, True):
+        for b_true in (False, True):
+            p_combo = (0.6 if a_true else 0.4) * (0.4 if b_true else 0.6)
+            likelihood = (0.8 if a_true else 0.2) * (0.7 if b_true else 0.3)
+            expected += p_combo * min(1, likelihood / 0.5)
+    assert math.isclose(prob(g, p, 'c'), expected)
+
+
+def test_heavy_logic_nodes_and_virgin():
+    g = graph([{'id': 'a', 'type': 'fact'}, {'id': 'b', 'type': 'fact'},
+               {'id': 'and', 'type': 'and'}, {'id': 'or', 'type': 'or'}, {'id': 'x', 'type': 'assertion'}],
+              [{'source': 'a', 'target': 'and'}, {'source': 'b', 'target': 'and', 'cpt': {'inverse': True}},
+               {'source': 'a', 'target': 'or'}, {'source': 'b', 'target': 'or'},
+               {'source': 'a', 'target': 'x'}])  # no CPT -> x stays virgin
+    p = propagate_heavy(g)
+    assert math.isclose(prob(g, p, 'and'), FACT_PROB * (1 - FACT_PROB))
+    assert math.isclose(prob(g, p, 'or'), 1 - (1 - FACT_PROB) ** 2)
+    assert math.isnan(prob(g, p, 'x'))
+
+
+def test_heavy_do_intervention_batch():
+    g = graph([{'id': 'x', 'type': 'fact'}, {'id': 'y', 'type': 'assertion'}],
+              [{'source': 'x', 'target': 'y', 'cpt': {'condTrue': 90, 'condFalse': 10, 'baseline': 50}}])
+    p = propagate_heavy(g, do={'x': np.array([0.0, 1.0])})
+    assert p.shape == (2, 2)
+    assert np.allclose(p[:, g.index['y']], [0.1, 0.9])
+
+
+def test_lite_single_edge_and_opposes():
+    g = graph([{'id': 'a', 'type': 'fact'}, {'id': 'b'}, {'id': 'c'}, {'id': 'd'}],
+              [{'source': 'a', 'target': 'b', 'weight': 0.6},
+               {'source': 'a', 'target': 'c', 'weight': 0.6, 'type': 'opposes'},
+               {'source': 'a', 'target': 'd', 'weight': 1.0}])
+    result = propagate_lite(g)
+    assert result.converged
+    odds = math.log(0.99 / 0.01)  # parent prob is epsilon-clamped before the logit
+    sat = 1 - math.exp(-0.6)
+    assert math.isclose(prob(g, result.probs, 'b'), 1 / (1 + math.exp(-sat * 0.6 * odds)))
+    assert math.isclose(prob(g, result.probs, 'c'), 1 / (1 + math.exp(sat * 0.6 * odds)))
+    # High-weight single edge copies the parent
+    assert math.isclose(prob(g, result.probs, 'd'), FACT_PROB)
+
+
+def test_lite_inert_fact_and_notes():
+    g = graph([{'id': 'a', 'type': 'fact', 'inert': True}, {'id': 'b', 'type': 'assertion'},
+               {'id': 'n', 'type': 'note'}],
+              [{'source': 'a', 'target': 'b', 'weight': 0.6}])
+    result = propagate_lite(g)
+    assert math.isnan(prob(g, result.probs, 'b'))
+    assert math.isnan(prob(g, result.probs, 'n'))
+
+
+def test_csr_and_topological_order():
+    g = graph([{'id': 'c'}, {'id': 'b'}, {'id': 'a'}],
+              [{'source': 'a', 'target': 'b', 'weight': 0.5}, {'source': 'b', 'target': 'c', 'weight': 0.5}])
+    assert [g.ids[v] for v in g.order] == ['a', 'b', 'c']
+    assert list(g.edge_source[g.parents(g.index['c'])]) == [g.index['b']]
+    assert list(g.edge_target[g.children(g.index['a'])]) == [g.index['b']]
+    # Omitted types are inferred from connectivity
+    assert g.node_type[g.index['a']] == 0 and g.node_type[g.index['c']] == 1
+
+
+def test_dangling_edge_rejected():
+    with pytest.raises(ValueError):
+        graph([{'id': 'a'}], [{'source': 'a', 'target': 'missing'}])
+
+
+REPO_GRAPHS = sorted((ROOT / 'tests' / 'minimal-json').glob('*.json')) + \
+    sorted(p for p in (ROOT / 'examples').glob('*.json') if p.stat().st_size)
+
+
+@pytest.mark.parametrize('path', REPO_GRAPHS)
+def test_repo_graphs_propagate(path):
+    g = load_graph(path)
+    for probs in (propagate_heavy(g), propagate_lite(g).probs):
+        finite = probs[~np.isnan(probs)]
+        assert np.all((finite >= 0) & (finite <= 1))
+
+
+@pytest.mark.parametrize('k', [3, 9, 14])
+def test_many_parent_kernels_match_enumeration(k):
+    from beliefgraph.heavy import (baseline_probs, bucketed_marginal, clamp_cpt, enumerated_marginal,
+                                   exact_marginal)
+    rng = np.random.default_rng(k)
+    probs = rng.uniform(0, 1, (5, k))
+    p_true, p_false = clamp_cpt(rng.uniform(1, 99, k)), clamp_cpt(rng.uniform(1, 99, k))
+    baseline = baseline_probs(rng.uniform(30, 70, k))
+    exact = exact_marginal(probs, p_true, p_false, baseline)
+    assert np.allclose(enumerated_marginal(probs, p_true, p_false, baseline, chunk_bits=4), exact, atol=1e-12)
+    dp, bound = bucketed_marginal(probs, p_true, p_false, baseline, return_bound=True)
+    assert (np.abs(dp - exact) <= bound + 1e-12).all() and bound.max() < 1e-3
+
+
+def test_heavy_exact_many_parents_is_opt_in():
+    k = 12
+    nodes = [{'id': f'f{i}', 'type': 'fact'} for i in range(k)] + [{'id': 'c', 'type': 'assertion'}]
+    edges = [{'source': f'f{i}', 'target': 'c', 'cpt': {'condTrue': 40, 'condFalse': 30, 'baseline': 50}}
+             for i in range(k)]
+    g = graph(nodes, edges)
+    from beliefgraph.heavy import exact_marginal
+    expected = exact_marginal(np.full((1, k), FACT_PROB), 0.4, 0.3, 0.5)[0]
+    exact = prob(g, propagate_heavy(g, exact_many_parents=True), 'c')
+    assert math.isclose(exact, expected, abs_tol=1e-9)
+    assert not math.isclose(prob(g, propagate_heavy(g), 'c'), expected, abs_tol=1e-3)
+
+
+def test_accuracy_report_rows():
+    from beliefgraph.accuracy import many_parent_report
+    rows = many_parent_report(fan_ins=(10, 20), n_cases=5, profiles=('wide',))
+    assert [r['method'] for r in rows] == ['enumeration', 'bucketed-dp']
+    assert all(r['log_odds_max_abs_err'] >= r['log_odds_mean_abs_err'] >= 0 for r in rows)
+
+
+def random_dag(n, fan_in, seed=0):
+    rng = np.random.default_rng(seed)
+    n_facts = max(fan_in, n // 8)
+    nodes = [{'id': f'n{i}', 'type': 'fact' if i < n_facts else ('and' if i % 17 == 0 else 'assertion')}
+             for i in range(n)]
+    edges = []
+    for i in range(n_facts, n):
+        for j in rng.choice(i, size=min(fan_in, i), replace=False):
+            edges.append({'id': f'e{len(edges)}', 'source': f'n{j}', 'target': f'n{i}',
+                          'type': 'opposes' if rng.random() < 0.2 else 'supports',
+                          'weight': round(float(rng.uniform(0.1, 1)), 3),
+                          'cpt': {'condTrue': int(rng.integers(55, 95)), 'condFalse': int(rng.integers(5, 45)),
+                                  'baseline': 50}})
+    return {'version': '2', 'nodes': nodes, 'edges': edges}
+
+
+@pytest.mark.parametrize('mode', ['heavy', 'lite'])
+def test_incremental_matches_full_recompute(mode):
+    from beliefgraph import IncrementalPropagator
+    g = compile_graph(random_dag(300, 3))
+    live = IncrementalPropagator(g, mode=mode, tolerance=0)
+    rng = np.random.default_rng(1)
+    for step in range(40):
+        e = int(rng.integers(g.n_edges))
+        if step % 3 == 0:
+            live.set_fact_prob(f'n{int(rng.integers(37))}', float(rng.uniform(0.1, 0.99)))
+        elif step % 3 == 1:
+            live.set_weight(e, float(rng.uniform(0.05, 1)))
+        else:
+            live.set_cpt(f'e{e}', condTrue=float(rng.integers(50, 99)))
+        full = propagate_heavy(g) if mode == 'heavy' else propagate_lite(g, tolerance=0).probs
+        np.testing.assert_allclose(live.probs, full, rtol=0, atol=1e-12)
+        assert live.last_updates < g.n_nodes
+
+
+def test_incremental_touches_only_the_cone_and_stops_early():
+    from beliefgraph import IncrementalPropagator
+    g = graph([{'id': 'a', 'type': 'fact'}, {'id': 'b', 'type': 'fact'},
+               {'id': 'c', 'type': 'assertion'}, {'id': 'd', 'type': 'assertion'}, {'id': 'x', 'type': 'assertion'}],
+              [{'source': 'a', 'target': 'c', 'cpt': {'condTrue': 80, 'condFalse': 20, 'baseline': 50}},
+               {'source': 'c', 'target': 'd', 'cpt': {'condTrue': 70, 'condFalse': 30, 'baseline': 50}},
+               {'source': 'b', 'target': 'x', 'cpt': {'condTrue': 60, 'condFalse': 40, 'baseline': 50}}])
+    live = IncrementalPropagator(g, mode='heavy')
+    live.set_cpt(('a', 'c'), condTrue=90)
+    assert live.flush() == 2                       # c and d; x untouched
+    live.set_fact_prob('a', FACT_PROB + 1e-12)     # below tolerance: nothing downstream is recomputed
+    assert live.flush() == 0
+    live.set_fact_prob('a', 0.5)
+    assert live.flush() == 2 and math.isclose(live.prob('c'), 0.9 * 0.5 + 0.2 * 0.5)
+    with pytest.raises(KeyError):
+        live.set_weight(('a', 'd'), 0.5)
+    with pytest.raises(KeyError):
+        live.set_weight('no-such-edge', 0.5)
+
+
+def test_ate_matrix_matches_per_pair_do():
+    from beliefgraph import ate_matrix, compute_do, dose_response
+    g = compile_graph(random_dag(120, 3))
+    res = ate_matrix(g, row_chunk=16)
+    rng = np.random.default_rng(2)
+    for t, o in rng.integers(len(res.treatments), size=(12, 2)):
+        x, y = res.treatments[t], res.outcomes[o]
+        p1 = prob(g, propagate_heavy(g, do={x: 1.0}), y)
+        p0 = prob(g, propagate_heavy(g, do={x: 0.0}), y)
+        assert math.isclose(res.effect(x, y)['ate'], p1 - p0, abs_tol=1e-12)
+    assert res.effect('n50', 'n50')['ate'] == 1.0
+    assert all(t != 'n119' for t, _ in res.top_drivers('n119', 5))
+    doses = np.linspace(0, 1, 5)
+    curve = dose_response(g, 'n40', doses, outcomes=['n119'])
+    np.testing.assert_allclose(curve[:, 0], propagate_heavy(g, do={'n40': doses})[:, g.index['n119']], atol=1e-12)
+    assert math.isclose(compute_do(g, {'n40': 0.25})['n119'], curve[1, 0], abs_tol=1e-12)
+
+
+def test_interventions_with_row_dependent_virgin_parents():
+    from beliefgraph import propagate_interventions
+    # v has no CPT parents (virgin, NaN) unless intervened on; y must ignore it per row
+    g = graph([{'id': 'a', 'type': 'fact'}, {'id': 'b', 'type': 'fact'},
+               {'id': 'v', 'type': 'assertion'}, {'id': 'y', 'type': 'assertion'}],
+              [{'source': 'a', 'target': 'v'},
+               {'source': 'v', 'target': 'y', 'cpt': {'condTrue': 90, 'condFalse': 10, 'baseline': 50}},
+               {'source': 'b', 'target': 'y', 'cpt': {'condTrue': 70, 'condFalse': 30, 'baseline': 50}}])
+    v, y = g.index['v'], g.index['y']
+    state = propagate_interventions(g, [[v], [-1], [v]], [[1.0], [0.0], [0.0]])
+    for row, do in zip(state, [{'v': 1.0}, {}, {'v': 0.0}]):
+        assert math.isclose(row[y], prob(g, propagate_heavy(g, do=do), 'y'), abs_tol=1e-12)
+    assert np.isnan(state[1, v])
+
+
+def moral_d_separated(g, X, Y, Z):
+    """isDSeparated from do-calculus.js: moralized ancestral graph, Z removed, BFS X -> Y."""
+    parents = [set() for _ in range(g.n_nodes)]
+    for s, t in zip(g.edge_source.tolist(), g.edge_target.tolist()):
+        parents[t].add(s)
+    needed, stack = set(X) | set(Y) | set(Z), list(set(X) | set(Y) | set(Z))
+    while stack:
+        for p in parents[stack.pop()] - needed:
+            needed.add(p)
+            stack.append(p)
+    undirected = {v: set() for v in needed - set(Z)}
+    for v in needed:
+        ps = sorted(parents[v] & needed)
+        for i, p in enumerate(ps):
+            for q in ps[i + 1:] + [v]:
+                if p in undirected and q in undirected:
+                    undirected[p].add(q)
+                    undirected[q].add(p)
+    seen, queue = set(), [x for x in X if x in undirected]
+    while queue:
+        v = queue.pop()
+        if v in seen:
+            continue
+        seen.add(v)
+        if v in Y:
+            return False
+        queue.extend(undirected[v] - seen)
+    return True
+
+
+def test_reachability_d_separation_matches_moral_graph():
+    from beliefgraph import ReachabilityIndex
+    g = compile_graph(random_dag(80, 2))
+    reach = ReachabilityIndex(g)
+    rng = np.random.default_rng(3)
+    queries = []
+    for _ in range(600):
+        x, y = (int(v) for v in rng.choice(80, 2, replace=False))
+        queries.append(([x], [y], [int(z) for z in rng.choice(80, int(rng.integers(0, 4)), replace=False)
+                                   if z not in (x, y)]))
+    expected = [moral_d_separated(g, *q) for q in queries]
+    assert [reach.d_separated(*q) for q in queries] == expected
+    assert reach.d_separated_many(queries).tolist() == expected
+
+
+def test_reachability_tracks_edge_edits():
+    from beliefgraph import ReachabilityIndex
+    g = graph([{'id': c, 'type': 'assertion'} for c in 'abcde'],
+              [{'source': 'a', 'target': 'b'}, {'source': 'b', 'target': 'c'}, {'source': 'a', 'target': 'c'}])
+    reach = ReachabilityIndex(g)
+    assert reach.would_create_cycle('c', 'a') and not reach.would_create_cycle('a', 'd')
+    with pytest.raises(ValueError):
+        reach.add_edge('c', 'a')
+    reach.add_edge('c', 'd')
+    reach.add_edge('d', 'e')
+    assert reach.is_ancestor('a', 'e') and [reach.ids[i] for i in reach.ancestral_set(['e'])] == list('abcde')
+    reach.remove_edge('b', 'c')
+    assert not reach.is_ancestor('b', 'e') and reach.is_ancestor('a', 'e')
+    reach.remove_edge('a', 'c')
+    assert reach.ancestors('e').tolist() == [2, 3]
+    # confounder z -> x, z -> y with x -> y: {z} is a backdoor set, {} is not, a descendant of x is rejected
+    g = graph([{'id': c, 'type': 'assertion'} for c in 'zxyw'],
+              [{'source': 'z', 'target': 'x'}, {'source': 'z', 'target': 'y'},
+               {'source': 'x', 'target': 'y'}, {'source': 'x', 'target': 'w'}])
+    reach = ReachabilityIndex(g)
+    assert reach.satisfies_backdoor('x', 'y', ['z']) and not reach.satisfies_backdoor('x', 'y', [])
+    assert not reach.satisfies_backdoor('x', 'y', ['z', 'w'])
+
+
+def lite_sweeps_to_fixed_point(g, tolerance=1e-12, max_sweeps=2000):
+    x = propagate_lite(g, max_iters=1).probs
+    for _ in range(max_sweeps):
+        y = propagate_lite(g, initial=x, max_iters=1).probs
+        if np.array_equal(np.isnan(x), np.isnan(y)) and np.nanmax(np.abs(y - x), initial=0) < tolerance:
+            return y
+        x = y
+    raise AssertionError('lite sweeps did not converge')
+
+
+@pytest.mark.parametrize('anderson', [0, 5])
+def test_sparse_lite_solver_matches_converged_sweeps(anderson):
+    from beliefgraph import solve_lite
+    doc = random_dag(300, 3)
+    rng = np.random.default_rng(4)
+    for k in range(60):                      # back edges make cycles
+        i, j = sorted(int(v) for v in rng.choice(range(40, 300), 2, replace=False))
+        doc['edges'].append({'id': f'b{k}', 'source': f'n{j}', 'target': f'n{i}',
+                             'type': 'opposes' if k % 4 == 0 else 'supports', 'weight': 0.9})
+    doc['nodes'].append({'id': 'gate', 'type': 'or'})
+    doc['edges'] += [{'source': 'n290', 'target': 'gate'}, {'source': 'n3', 'target': 'gate', 'type': 'opposes'}]
+    g = compile_graph(doc)
+    res = solve_lite(g, anderson=anderson)
+    assert res.converged and res.final_delta < 1e-10 and res.residuals[-1] == res.final_delta
+    np.testing.assert_allclose(res.probs, lite_sweeps_to_fixed_point(g), rtol=0, atol=1e-9)
+
+
+def test_sparse_lite_solver_ring_and_repo_graphs():
+    from beliefgraph import solve_lite
+    # A ring entered at its last node: sweeps define one node per pass around the ring
+    n = 50
+    g = graph([{'id': 'f', 'type': 'fact'}] + [{'id': f'a{i}', 'type': 'assertion'} for i in range(n)],
+              [{'source': 'f', 'target': 'a0', 'weight': 0.3}] +
+              [{'source': f'a{i}', 'target': f'a{(i + 1) % n}', 'weight': 0.8} for i in range(n)])
+    res = solve_lite(g)
+    assert res.converged and not np.isnan(res.probs).any()
+    np.testing.assert_allclose(res.probs, lite_sweeps_to_fixed_point(g), rtol=0, atol=1e-9)
+    for path in sorted((ROOT / 'tests' / 'minimal-json').glob('*.json')):
+        g = load_graph(path)
+        np.testing.assert_allclose(solve_lite(g).probs, lite_sweeps_to_fixed_point(g), rtol=0, atol=1e-9)
+
+
+def test_monte_carlo_bands_and_streaming():
+    from beliefgraph import solve_lite
+    from beliefgraph.montecarlo import Histogram, iter_monte_carlo, monte_carlo
+    g = compile_graph(random_dag(60, 2))
+    # Almost no parameter noise: every quantile collapses onto the point estimate
+    heavy = monte_carlo(g, 64, mode='heavy', chunk=32, cpt_concentration=1e9)
+    point = propagate_heavy(g)
+    np.testing.assert_allclose(heavy.quantiles, np.broadcast_to(point, heavy.quantiles.shape), atol=2e-3)
+    lite = monte_carlo(g, 16, mode='lite', weight_jitter=0.0)
+    np.testing.assert_allclose(lite.mean, solve_lite(g).probs, atol=1e-9)
+    # Noisy run: streamed partials grow, bands are ordered, results do not depend on the worker count
+    partials = list(iter_monte_carlo(g, 300, chunk=128, seed=7))
+    assert [p.samples for p in partials] == [128, 256, 300]
+    final = partials[-1]
+    q05, q50, q95 = final.quantiles
+    assert np.all(q05[~np.isnan(q05)] <= q50[~np.isnan(q05)]) and np.all(q50[~np.isnan(q50)] <= q95[~np.isnan(q50)])
+    assert final.band('n59')['q95'] > final.band('n59')['q05']
+    node = final.to_dict()['nodes']['n59']
+    assert node == dict({k: round(v, 6) for k, v in final.band('n59').items()}, defined=node['defined'])
+    pooled = monte_carlo(g, 300, chunk=128, seed=7, workers=2)
+    np.testing.assert_array_equal(pooled.quantiles, final.quantiles)
+    # Histogram quantiles are within one bucket of the exact sample quantiles
+    samples = np.random.default_rng(0).beta(2, 5, size=(5000, 3))
+    hist = Histogram(3, bins=200)
+    hist.add(samples[:2500])
+    hist.add(samples[2500:])
+    np.testing.assert_allclose(hist.quantiles([0.1, 0.5, 0.9]), np.quantile(samples, [0.1, 0.5, 0.9], axis=0), atol=1 / 200)
+    np.testing.assert_allclose(hist.mean(), samples.mean(axis=0))
+
+
+def central_difference(g, target, mode, arr, i, h, exact_many_parents=False):
+    def value():
+        if mode == 'heavy':
+            return propagate_heavy(g, exact_many_parents=exact_many_parents)[g.index[target]]
+        from beliefgraph import solve_lite
+        return solve_lite(g).probs[g.index[target]]
+    old = arr[i]
+    arr[i] = old + h
+    up = value()
+    arr[i] = old - h
+    down = value()
+    arr[i] = old
+    return (up - down) / (2 * h)
+
+
+def many_parent_doc(n_mid):
+    nodes = [{'id': f'f{i}', 'type': 'fact'} for i in range(n_mid)] + \
+            [{'id': f'a{i}', 'type': 'assertion'} for i in range(n_mid)] + [{'id': 't', 'type': 'assertion'}]
+    edges = [{'source': f'f{i}', 'target': f'a{i}', 'cpt': {'condTrue': 70 + i, 'condFalse': 20 + i, 'baseline': 50}}
+             for i in range(n_mid)]
+    edges += [{'source': f'a{i}', 'target': 't', 'cpt': {'condTrue': 60 + 2 * i, 'condFalse': 30 + i, 'baseline': 40 + i}}
+              for i in range(n_mid)]
+    return {'version': '2', 'nodes': nodes, 'edges': edges}
+
+
+@pytest.mark.parametrize('case', ['heavy-dag', 'heavy-exact-6', 'heavy-log-odds-12', 'heavy-many-12', 'lite-cyclic'])
+def test_sensitivities_match_finite_differences(case):
+    from beliefgraph.sensitivity import sensitivities
+    mode, exact_many = case.split('-')[0], case == 'heavy-many-12'
+    if case == 'heavy-dag':
+        doc, target = random_dag(120, 3), 'n119'
+    elif case == 'lite-cyclic':
+        doc, target = random_dag(120, 3), 'n119'
+        doc['edges'] += [{'source': f'n{j}', 'target': f'n{j - 30}', 'weight': 0.9} for j in range(80, 120, 7)]
+    else:
+        doc, target = many_parent_doc(int(case.rsplit('-', 1)[1])), 't'
+    g = compile_graph(doc)
+    sens = sensitivities(g, target, mode, exact_many)
+    rng = np.random.default_rng(5)
+    params = [(g.fact_prob, sens.d_fact_prob, 1e-6)]
+    params += [(g.weight, sens.d_weight, 1e-5)] if mode == 'lite' else \
+        [(g.cond_true, sens.d_cond_true, 1e-3), (g.cond_false, sens.d_cond_false, 1e-3), (g.baseline, sens.d_baseline, 1e-3)]
+    for arr, grad, h in params:
+        for i in rng.choice(np.flatnonzero(~np.isnan(arr)), 10, replace=False):
+            assert math.isclose(grad[i], central_difference(g, target, mode, arr, i, h, exact_many), abs_tol=1e-6)
+    rows = sens.tornado(5)
+    assert len(rows) == 5 and rows[0]['swing'] >= rows[-1]['swing'] > 0
+    assert rows[0]['low'] <= sens.value <= rows[0]['high']
+
+
+def apply_peer_influence(ids, types, probs, peer_links):
+    """Direct port of applyPeerInfluence (peer-relations.js) over per-node peerLinks."""
+    index = {nid: i for i, nid in enumerate(ids)}
+    display = {}
+    for i, nid in enumerate(ids):
+        base = probs[i]
+        if math.isnan(base) or types[i] == 'fact' or not peer_links.get(nid):
+            continue
+        delta = 0.0
+        for link in peer_links[nid]:
+            j = index[link['peerId']]
+            if types[j] == 'fact' or math.isnan(probs[j]):
+                continue
+            diff = probs[j] - base
+            delta += link['strength'] * diff if link['relation'] == 'aligned' else -link['strength'] * diff
+        delta = max(-0.25, min(0.25, delta))
+        adj = min(1.0, max(0.0, base + delta))
+        if abs(adj - base) > 0.0005:
+            display[nid] = adj
+    return display
+
+
+def test_peer_overlay_matches_browser_and_updates_incrementally():
+    from beliefgraph import PeerOverlay
+    doc = random_dag(400, 3)
+    rng = np.random.default_rng(11)
+    ids = [n['id'] for n in doc['nodes']]
+    types = [n['type'] for n in doc['nodes']]
+    links = {}
+    for _ in range(1500):
+        a, b = rng.choice(400, 2, replace=False)
+        rel = 'aligned' if rng.random() < 0.6 else 'antagonistic'
+        links.setdefault(ids[a], []).append({'peerId': ids[b], 'relation': rel, 'strength': float(rng.uniform(0, 0.5))})
+    for n in doc['nodes']:
+        n['peerLinks'] = links.get(n['id'], [])
+    doc['nodes'][50]['peerLinks'].append({'peerId': 'n50', 'relation': 'aligned', 'strength': 0.3})   # self link
+    g = compile_graph(doc)
+    peers = PeerOverlay.from_document(g, doc)
+    sym = {nid: peers.relations(nid) for nid in ids}
+    assert all(any(l['peerId'] == a for l in sym[l2['peerId']]) for a in ids for l2 in sym[a])
+    assert all(types[g.index[l['peerId']]] != 'fact' and l['peerId'] != a for a in ids for l in sym[a])
+
+    probs = propagate_lite(g).probs.copy()
+    probs[rng.choice(400, 20, replace=False)] = np.nan
+    display = peers.update(probs)
+    expected = apply_peer_influence(ids, types, probs, sym)
+    assert set(np.flatnonzero(peers.adjusted)) == {g.index[nid] for nid in expected}
+    for nid, p in expected.items():
+        assert math.isclose(display[g.index[nid]], p, abs_tol=1e-12)
+    assert np.array_equal(np.isnan(display), np.isnan(probs))
+
+    # Incremental: a moved prob and an edited pair recompute a few rows and match a full pass
+    probs[ids.index('n200')] = 0.9
+    peers.add('n210', 'n220', 'antagonistic', 0.4)
+    assert peers.set_strength('n300', sym['n300'][0]['peerId'], 0.05) and not peers.set_strength('n300', 'n301', 0.05)
+    display = peers.update(probs)
+    assert 0 < peers.last_updates < 60
+    full, adjusted = PeerOverlay.from_document(g, {'nodes': [{'id': nid, 'peerLinks': peers.relations(nid)}
+                                                             for nid in ids]}).apply(probs)
+    assert np.allclose(display, full, equal_nan=True) and np.array_equal(peers.adjusted, adjusted)
+    assert peers.update(probs) is not None and peers.last_updates == 0
+    batch = peers.apply(np.stack([probs, probs]))[0]
+    assert np.allclose(batch[1], full, equal_nan=True)
+
+
+def test_binary_format_round_trips_and_maps_into_the_engine(tmp_path):
+    from beliefgraph.binary import BinaryGraph, read_binary, write_binary
+    from beliefgraph.graph import normalize_any
+    for path in REPO_GRAPHS:
+        doc = json.loads(path.read_text(encoding='utf-8'))
+        out = tmp_path / (path.stem + '.bgraph')
+        write_binary(doc, out)
+        assert read_binary(out) == normalize_any(doc), path.name
+        g, mapped = compile_graph(doc), load_graph(out)
+        assert mapped.ids == g.ids and list(mapped.edge_ids) == g.edge_ids
+        for name in ('node_type', 'prob', 'weight', 'cond_true', 'baseline', 'inverse', 'parent_edges', 'order'):
+            assert np.array_equal(getattr(mapped, name), getattr(g, name), equal_nan=True), name
+        assert np.allclose(propagate_heavy(mapped), propagate_heavy(g), equal_nan=True)
+
+    doc = {'version': '2', 'layout': {'positions': {'a': {'x': 1.5, 'y': -2}, 'gone': {'x': 0, 'y': 0}}},
+           'annotations': [{'text': 'note'}], 'layoutType': 'dagre',
+           'nodes': [{'id': 'a', 'type': 'fact', 'inert': False, 'style': {'sizeIndex': 3, 'textColor': '#333'}},
+                     {'id': 'b\x00', 'label': 'B', 'prob': 'high', 'position': {'x': 1, 'y': 2}}],
+           'edges': [{'source': 'a', 'target': 'b\x00', 'opposes': True, 'contributingFactors': [],
+                      'cpt': {'condTrue': 80.5, 'condFalse': 10, 'inverse': False}}]}
+    out = tmp_path / 'extras.bgraph'
+    write_binary(doc, out)
+    assert read_binary(out) == doc
+    f = BinaryGraph(out)
+    g = f.graph()
+    assert g.ids == ['a', 'b\x00'] and g.edge_ids[0] is None
+    g.weight[:] = 0.5                                     # copy-on-write: the file is unchanged
+    assert BinaryGraph(out).graph().weight[0] == 0.15
+
+
+def test_streaming_reader_validator_and_writer():
+    import io
+    from beliefgraph.stream import MinimalValidator, iter_minimal, validate_stream
+    for path in sorted((ROOT / 'tests' / 'minimal-json').glob('*.json')):
+        text = path.read_text(encoding='utf-8')
+        events = list(iter_minimal(io.StringIO(text), chunk_size=7))     # values cut across many refills
+        assert events == list(iter_minimal(io.StringIO(text)))
+        out = io.StringIO()
+        v = validate_stream(io.StringIO(text), out, allow_unknown_fields=True)
+        assert v.valid, (path.name, v.errors)
+        assert json.loads(out.getvalue()) == json.loads(text) and '\n ' not in out.getvalue()
+
+    # JSON Lines with edges before their nodes, plus one of each error validateMinimal reports
+    lines = [{'version': '2'},
+             {'edge': {'source': 'a', 'target': 'b', 'weight': 0.4, 'contributingFactors': ['Motive', 'motive ']}},
+             {'node': {'id': 'a', 'type': 'fact'}}, {'node': {'id': 'b', 'prob': 0.5, 'style': {'sizeIndex': 3}}}]
+    v = validate_stream(io.StringIO('\n'.join(map(json.dumps, lines))))
+    assert v.valid and v.n_nodes == 2 and v.n_edges == 1
+    assert v.warnings == ["edges[0].contributingFactors contains duplicate phrase 'motive'"]
+    doc = {'nodes': [{'id': 'a'}, {'id': 'a'}, {'label': 'no id'}, {'id': 'n', 'type': 'note'},
+                     {'id': 'p', 'prob': 1.5, 'cpt': {'condTrue': 120}, 'position': {'x': 0, 'y': 0}}],
+           'edges': [{'source': 'a', 'target': 'ghost', 'weight': 2}, {'source': 'n', 'target': 'p', 'type': 'causes'}]}
+    v = MinimalValidator()
+    for event in iter_minimal(io.StringIO(json.dumps(doc))):
+        v.feed(*event)
+    assert sorted(v.finish().errors) == sorted([
+        "Duplicate node id 'a'", 'nodes[2] missing id', 'nodes[4].prob must be 0..1',
+        'nodes[4].cpt.condTrue must be 0..100', "nodes[4]: unknown field 'position'",
+        "edges[0] target 'ghost' not in nodes", 'edges[0].weight must be -1..1',
+        'edges[1] connects to note node which must be isolated', "edges[1].type 'causes' invalid"])
+    assert v.warnings == ["note node 'n' missing description"]
+    v = validate_stream(io.StringIO('{"nodes": [{"id": "a"}, {"id": '))
+    assert not v.valid and v.errors[0].startswith('Invalid JSON at offset')
+
+
+def test_snapshot_store_restores_every_point_and_dedups(tmp_path):
+    import copy
+    from beliefgraph.snapshots import SnapshotStore
+    doc = {'nodes': [{'id': f'n{i}', 'type': 'assertion', 'label': f'node {i}'} for i in range(40)],
+           'edges': [{'source': f'n{i}', 'target': f'n{i + 1}', 'weight': 0.5} for i in range(39)],
+           'layoutType': 'dagre'}
+    store = SnapshotStore(tmp_path / 'history', keyframe_interval=10)
+    saved = {}
+    for step in range(25):
+        doc = copy.deepcopy(doc)
+        if step % 5 == 1:
+            doc['nodes'].append({'id': f'x{step}', 'type': 'fact'})
+        elif step % 5 == 2:
+            del doc['nodes'][3]
+        elif step % 5 == 3:
+            doc['layoutType'] = f'layout {step}'
+        else:
+            doc['nodes'][step]['label'] += ' (edited)'
+        saved[store.save(doc, timestamp=step * 120.0)] = copy.deepcopy(doc)
+    assert [s.id for s in store.snapshots if s.keyframe] == [0, 10, 20]
+    assert all(s.changes <= s.id - s.base for s in store.snapshots if not s.keyframe)     # one edit per step
+    assert all(store.restore(sid) == d for sid, d in saved.items())
+    before = store.disk_usage()
+    store.save(doc, timestamp=3000.0)                    # no edits: the same delta again, no new objects
+    assert store.snapshots[-1].changes == store.snapshots[-2].changes and store.disk_usage() - before < 400
+    store.close()
+
+    store = SnapshotStore(tmp_path / 'history')          # reopened from disk
+    assert store.latest() == doc
+    keep = store.autosave_retention(((0, 3), (600, 3)))
+    assert keep == {15, 20, 23, 24, 25}
+    store.compact(keep)
+    assert [s.id for s in store.snapshots] == [10, 15, 20, 23, 24, 25]         # 10: the keyframe 15 needs
+    assert all(store.restore(sid) == saved.get(sid, doc) for sid in keep)
+    els = [{'group': 'nodes', 'data': {'id': 'a', 'prob': 0.1}}, {'group': 'edges', 'data': {'source': 'a', 'target': 'a'}}]
+    sid = store.save(els)
+    assert store.snapshots[-1].keyframe and store.restore(sid) == els
+
+
+def test_snapshot_store_survives_torn_writes_and_keeps_no_orphans(tmp_path):
+    from beliefgraph.snapshots import LOG, PACK, SnapshotStore
+    doc = {'nodes': [{'id': f'n{i}', 'label': f'node {i}'} for i in range(8)], 'edges': []}
+    with SnapshotStore(tmp_path / 'h') as store:
+        for i in range(3):
+            doc['nodes'][i]['label'] += '!'
+            store.save(doc)
+    with (tmp_path / 'h' / LOG).open('a', encoding='utf-8') as f:
+        f.write('{"id": 3, "t": 1.0, "ki')                        # crash mid-record
+    with SnapshotStore(tmp_path / 'h') as store:
+        for i in range(3):
+            doc['nodes'][i]['label'] += '?'
+            store.save(doc)
+    with (tmp_path / 'h' / PACK).open('ab') as f:
+        f.write(b'\x00' * 7)                                    # crash inside an object header
+    with SnapshotStore(tmp_path / 'h') as store:
+        doc['nodes'][0]['label'] += '#'
+        store.save(doc)
+    with SnapshotStore(tmp_path / 'h') as store:
+        assert [s.id for s in store.snapshots] == [0, 1, 2, 3, 4, 5, 6] and store.latest() == doc
+        assert store.restore(6) == doc
+        pack = (tmp_path / 'h' / PACK).stat().st_size
+        store.keyframe_ratio = 0.1
+        doc = {'nodes': [dict(n, label='rewritten') for n in doc['nodes']], 'edges': []}
+        store.save(doc)                                        # too many changes: falls back to a keyframe
+        assert store.snapshots[-1].keyframe
+        written = (tmp_path / 'h' / PACK).stat().st_size - pack
+    with SnapshotStore(tmp_path / 'k', keyframe_ratio=0.1) as fresh:
+        fresh.save(doc)                                        # the rejected delta left no objects behind
+        assert (tmp_path / 'k' / PACK).stat().st_size == written
+
+
+def test_scoring_service_coalesces_requests_and_evicts_by_budget(tmp_path):
+    import asyncio
+    from beliefgraph.service import ScoringService
+    doc = random_dag(120, 3)
+    raw = json.dumps(doc).encode('utf-8')
+    g = compile_graph(doc)
+    scenarios = [{}, {'facts': {'n0': 0.9, 'n5': 0.1}}, {'do': {'n40': 1.0}, 'facts': {'n1': 0.3}}]
+
+    async def http(port, method, target, body=b''):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(f"{method} {target} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+                     .encode() + body)
+        head, _, payload = (await reader.read()).partition(b'\r\n\r\n')
+        writer.close()
+        return int(head.split()[1]), json.loads(payload)
+
+    async def run():
+        service = ScoringService(cache_dir=tmp_path, coalesce=0.01)
+        _, port = await service.start('127.0.0.1', 0)
+        try:
+            status, info = await http(port, 'POST', '/graphs', raw)
+            assert status == 200 and info['nodes'] == 120 and not info['cached']
+            assert (await service.add_graph(raw))['cached']
+            key = info['graph']
+            results = await asyncio.gather(*[service.score(key, scenarios) for _ in range(20)],
+                                           http(port, 'POST', f'/graphs/{key}/score',
+                                                json.dumps({'scenarios': scenarios[1:], 'nodes': ['n60']}).encode()))
+            assert service.batches == 1 and service.rows == 62                    # one propagation for all
+            fact_probs = np.tile(g.fact_prob, (3, 1))
+            fact_probs[1, [0, 5]] = 0.9, 0.1
+            fact_probs[2, 1] = 0.3
+            expected = [propagate_heavy(g, fact_probs=fact_probs[0]), propagate_heavy(g, fact_probs=fact_probs[1]),
+                        propagate_heavy(g, do={'n40': 1.0}, fact_probs=fact_probs[2])]
+            for row, want in zip(results[0], expected):
+                assert all(math.isclose(row[nid], round(float(want[g.index[nid]]), 6)) for nid in g.ids)
+            assert results[-1] == (200, {'results': [{'n60': r['n60']} for r in results[0][1:]]})
+
+            status, err = await http(port, 'POST', f'/graphs/{key}/score',
+                                     json.dumps({'scenarios': [{'facts': {'n50': 0.5}}]}).encode())
+            assert status == 400 and 'not a fact' in err['error']
+            service.graphs.budget = service.graphs.nbytes                           # room for one graph
+            other = await service.add_graph(json.dumps(random_dag(60, 2)).encode('utf-8'))
+            assert service.graphs.evictions == 1 and not (tmp_path / f'{key}.bgraph').exists()
+            assert (await http(port, 'POST', f'/graphs/{key}/score', b'{"scenarios": [{}]}'))[0] == 404
+            assert (await http(port, 'GET', f"/graphs/{other['graph']}"))[1]['nodes'] == 60
+        finally:
+            await service.close()
+
+    asyncio.run(run())
+
+
+def test_profiler_records_phases_iterations_and_hot_nodes(tmp_path):
+    from beliefgraph import profiling
+    from beliefgraph.profiling import Profiler
+    doc = random_dag(200, 3)
+    doc['nodes'].append({'id': 'hub', 'type': 'assertion'})
+    doc['edges'] += [{'source': f'n{j}', 'target': 'hub', 'cpt': {'condTrue': 70, 'condFalse': 30, 'baseline': 50}}
+                     for j in range(12)]
+    path = tmp_path / 'graph.json'
+    path.write_text(json.dumps(doc), encoding='utf-8')
+    with Profiler(slow_node_seconds=0.0) as prof:
+        g = load_graph(path)
+        heavy = propagate_heavy(g, exact_many_parents=True)
+        lite = propagate_lite(g)
+    assert profiling.ACTIVE is None
+    assert np.array_equal(heavy, propagate_heavy(g, exact_many_parents=True), equal_nan=True)
+    assert {'load', 'compile', 'sort', 'propagate'} <= set(prof.phases())
+    deltas = [e['args']['value'] for e in prof.events if e['name'] == 'lite max delta']
+    assert len(deltas) == lite.iterations and deltas[-1] == lite.final_delta
+
+    rows = {r['id']: r for r in prof.hot_nodes(None)}
+    hub = rows['hub']
+    assert hub['fanIn'] == 12 and hub['evaluations'] == 2 and hub['marginalCalls'] == 1
+    assert 0 < hub['marginalSeconds'] <= hub['seconds']
+    assert prof.hot_nodes(1)[0]['seconds'] == max(r['seconds'] for r in rows.values())
+
+    prof.write_chrome_trace(tmp_path / 'trace.json')
+    trace = json.loads((tmp_path / 'trace.json').read_text(encoding='utf-8'))
+    assert {e['ph'] for e in trace['traceEvents']} == {'X', 'C'} and len(trace['otherData']['nodes']) == len(rows)
+    prof.write_jsonl(tmp_path / 'trace.jsonl')
+    records = [json.loads(line) for line in (tmp_path / 'trace.jsonl').read_text(encoding='utf-8').splitlines()]
+    assert {r['type'] for r in records} == {'phase', 'node', 'iteration', 'nodeTotals'}
+
+
+def test_components_propagate_in_parallel_and_directories_score_in_bulk(tmp_path):
+    from beliefgraph.parallel import propagate_components, score_directory, summarize
+    nodes, edges = [], []
+    for k in range(3):
+        part = random_dag(120, 3, seed=k)
+        nodes += [dict(nd, id=f'g{k}{nd["id"]}') for nd in part['nodes']]
+        edges += [dict(e, id=f'g{k}{e["id"]}', source=f'g{k}{e["source"]}', target=f'g{k}{e["target"]}')
+                  for e in part['edges']]
+    g = graph(nodes, edges)
+    labels, count = g.components()
+    assert g.components()[0] is labels
+    assert len({int(labels[g.index[f'g{k}n0']]) for k in range(3)}) == 3
+    assert all(labels[s] == labels[t] for s, t in zip(g.edge_source, g.edge_target))
+    assert count == len(np.unique(labels)) >= 3
+
+    heavy = propagate_components(g, 'heavy', workers=2, min_nodes=0)
+    np.testing.assert_array_equal(heavy, propagate_heavy(g))
+    lite = propagate_components(g, 'lite', workers=2, min_nodes=0)
+    assert lite.converged
+    np.testing.assert_allclose(lite.probs, propagate_lite(g).probs, atol=1e-6)
+
+    (tmp_path / 'broken.json').write_text('{', encoding='utf-8')
+    records = list(score_directory([ROOT / 'tests' / 'minimal-json', tmp_path], 'heavy', workers=2))
+    assert sum('error' in r for r in records) == 1
+    assert all(r['seconds'] >= 0 for r in records)
+    summary = summarize(records, 1.0)
+    assert summary['graphs'] == len(records) - 1 and summary['nodes'] == sum(r.get('nodes', 0) for r in records)
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Tests for the Excel → Minimal JSON converters in tests/dev-tools/.
+
+Each test builds a small synthetic workbook with openpyxl, so no fixture files
+are needed.
+
+Run:
+    python3 -m pytest -q tests/test_excel_converters.py
+"""
+
+import json
+import math
+import zipfile
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+openpyxl = pytest.importorskip('openpyxl')
+
+import excel_index
+from excel_deps import DependencyIndex, IntervalIndex, RangeRef, parse_ranges
+from excel_eval import WorkbookModel, influence_unit, reference_weights
+from excel_index import CellRef, FormulaCell, parse_refs, pop_scan_args, scan_workbook
+from excel_lineage_to_minimal import (build_full_lineage, build_lineage_graph,
+                                      write_lineage_chunks, write_lineage_jsonl)
+from excel_to_minimal import build_sheet_dependency_graph
+from excel_topics_to_minimal import build_topic_graph
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    wb = openpyxl.Workbook()
+    inputs = wb.active
+    inputs.title = 'Inputs'
+    rates = wb.create_sheet('Rate Table')
+    proj = wb.create_sheet('Projection')
+    inputs['A1'], inputs['B1'], inputs['C1'] = 'Label', 'Revenue', 'Cost'
+    rates['A1'], rates['B1'] = 'Year', 'Growth'
+    proj['A1'], proj['B1'] = 'Line', 'Forecast'
+    for r in range(2, 6):
+        inputs.cell(row=r, column=1, value=f'Item {r}')
+        inputs.cell(row=r, column=2, value=r * 10)
+        inputs.cell(row=r, column=3, value=r)
+        rates.cell(row=r, column=2, value=0.05)
+        proj.cell(row=r, column=1, value=f'Line {r}')
+        proj.cell(row=r, column=2, value=f"=Inputs!B{r}*(1+'Rate Table'!$B${r})-Inputs!C{r}")
+        proj.cell(row=r, column=3, value=f"=B{r}*2")
+    path = tmp_path / 'model.xlsx'
+    wb.save(path)
+    return path
+
+
+def test_parse_refs_quoted_and_absolute():
+    refs = parse_refs("=Inputs!B2*'Rate Table'!$B$3+C4")
+    assert [tuple(r) for r in refs] == [('Inputs', 'B', 2), ('Rate Table', 'B', 3)]
+
+
+def test_scan_indexes_every_formula(workbook):
+    index = scan_workbook(workbook)
+    assert index.sheet_names == ['Inputs', 'Rate Table', 'Projection']
+    assert index.formula_counts == {'Projection': 8}
+    first = index.formulas_in('Projection')[0]
+    assert first.cell == 'B2' and first.refs[1].sheet == 'Rate Table'
+
+
+def test_projections_share_one_scan(workbook, monkeypatch):
+    loads = []
+    real_load = excel_index.load_workbook
+    monkeypatch.setattr(excel_index, 'load_workbook', lambda *a, **kw: loads.append(1) or real_load(*a, **kw))
+
+    index = scan_workbook(workbook)
+    from_index = (build_sheet_dependency_graph(index), build_topic_graph(index), build_lineage_graph(index))
+    assert len(loads) == 1
+    from_paths = (build_sheet_dependency_graph(workbook), build_topic_graph(workbook), build_lineage_graph(workbook))
+    assert from_index == from_paths
+
+
+def test_sheet_and_topic_graphs(workbook):
+    sheet = build_sheet_dependency_graph(workbook)
+    weights = {(e['source'], e['target']): e['weight'] for e in sheet['edges']}
+    assert weights == {('Inputs', 'Projection'): round(8 / 12, 4), ('Rate Table', 'Projection'): round(4 / 12, 4)}
+
+    topics = build_topic_graph(workbook)
+    topic_ids = {n['id'] for n in topics['nodes'] if n['type'] == 'fact'}
+    assert topic_ids == {'Inputs::Revenue', 'Inputs::Cost', 'Rate_Table::Growth'}
+
+
+def test_lineage_graph(workbook):
+    lineage = build_lineage_graph(workbook, max_targets=2)
+    targets = [n['id'] for n in lineage['nodes'] if n['id'].startswith('Projection_')]
+    assert targets == ['Projection_B2', 'Projection_B3']
+    sources = {e['source'] for e in lineage['edges'] if e['target'] == 'Projection_B2'}
+    assert sources == {'Inputs_B2', 'Rate_Table_B2', 'Inputs_C2'}
+
+
+def test_full_lineage_streams_interned_graph(workbook, tmp_path):
+    graph = build_full_lineage(workbook)
+    assert graph.n_nodes == 8 + 12 and graph.n_edges == 12    # 8 formula cells, 3 distinct refs per B cell
+    assert graph.edge_source.typecode == graph.edge_target.typecode == 'I'
+    top = build_lineage_graph(workbook, max_targets=4)
+    top_edges = {(e['source'], e['target'], e['weight']) for e in top['edges'] if e['target'] != 'Projection'}
+    full_edges = {(e['source'], e['target'], e['weight']) for e in map(graph.edge, range(graph.n_edges))}
+    assert top_edges == full_edges
+    # Streamed sheet by sheet: no formula cells stay resident, texts come back from the spill file
+    assert graph.index.formulas_by_sheet == {} and graph.formula_text(0) == "=Inputs!B2*(1+'Rate Table'!$B$2)-Inputs!C2"
+    from_index = build_full_lineage(scan_workbook(workbook, backend='xml'))
+    assert [from_index.node(v) for v in range(from_index.n_nodes)] == [graph.node(v) for v in range(graph.n_nodes)]
+    assert from_index.edge_source == graph.edge_source and from_index.edge_target == graph.edge_target
+
+    assert write_lineage_jsonl(graph, tmp_path / 'full.jsonl') == 1 + graph.n_nodes + graph.n_edges
+    lines = [json.loads(line) for line in (tmp_path / 'full.jsonl').read_text().splitlines()]
+    assert lines[0] == {'version': '2'}
+    assert lines[1]['node']['type'] == 'assertion' and 'edge' in lines[-1]
+
+    chunks = write_lineage_chunks(graph, tmp_path / 'full.json', chunk_edges=5)
+    assert [p.name for p in chunks] == ['full.part0001.json', 'full.part0002.json', 'full.part0003.json']
+    seen = set()
+    for path in chunks:
+        doc = json.loads(path.read_text())
+        ids = {n['id'] for n in doc['nodes']}
+        assert all(e['source'] in ids and e['target'] in ids for e in doc['edges'])
+        seen |= ids
+    assert len(seen) == graph.n_nodes
+
+
+def test_parse_ranges_keeps_intervals():
+    refs = parse_ranges("=SUM(Inputs!B2:B500)+LOG10(A1)+'It''s'!$C$3*D:C+\"X9\"+S1:S3!A1", 'Own')
+    assert refs == (RangeRef('Inputs', 2, 2, 2, 500), RangeRef('Own', 1, 1, 1, 1),
+                    RangeRef("It's", 3, 3, 3, 3), RangeRef('Own', 3, 1, 4, 1_048_576))
+
+
+def test_interval_index_stab():
+    spans = [(s, s + (s * 7) % 13, s) for s in range(1, 200)]
+    tree = IntervalIndex(spans)
+    for point in range(0, 220, 3):
+        assert sorted(tree.stab(point)) == [p for s, e, p in spans if s <= point <= e]
+
+
+def test_dependency_closure_collapses_same_sheet_chains(workbook):
+    deps = DependencyIndex(workbook)
+    c2 = deps.formula_at('Projection', 3, 2)
+    b2 = deps.formula_at('Projection', 2, 2)
+    assert deps.dependents('Projection', 2, 2) == [c2]
+    assert deps.dependents('Inputs', 2, 2) == [b2]
+    assert deps.provenance(c2) is deps.provenance(b2)      # chain shares its precedent's set
+    assert sorted(deps.provenance(c2)) == [RangeRef('Inputs', 2, 2, 2, 2), RangeRef('Inputs', 3, 2, 3, 2),
+                                           RangeRef('Rate Table', 2, 2, 2, 2)]
+
+
+def test_dependency_closure_handles_cycles_and_ranges():
+    cells = [excel_index.FormulaCell('Calc', 'A1', '=A2+Inputs!B1', ()),
+             excel_index.FormulaCell('Calc', 'A2', '=A1+Inputs!B2', ()),
+             excel_index.FormulaCell('Calc', 'B1', '=SUM(A1:A9)', ())]
+    cells += [excel_index.FormulaCell('Calc', f'C{r}', f'=C{r - 1}+1', ()) for r in range(2, 5000)]
+    cells.insert(3, excel_index.FormulaCell('Calc', 'C1', "=inputs!D1", ()))
+    index = excel_index.WorkbookIndex(None, ['Inputs', 'Calc'], {'Inputs': [], 'Calc': cells})
+    deps = DependencyIndex(index)
+    loop = {RangeRef('Inputs', 2, 1, 2, 1), RangeRef('Inputs', 2, 2, 2, 2)}
+    assert deps.provenance(0) == deps.provenance(1) == deps.provenance(2) == loop
+    assert deps.provenance(len(cells) - 1) == {RangeRef('Inputs', 4, 1, 4, 1)}   # sheet name resolved
+
+
+def test_full_lineage_range_and_provenance_modes(workbook):
+    ranges = build_full_lineage(workbook, deps='ranges')
+    provenance = build_full_lineage(workbook, deps='provenance')
+    c2 = 'Projection_C2'
+    assert {ranges.edge(e)['source'] for e in range(ranges.n_edges) if ranges.edge(e)['target'] == c2} == {'Projection_B2'}
+    assert {provenance.edge(e)['source'] for e in range(provenance.n_edges)
+            if provenance.edge(e)['target'] == c2} == {'Inputs_B2', 'Inputs_C2', 'Rate_Table_B2'}
+    with pytest.raises(ValueError):
+        build_full_lineage(workbook, deps='cells')
+
+
+def test_header_band_and_row_labels_need_no_random_access(tmp_path):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'Data'
+    ws['B3'] = '  Revenue  '   # header below a blank band
+    ws['C1'] = 42              # numeric cells are not headers
+    ws['C12'] = 'Late header'  # outside the 10-row band
+    ws['B20'] = 'Label in B'   # row label found in the second label column
+    path = tmp_path / 'labels.xlsx'
+    wb.save(path)
+
+    index = scan_workbook(path)
+    workbook, index.workbook = index.workbook, None  # in-band lookups must not touch the sheet
+    assert index.column_header('Data', 2) == 'Revenue'
+    assert index.column_header('Data', 3) == 'Col C'
+    assert index.row_label('Data', 20) == 'Label in B'
+    assert index.row_label('Data', 21) == 'Row 21'
+    assert index.column_header.cache_info().currsize == 2
+
+    index.workbook = workbook
+    assert index.column_header('Data', 3, max_scan_rows=15) == 'Late header'
+
+
+def test_parallel_scan_matches_serial(workbook):
+    serial = scan_workbook(workbook)
+    parallel = scan_workbook(workbook, workers=2)
+    assert parallel.sheet_names == serial.sheet_names
+    assert parallel.formulas_by_sheet == serial.formulas_by_sheet
+    assert parallel.headers_by_sheet == serial.headers_by_sheet
+    assert parallel.row_labels_by_sheet == serial.row_labels_by_sheet
+    for build in (build_sheet_dependency_graph, build_topic_graph, build_lineage_graph):
+        assert json.dumps(build(parallel)) == json.dumps(build(serial))
+
+
+def test_pop_scan_args():
+    defaults = {'workers': 1, 'backend': 'openpyxl', 'cache_dir': None}
+    assert pop_scan_args(['a.xlsx', '--workers', '4', 'out.json']) == (['a.xlsx', 'out.json'], {**defaults, 'workers': 4})
+    assert pop_scan_args(['a.xlsx', '--workers=2', '--backend=xml']) == (['a.xlsx'], {**defaults, 'workers': 2, 'backend': 'xml'})
+    assert pop_scan_args(['--cache', 'c', 'a.xlsx']) == (['a.xlsx'], {**defaults, 'cache_dir': 'c'})
+    assert pop_scan_args(['a.xlsx']) == (['a.xlsx'], defaults)
+    with pytest.raises(ValueError):
+        pop_scan_args(['a.xlsx', '--backend', 'xlrd'])
+
+
+def _same_index(a, b):
+    return (a.sheet_names == b.sheet_names and a.formulas_by_sheet == b.formulas_by_sheet
+            and a.headers_by_sheet == b.headers_by_sheet and a.row_labels_by_sheet == b.row_labels_by_sheet)
+
+
+def _rewrite_parts(src, dst, edits):
+    """Copy workbook ``src`` to ``dst`` applying ``edits``: part name -> fn(bytes) -> bytes."""
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dst, 'w') as zout:
+        for name in zin.namelist():
+            data = zin.read(name)
+            zout.writestr(name, edits[name](data) if name in edits else data)
+    return dst
+
+
+def _with_sheet_xml(src, dst, sheet_xml):
+    """Copy workbook ``src`` to ``dst`` with the first worksheet replaced by ``sheet_xml``."""
+    return _rewrite_parts(src, dst, {'xl/worksheets/sheet1.xml': lambda _: sheet_xml.encode()})
+
+
+SHEET_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<dimension ref="A1:D20"/><sheetData>'
+    '<row r="1"><c r="A1" t="inlineStr"><is><r><t>Rich </t></r><r><t>Head</t></r></is></c>'
+    '<c r="B1" t="str"><f>Other!A1&amp;"x"</f><v>x</v></c><c r="C1" t="e"><v>#N/A</v></c></row>'
+    '<row r="2"><c r="B2"><f t="shared" ref="B2:B4" si="0">Other!A2*2</f><v>1</v></c>'
+    '<c r="C2"><f t="array" ref="C2">SUM(Other!A1:A3)</f><v>3</v></c></row>'
+    '<row r="3"><c r="B3"><f t="shared" si="0"/><v>2</v></c></row>'
+    '<row r="4"><c r="A4" t="inlineStr"><is><t>Row four</t></is></c><c r="B4"><f t="shared" si="0"/></c>'
+    '<c r="E4"><f>Other!A9</f></c></row>'
+    '<row r="30"><c r="B30"><f>Other!A30</f></c></row>'
+    '</sheetData></worksheet>'
+)
+
+
+def test_xml_backend_matches_openpyxl(workbook):
+    serial = scan_workbook(workbook)
+    assert _same_index(scan_workbook(workbook, backend='xml'), serial)
+    assert _same_index(scan_workbook(workbook, workers=2, backend='xml'), serial)
+
+
+def test_xml_backend_expands_shared_formulas(workbook, tmp_path):
+    path = _with_sheet_xml(workbook, tmp_path / 'shared.xlsx', SHEET_XML)
+    fast = scan_workbook(path, backend='xml')
+    assert _same_index(fast, scan_workbook(path))
+    cells = fast.formulas_in('Inputs')
+    # Array formula skipped; E4 and B30 lie outside the <dimension> bounds
+    assert [(f.cell, f.formula) for f in cells] == [
+        ('B1', '=Other!A1&"x"'), ('B2', '=Other!A2*2'), ('B3', '=Other!A3*2'), ('B4', '=Other!A4*2')]
+    assert fast.headers_by_sheet['Inputs'] == {1: (1, 'Rich Head'), 2: (1, '=Other!A1&"x"'), 3: (1, '#N/A')}
+    assert fast.row_label('Inputs', 4) == 'Row four'
+
+
+def test_xml_backend_falls_back_to_openpyxl(workbook, tmp_path, capsys):
+    no_refs = SHEET_XML.replace('<c r="A4" t="inlineStr">', '<c t="inlineStr">')
+    path = _with_sheet_xml(workbook, tmp_path / 'norefs.xlsx', no_refs)
+    assert _same_index(scan_workbook(path, backend='xml'), scan_workbook(path))
+    assert 'falling back to openpyxl' in capsys.readouterr().err
+
+
+@pytest.mark.parametrize('backend', ['openpyxl', 'xml'])
+def test_cache_reuses_unchanged_sheets(workbook, tmp_path, backend):
+    cache = tmp_path / 'cache'
+    first = scan_workbook(workbook, backend=backend, cache_dir=cache)
+    assert first.reused_sheets == [] and first.parsed_sheets == ['Inputs', 'Rate Table', 'Projection']
+    again = scan_workbook(workbook, backend=backend, cache_dir=cache)
+    assert again.reused_sheets == ['Inputs', 'Rate Table', 'Projection'] and again.parsed_sheets == []
+    assert _same_index(again, scan_workbook(workbook))
+
+    # A formula edit on one sheet only re-parses that sheet
+    edited = _rewrite_parts(workbook, tmp_path / 'edited.xlsx', {
+        'xl/worksheets/sheet3.xml': lambda data: data.replace(b'B2*2', b'B2*3')})
+    index = scan_workbook(edited, backend=backend, cache_dir=cache)
+    assert index.parsed_sheets == ['Projection']
+    assert _same_index(index, scan_workbook(edited))
+    assert build_lineage_graph(index) == build_lineage_graph(edited)
+
+
+def _with_shared_strings(src, dst, strings):
+    """Copy ``src`` with sheet1 holding shared-string headers A1.. and a shared-strings part."""
+    ns = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    cells = ''.join(f'<c r="{chr(65 + i)}1" t="s"><v>{i}</v></c>' for i in range(2))
+    sheet = f'<worksheet xmlns="{ns}"><sheetData><row r="1">{cells}</row></sheetData></worksheet>'
+    sst = f'<sst xmlns="{ns}" count="{len(strings)}">' + ''.join(f'<si><t>{t}</t></si>' for t in strings) + '</sst>'
+    rel = ('<Relationship Id="rIdSst" Target="sharedStrings.xml" Type="http://schemas.openxmlformats.org/'
+           'officeDocument/2006/relationships/sharedStrings"/></Relationships>')
+    ctype = ('<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-'
+             'officedocument.spreadsheetml.sharedStrings+xml"/></Types>')
+    _rewrite_parts(src, dst, {
+        'xl/worksheets/sheet1.xml': lambda _: sheet.encode(),
+        'xl/_rels/workbook.xml.rels': lambda data: data.replace(b'</Relationships>', rel.encode()),
+        '[Content_Types].xml': lambda data: data.replace(b'</Types>', ctype.encode()),
+    })
+    with zipfile.ZipFile(dst, 'a') as zf:
+        zf.writestr('xl/sharedStrings.xml', sst)
+    return dst
+
+
+def test_cache_rechecks_shared_strings(workbook, tmp_path):
+    cache = tmp_path / 'cache'
+    base = _with_shared_strings(workbook, tmp_path / 'base.xlsx', ['Label', 'Revenue'])
+    assert scan_workbook(base, cache_dir=cache).column_header('Inputs', 2) == 'Revenue'
+
+    # Strings appended for other sheets keep the entry valid
+    appended = _with_shared_strings(workbook, tmp_path / 'appended.xlsx', ['Label', 'Revenue', 'New'])
+    assert 'Inputs' in scan_workbook(appended, cache_dir=cache).reused_sheets
+
+    # Renaming a header only rewrites the shared-strings table, not sheet1.xml
+    renamed = _with_shared_strings(workbook, tmp_path / 'renamed.xlsx', ['Label', 'Sales'])
+    index = scan_workbook(renamed, cache_dir=cache)
+    assert 'Inputs' in index.parsed_sheets
+    assert index.column_header('Inputs', 2) == 'Sales'
+    assert _same_index(index, scan_workbook(renamed))
+
+
+def test_workbook_model_evaluates_formulas_and_sensitivities(workbook, tmp_path):
+    wb = openpyxl.load_workbook(workbook)
+    calc = wb.create_sheet('Calc')
+    calc['A1'] = "=SUM(Projection!B2:B5)+AVERAGE(Inputs!B:B)-MAX(Inputs!C2:C5,1)+IF(Projection!B2>20,1,0)+2^2*50%"
+    calc['A2'] = "=INDEX(Inputs!$A$1:$C$5,MATCH(\"Item 4\",Inputs!$A$1:$A$5,0),2)*ROUND(Inputs!C2/3,1)"
+    calc['A3'], calc['A4'] = '=A4+1', '=A3'
+    calc['A5'] = '=VLOOKUP(1,Inputs!A1:B5,2)'
+    calc['A6'] = '=IFERROR(1/(Inputs!C2-2),"")+MIN(Inputs!A2:A5)'
+    path = tmp_path / 'calc.xlsx'
+    wb.save(path)
+
+    model = WorkbookModel(path)
+    assert model.value('Projection', 'B3') == pytest.approx(30 * 1.05 - 3)
+    assert model.value('Calc', 'A1') == pytest.approx((19 + 28.5 + 38 + 47.5) + 35 - 5 + 0 + 2)
+    assert model.value('Calc', 'A2') == pytest.approx(40 * 0.7)
+    assert math.isnan(model.value('Calc', 'A6'))                    # IFERROR falls back to text; MIN over labels is 0
+    assert model.errors == {('Calc', 'A3'): 'circular reference', ('Calc', 'A4'): 'circular reference',
+                            ('Calc', 'A5'): 'unsupported function VLOOKUP'}
+
+    sens = model.reference_sensitivities(batch=2)
+    # d B_r / d Inputs!B_r = 1.05, d / d growth = Inputs!B_r, d / d cost = -1; times source / target magnitude
+    np.testing.assert_allclose(sens[('Projection', 'B3')], np.array([30 * 1.05, 30 * 0.05, -3]) / 28.5, rtol=1e-5)
+    assert len(sens[('Projection', 'C3')]) == 0
+    # MATCH/INDEX resolve to Inputs!B4; ROUND passes the unrounded slope (B4 / 3) through
+    cells = [model.cell_id('Inputs', 'B4'), model.cell_id('Inputs', 'C2')]
+    np.testing.assert_allclose(model.derivatives([(c, model.cell_id('Calc', 'A2')) for c in cells]),
+                               [0.7, 40 / 3], rtol=1e-5)
+
+
+def test_values_scan_matches_across_backends_and_cache(workbook, tmp_path):
+    wb = openpyxl.load_workbook(workbook)
+    wb['Inputs']['D2'], wb['Inputs']['D3'] = True, datetime(2024, 1, 31)
+    path = tmp_path / 'values.xlsx'
+    wb.save(path)
+
+    assert scan_workbook(path).values_by_sheet is None
+    values = scan_workbook(path, values=True).values_by_sheet
+    assert values['Inputs'][:6] == [(1, 1, 'Label'), (1, 2, 'Revenue'), (1, 3, 'Cost'),
+                                    (2, 1, 'Item 2'), (2, 2, 20.0), (2, 3, 2.0)]
+    assert (2, 4, 1.0) in values['Inputs'] and (3, 4, 45322.0) in values['Inputs']
+    assert values['Projection'] == [(1, 1, 'Line'), (1, 2, 'Forecast')] + [(r, 1, f'Line {r}') for r in range(2, 6)]
+    assert scan_workbook(path, backend='xml', values=True).values_by_sheet == values
+    cache = tmp_path / 'cache'
+    assert scan_workbook(path, cache_dir=cache).values_by_sheet is None
+    assert scan_workbook(path, backend='xml', cache_dir=cache, values=True).values_by_sheet == values
+    again = scan_workbook(path, cache_dir=cache, values=True)
+    assert again.parsed_sheets == [] and again.values_by_sheet == values
+
+
+@pytest.mark.parametrize('iso_dates', [False, True])
+def test_values_scan_honours_1904_dates(workbook, tmp_path, iso_dates):
+    from openpyxl.utils.datetime import CALENDAR_MAC_1904
+    wb = openpyxl.load_workbook(workbook)
+    wb.epoch, wb.iso_dates = CALENDAR_MAC_1904, iso_dates
+    wb['Inputs']['D2'] = datetime(2024, 1, 31)
+    path = tmp_path / 'mac.xlsx'
+    wb.save(path)
+    values = scan_workbook(path, values=True).values_by_sheet
+    assert (2, 4, 45322.0 - 1462) in values['Inputs']
+    assert scan_workbook(path, backend='xml', values=True).values_by_sheet == values
+
+
+def test_reference_weights_carry_magnitude_and_fill_unknowns():
+    formula = FormulaCell('P', 'B2', '=A!B2-A!C2+R!B2', (CellRef('A', 'B', 2), CellRef('A', 'C', 2), CellRef('R', 'B', 2)))
+    assert reference_weights(None, formula) == ([1.0] * 3, [1] * 3)
+    sens = {('P', 'B2'): np.array([30.0, -10.0, np.nan])}
+    # Only the unknown reference falls back, to the formula's mean known mass
+    assert reference_weights(sens, formula) == ([30.0, 10.0, 20.0], [1, -1, 1])
+    assert reference_weights(sens, formula, [2]) == ([20.0], [1])
+    sens[('P', 'B2')][:] = np.nan
+    assert reference_weights(sens, formula, unit=5.0) == ([5.0] * 3, [1] * 3)
+    assert influence_unit({('P', 'B2'): np.array([np.nan, 0.0, 2.0, 4.0, 10.0])}) == 4.0
+    assert influence_unit(None) == 1.0
+
+
+def test_sensitivity_weights_replace_reference_counts(workbook, tmp_path):
+    with pytest.raises(ValueError):
+        WorkbookModel(scan_workbook(workbook))
+    index = scan_workbook(workbook, values=True)
+    sens = WorkbookModel(index).reference_sensitivities()
+    # Each Projection!B_r = 9.5 r reads Inputs!B_r (10.5 r), the growth rate (0.5 r) and Inputs!C_r (-r)
+    sheet = build_sheet_dependency_graph(index, sens)
+    edges = {(e['source'], e['target']): (e['weight'], e['type']) for e in sheet['edges']}
+    assert edges == {('Inputs', 'Projection'): (round(11.5 / 12, 4), 'supports'),
+                     ('Rate Table', 'Projection'): (round(0.5 / 12, 4), 'supports')}
+
+    topics = {e['source']: (e['weight'], e['type']) for e in build_topic_graph(index, sens)['edges']}
+    assert topics == {'Inputs::Revenue': (round(10.5 / 12, 4), 'supports'),
+                      'Rate_Table::Growth': (round(0.5 / 12, 4), 'supports'),
+                      'Inputs::Cost': (round(1 / 12, 4), 'opposes')}
+
+    lineage = build_lineage_graph(index, max_targets=1, sensitivity=sens)
+    weights = {e['source']: (e['weight'], e['type']) for e in lineage['edges'] if e['target'] == 'Projection_B2'}
+    assert weights == {'Inputs_B2': (0.875, 'supports'), 'Rate_Table_B2': (round(0.5 / 12, 4), 'supports'),
+                       'Inputs_C2': (round(1 / 12, 4), 'opposes')}
+    assert build_lineage_graph(index, sensitivity={}) == build_lineage_graph(index)
+
+    # Mixed magnitudes on one sheet: D2 depends fully (elasticity 1) on the growth rate, and
+    # its scale does not matter; each B_r contributes 11.5 / 9.5 to Inputs and 0.5 / 9.5 to Rate
+    weights = []
+    for scale in (1, 1_000_000):
+        wb = openpyxl.load_workbook(workbook)
+        wb['Projection']['D2'] = f"='Rate Table'!B3*{scale}"
+        path = tmp_path / f'scaled{scale}.xlsx'
+        wb.save(path)
+        index = scan_workbook(path, values=True)
+        sheet = build_sheet_dependency_graph(index, WorkbookModel(index).reference_sensitivities())
+        weights.append({(e['source'], e['target']): e['weight'] for e in sheet['edges']})
+    assert weights[0] == weights[1] == {('Inputs', 'Projection'): 0.8, ('Rate Table', 'Projection'): 0.2}
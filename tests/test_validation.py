@@ -5,11 +5,22 @@ Bayesian Belief Graph Test Validation
 
 This script validates the mathematical calculations in the belief graph tool
 by manually computing expected values and comparing with observed results.
+
+The batched checks (``validate_multi_parent_bayes_batch``) need numpy:
+    pip install numpy
 """
 
 import math
+import sys
+import time
 from typing import List, Dict, Tuple
 
+try:
+    import numpy as np
+except Exception:
+    print("Missing dependency 'numpy'. Install with: pip install numpy", file=sys.stderr)
+    raise
+
 def validate_single_parent_bayes(parent_prob: float, cond_true: float, cond_false: float) -> float:
     """
     Validate single parent Bayesian calculation:
@@ -55,7 +66,8 @@ def validate_multi_parent_bayes(parent_probs: List[float], cpts: List[Dict]) ->
     
     print(f"Multi-Parent Validation ({n_parents} parents):")
     print(f"  Parent probabilities: {[f'{p:.4f}' for p in parent_probs]}")
-    print(f"  Baselines: {[f'{cpt['baseline']:.1f}%' for cpt in cpts]}")
+    baselines = [f"{cpt['baseline']:.1f}%" for cpt in cpts]
+    print(f"  Baselines: {baselines}")
     print(f"  Enumerating {2**n_parents} combinations:")
     
     for combo in range(2**n_parents):
@@ -100,6 +112,78 @@ def validate_multi_parent_bayes(parent_probs: List[float], cpts: List[Dict]) ->
     print()
     return total_prob
 
+def parent_state_combos(n_parents: int) -> np.ndarray:
+    """
+    Build the (2^n, n) boolean matrix of parent states.
+
+    Row ``combo`` has column ``i`` set when bit ``i`` of ``combo`` is set, which is
+    the same ordering used by ``validate_multi_parent_bayes`` and bayes-logic.js.
+    """
+    combo_ids = np.arange(1 << n_parents, dtype=np.int64)
+    return ((combo_ids[:, None] >> np.arange(n_parents)) & 1).astype(bool)
+
+
+def validate_multi_parent_bayes_batch(parent_probs: np.ndarray, cpts: np.ndarray,
+                                      chunk_size: int = 4096) -> np.ndarray:
+    """
+    Vectorized exact enumeration for a batch of multi-parent nodes.
+
+    Computes the same quantity as ``validate_multi_parent_bayes`` for every row of
+    the batch at once: the combination matrix is built once, and the combo
+    probabilities, likelihood products, baseline normalization and clamped
+    contributions are all array operations. Nodes are processed in chunks so the
+    (chunk, 2^n) work arrays stay bounded in memory.
+
+    Args:
+        parent_probs: (B, n) array of P(Parent_i=true) as decimals
+        cpts: (B, n, 3) array of [condTrue, condFalse, baseline] (all percentages)
+        chunk_size: number of nodes evaluated per vectorized pass
+
+    Returns:
+        (B,) array of P(Child=true) as decimals
+    """
+    parent_probs = np.asarray(parent_probs, dtype=np.float64)
+    cpts = np.asarray(cpts, dtype=np.float64)
+    if parent_probs.ndim != 2 or cpts.shape != parent_probs.shape + (3,):
+        raise ValueError(f"Expected parent_probs (B, n) and cpts (B, n, 3); got {parent_probs.shape} and {cpts.shape}")
+
+    n_nodes, n_parents = parent_probs.shape
+    combos = parent_state_combos(n_parents)
+    result = np.empty(n_nodes, dtype=np.float64)
+
+    for start in range(0, n_nodes, chunk_size):
+        stop = min(start + chunk_size, n_nodes)
+        p = parent_probs[start:stop]
+        cond_true = cpts[start:stop, :, 0] / 100
+        cond_false = cpts[start:stop, :, 1] / 100
+        baseline = cpts[start:stop, :, 2] / 100
+
+        p_combo = np.ones((stop - start, combos.shape[0]))
+        likelihood_product = np.ones_like(p_combo)
+        for i in range(n_parents):
+            state = combos[:, i]
+            p_combo *= np.where(state, p[:, i:i + 1], 1 - p[:, i:i + 1])
+            likelihood_product *= np.where(state, cond_true[:, i:i + 1], cond_false[:, i:i + 1])
+
+        # Baseline normalization does not depend on the combination
+        baseline_normalization = baseline.prod(axis=1) / baseline[:, 0]
+        p_child_given_combo = np.clip(likelihood_product / baseline_normalization[:, None], 0, 1)
+        result[start:stop] = (p_combo * p_child_given_combo).sum(axis=1)
+
+    return result
+
+
+def random_multi_parent_cases(n_nodes: int, n_parents: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Generate random parent probabilities and CPTs (percentages) for batch validation."""
+    rng = np.random.default_rng(seed)
+    parent_probs = rng.uniform(0, 1, size=(n_nodes, n_parents))
+    cpts = np.empty((n_nodes, n_parents, 3))
+    cpts[..., 0] = rng.uniform(1, 99, size=(n_nodes, n_parents))
+    cpts[..., 1] = rng.uniform(1, 99, size=(n_nodes, n_parents))
+    cpts[..., 2] = rng.uniform(30, 70, size=(n_nodes, n_parents))
+    return parent_probs, cpts
+
+
 def validate_and_node(parent_probs: List[float], inverses: List[bool] = None) -> float:
     """Validate AND node calculation: product of parent probabilities (with optional inversions)"""
     if inverses is None:
@@ -204,6 +288,32 @@ print("TEST CASE 8: AND Node with Inversions")
 print("-" * 40)
 validate_and_node([0.8, 0.6, 0.9], inverses=[False, True, False])
 
+# Test Case 9: Batched enumeration agrees with the per-node reference
+print("TEST CASE 9: Batched Enumeration vs Per-Node Enumeration")
+print("-" * 40)
+batch_probs, batch_cpts = random_multi_parent_cases(n_nodes=3, n_parents=3, seed=9)
+batch_result = validate_multi_parent_bayes_batch(batch_probs, batch_cpts)
+for i in range(len(batch_result)):
+    expected = validate_multi_parent_bayes(
+        parent_probs=list(batch_probs[i]),
+        cpts=[{'condTrue': ct, 'condFalse': cf, 'baseline': bl} for ct, cf, bl in batch_cpts[i]]
+    )
+    assert math.isclose(batch_result[i], expected, rel_tol=1e-12, abs_tol=1e-12), (batch_result[i], expected)
+print(f"  Batched results: {[f'{r:.4f}' for r in batch_result]} (match per-node enumeration)")
+print()
+
+# Test Case 10: Large randomized batch at the 8-parent exact-enumeration cutoff
+print("TEST CASE 10: 100,000 Random Nodes with 8 Parents")
+print("-" * 40)
+batch_probs, batch_cpts = random_multi_parent_cases(n_nodes=100_000, n_parents=8, seed=10)
+t0 = time.perf_counter()
+batch_result = validate_multi_parent_bayes_batch(batch_probs, batch_cpts)
+elapsed = time.perf_counter() - t0
+assert np.all((batch_result >= 0) & (batch_result <= 1 + 1e-9))
+print(f"  Evaluated {len(batch_result)} nodes x {1 << 8} combinations in {elapsed:.2f}s")
+print(f"  Mean P(child=true): {batch_result.mean():.4f}")
+print()
+
 print("="*60)
 print("VALIDATION COMPLETE")
 print("="*60)